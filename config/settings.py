@@ -84,6 +84,18 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # BEGIN IMMEDIATE: toda transação reserva o lock de escrita já no início.
+            # Evita o "database is locked" na promoção leitura -> escrita e serializa a
+            # verificação de conflito + gravação do apontamento (produtividade.registro).
+            'transaction_mode': 'IMMEDIATE',
+            # Segundos aguardando o lock antes de falhar (envios simultâneos no pico)
+            'timeout': int(os.getenv('SQLITE_TIMEOUT', '20')),
+        },
+        # Testes em arquivo: o banco em memória compartilhada responde "table is locked"
+        # na hora em vez de aguardar o lock, e o teste de envios simultâneos precisa do
+        # mesmo comportamento de produção.
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -149,4 +161,66 @@ DJANGO_API_KEY = os.getenv('DJANGO_API_KEY', 'chave_secreta_123')
 CORS_ALLOWED_ORIGINS = [
     "http://127.0.0.1:8081",  # Local do Dashboard PHP
     "http://localhost:8081",  # Variação comum
-]
\ No newline at end of file
+]
+
+# ARQUIVAMENTO DE DADOS ANTIGOS
+# Registros mais antigos que este número de dias são movidos para as tabelas de arquivo
+# pelo comando 'python manage.py arquivar_apontamentos' (agendar via cron).
+ARQUIVO_APONTAMENTOS_DIAS = int(os.getenv('ARQUIVO_APONTAMENTOS_DIAS', '365'))
+
+# BACKUP A QUENTE DO BANCO
+# Diretório e quantidade de cópias mantidas por 'python manage.py manutencao_banco' (cron).
+BACKUP_DIR = os.getenv('BACKUP_DIR', str(BASE_DIR / 'backups'))
+BACKUP_MANTER = int(os.getenv('BACKUP_MANTER', '14'))
+
+# FEED AO VIVO DO DASHBOARD (SSE)
+# Tempo máximo (segundos) de cada conexão; o EventSource reconecta automaticamente.
+DASHBOARD_SSE_DURACAO = int(os.getenv('DASHBOARD_SSE_DURACAO', '300'))
+
+# FILA DE GRAVAÇÃO (WRITE-BEHIND) PARA OS PICOS DE ENVIO
+# Com FILA_GRAVACAO=1 os novos apontamentos validados vão para um arquivo SQLite separado
+# e o usuário recebe um protocolo na hora; 'python manage.py processar_fila' (um único
+# processo) grava a fila em lotes no banco principal. Ver produtividade/fila.py.
+FILA_GRAVACAO = os.getenv('FILA_GRAVACAO', '') == '1'
+FILA_SQLITE_PATH = os.getenv('FILA_SQLITE_PATH', str(BASE_DIR / 'fila.sqlite3'))
+
+# PACOTE DE FECHAMENTO (PLANILHAS EM PROCESSOS PARALELOS)
+# Arquivo de trava que limita a um o número de pacotes gerados em paralelo na máquina;
+# os demais pedidos simultâneos são gerados em série. Ver produtividade/pacote.py.
+PACOTE_TRAVA_PATH = os.getenv('PACOTE_TRAVA_PATH', str(BASE_DIR / 'pacote.lock'))
+
+# FOLHA (HORAS NORMAIS, EXTRAS E ADICIONAL NOTURNO)
+# Jornada diária em minutos, de segunda a sábado, separada por vírgulas. O que passar da
+# jornada do dia é hora extra 50%; domingos e feriados são extra 100%. Ver produtividade/folha.py.
+FOLHA_JORNADA_MINUTOS = tuple(
+    int(m) for m in os.getenv('FOLHA_JORNADA_MINUTOS', '528,528,528,528,528,0').split(',')
+)
+
+# AUDITORIA DE APONTAMENTOS
+# Total diário (minutos) acima do qual o dia do colaborador é apontado como suspeito
+# por 'python manage.py auditar_apontamentos' e pela tela de auditoria.
+AUDITORIA_LIMITE_DIARIO_MINUTOS = int(os.getenv('AUDITORIA_LIMITE_DIARIO_MINUTOS', str(16 * 60)))
+
+# CACHE COMPARTILHADO ENTRE WORKERS
+# Padrão: arquivo SQLite local (sem serviço externo). Com CACHE_URL=redis://... usa o
+# backend Redis do Django (qualquer servidor compatível: Redis, Valkey, KeyDB).
+CACHE_URL = os.getenv('CACHE_URL', '')
+if CACHE_URL.startswith(('redis://', 'rediss://', 'unix://')):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+            'KEY_PREFIX': 'produtividade',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'produtividade.cache_sqlite.SQLiteCache',
+            'LOCATION': os.getenv('CACHE_SQLITE_PATH', str(BASE_DIR / 'cache.sqlite3')),
+            'OPTIONS': {
+                'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '50000')),
+                'MMAP_SIZE': 256 * 1024 * 1024,
+            },
+        }
+    }
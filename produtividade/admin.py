@@ -1,11 +1,90 @@
+import csv
+import hashlib
+
+from django import forms
 from django.contrib import admin
-from .models import Projeto, Colaborador, Veiculo, Apontamento, Setor, CodigoCliente, CentroCusto
+from django.contrib.admin import helpers
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.core.validators import FileExtensionValidator
+from django.http import StreamingHttpResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .busca import filtrar_por_texto
+from .cache_tags import obter_ou_calcular
+from .importacao import CADASTROS, importar_cadastro
+from .linhas import linhas_apontamentos
+from .lote import atualizar_em_lote, reatribuir_em_lote
+from .relatorio import CABECALHO_RELATORIO, linhas_relatorio
+from .views import Echo
+from .models import Projeto, Colaborador, Veiculo, Apontamento, Setor, CodigoCliente, CentroCusto, ApontamentoArquivado, FechamentoPeriodo, FechamentoResumo, Feriado, ImportacaoLegado
 
 # ==============================================================================
 # CADASTROS AUXILIARES
 # Tabelas de apoio para o funcionamento do sistema (Obras, Pessoas, Ativos)
 # ==============================================================================
 
+class ImportacaoPlanilhaForm(forms.Form):
+    arquivo = forms.FileField(
+        label="Planilha", validators=[FileExtensionValidator(['xlsx', 'csv'])],
+        help_text="Arquivo .xlsx ou .csv (separador ; ou ,)."
+    )
+    simular = forms.BooleanField(label="Apenas validar (não grava)", required=False)
+
+
+class ImportacaoPlanilhaMixin:
+    """Página 'Importar planilha' na listagem do cadastro (upsert em lote, ver importacao.py)."""
+    tipo_importacao = None
+    change_list_template = 'admin/produtividade/change_list_importacao.html'
+
+    # Quantidade máxima de linhas com erro exibidas na página
+    LIMITE_ERROS = 200
+
+    def get_urls(self):
+        nome = f'{self.model._meta.app_label}_{self.model._meta.model_name}_importar'
+        return [
+            path('importar/', self.admin_site.admin_view(self.importar_view), name=nome),
+        ] + super().get_urls()
+
+    def importar_view(self, request):
+        if not (self.has_add_permission(request) and self.has_change_permission(request)):
+            raise PermissionDenied
+
+        cadastro = CADASTROS[self.tipo_importacao]
+        form = ImportacaoPlanilhaForm(request.POST or None, request.FILES or None)
+        erros = []
+        if request.method == 'POST' and form.is_valid():
+            arquivo = form.cleaned_data['arquivo']
+            simular = form.cleaned_data['simular']
+            resultado = importar_cadastro(self.tipo_importacao, arquivo, arquivo.name, simular=simular)
+            acao = "validados" if simular else "importados"
+            self.message_user(
+                request, f"{resultado.processados} registro(s) {acao}: {resultado.criados} novo(s), "
+                f"{resultado.atualizados} atualizado(s)."
+            )
+            if not resultado.erros and not simular:
+                return redirect(f'admin:{self.model._meta.app_label}_{self.model._meta.model_name}_changelist')
+            if resultado.erros:
+                self.message_user(request, f"{len(resultado.erros)} linha(s) com erro foram ignoradas.", level='warning')
+            erros = resultado.erros[:self.LIMITE_ERROS]
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': f"Importar {self.model._meta.verbose_name_plural}",
+            'opts': self.model._meta,
+            'form': form,
+            'erros': erros,
+            'chave': cadastro.chave,
+            'colunas': list(cadastro.colunas),
+        }
+        return TemplateResponse(request, 'admin/produtividade/importar_cadastro.html', context)
+
+
 @admin.register(Setor)
 class SetorAdmin(admin.ModelAdmin):
     """Gerenciamento de Setores/Departamentos (ex: Manutenção, E&O)."""
@@ -21,28 +100,39 @@ class CentroCustoAdmin(admin.ModelAdmin):
     list_filter = ('ativo', 'permite_alocacao')
 
 
+@admin.register(Feriado)
+class FeriadoAdmin(admin.ModelAdmin):
+    """Feriados: fora do controle de dias sem apontamento e extra 100% na folha."""
+    list_display = ('data', 'descricao')
+    search_fields = ('descricao',)
+    date_hierarchy = 'data'
+
+
 @admin.register(Projeto)
-class ProjetoAdmin(admin.ModelAdmin):
+class ProjetoAdmin(ImportacaoPlanilhaMixin, admin.ModelAdmin):
     """Gerenciamento de Obras e Projetos."""
+    tipo_importacao = 'projeto'
     list_display = ('codigo', 'nome', 'ativo')
     search_fields = ('codigo', 'nome')
     list_filter = ('ativo',)
 
 
 @admin.register(CodigoCliente)
-class CodigoClienteAdmin(admin.ModelAdmin):
+class CodigoClienteAdmin(ImportacaoPlanilhaMixin, admin.ModelAdmin):
     """Gerenciamento de Códigos de Cliente (4 dígitos)."""
+    tipo_importacao = 'cliente'
     list_display = ('codigo', 'nome', 'ativo')
     search_fields = ('codigo', 'nome')
     list_filter = ('ativo',)
 
 
 @admin.register(Colaborador)
-class ColaboradorAdmin(admin.ModelAdmin):
+class ColaboradorAdmin(ImportacaoPlanilhaMixin, admin.ModelAdmin):
     """
     Cadastro de funcionários e prestadores de serviço. 
     Permite vincular o colaborador à conta de usuário e definir setores gerenciados.
     """
+    tipo_importacao = 'colaborador'
     list_display = ('id_colaborador', 'nome_completo', 'cargo', 'setor', 'user_account')
     search_fields = ('nome_completo', 'id_colaborador')
     list_filter = ('cargo', 'setor')
@@ -54,8 +144,9 @@ class ColaboradorAdmin(admin.ModelAdmin):
 
 
 @admin.register(Veiculo)
-class VeiculoAdmin(admin.ModelAdmin):
+class VeiculoAdmin(ImportacaoPlanilhaMixin, admin.ModelAdmin):
     """Cadastro da frota de veículos oficiais ou alugados."""
+    tipo_importacao = 'veiculo'
     list_display = ('placa', 'descricao')
     search_fields = ('placa', 'descricao')
 
@@ -65,14 +156,130 @@ class VeiculoAdmin(admin.ModelAdmin):
 # Tabela onde ficam armazenados os apontamentos de horas e produtividade
 # ==============================================================================
 
+# --- Listagem para alto volume (milhões de linhas) ---
+
+class PaginadorContagemCache(Paginator):
+    """
+    Paginador com COUNT(*) em cache por alguns minutos, por consulta (SQL + parâmetros).
+    Navegar entre páginas do mesmo filtro não refaz a contagem; o total pode ficar
+    defasado por até TIMEOUT segundos, o que é aceitável para a listagem do admin.
+    """
+    TIMEOUT = 120
+
+    @cached_property
+    def count(self):
+        sql, params = self.object_list.query.sql_with_params()
+        assinatura = hashlib.blake2s(f"{sql}|{params!r}".encode(), digest_size=10).hexdigest()
+        return obter_ou_calcular(
+            f'admin:contagem:{assinatura}', self.object_list.count, timeout=self.TIMEOUT
+        )
+
+
+class FiltroAutocomplete(admin.FieldListFilter):
+    """
+    Filtro por chave estrangeira sem carregar todas as opções na lateral.
+    O valor é escolhido pelo autocomplete do próprio admin (select2); apenas o item
+    selecionado é lido do banco. Requer search_fields no admin do modelo relacionado.
+    """
+    template = 'admin/produtividade/filtro_autocomplete.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.parametro = f'{field_path}__{field.target_field.name}__exact'
+        valor = params.get(self.parametro)
+        self.valor = valor[-1] if isinstance(valor, list) else valor
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.url_autocomplete = reverse(f'{model_admin.admin_site.name}:autocomplete')
+        self.app_label = model._meta.app_label
+        self.model_name = model._meta.model_name
+        self.url_base = '?'
+
+    def expected_parameters(self):
+        return [self.parametro]
+
+    def get_facet_counts(self, pk_attname, filtered_qs):
+        return {}
+
+    @cached_property
+    def selecionado(self):
+        if not self.valor:
+            return None
+        return self.field.remote_field.model._default_manager.filter(pk=self.valor).first()
+
+    def choices(self, changelist):
+        self.url_base = changelist.get_query_string(remove=[self.parametro])
+        yield {
+            'selected': not self.valor,
+            'query_string': self.url_base,
+            'display': 'Todos',
+        }
+        if self.selecionado is not None:
+            yield {
+                'selected': True,
+                'query_string': changelist.get_query_string({self.parametro: self.valor}),
+                'display': str(self.selecionado),
+            }
+
+
+# --- Formulários das ações em lote ---
+
+class RejeicaoLoteForm(forms.Form):
+    motivo_rejeicao = forms.CharField(label="Motivo da rejeição", widget=forms.Textarea(attrs={'rows': 3, 'cols': 60}))
+
+
+class AprovacaoLoteForm(forms.Form):
+    """Comentário obrigatório, como na análise individual (processar_aprovacao_view)."""
+    motivo_rejeicao = forms.CharField(label="Comentário da aprovação", widget=forms.Textarea(attrs={'rows': 3, 'cols': 60}))
+
+
+class ReatribuicaoLoteForm(forms.Form):
+    """Novo projeto e/ou centro de custo para os registros selecionados (autocomplete do admin)."""
+
+    def __init__(self, *args, admin_site, **kwargs):
+        super().__init__(*args, **kwargs)
+        for nome, model in (('projeto', Projeto), ('centro_custo', CentroCusto)):
+            self.fields[nome] = forms.ModelChoiceField(
+                model.objects.filter(ativo=True), required=False,
+                label=Apontamento._meta.get_field(nome).verbose_name,
+                widget=AutocompleteSelect(Apontamento._meta.get_field(nome), admin_site),
+            )
+
+    def clean(self):
+        dados = super().clean()
+        if not dados.get('projeto') and not dados.get('centro_custo'):
+            raise forms.ValidationError("Informe o projeto e/ou o centro de custo.")
+        centro_custo = dados.get('centro_custo')
+        if dados.get('projeto') and centro_custo and not centro_custo.permite_alocacao:
+            raise forms.ValidationError(f"O centro de custo {centro_custo} não permite alocação em obra.")
+        return dados
+
+
+class BuscaTextoMixin:
+    """
+    Soma à busca padrão do admin a busca textual em ocorrências e motivos
+    (índice FTS, ver produtividade/busca.py) no lugar de LIKE '%...%' na tabela inteira.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        resultado, duplicados = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            resultado = resultado | filtrar_por_texto(queryset, search_term)
+        return resultado, duplicados
+
+
 @admin.register(Apontamento)
-class ApontamentoAdmin(admin.ModelAdmin):
+class ApontamentoAdmin(BuscaTextoMixin, admin.ModelAdmin):
     """
     Visão geral dos apontamentos de produtividade.
     Configurado para alta performance com muitos registros e facilidade de auditoria.
     """
-    # Navegação rápida por data no topo da lista
+    # Navegação rápida por data no topo da lista (apoiada pelo índice apontamento_data_id_idx)
     date_hierarchy = 'data_apontamento'
+
+    # Alto volume: relações da listagem em um único JOIN, contagem em cache
+    # e sem o segundo COUNT(*) do total sem filtros
+    list_select_related = ('colaborador', 'projeto', 'codigo_cliente', 'centro_custo', 'registrado_por')
+    paginator = PaginadorContagemCache
+    show_full_result_count = False
     
     list_display = (
         'data_apontamento',
@@ -91,8 +298,8 @@ class ApontamentoAdmin(admin.ModelAdmin):
         'status_ajuste',
         'em_plantao',
         'dorme_fora',
-        'centro_custo',
-        'projeto'
+        ('centro_custo', FiltroAutocomplete),
+        ('projeto', FiltroAutocomplete),
     )
 
     search_fields = (
@@ -100,13 +307,18 @@ class ApontamentoAdmin(admin.ModelAdmin):
         'projeto__nome',
         'projeto__codigo',
         'codigo_cliente__nome',
-        'ocorrencias'    
     )
 
     # Otimização: Transforma dropdowns em campos de busca (AJAX)
     # Requer que os Admins relacionados tenham 'search_fields' definidos
     autocomplete_fields = ['colaborador', 'projeto', 'codigo_cliente', 'centro_custo', 'veiculo']
 
+    @property
+    def media(self):
+        # select2 também na listagem (FiltroAutocomplete); mesma mídia do widget de autocomplete
+        widget = AutocompleteSelect(Apontamento._meta.get_field('projeto'), self.admin_site)
+        return super().media + widget.media
+
     # Campos que não devem ser editados manualmente para manter integridade
     readonly_fields = ('data_registro', 'registrado_por')
 
@@ -148,6 +360,27 @@ class ApontamentoAdmin(admin.ModelAdmin):
         }),
     )
 
+    # --- Bloqueio de Competência Fechada ---
+
+    def has_change_permission(self, request, obj=None):
+        """Registros de meses fechados ficam somente leitura."""
+        if obj is not None and FechamentoPeriodo.data_esta_fechada(obj.data_apontamento):
+            return False
+        return super().has_change_permission(request, obj)
+
+    def has_delete_permission(self, request, obj=None):
+        if obj is not None and FechamentoPeriodo.data_esta_fechada(obj.data_apontamento):
+            return False
+        return super().has_delete_permission(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        """Exclusão em massa ignora registros de competências fechadas."""
+        bloqueados = queryset.filter(FechamentoPeriodo.filtro_fechados())
+        qtd_bloqueados = bloqueados.count()
+        if qtd_bloqueados:
+            self.message_user(request, f"{qtd_bloqueados} registro(s) de competência fechada não foram excluídos.", level='warning')
+        super().delete_queryset(request, queryset.exclude(pk__in=bloqueados.values('pk')))
+
     # --- Métodos Personalizados para Listagem ---
 
     def get_tipo_local(self, obj):
@@ -172,4 +405,159 @@ class ApontamentoAdmin(admin.ModelAdmin):
                 return f"{base} -> Cli: {obj.codigo_cliente.codigo}"
             return base
         return "—"
-    get_detalhe_local.short_description = "Local / Detalhe"
\ No newline at end of file
+    get_detalhe_local.short_description = "Local / Detalhe"
+
+    # --- Ações em Lote (um UPDATE por ação; histórico com bulk_create, ver lote.py) ---
+
+    actions = ['aprovar_selecionados', 'rejeitar_selecionados', 'aprovar_ajustes_selecionados',
+               'reatribuir_selecionados', 'exportar_selecionados']
+
+    def _aplicar_lote(self, request, queryset, descricao, **valores):
+        atualizados, ignorados = atualizar_em_lote(queryset, request.user, **valores)
+        self.message_user(request, f"{atualizados} registro(s) {descricao}.")
+        if ignorados:
+            self.message_user(request, f"{ignorados} registro(s) de competência fechada não foram alterados.", level='warning')
+
+    def _formulario_lote(self, request, queryset, acao, titulo, form):
+        """Página intermediária da ação (mesmo fluxo da confirmação de exclusão do admin)."""
+        context = {
+            **self.admin_site.each_context(request),
+            'title': titulo,
+            'opts': self.model._meta,
+            'form': form,
+            'media': self.media + form.media,
+            'acao': acao,
+            'total': queryset.count(),
+            'selecionados': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'select_across': request.POST.get('select_across', '0'),
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        }
+        return TemplateResponse(request, 'admin/produtividade/apontamento/acao_lote.html', context)
+
+    @admin.action(description="Aprovar selecionados (com comentário)")
+    def aprovar_selecionados(self, request, queryset):
+        form = AprovacaoLoteForm(request.POST if 'aplicar' in request.POST else None)
+        if form.is_valid():
+            self._aplicar_lote(
+                request, queryset, "aprovado(s)",
+                status_aprovacao='APROVADO', motivo_rejeicao=form.cleaned_data['motivo_rejeicao'].strip()
+            )
+            return None
+        return self._formulario_lote(request, queryset, 'aprovar_selecionados', "Aprovar apontamentos", form)
+
+    @admin.action(description="Rejeitar selecionados (com motivo)")
+    def rejeitar_selecionados(self, request, queryset):
+        form = RejeicaoLoteForm(request.POST if 'aplicar' in request.POST else None)
+        if form.is_valid():
+            self._aplicar_lote(
+                request, queryset, "rejeitado(s)",
+                status_aprovacao='REJEITADO', motivo_rejeicao=form.cleaned_data['motivo_rejeicao'].strip()
+            )
+            return None
+        return self._formulario_lote(request, queryset, 'rejeitar_selecionados', "Rejeitar apontamentos", form)
+
+    @admin.action(description="Marcar solicitações de ajuste como aprovadas")
+    def aprovar_ajustes_selecionados(self, request, queryset):
+        self._aplicar_lote(request, queryset.filter(status_ajuste__isnull=False), "com ajuste aprovado", status_ajuste='APROVADO')
+
+    @admin.action(description="Reatribuir projeto / centro de custo")
+    def reatribuir_selecionados(self, request, queryset):
+        form = ReatribuicaoLoteForm(request.POST if 'aplicar' in request.POST else None, admin_site=self.admin_site)
+        if form.is_valid():
+            atualizados, fechados, incompativeis = reatribuir_em_lote(
+                queryset, request.user, form.cleaned_data['projeto'], form.cleaned_data['centro_custo']
+            )
+            self.message_user(request, f"{atualizados} registro(s) reatribuído(s).")
+            if fechados:
+                self.message_user(request, f"{fechados} registro(s) de competência fechada não foram alterados.", level='warning')
+            if incompativeis:
+                self.message_user(
+                    request,
+                    f"{incompativeis} registro(s) ignorado(s): o local (interno/externo) ou o centro de custo "
+                    "não admite essa combinação.",
+                    level='warning',
+                )
+            return None
+        return self._formulario_lote(request, queryset, 'reatribuir_selecionados', "Reatribuir apontamentos", form)
+
+    @admin.action(description="Exportar selecionados (CSV)")
+    def exportar_selecionados(self, request, queryset):
+        """Mesmo layout do relatório CSV, em streaming (uma leitura em blocos)."""
+        writer = csv.writer(Echo(), delimiter=';')
+        linhas = linhas_apontamentos(queryset.order_by())
+
+        def gerar():
+            yield '\ufeff'
+            yield writer.writerow(CABECALHO_RELATORIO)
+            for row in linhas_relatorio(linhas):
+                yield writer.writerow(['' if v is None else v for v in row])
+
+        response = StreamingHttpResponse(gerar(), content_type='text/csv; charset=utf-8')
+        filename = f"Apontamentos_Selecionados_{timezone.now().strftime('%Y%m%d_%H%M')}.csv"
+        response['Content-Disposition'] = f'attachment; filename={filename}'
+        return response
+
+
+# ==============================================================================
+# ARQUIVO (DADOS FRIOS)
+# Consulta somente leitura dos registros movidos por 'arquivar_apontamentos'
+# ==============================================================================
+
+@admin.register(ApontamentoArquivado)
+class ApontamentoArquivadoAdmin(BuscaTextoMixin, admin.ModelAdmin):
+    """Consulta dos apontamentos arquivados (não permite inclusão ou edição)."""
+    date_hierarchy = 'data_apontamento'
+    list_display = ('id', 'data_apontamento', 'colaborador', 'hora_inicio', 'hora_termino', 'status_aprovacao', 'data_arquivamento')
+    list_select_related = ('colaborador',)
+    search_fields = ('colaborador__nome_completo', 'projeto__codigo')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+
+# ==============================================================================
+# FECHAMENTO DE PERÍODO (FOLHA)
+# Totais congelados; excluir um fechamento reabre a competência
+# ==============================================================================
+
+class FechamentoResumoInline(admin.TabularInline):
+    model = FechamentoResumo
+    fields = ('colaborador', 'total_minutos', 'qtd_registros', 'dias_plantao', 'dias_dorme_fora', 'rateio')
+    readonly_fields = fields
+    can_delete = False
+    extra = 0
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(FechamentoPeriodo)
+class FechamentoPeriodoAdmin(admin.ModelAdmin):
+    """Competências fechadas. Criação apenas pela tela de Fechamento de Período."""
+    list_display = ('__str__', 'fechado_por', 'data_fechamento')
+    readonly_fields = ('ano', 'mes', 'fechado_por', 'data_fechamento')
+    inlines = [FechamentoResumoInline]
+
+    def has_add_permission(self, request):
+        return False
+
+
+# ==============================================================================
+# IMPORTAÇÕES DE PLANILHAS LEGADAS
+# Checkpoints do comando 'importar_legado' (somente consulta)
+# ==============================================================================
+
+@admin.register(ImportacaoLegado)
+class ImportacaoLegadoAdmin(admin.ModelAdmin):
+    list_display = ('nome_arquivo', 'importados', 'rejeitados', 'ultima_posicao', 'iniciado_em', 'concluido_em')
+    readonly_fields = [f.name for f in ImportacaoLegado._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
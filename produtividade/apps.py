@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ProdutividadeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'produtividade'
+
+    def ready(self):
+        from . import cache_tags, eventos
+        eventos.conectar_signals()
+        cache_tags.conectar_signals()
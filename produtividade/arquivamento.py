@@ -0,0 +1,103 @@
+"""
+Arquivamento de apontamentos antigos (dados quentes x frios).
+
+A tabela principal guarda apenas o período operacional. Registros fechados mais
+antigos que o corte são movidos para as tabelas de arquivo, mantendo o ID original.
+Leituras de longo prazo (exportações e histórico do Owner) consultam as duas tabelas
+pelo pipeline de linhas.py.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import router, transaction
+from django.utils import timezone
+
+from .cache_tags import invalidar, tag_mes
+from .models import (
+    Apontamento, ApontamentoArquivado, ApontamentoHistorico, ApontamentoHistoricoArquivado
+)
+
+# Registros em fluxo de aprovação continuam na tabela principal até serem resolvidos
+STATUS_NAO_ARQUIVAVEIS = ('EM_ANALISE', 'SOLICITACAO_AJUSTE')
+
+
+def data_corte_padrao():
+    """Data limite padrão: hoje menos ARQUIVO_APONTAMENTOS_DIAS."""
+    dias = getattr(settings, 'ARQUIVO_APONTAMENTOS_DIAS', 365)
+    return timezone.now().date() - timedelta(days=dias)
+
+
+def candidatos_arquivamento(data_corte):
+    """Apontamentos anteriores à data de corte e fora do fluxo de aprovação."""
+    return Apontamento.objects.filter(
+        data_apontamento__lt=data_corte
+    ).exclude(status_aprovacao__in=STATUS_NAO_ARQUIVAVEIS)
+
+
+def _campos_copiaveis(model):
+    """Nomes de coluna (attname) dos campos concretos, exceto M2M."""
+    return [f.attname for f in model._meta.concrete_fields]
+
+
+@transaction.atomic
+def arquivar_lote(ids):
+    """
+    Move um lote de apontamentos (e seus auxiliares e históricos) para o arquivo.
+    Tudo acontece em uma única transação: ou o lote inteiro muda de tabela, ou nada.
+    Não publica eventos no feed do Dashboard; o cache dos meses e colaboradores
+    afetados é invalidado uma única vez, após o commit.
+    """
+    if not ids:
+        return 0
+
+    linhas = list(Apontamento.objects.filter(pk__in=ids).values(*_campos_copiaveis(Apontamento)))
+    ApontamentoArquivado.objects.bulk_create([ApontamentoArquivado(**linha) for linha in linhas])
+
+    # Auxiliares extras (tabela intermediária do M2M)
+    ThroughQuente = Apontamento.auxiliares_extras.through
+    ThroughFrio = ApontamentoArquivado.auxiliares_extras.through
+    vinculos = ThroughQuente.objects.filter(apontamento_id__in=ids).values_list(
+        'apontamento_id', 'colaborador_id'
+    )
+    ThroughFrio.objects.bulk_create([
+        ThroughFrio(apontamentoarquivado_id=ap_id, colaborador_id=colab_id)
+        for ap_id, colab_id in vinculos
+    ])
+
+    # Versões anteriores (snapshots de edição)
+    historicos = ApontamentoHistorico.objects.filter(apontamento_original_id__in=ids).values(
+        *_campos_copiaveis(ApontamentoHistorico)
+    )
+    ApontamentoHistoricoArquivado.objects.bulk_create([
+        ApontamentoHistoricoArquivado(**h) for h in historicos
+    ])
+
+    # Remoção da tabela quente (históricos e vínculos primeiro)
+    ApontamentoHistorico.objects.filter(apontamento_original_id__in=ids).delete()
+    ThroughQuente.objects.filter(apontamento_id__in=ids).delete()
+    # DELETE direto, sem signals: o delete() carregaria e removeria registro a registro
+    # (com consulta e evento por linha em eventos.py e uma invalidação por linha em cache_tags.py)
+    apagar = Apontamento.objects.filter(pk__in=ids)
+    apagar._raw_delete(router.db_for_write(Apontamento))
+
+    tags = {tag_mes(linha['data_apontamento']) for linha in linhas}
+    tags |= {f"colaborador:{linha['colaborador_id']}" for linha in linhas}
+    transaction.on_commit(lambda: invalidar(*tags))
+    return len(linhas)
+
+
+def arquivar_anteriores_a(data_corte, tamanho_lote=500):
+    """
+    Arquiva em lotes curtos para não segurar a trava de escrita do banco.
+    Gera o total acumulado após cada lote (útil para progresso no comando).
+    """
+    total = 0
+    while True:
+        ids = list(
+            candidatos_arquivamento(data_corte).order_by('pk').values_list('pk', flat=True)[:tamanho_lote]
+        )
+        if not ids:
+            break
+        total += arquivar_lote(ids)
+        yield total
+
@@ -0,0 +1,185 @@
+"""
+Auditoria de qualidade dos apontamentos (tabela principal + arquivo).
+
+Registros lançados pelo admin não passam pelo ApontamentoForm.clean, e a verificação
+do formulário compara horários só dentro do mesmo dia. Esta auditoria percorre a base
+inteira procurando:
+
+- SOBREPOSICAO: intervalos do mesmo colaborador que se sobrepõem, inclusive na virada
+  de dia (22h às 02h sobrepõe um registro das 01h do dia seguinte);
+- DIA_EXCESSIVO: total do colaborador no dia acima do limite (AUDITORIA_LIMITE_DIARIO_MINUTOS);
+- DUPLICADO: mesmo colaborador, dia, horário e destino (obra/cliente/centro de custo);
+- RATEIO_ORFAO: id_agrupamento com um único registro restante ou misturando
+  colaboradores ou dias diferentes.
+
+Varredura (sweep line): as duas tabelas são lidas em streaming, em lotes, ordenadas por
+(colaborador, data, hora de início, id) pelo índice apontamento_auditoria_idx (sem
+ordenação em memória no banco), e intercaladas com heapq.merge. Como os inícios chegam
+em ordem, basta guardar, por colaborador, o maior fim visto até agora: um início antes
+dele é sobreposição. A memória fica constante, seja qual for o tamanho da base. Os
+grupos de rateio são agregados no próprio banco (GROUP BY id_agrupamento).
+"""
+import heapq
+from collections import namedtuple
+from datetime import date
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .models import Apontamento, ApontamentoArquivado, Colaborador
+from .series import MinutosIntervalo
+
+TIPOS_ANOMALIA = {
+    'SOBREPOSICAO': 'Sobreposição de horário',
+    'DIA_EXCESSIVO': 'Total diário acima do limite',
+    'DUPLICADO': 'Registro duplicado',
+    'RATEIO_ORFAO': 'Rateio inconsistente',
+}
+
+TAMANHO_LOTE = 2000
+
+# registros: ((id, arquivado), ...) dos apontamentos envolvidos
+Anomalia = namedtuple('Anomalia', 'tipo colaborador_id data registros detalhe')
+
+_CAMPOS = (
+    'colaborador_id', 'data_apontamento', 'hora_inicio', 'id', 'hora_termino', 'minutos',
+    'projeto_id', 'codigo_cliente_id', 'centro_custo_id',
+)
+
+
+def _hhmm(minutos):
+    return f"{minutos // 60:02d}:{minutos % 60:02d}"
+
+
+def _registros_ordenados(model, filtro, arquivado, tamanho_lote):
+    """Linhas da tabela em ordem de varredura, lidas em lotes (iterator)."""
+    linhas = model.objects.filter(filtro).order_by(
+        'colaborador_id', 'data_apontamento', 'hora_inicio', 'id'
+    ).annotate(minutos=MinutosIntervalo()).values_list(*_CAMPOS)
+    for linha in linhas.iterator(chunk_size=tamanho_lote):
+        yield (*linha, arquivado)
+
+
+def varrer_intervalos(filtro=Q(), limite_diario=None, tamanho_lote=TAMANHO_LOTE):
+    """Sobreposições, dias acima do limite e duplicados, numa única passada ordenada."""
+    limite_diario = limite_diario or settings.AUDITORIA_LIMITE_DIARIO_MINUTOS
+    registros = heapq.merge(
+        _registros_ordenados(Apontamento, filtro, False, tamanho_lote),
+        _registros_ordenados(ApontamentoArquivado, filtro, True, tamanho_lote),
+        key=lambda r: r[:4],
+    )
+
+    colaborador_atual = dia_atual = None
+    maior_fim = registro_maior_fim = None
+    total_dia, registros_dia = 0, []
+    # Registros com o mesmo início (chave -> registro): duplicados chegam sempre juntos
+    comeco_vistos, vistos = None, {}
+
+    def fechar_dia():
+        if total_dia > limite_diario:
+            yield Anomalia(
+                'DIA_EXCESSIVO', colaborador_atual, dia_atual, tuple(registros_dia),
+                f"{_hhmm(total_dia)} apontadas no dia (limite {_hhmm(limite_diario)})",
+            )
+
+    for colaborador_id, data, inicio, pk, termino, minutos, projeto, cliente, centro, arquivado in registros:
+        registro = (pk, arquivado)
+        if (colaborador_id, data) != (colaborador_atual, dia_atual):
+            yield from fechar_dia()
+            if colaborador_id != colaborador_atual:
+                maior_fim = registro_maior_fim = comeco_vistos = None
+            colaborador_atual, dia_atual = colaborador_id, data
+            total_dia, registros_dia = 0, []
+        total_dia += minutos
+        registros_dia.append(registro)
+
+        # Minutos absolutos: a virada de dia entra pela duração
+        comeco = data.toordinal() * 1440 + inicio.hour * 60 + inicio.minute
+        fim = comeco + minutos
+
+        if comeco != comeco_vistos:
+            comeco_vistos, vistos = comeco, {}
+        chave = (termino, projeto, cliente, centro)
+        if chave in vistos:
+            yield Anomalia(
+                'DUPLICADO', colaborador_id, data, (vistos[chave], registro),
+                f"Mesmo horário ({inicio:%H:%M} às {termino:%H:%M}) e destino",
+            )
+        else:
+            vistos[chave] = registro
+            if maior_fim is not None and comeco < maior_fim:
+                yield Anomalia(
+                    'SOBREPOSICAO', colaborador_id, data, (registro_maior_fim, registro),
+                    f"Início {inicio:%H:%M} antes do fim do registro anterior ({_hhmm(maior_fim % 1440)})",
+                )
+
+        if maior_fim is None or fim > maior_fim:
+            maior_fim, registro_maior_fim = fim, registro
+
+    yield from fechar_dia()
+
+
+def rateios_orfaos(filtro=Q()):
+    """Grupos de rateio com um só registro ou com colaboradores/dias diferentes."""
+    grupos = {}
+    for model in (Apontamento, ApontamentoArquivado):
+        suspeitos = model.objects.filter(filtro, id_agrupamento__isnull=False).exclude(id_agrupamento='').order_by(
+        ).values('id_agrupamento').annotate(
+            qtd=Count('id'), colaboradores=Count('colaborador_id', distinct=True),
+            dias=Count('data_apontamento', distinct=True),
+        ).filter(Q(qtd=1) | Q(colaboradores__gt=1) | Q(dias__gt=1)).values_list('id_agrupamento', flat=True)
+        grupos.update(dict.fromkeys(suspeitos.iterator(chunk_size=TAMANHO_LOTE)))
+
+    # Um grupo pode estar dividido entre as tabelas (registro pendente não é arquivado):
+    # os suspeitos são reavaliados com os registros das duas
+    ids = list(grupos)
+    for i in range(0, len(ids), 500):
+        membros = {}
+        for model, arquivado in ((Apontamento, False), (ApontamentoArquivado, True)):
+            for grupo, pk, colaborador_id, data in model.objects.filter(
+                id_agrupamento__in=ids[i:i + 500]
+            ).order_by().values_list('id_agrupamento', 'id', 'colaborador_id', 'data_apontamento'):
+                membros.setdefault(grupo, []).append(((pk, arquivado), colaborador_id, data))
+
+        for grupo, itens in membros.items():
+            colaboradores = {c for _, c, _ in itens}
+            dias = {d for _, _, d in itens}
+            if len(itens) == 1:
+                detalhe = "Rateio com um único registro restante"
+            elif len(colaboradores) > 1 or len(dias) > 1:
+                detalhe = f"Rateio com {len(colaboradores)} colaboradores e {len(dias)} dias diferentes"
+            else:
+                continue
+            _, colaborador_id, data = min(itens, key=lambda item: item[2])
+            yield Anomalia(
+                'RATEIO_ORFAO', colaborador_id, data, tuple(sorted(r for r, _, _ in itens)),
+                f"{detalhe} (grupo {grupo})",
+            )
+
+
+def auditar(inicio=None, fim=None, limite_diario=None, tamanho_lote=TAMANHO_LOTE):
+    """Todas as anomalias (gerador), opcionalmente restritas ao período [inicio, fim]."""
+    filtro = Q()
+    if inicio:
+        filtro &= Q(data_apontamento__gte=inicio)
+    if fim:
+        filtro &= Q(data_apontamento__lte=fim)
+    yield from varrer_intervalos(filtro, limite_diario, tamanho_lote)
+    yield from rateios_orfaos(filtro)
+
+
+def nomes_colaboradores(anomalias):
+    """{colaborador_id: nome} dos colaboradores das anomalias."""
+    ids = {a.colaborador_id for a in anomalias}
+    return dict(Colaborador.objects.filter(pk__in=ids).values_list('pk', 'nome_completo'))
+
+
+def linha_anomalia(anomalia, nomes):
+    """Linha de exportação (CSV) de uma anomalia."""
+    return [
+        TIPOS_ANOMALIA[anomalia.tipo],
+        nomes.get(anomalia.colaborador_id, anomalia.colaborador_id),
+        anomalia.data.strftime('%d/%m/%Y') if isinstance(anomalia.data, date) else '',
+        ' '.join(f"{pk}{' (arquivo)' if arquivado else ''}" for pk, arquivado in anomalia.registros),
+        anomalia.detalhe,
+    ]
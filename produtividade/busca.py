@@ -0,0 +1,49 @@
+"""
+Busca textual em ocorrencias, motivo_ajuste e motivo_rejeicao.
+
+No SQLite usa os índices FTS5 criados na migração 0022 (sem acentos, por prefixo),
+um para a tabela principal e outro para o arquivo; em outros bancos cai para
+icontains nos três campos.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+CAMPOS_BUSCA = ('ocorrencias', 'motivo_ajuste', 'motivo_rejeicao')
+
+# Limite de termos por consulta (evita consultas FTS gigantes vindas da querystring)
+MAX_TERMOS = 8
+
+
+def termos_busca(texto):
+    return re.findall(r'\w+', texto or '')[:MAX_TERMOS]
+
+
+def consulta_fts(termos):
+    """Todos os termos devem aparecer; cada um casa por prefixo ("vazam" -> "vazamento")."""
+    return ' '.join(f'"{t}"*' for t in termos)
+
+
+def filtrar_por_texto(queryset, texto):
+    """
+    Filtra Apontamento ou ApontamentoArquivado pelo texto (índice da própria tabela).
+    Texto vazio devolve o queryset intacto.
+    """
+    termos = termos_busca(texto)
+    if not termos:
+        return queryset
+
+    if connection.vendor == 'sqlite':
+        fts = f"{queryset.model._meta.db_table}_fts"
+        ids = RawSQL(f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s", (consulta_fts(termos),))
+        return queryset.filter(id__in=ids)
+
+    filtro = Q()
+    for termo in termos:
+        por_termo = Q()
+        for campo in CAMPOS_BUSCA:
+            por_termo |= Q(**{f'{campo}__icontains': termo})
+        filtro &= por_termo
+    return queryset.filter(filtro)
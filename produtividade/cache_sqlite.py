@@ -0,0 +1,219 @@
+"""
+Backend de cache em arquivo SQLite, compartilhado entre os workers do gunicorn.
+
+Não depende de serviço externo: cada processo abre o mesmo arquivo em modo WAL
+(leituras não bloqueiam a escrita) com mmap habilitado, de modo que as páginas
+quentes ficam no page cache do sistema operacional e são lidas sem cópia.
+
+Uso em settings.CACHES:
+    'BACKEND': 'produtividade.cache_sqlite.SQLiteCache',
+    'LOCATION': '/caminho/cache.sqlite3',
+    'OPTIONS': {'MAX_ENTRIES': 50000, 'CULL_FREQUENCY': 4, 'MMAP_SIZE': 256 * 1024 * 1024}
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Chave primária textual sem rowid: a árvore B é a própria tabela (uma leitura por get)
+SQL_CRIACAO = """
+CREATE TABLE IF NOT EXISTS cache (
+    chave TEXT PRIMARY KEY,
+    valor BLOB NOT NULL,
+    expira REAL
+) WITHOUT ROWID
+"""
+
+
+class SQLiteCache(BaseCache):
+    # A cada quantas escritas (por processo) verifica o limite de entradas
+    INTERVALO_CULL = 200
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.caminho = str(location)
+        opcoes = params.get('OPTIONS', {})
+        self.mmap_size = int(opcoes.get('MMAP_SIZE', 256 * 1024 * 1024))
+        self.busy_timeout = int(opcoes.get('BUSY_TIMEOUT', 5000))
+        self._local = threading.local()
+        self._escritas = 0
+
+    # --------------------------------------------------------------------------
+    # Conexão (uma por thread; reaberta após fork do gunicorn)
+    # --------------------------------------------------------------------------
+
+    def _conexao(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        diretorio = os.path.dirname(self.caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        conn = sqlite3.connect(self.caminho, timeout=self.busy_timeout / 1000, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA mmap_size={self.mmap_size}')
+        conn.execute(f'PRAGMA busy_timeout={self.busy_timeout}')
+        conn.execute(SQL_CRIACAO)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def close(self, **kwargs):
+        # Mantém a conexão aberta entre requisições (o arquivo é local e a conexão é barata)
+        pass
+
+    # --------------------------------------------------------------------------
+    # Serialização
+    # --------------------------------------------------------------------------
+
+    @staticmethod
+    def _dump(valor):
+        return pickle.dumps(valor, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _load(dado):
+        return pickle.loads(dado)
+
+    def _expira(self, timeout):
+        # None = sem expiração; valores <= 0 já nascem expirados
+        return self.get_backend_timeout(timeout)
+
+    # --------------------------------------------------------------------------
+    # API do BaseCache
+    # --------------------------------------------------------------------------
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        linha = self._conexao().execute(
+            'SELECT valor FROM cache WHERE chave = ? AND (expira IS NULL OR expira > ?)',
+            (key, time.time())
+        ).fetchone()
+        return default if linha is None else self._load(linha[0])
+
+    def get_many(self, keys, version=None):
+        mapa = {self.make_and_validate_key(k, version=version): k for k in keys}
+        if not mapa:
+            return {}
+        marcadores = ','.join('?' * len(mapa))
+        linhas = self._conexao().execute(
+            f'SELECT chave, valor FROM cache WHERE chave IN ({marcadores}) '
+            'AND (expira IS NULL OR expira > ?)',
+            (*mapa, time.time())
+        ).fetchall()
+        return {mapa[chave]: self._load(valor) for chave, valor in linhas}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._conexao().execute(
+            'INSERT OR REPLACE INTO cache (chave, valor, expira) VALUES (?, ?, ?)',
+            (key, self._dump(value), self._expira(timeout))
+        )
+        self._talvez_cull()
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expira = self._expira(timeout)
+        linhas = [
+            (self.make_and_validate_key(k, version=version), self._dump(v), expira)
+            for k, v in data.items()
+        ]
+        conn = self._conexao()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('INSERT OR REPLACE INTO cache (chave, valor, expira) VALUES (?, ?, ?)', linhas)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._talvez_cull()
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """Grava apenas se a chave não existe (ou expirou). Atômico entre processos."""
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._conexao().execute(
+            'INSERT INTO cache (chave, valor, expira) VALUES (?, ?, ?) '
+            'ON CONFLICT(chave) DO UPDATE SET valor = excluded.valor, expira = excluded.expira '
+            'WHERE cache.expira IS NOT NULL AND cache.expira <= ?',
+            (key, self._dump(value), self._expira(timeout), time.time())
+        )
+        if cursor.rowcount:
+            self._talvez_cull()
+        return cursor.rowcount > 0
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._conexao().execute(
+            'UPDATE cache SET expira = ? WHERE chave = ? AND (expira IS NULL OR expira > ?)',
+            (self._expira(timeout), key, time.time())
+        )
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        """Leitura e escrita na mesma transação IMMEDIATE: contadores corretos entre workers."""
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._conexao()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            linha = conn.execute(
+                'SELECT valor FROM cache WHERE chave = ? AND (expira IS NULL OR expira > ?)',
+                (key, time.time())
+            ).fetchone()
+            if linha is None:
+                raise ValueError(f"Key '{key}' not found")
+            novo = self._load(linha[0]) + delta
+            conn.execute('UPDATE cache SET valor = ? WHERE chave = ?', (self._dump(novo), key))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return novo
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._conexao().execute('DELETE FROM cache WHERE chave = ?', (key,))
+        return cursor.rowcount > 0
+
+    def delete_many(self, keys, version=None):
+        chaves = [self.make_and_validate_key(k, version=version) for k in keys]
+        if chaves:
+            marcadores = ','.join('?' * len(chaves))
+            self._conexao().execute(f'DELETE FROM cache WHERE chave IN ({marcadores})', chaves)
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._conexao().execute(
+            'SELECT 1 FROM cache WHERE chave = ? AND (expira IS NULL OR expira > ?)',
+            (key, time.time())
+        ).fetchone() is not None
+
+    def clear(self):
+        self._conexao().execute('DELETE FROM cache')
+
+    # --------------------------------------------------------------------------
+    # Limpeza
+    # --------------------------------------------------------------------------
+
+    def _talvez_cull(self):
+        self._escritas += 1
+        if self._escritas % self.INTERVALO_CULL == 0:
+            self.cull()
+
+    def cull(self):
+        """Remove expirados e, se ainda acima de MAX_ENTRIES, 1/CULL_FREQUENCY das entradas mais próximas de expirar."""
+        conn = self._conexao()
+        conn.execute('DELETE FROM cache WHERE expira IS NOT NULL AND expira <= ?', (time.time(),))
+        total = conn.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if total > self._max_entries:
+            if self._cull_frequency == 0:
+                self.clear()
+                return
+            conn.execute(
+                'DELETE FROM cache WHERE chave IN ('
+                ' SELECT chave FROM cache ORDER BY expira IS NULL, expira LIMIT ?)',
+                (total // self._cull_frequency,)
+            )
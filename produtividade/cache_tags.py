@@ -0,0 +1,192 @@
+"""
+Camada de cache com invalidação por tags, proteção contra stampede e métricas.
+
+Cada tag (ex: "colaborador:42", "catalog:projeto") tem uma versão guardada no
+próprio cache. A chave final de um valor inclui as versões das suas tags, então
+invalidar uma tag é apenas incrementar a versão: os valores antigos deixam de ser
+encontrados e expiram sozinhos. Funciona com qualquer backend (SQLite, Redis, locmem).
+"""
+import hashlib
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .models import Apontamento, CentroCusto, CodigoCliente, Colaborador, Feriado, Projeto, Setor, Veiculo
+
+TIMEOUT_PADRAO = 300
+
+# Tempo máximo que um processo segura a trava de cálculo de uma chave
+TEMPO_TRAVA = 30
+# Quanto um processo espera o valor calculado por outro antes de calcular por conta própria
+ESPERA_MAXIMA = 5.0
+INTERVALO_ESPERA = 0.05
+
+# Contadores locais são enviados ao cache compartilhado a cada N operações
+LOTE_METRICAS = 50
+
+_AUSENTE = object()
+_metricas_locais = Counter()
+
+
+# ==============================================================================
+# TAGS
+# ==============================================================================
+
+def _chave_tag(tag):
+    return f'tag:{tag}'
+
+
+def versoes_tags(tags):
+    """Versão atual de cada tag. Tags sem versão recebem uma inicial baseada no relógio."""
+    chaves = [_chave_tag(t) for t in tags]
+    atuais = cache.get_many(chaves)
+    faltando = [c for c in chaves if c not in atuais]
+    if faltando:
+        # Versão inicial única: se a tag for removida do cache, valores antigos não "ressuscitam"
+        for chave in faltando:
+            cache.add(chave, time.time_ns(), timeout=None)
+        atuais.update(cache.get_many(faltando))
+    return [atuais.get(c, 0) for c in chaves]
+
+
+def invalidar(*tags):
+    """Invalida todos os valores associados às tags."""
+    for tag in tags:
+        chave = _chave_tag(tag)
+        try:
+            cache.incr(chave)
+        except ValueError:
+            cache.set(chave, time.time_ns(), timeout=None)
+
+
+def chave_versionada(chave, tags):
+    if not tags:
+        return chave
+    assinatura = '.'.join(str(v) for v in versoes_tags(tags))
+    return f"{chave}:{hashlib.blake2s(assinatura.encode(), digest_size=6).hexdigest()}"
+
+
+# ==============================================================================
+# LEITURA COM PROTEÇÃO CONTRA STAMPEDE
+# ==============================================================================
+
+def obter_ou_calcular(chave, calcular, tags=(), timeout=TIMEOUT_PADRAO):
+    """
+    Retorna o valor em cache ou o calcula uma única vez entre todos os workers.
+    Enquanto um processo calcula (segurando a trava), os demais aguardam o resultado.
+    """
+    chave_final = chave_versionada(chave, tags)
+    valor = cache.get(chave_final, _AUSENTE)
+    if valor is not _AUSENTE:
+        _contar('hits')
+        return valor
+    _contar('misses')
+
+    trava = f'trava:{chave_final}'
+    if cache.add(trava, 1, timeout=TEMPO_TRAVA):
+        try:
+            valor = calcular()
+            cache.set(chave_final, valor, timeout=timeout)
+            return valor
+        finally:
+            cache.delete(trava)
+
+    limite = time.monotonic() + ESPERA_MAXIMA
+    while time.monotonic() < limite:
+        time.sleep(INTERVALO_ESPERA)
+        valor = cache.get(chave_final, _AUSENTE)
+        if valor is not _AUSENTE:
+            return valor
+    _contar('esperas_esgotadas')
+    return calcular()
+
+
+# ==============================================================================
+# MÉTRICAS (HIT/MISS)
+# ==============================================================================
+
+def _contar(nome):
+    _metricas_locais[nome] += 1
+    if sum(_metricas_locais.values()) >= LOTE_METRICAS:
+        enviar_metricas()
+
+
+def enviar_metricas():
+    """Soma os contadores deste processo aos contadores compartilhados."""
+    for nome, qtd in list(_metricas_locais.items()):
+        chave = f'metricas:{nome}'
+        cache.add(chave, 0, timeout=None)
+        try:
+            cache.incr(chave, qtd)
+        except ValueError:
+            cache.set(chave, qtd, timeout=None)
+    _metricas_locais.clear()
+
+
+def estatisticas():
+    enviar_metricas()
+    valores = cache.get_many(['metricas:hits', 'metricas:misses', 'metricas:esperas_esgotadas'])
+    hits = valores.get('metricas:hits', 0)
+    misses = valores.get('metricas:misses', 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'esperas_esgotadas': valores.get('metricas:esperas_esgotadas', 0),
+        'taxa_acerto': round(hits / total * 100, 1) if total else 0.0,
+    }
+
+
+def zerar_estatisticas():
+    _metricas_locais.clear()
+    cache.delete_many(['metricas:hits', 'metricas:misses', 'metricas:esperas_esgotadas'])
+
+
+# ==============================================================================
+# INVALIDAÇÃO AUTOMÁTICA (registrada em ProdutividadeConfig.ready)
+# Atenção: update() e bulk_create() não disparam signals; quem usa deve chamar invalidar().
+# ==============================================================================
+
+TAGS_CATALOGO = {
+    Projeto: 'catalog:projeto',
+    CodigoCliente: 'catalog:cliente',
+    CentroCusto: 'catalog:centro_custo',
+    Veiculo: 'catalog:veiculo',
+    Setor: 'catalog:setor',
+    Colaborador: 'catalog:colaborador',
+    Feriado: 'catalog:feriado',
+}
+
+
+def _invalidar_catalogo(sender, instance, **kwargs):
+    tags = [TAGS_CATALOGO[sender]]
+    if sender is Colaborador:
+        tags.append(f'colaborador:{instance.pk}')
+    # Após o commit: outro worker não pode recachear o valor antigo antes da gravação
+    transaction.on_commit(lambda: invalidar(*tags))
+
+
+def tag_mes(data):
+    """Tag dos valores calculados sobre os apontamentos de um mês (séries temporais)."""
+    return f'apontamentos:{data:%Y-%m}'
+
+
+def _invalidar_colaborador_do_apontamento(sender, instance, **kwargs):
+    tags = {f'colaborador:{instance.colaborador_id}', tag_mes(instance.data_apontamento)}
+    # Edição que troca a data: o mês antigo vem da leitura feita no pre_save de eventos.py
+    anterior = getattr(instance, '_contribuicao_anterior', None)
+    if anterior:
+        tags.add(tag_mes(anterior['data']))
+    transaction.on_commit(lambda: invalidar(*tags))
+
+
+def conectar_signals():
+    for model in TAGS_CATALOGO:
+        uid = f'cache_tags_{model._meta.model_name}'
+        post_save.connect(_invalidar_catalogo, sender=model, dispatch_uid=f'{uid}_save')
+        post_delete.connect(_invalidar_catalogo, sender=model, dispatch_uid=f'{uid}_delete')
+    post_save.connect(_invalidar_colaborador_do_apontamento, sender=Apontamento, dispatch_uid='cache_tags_apontamento_save')
+    post_delete.connect(_invalidar_colaborador_do_apontamento, sender=Apontamento, dispatch_uid='cache_tags_apontamento_delete')
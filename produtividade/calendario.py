@@ -0,0 +1,103 @@
+"""
+Dias úteis sem apontamento, para todos os colaboradores de uma vez.
+
+O calendário esperado vem da jornada da folha (dias da semana com jornada > 0 em
+settings.FOLHA_JORNADA_MINUTOS, ver folha.jornada_por_dia), opcionalmente sem os
+feriados cadastrados, até hoje. Os dias preenchidos de cada colaborador saem de uma
+única consulta (UNION, já sem duplicatas no banco) de pares (colaborador, data) das
+duas tabelas: quem participou como auxiliar também tem o dia preenchido. Os dias
+faltantes são a diferença entre os dois conjuntos.
+
+O resultado de todos os setores fica em cache por dia (a chave inclui a data de hoje),
+com as tags dos meses consultados; o filtro de setor é aplicado sobre ele.
+"""
+import calendar
+from datetime import date, timedelta
+
+from django.utils import timezone
+
+from .cache_tags import obter_ou_calcular, tag_mes
+from .folha import jornada_por_dia
+from .models import Apontamento, ApontamentoArquivado, Colaborador, Feriado
+
+TIMEOUT_FALTANTES = 24 * 60 * 60
+
+TAGS_CADASTROS = ('catalog:colaborador', 'catalog:setor', 'catalog:feriado')
+
+
+def dias_esperados(inicio, fim, feriados=()):
+    """Dias úteis do intervalo: jornada maior que zero e fora dos feriados informados."""
+    dias = (fim - inicio).days + 1
+    if dias <= 0:
+        return []
+    limite, _ = jornada_por_dia(inicio, dias)
+    return [
+        inicio + timedelta(days=i) for i in range(dias)
+        if limite[i] > 0 and inicio + timedelta(days=i) not in feriados
+    ]
+
+
+def dias_preenchidos(inicio, fim):
+    """Conjunto de (colaborador_id, data) com algum apontamento, como titular ou auxiliar."""
+    filtro = {'data_apontamento__gte': inicio, 'data_apontamento__lte': fim}
+    consultas = []
+    for model in (Apontamento, ApontamentoArquivado):
+        registros = model.objects.filter(**filtro).order_by()
+        consultas.append(registros.values_list('colaborador_id', 'data_apontamento'))
+        consultas.append(registros.filter(auxiliar__isnull=False).values_list('auxiliar_id', 'data_apontamento'))
+
+        # Tabela intermediária dos auxiliares extras (campo do registro: apontamento / apontamentoarquivado)
+        campo = model._meta.model_name
+        consultas.append(model.auxiliares_extras.through.objects.filter(
+            **{f'{campo}__{chave}': valor for chave, valor in filtro.items()}
+        ).order_by().values_list('colaborador_id', f'{campo}__data_apontamento'))
+
+    primeira, *demais = consultas
+    return set(primeira.union(*demais))
+
+
+def calcular_faltantes(inicio, fim, excluir_feriados=True):
+    """Colaboradores com dias úteis sem apontamento no intervalo (todos os setores)."""
+    feriados = Feriado.datas_no_intervalo(inicio, fim) if excluir_feriados else set()
+    esperados = dias_esperados(inicio, fim, feriados)
+    preenchidos = dias_preenchidos(inicio, fim)
+
+    colaboradores = []
+    cadastro = Colaborador.objects.values_list('pk', 'id_colaborador', 'nome_completo', 'setor_id', 'setor__nome')
+    for pk, id_colaborador, nome, setor_id, setor in cadastro:
+        faltantes = [dia for dia in esperados if (pk, dia) not in preenchidos]
+        if faltantes:
+            colaboradores.append({
+                'id': pk,
+                'id_colaborador': id_colaborador,
+                'colaborador': nome,
+                'setor_id': setor_id,
+                'setor': setor or 'Sem setor',
+                'faltantes': faltantes,
+            })
+    colaboradores.sort(key=lambda c: (-len(c['faltantes']), c['colaborador'].lower()))
+    return {'inicio': inicio, 'fim': fim, 'dias_esperados': esperados, 'colaboradores': colaboradores}
+
+
+def dias_faltantes(ano, mes, setor_id=None, excluir_feriados=True, hoje=None):
+    """
+    Dias úteis sem apontamento na competência, até hoje (dias futuros não contam).
+    setor_id: apenas os colaboradores do setor. ValueError para competência inválida.
+    """
+    if not 1 <= mes <= 12:
+        raise ValueError("Informe uma competência válida.")
+    hoje = hoje or timezone.localdate()
+    inicio = date(ano, mes, 1)
+    fim = min(date(ano, mes, calendar.monthrange(ano, mes)[1]), hoje)
+
+    resultado = obter_ou_calcular(
+        f'faltantes:{inicio:%Y%m}:{hoje:%Y%m%d}:{int(excluir_feriados)}',
+        lambda: calcular_faltantes(inicio, fim, excluir_feriados),
+        tags=[tag_mes(inicio), *TAGS_CADASTROS], timeout=TIMEOUT_FALTANTES,
+    )
+    if setor_id is not None:
+        resultado = {
+            **resultado,
+            'colaboradores': [c for c in resultado['colaboradores'] if c['setor_id'] == setor_id],
+        }
+    return resultado
@@ -0,0 +1,336 @@
+"""
+Feed ao vivo do Dashboard (Server-Sent Events).
+
+Cada alteração em Apontamento grava um EventoDashboard com o delta dos KPIs do dia
+(horas, registros, colaboradores e projetos). A tabela funciona como canal entre os
+workers: em cada processo, uma única tarefa lê os eventos novos e repassa às filas
+dos clientes conectados, que recebem apenas os deltas (sem polling no servidor).
+
+O evento é gravado na mesma transação da alteração (Apontamento.save é atômico e o
+delete já roda numa transação), nunca depois do commit: desfeito junto com ela, e
+nenhuma leitura enxerga o registro alterado sem o evento correspondente. É isso que
+permite ao EstadoKPI.carregar ler snapshot e último id de forma consistente.
+
+Caminhos de escrita que publicam eventos:
+- save()/delete() de Apontamento (formulários, fila de gravação, admin): signals abaixo;
+- alterações em lote via update() (ações do admin): lote.atualizar_em_lote -> publicar_lote.
+Não publicam (o feed só é corrigido no próximo snapshot): a importação do histórico
+(importacao_legado, bulk_create de datas passadas), o arquivamento (registros antigos)
+e qualquer update()/bulk_create novo sobre Apontamento que não passe por publicar_lote.
+"""
+import asyncio
+import json
+from collections import Counter
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.utils import timezone
+
+from .fechamento import minutos_intervalo
+from .models import Apontamento, EventoDashboard
+
+# Eventos mais antigos que isso são removidos do canal (clientes novos recebem snapshot)
+RETENCAO_EVENTOS = timedelta(hours=1)
+
+CAMPOS_CONTRIBUICAO = (
+    'data_apontamento', 'hora_inicio', 'hora_termino', 'status_aprovacao', 'local_execucao',
+    'projeto__nome', 'codigo_cliente__codigo', 'centro_custo__nome', 'colaborador__nome_completo',
+)
+
+
+def rotulo_projeto_dashboard(local_execucao, projeto_nome, cliente_codigo, centro_custo_nome):
+    """Rótulo usado no gráfico de projetos do Dashboard."""
+    if local_execucao == 'INT':
+        if projeto_nome: return projeto_nome
+        if cliente_codigo: return f"Cliente {cliente_codigo}"
+    elif centro_custo_nome:
+        return centro_custo_nome
+    return "Outros"
+
+
+def _contribuicao(pk):
+    """O que um apontamento soma aos KPIs do seu dia (None se não existe)."""
+    linha = Apontamento.objects.filter(pk=pk).values(*CAMPOS_CONTRIBUICAO).first()
+    if linha is None:
+        return None
+    return _formatar_contribuicao(linha)
+
+
+def contribuicoes(queryset):
+    """{pk: contribuição} de vários apontamentos em uma consulta (alterações em lote)."""
+    linhas = queryset.values('pk', *CAMPOS_CONTRIBUICAO)
+    return {linha['pk']: _formatar_contribuicao(linha) for linha in linhas}
+
+
+def _formatar_contribuicao(linha):
+    return {
+        'data': linha['data_apontamento'],
+        'minutos': minutos_intervalo(linha['hora_inicio'], linha['hora_termino']),
+        'colaborador': linha['colaborador__nome_completo'],
+        'projeto': rotulo_projeto_dashboard(
+            linha['local_execucao'], linha['projeto__nome'],
+            linha['codigo_cliente__codigo'], linha['centro_custo__nome']
+        ),
+        'status': linha['status_aprovacao'],
+    }
+
+
+def _deltas(antes, depois):
+    """Deltas por data: uma edição que troca a data gera retirada em um dia e soma no outro."""
+    por_data = {}
+    for contrib, sinal in ((antes, -1), (depois, 1)):
+        if contrib is None:
+            continue
+        d = por_data.setdefault(contrib['data'], {
+            'minutos': 0, 'registros': 0, 'colaboradores': Counter(), 'projetos': Counter()
+        })
+        d['minutos'] += sinal * contrib['minutos']
+        d['registros'] += sinal
+        d['colaboradores'][contrib['colaborador']] += sinal
+        d['projetos'][contrib['projeto']] += sinal
+
+    for d in por_data.values():
+        d['colaboradores'] = {k: v for k, v in d['colaboradores'].items() if v}
+        d['projetos'] = {k: v for k, v in d['projetos'].items() if v}
+    return por_data
+
+
+def _eventos(tipo, apontamento_id, antes, depois):
+    status = depois['status'] if depois else None
+    mudou_status = antes and depois and antes['status'] != depois['status']
+
+    for data, delta in _deltas(antes, depois).items():
+        if not (delta['minutos'] or delta['registros'] or delta['colaboradores'] or delta['projetos']) and not mudou_status:
+            continue
+        delta['status'] = status
+        yield EventoDashboard(
+            tipo='APROVACAO' if tipo == 'EDITADO' and mudou_status else tipo,
+            data_apontamento=data, apontamento_id=apontamento_id, delta=delta
+        )
+
+
+def _gravar(eventos):
+    """Grava os eventos e faz a limpeza periódica do canal."""
+    if not eventos:
+        return
+    criados = EventoDashboard.objects.bulk_create(eventos, batch_size=500)
+    # A cada 100 eventos (o lote pode atravessar o múltiplo de 100)
+    if criados[-1].pk and criados[-1].pk // 100 != (criados[0].pk - 1) // 100:
+        EventoDashboard.objects.filter(criado_em__lt=timezone.now() - RETENCAO_EVENTOS).delete()
+
+
+def publicar(tipo, apontamento_id, antes, depois):
+    """Grava os eventos de um apontamento (um por data afetada)."""
+    _gravar(list(_eventos(tipo, apontamento_id, antes, depois)))
+
+
+def publicar_lote(tipo, antes, depois):
+    """
+    Mesmo que publicar() para vários apontamentos ({pk: contribuição} antes/depois),
+    em um único bulk_create. Usado pelas alterações via update(), que não disparam signals;
+    chame dentro da transação do update().
+    """
+    eventos = []
+    for pk in antes.keys() | depois.keys():
+        eventos.extend(_eventos(tipo, pk, antes.get(pk), depois.get(pk)))
+    _gravar(eventos)
+
+
+# ==============================================================================
+# SIGNALS (registrados em ProdutividadeConfig.ready)
+# ==============================================================================
+
+def _antes_de_salvar(sender, instance, **kwargs):
+    instance._contribuicao_anterior = _contribuicao(instance.pk) if instance.pk else None
+
+
+def _depois_de_salvar(sender, instance, created, **kwargs):
+    antes = getattr(instance, '_contribuicao_anterior', None)
+    tipo = 'CRIADO' if created else 'EDITADO'
+    # Na transação do save (ver docstring do módulo): rollback desfaz o evento também
+    publicar(tipo, instance.pk, antes, _contribuicao(instance.pk))
+
+
+def _antes_de_excluir(sender, instance, **kwargs):
+    instance._contribuicao_anterior = _contribuicao(instance.pk)
+
+
+def _depois_de_excluir(sender, instance, **kwargs):
+    antes = getattr(instance, '_contribuicao_anterior', None)
+    publicar('EXCLUIDO', instance.pk, antes, None)
+
+
+def conectar_signals():
+    pre_save.connect(_antes_de_salvar, sender=Apontamento, dispatch_uid='eventos_pre_save')
+    post_save.connect(_depois_de_salvar, sender=Apontamento, dispatch_uid='eventos_post_save')
+    pre_delete.connect(_antes_de_excluir, sender=Apontamento, dispatch_uid='eventos_pre_delete')
+    post_delete.connect(_depois_de_excluir, sender=Apontamento, dispatch_uid='eventos_post_delete')
+
+
+# ==============================================================================
+# FAN-OUT EM PROCESSO
+# ==============================================================================
+
+class CanalEventos:
+    """
+    Uma tarefa de leitura por processo, compartilhada por todos os clientes conectados.
+    Começa no primeiro assinante e termina quando o último desconecta.
+    """
+    INTERVALO_LEITURA = 0.3
+    TAMANHO_FILA = 500
+
+    def __init__(self):
+        self.assinantes = set()
+        self.tarefa = None
+
+    def assinar(self):
+        fila = asyncio.Queue(maxsize=self.TAMANHO_FILA)
+        self.assinantes.add(fila)
+        loop = asyncio.get_running_loop()
+        if self.tarefa is None or self.tarefa.done() or self.tarefa.get_loop() is not loop:
+            self.tarefa = loop.create_task(self._ler())
+        return fila
+
+    def cancelar(self, fila):
+        self.assinantes.discard(fila)
+
+    async def _ler(self):
+        ultimo = (await EventoDashboard.objects.aaggregate(m=Max('id')))['m'] or 0
+        while self.assinantes:
+            novos = [e async for e in EventoDashboard.objects.filter(id__gt=ultimo).order_by('id')[:500]]
+            for evento in novos:
+                for fila in list(self.assinantes):
+                    self._entregar(fila, evento)
+            if novos:
+                ultimo = novos[-1].id
+            else:
+                await asyncio.sleep(self.INTERVALO_LEITURA)
+
+    def _entregar(self, fila, evento):
+        try:
+            fila.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Cliente lento: descarta o acumulado e pede um novo snapshot (None)
+            while not fila.empty():
+                fila.get_nowait()
+            fila.put_nowait(None)
+
+
+canal = CanalEventos()
+
+
+# ==============================================================================
+# ESTADO DOS KPIs POR CONEXÃO
+# ==============================================================================
+
+class EstadoKPI:
+    """Totais do dia mantidos pela conexão; cada evento vira um delta dos KPIs."""
+
+    def __init__(self, data):
+        self.data = data
+        self.ultimo_id = 0
+        self.minutos = 0
+        self.registros = 0
+        self.colaboradores = Counter()
+        self.projetos = Counter()
+
+    @classmethod
+    async def carregar(cls, data):
+        return await sync_to_async(cls._carregar)(data)
+
+    @classmethod
+    def _carregar(cls, data):
+        """
+        Snapshot do dia e o id do último evento já refletido nele, lidos numa única
+        transação (serializável no SQLite). Como cada evento é gravado na transação do
+        seu apontamento, os eventos com id > ultimo_id são exatamente os que o snapshot
+        ainda não contém: nenhum é perdido nem aplicado em dobro.
+        """
+        estado = cls(data)
+        with transaction.atomic():
+            estado.ultimo_id = EventoDashboard.objects.aggregate(m=Max('id'))['m'] or 0
+            linhas = list(Apontamento.objects.filter(data_apontamento=data).values(*CAMPOS_CONTRIBUICAO))
+        for linha in linhas:
+            estado.minutos += minutos_intervalo(linha['hora_inicio'], linha['hora_termino'])
+            estado.registros += 1
+            estado.colaboradores[linha['colaborador__nome_completo']] += 1
+            estado.projetos[rotulo_projeto_dashboard(
+                linha['local_execucao'], linha['projeto__nome'],
+                linha['codigo_cliente__codigo'], linha['centro_custo__nome']
+            )] += 1
+        return estado
+
+    def kpis(self):
+        projetos = {k: v for k, v in self.projetos.items() if v > 0}
+        return {
+            'data_referencia': self.data.strftime('%d/%m/%Y'),
+            'total_apontamentos': self.registros,
+            'total_horas': round(self.minutos / 60, 2),
+            'colaboradores_ativos': sum(1 for v in self.colaboradores.values() if v > 0),
+            'grafico_projetos': {'labels': list(projetos), 'valores': list(projetos.values())},
+        }
+
+    def aplicar(self, evento):
+        delta = evento.delta
+        ativos_antes = sum(1 for v in self.colaboradores.values() if v > 0)
+        self.minutos += delta.get('minutos', 0)
+        self.registros += delta.get('registros', 0)
+        self.colaboradores.update(delta.get('colaboradores', {}))
+        self.projetos.update(delta.get('projetos', {}))
+        self.ultimo_id = evento.id
+        kpis = self.kpis()
+        return {
+            'tipo': evento.tipo,
+            'apontamento_id': evento.apontamento_id,
+            'status': delta.get('status'),
+            'delta': {
+                'total_horas': round(delta.get('minutos', 0) / 60, 2),
+                'total_apontamentos': delta.get('registros', 0),
+                'colaboradores_ativos': kpis['colaboradores_ativos'] - ativos_antes,
+                'projetos': delta.get('projetos', {}),
+            },
+            'kpis': kpis,
+        }
+
+
+def formatar_sse(evento, dados, id_evento=None):
+    linhas = []
+    if id_evento is not None:
+        linhas.append(f"id: {id_evento}")
+    linhas.append(f"event: {evento}")
+    linhas.append(f"data: {json.dumps(dados, ensure_ascii=False)}")
+    return "\n".join(linhas) + "\n\n"
+
+
+async def fluxo_kpis(duracao_maxima, intervalo_ping=15):
+    """
+    Gerador do stream: snapshot inicial e depois um 'delta' por evento do dia.
+    Encerra após duracao_maxima segundos; o EventSource reconecta sozinho.
+    """
+    loop = asyncio.get_running_loop()
+    limite = loop.time() + duracao_maxima
+    fila = canal.assinar()
+    try:
+        yield "retry: 1000\n\n"
+        estado = await EstadoKPI.carregar(timezone.localdate())
+        yield formatar_sse('snapshot', estado.kpis(), estado.ultimo_id)
+
+        while loop.time() < limite:
+            try:
+                evento = await asyncio.wait_for(fila.get(), timeout=intervalo_ping)
+            except asyncio.TimeoutError:
+                evento = False
+
+            if evento is None or estado.data != timezone.localdate():
+                # Virada do dia ou cliente atrasado: recomeça do zero
+                estado = await EstadoKPI.carregar(timezone.localdate())
+                yield formatar_sse('snapshot', estado.kpis(), estado.ultimo_id)
+            elif evento is False:
+                yield ": ping\n\n"
+            elif evento.id > estado.ultimo_id and evento.data_apontamento == estado.data:
+                yield formatar_sse('delta', estado.aplicar(evento), evento.id)
+    finally:
+        canal.cancelar(fila)
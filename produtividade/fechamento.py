@@ -0,0 +1,199 @@
+"""
+Fechamento mensal de período (competência da folha).
+
+Ao fechar um mês, os totais por colaborador são calculados uma única vez e
+gravados em FechamentoResumo. Como o período fica bloqueado para edição, os
+relatórios do mês fechado são imutáveis e podem ficar em cache sem invalidação.
+Registros rejeitados não entram nos totais; os ainda não aprovados entram.
+"""
+import io
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import openpyxl
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from openpyxl.styles import Alignment, Font, PatternFill
+
+from .models import (
+    Apontamento, ApontamentoArquivado, FechamentoPeriodo, FechamentoResumo
+)
+
+CAMPOS_CALCULO = (
+    'id', 'colaborador_id', 'auxiliar_id', 'data_apontamento', 'hora_inicio', 'hora_termino',
+    'em_plantao', 'data_plantao', 'dorme_fora', 'data_dorme_fora', 'local_execucao',
+    'projeto__codigo', 'codigo_cliente__codigo', 'centro_custo__nome',
+)
+
+
+def minutos_intervalo(inicio, fim):
+    """Duração em minutos considerando virada de dia (ex: 22h às 02h)."""
+    if not inicio or not fim:
+        return 0
+    d = date(2000, 1, 1)
+    dt_ini = datetime.combine(d, inicio)
+    dt_fim = datetime.combine(d, fim)
+    if dt_fim < dt_ini:
+        dt_fim += timedelta(days=1)
+    return int((dt_fim - dt_ini).total_seconds() // 60)
+
+
+def destino_custo(linha):
+    """Rótulo do destino de custo usado no rateio (Obra > Cliente > Centro de Custo)."""
+    if linha['projeto__codigo']:
+        return f"OBRA {linha['projeto__codigo']}"
+    if linha['codigo_cliente__codigo']:
+        return f"CLIENTE {linha['codigo_cliente__codigo']}"
+    if linha['local_execucao'] == 'EXT' and linha['centro_custo__nome']:
+        return f"CC {linha['centro_custo__nome']}"
+    return "NÃO INFORMADO"
+
+
+def _linhas_periodo(inicio, fim):
+    """Registros do período (tabela principal + arquivo), exceto os rejeitados, e seus auxiliares extras."""
+    filtro = {'data_apontamento__gte': inicio, 'data_apontamento__lte': fim}
+    linhas = list(Apontamento.objects.filter(**filtro).exclude(status_aprovacao='REJEITADO').values(*CAMPOS_CALCULO))
+    linhas += list(
+        ApontamentoArquivado.objects.filter(**filtro).exclude(status_aprovacao='REJEITADO').values(*CAMPOS_CALCULO)
+    )
+
+    extras = defaultdict(list)
+    ThroughQuente = Apontamento.auxiliares_extras.through
+    for ap_id, colab_id in ThroughQuente.objects.filter(
+        apontamento__data_apontamento__gte=inicio, apontamento__data_apontamento__lte=fim
+    ).values_list('apontamento_id', 'colaborador_id'):
+        extras[ap_id].append(colab_id)
+
+    ThroughFrio = ApontamentoArquivado.auxiliares_extras.through
+    for ap_id, colab_id in ThroughFrio.objects.filter(
+        apontamentoarquivado__data_apontamento__gte=inicio, apontamentoarquivado__data_apontamento__lte=fim
+    ).values_list('apontamentoarquivado_id', 'colaborador_id'):
+        extras[ap_id].append(colab_id)
+
+    return linhas, extras
+
+
+def calcular_resumos(inicio, fim):
+    """
+    Consolida horas, plantões, dorme-fora e rateio por colaborador.
+    Auxiliares (principal e extras) recebem as mesmas horas do registro, como na exportação.
+    """
+    linhas, extras = _linhas_periodo(inicio, fim)
+    totais = defaultdict(lambda: {
+        'total_minutos': 0, 'qtd_registros': 0,
+        'plantao': set(), 'dorme_fora': set(), 'rateio': defaultdict(int),
+    })
+
+    for linha in linhas:
+        minutos = minutos_intervalo(linha['hora_inicio'], linha['hora_termino'])
+        destino = destino_custo(linha)
+
+        participantes = [linha['colaborador_id']]
+        if linha['auxiliar_id']:
+            participantes.append(linha['auxiliar_id'])
+        participantes.extend(extras.get(linha['id'], []))
+
+        for colab_id in set(participantes):
+            t = totais[colab_id]
+            t['total_minutos'] += minutos
+            t['qtd_registros'] += 1
+            t['rateio'][destino] += minutos
+            if linha['em_plantao']:
+                t['plantao'].add(linha['data_plantao'] or linha['data_apontamento'])
+            if linha['dorme_fora']:
+                t['dorme_fora'].add(linha['data_dorme_fora'] or linha['data_apontamento'])
+
+    return totais
+
+
+def fechar_periodo(ano, mes, usuario):
+    """
+    Fecha a competência e grava os resumos congelados.
+    Lança ValueError quando o mês ainda não terminou ou já foi fechado.
+    """
+    hoje = timezone.localdate()
+    if (ano, mes) >= (hoje.year, hoje.month):
+        raise ValueError("Só é possível fechar competências já encerradas (mês anterior ou antes).")
+
+    try:
+        with transaction.atomic():
+            fechamento = FechamentoPeriodo.objects.create(ano=ano, mes=mes, fechado_por=usuario)
+            totais = calcular_resumos(fechamento.inicio, fechamento.fim)
+            FechamentoResumo.objects.bulk_create([
+                FechamentoResumo(
+                    fechamento=fechamento,
+                    colaborador_id=colab_id,
+                    total_minutos=t['total_minutos'],
+                    qtd_registros=t['qtd_registros'],
+                    dias_plantao=len(t['plantao']),
+                    dias_dorme_fora=len(t['dorme_fora']),
+                    rateio=dict(sorted(t['rateio'].items())),
+                )
+                for colab_id, t in totais.items()
+            ])
+    except IntegrityError:
+        raise ValueError(f"A competência {mes:02d}/{ano} já está fechada.")
+    return fechamento
+
+
+# ==============================================================================
+# LEITURA DOS DADOS CONGELADOS (CACHE SEM EXPIRAÇÃO)
+# ==============================================================================
+
+def resumo_congelado(fechamento):
+    """Linhas do resumo prontas para exibição. Imutáveis: cache sem timeout."""
+    def carregar():
+        return [
+            {
+                'colaborador': r.colaborador.nome_completo,
+                'id_colaborador': r.colaborador.id_colaborador,
+                'cargo': r.colaborador.cargo,
+                'setor': r.colaborador.setor.nome if r.colaborador.setor else "",
+                'total_minutos': r.total_minutos,
+                'total_horas': r.total_horas_str,
+                'qtd_registros': r.qtd_registros,
+                'dias_plantao': r.dias_plantao,
+                'dias_dorme_fora': r.dias_dorme_fora,
+                'rateio': r.rateio,
+            }
+            for r in fechamento.resumos.select_related('colaborador', 'colaborador__setor')
+        ]
+    return cache.get_or_set(f'fechamento:{fechamento.pk}:resumo', carregar, timeout=None)
+
+
+def planilha_fechamento(fechamento):
+    """Bytes do .xlsx do período fechado. Gerado uma vez e mantido em cache."""
+    chave = f'fechamento:{fechamento.pk}:xlsx'
+    conteudo = cache.get(chave)
+    if conteudo is not None:
+        return conteudo
+
+    linhas = resumo_congelado(fechamento)
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = f"Fechamento {fechamento.mes:02d}-{fechamento.ano}"
+    ws.append([
+        "ID Colaborador", "Colaborador", "Cargo", "Setor", "Total Horas", "Total Minutos",
+        "Registros", "Dias Plantão", "Dias Dorme Fora", "Rateio"
+    ])
+    for cell in ws[1]:
+        cell.font = Font(bold=True, color="FFFFFF")
+        cell.fill = PatternFill(start_color="4F46E5", end_color="4F46E5", fill_type="solid")
+        cell.alignment = Alignment(horizontal='center', vertical='center')
+
+    for linha in linhas:
+        rateio_str = "; ".join(
+            f"{destino}: {m // 60:02d}:{m % 60:02d}" for destino, m in linha['rateio'].items()
+        )
+        ws.append([
+            linha['id_colaborador'], linha['colaborador'], linha['cargo'], linha['setor'],
+            linha['total_horas'], linha['total_minutos'], linha['qtd_registros'],
+            linha['dias_plantao'], linha['dias_dorme_fora'], rateio_str
+        ])
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    conteudo = buffer.getvalue()
+    cache.set(chave, conteudo, timeout=None)
+    return conteudo
@@ -0,0 +1,279 @@
+"""
+Fila de gravação (write-behind) para os picos de envio de apontamentos.
+
+Às 07:00 e às 17:00 centenas de envios chegam em poucos minutos e o SQLite aceita um
+escritor por vez: os workers do gunicorn ficam presos no lock do banco. Com
+settings.FILA_GRAVACAO ligado, o envio já validado pelo formulário vai para um
+arquivo SQLite separado (FILA_SQLITE_PATH, modo WAL, synchronous=FULL), que só
+recebe INSERTs curtos, e o usuário recebe o protocolo na hora. Um único processo
+('python manage.py processar_fila') drena a fila em lotes: cada lote é uma transação
+no banco principal, com a verificação de conflito refeita por envio
+(produtividade.registro, aninhado = savepoint).
+
+Enquanto não é gravado, o envio aparece no histórico de quem registrou como
+"Processando"; se for recusado (conflito com outro registro, competência fechada
+depois do envio, cadastro removido ou dado inválido), como "Recusado". Um envio com
+erro é recusado sozinho: o restante do lote é gravado e a fila segue.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .lote import _valor_json
+from .models import Apontamento, Colaborador, FechamentoPeriodo
+from .registro import ConflitoHorario, gravar_apontamentos
+
+SQL_CRIACAO = (
+    """
+    CREATE TABLE IF NOT EXISTS fila (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        criado_em REAL NOT NULL,
+        usuario_id INTEGER,
+        dados TEXT NOT NULL,
+        estado TEXT NOT NULL DEFAULT 'PENDENTE',
+        mensagem TEXT,
+        processado_em REAL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS fila_estado_idx ON fila (estado, id)",
+    "CREATE INDEX IF NOT EXISTS fila_usuario_idx ON fila (usuario_id, estado)",
+)
+
+PENDENTE = 'PENDENTE'
+GRAVADO = 'GRAVADO'
+RECUSADO = 'RECUSADO'
+
+# Envios por transação no banco principal
+TAMANHO_LOTE = 200
+
+# Recusados continuam visíveis no histórico de quem registrou por este tempo
+EXIBIR_RECUSADOS_SEGUNDOS = 24 * 3600
+
+# Campos copiados do apontamento validado (data_registro é preenchida na gravação)
+CAMPOS = [f for f in Apontamento._meta.concrete_fields if f.editable and not f.primary_key]
+
+# Chaves estrangeiras conferidas antes da gravação (ver _referencias_ausentes)
+CAMPOS_FK = [f for f in CAMPOS if f.many_to_one]
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def ativa():
+    return getattr(settings, 'FILA_GRAVACAO', False)
+
+
+def _conexao():
+    """Uma conexão por thread e por arquivo (reaberta após fork do gunicorn)."""
+    caminho = settings.FILA_SQLITE_PATH
+    chave = (caminho, os.getpid())
+    conexoes = getattr(_local, 'conexoes', None)
+    if conexoes is None:
+        conexoes = _local.conexoes = {}
+    conn = conexoes.get(chave)
+    if conn is not None:
+        return conn
+
+    diretorio = os.path.dirname(caminho)
+    if diretorio:
+        os.makedirs(diretorio, exist_ok=True)
+    conn = sqlite3.connect(caminho, timeout=10, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    # O protocolo entregue ao usuário precisa sobreviver a uma queda de energia
+    conn.execute('PRAGMA synchronous=FULL')
+    for sql in SQL_CRIACAO:
+        conn.execute(sql)
+    conexoes[chave] = conn
+    return conn
+
+
+# ==============================================================================
+# ENTRADA (REQUISIÇÃO)
+# ==============================================================================
+
+def _serializar(apontamentos, auxiliares_extras):
+    return json.dumps({
+        'apontamentos': [
+            {f.attname: _valor_json(getattr(a, f.attname)) for f in CAMPOS} for a in apontamentos
+        ],
+        'auxiliares_extras': list(auxiliares_extras or []),
+    })
+
+
+def _desserializar(dados):
+    conteudo = json.loads(dados)
+    apontamentos = [
+        Apontamento(**{f.attname: f.to_python(valores.get(f.attname)) for f in CAMPOS})
+        for valores in conteudo['apontamentos']
+    ]
+    return apontamentos, conteudo['auxiliares_extras']
+
+
+def enfileirar(apontamentos, auxiliares_extras, usuario):
+    """Guarda o envio validado na fila e devolve o número do protocolo."""
+    cursor = _conexao().execute(
+        'INSERT INTO fila (criado_em, usuario_id, dados) VALUES (?, ?, ?)',
+        (time.time(), usuario.pk if usuario else None, _serializar(apontamentos, auxiliares_extras))
+    )
+    return cursor.lastrowid
+
+
+def gravar_ou_enfileirar(apontamentos, auxiliares_extras, usuario):
+    """
+    Com a fila ligada, enfileira e devolve o protocolo; senão grava na hora
+    (gravar_apontamentos, que pode levantar ConflitoHorario) e devolve None.
+    """
+    if not apontamentos:
+        return None
+    if ativa():
+        return enfileirar(apontamentos, auxiliares_extras, usuario)
+    gravar_apontamentos(apontamentos, auxiliares_extras)
+    return None
+
+
+def envios_do_usuario(usuario_id):
+    """Envios pendentes e recusados recentes do usuário, mais recentes primeiro."""
+    if not ativa():
+        return []
+    linhas = _conexao().execute(
+        'SELECT id, estado, mensagem, dados FROM fila '
+        'WHERE usuario_id = ? AND (estado = ? OR (estado = ? AND processado_em > ?)) '
+        'ORDER BY id DESC',
+        (usuario_id, PENDENTE, RECUSADO, time.time() - EXIBIR_RECUSADOS_SEGUNDOS)
+    ).fetchall()
+    envios = []
+    for protocolo, estado, mensagem, dados in linhas:
+        apontamentos, _ = _desserializar(dados)
+        for apontamento in apontamentos:
+            envios.append({
+                'protocolo': protocolo, 'estado': estado, 'mensagem': mensagem or '',
+                'apontamento': apontamento,
+            })
+    return envios
+
+
+# ==============================================================================
+# GRAVAÇÃO (PROCESSO ÚNICO)
+# ==============================================================================
+
+def _ja_gravado(conflito, apontamento):
+    """
+    Reprocessamento após uma queda entre o commit e a baixa na fila: o "conflito" é o
+    próprio envio já gravado, não outro registro.
+    """
+    return (
+        conflito.hora_inicio == apontamento.hora_inicio
+        and conflito.hora_termino == apontamento.hora_termino
+        and conflito.registrado_por_id == apontamento.registrado_por_id
+        and conflito.ocorrencias == apontamento.ocorrencias
+    )
+
+
+def _referencias_ausentes(apontamentos, auxiliares_extras):
+    """
+    Cadastro removido entre o envio e a gravação (obra, colaborador...), ou None.
+    No SQLite as chaves estrangeiras só são verificadas no COMMIT (DEFERRABLE INITIALLY
+    DEFERRED): o savepoint do envio não pega o erro, que desfaria o lote inteiro.
+    """
+    for campo in CAMPOS_FK:
+        ids = {getattr(a, campo.attname) for a in apontamentos} - {None}
+        faltando = ids - set(campo.related_model._base_manager.filter(pk__in=ids).values_list('pk', flat=True))
+        if faltando:
+            return f"{campo.verbose_name} #{min(faltando)} não existe mais."
+    ids = set(auxiliares_extras)
+    faltando = ids - set(Colaborador.objects.filter(pk__in=ids).values_list('pk', flat=True))
+    if faltando:
+        return f"Auxiliar #{min(faltando)} não existe mais."
+    return None
+
+
+def _gravar_envio(dados):
+    """Grava um envio da fila num savepoint próprio. Retorna (estado, mensagem)."""
+    try:
+        apontamentos, auxiliares_extras = _desserializar(dados)
+        # A competência pode ter sido fechada depois do envio
+        fechada = next(
+            (a.data_apontamento for a in apontamentos if FechamentoPeriodo.data_esta_fechada(a.data_apontamento)),
+            None
+        )
+        if fechada:
+            return RECUSADO, f"A competência {fechada:%m/%Y} foi fechada antes da gravação."
+        ausente = _referencias_ausentes(apontamentos, auxiliares_extras)
+        if ausente:
+            return RECUSADO, ausente
+        # Savepoint: um envio recusado não desfaz os demais do lote
+        with transaction.atomic():
+            gravar_apontamentos(apontamentos, auxiliares_extras)
+    except ConflitoHorario as e:
+        conflito = e.conflito
+        if any(_ja_gravado(conflito, a) for a in apontamentos):
+            return GRAVADO, None
+        return RECUSADO, (
+            f"Conflito com o registro de {conflito.data_apontamento:%d/%m/%Y} "
+            f"{conflito.hora_inicio:%H:%M}-{conflito.hora_termino:%H:%M}."
+        )
+    except Exception as e:
+        # Dado inválido no envio: recusado sozinho, senão voltaria a cada reinício
+        logger.exception("Envio da fila recusado")
+        return RECUSADO, f"Envio inválido: {e}"
+    return GRAVADO, None
+
+
+def processar_lote(tamanho_lote=TAMANHO_LOTE):
+    """
+    Grava até 'tamanho_lote' envios pendentes numa única transação do banco principal,
+    cada envio no seu savepoint. Retorna (gravados, recusados).
+    """
+    fila = _conexao()
+    linhas = fila.execute(
+        'SELECT id, dados FROM fila WHERE estado = ? ORDER BY id LIMIT ?', (PENDENTE, tamanho_lote)
+    ).fetchall()
+    if not linhas:
+        return 0, 0
+
+    try:
+        with transaction.atomic():
+            resultados = [(*_gravar_envio(dados), protocolo) for protocolo, dados in linhas]
+    except IntegrityError:
+        # Restrição que só falhou no COMMIT: regrava envio a envio, cada um na sua
+        # transação, para recusar apenas o culpado
+        logger.exception("Lote da fila desfeito no COMMIT; gravando envio a envio")
+        resultados = []
+        for protocolo, dados in linhas:
+            try:
+                with transaction.atomic():
+                    estado, mensagem = _gravar_envio(dados)
+            except IntegrityError as e:
+                estado, mensagem = RECUSADO, f"Envio inválido: {e}"
+            resultados.append((estado, mensagem, protocolo))
+
+    # Baixa na fila só depois do commit no banco principal
+    agora = time.time()
+    fila.execute('BEGIN IMMEDIATE')
+    fila.executemany(
+        'UPDATE fila SET estado = ?, mensagem = ?, processado_em = ? WHERE id = ?',
+        [(estado, mensagem, agora, protocolo) for estado, mensagem, protocolo in resultados]
+    )
+    fila.execute('COMMIT')
+
+    recusados = sum(1 for estado, _, _ in resultados if estado == RECUSADO)
+    return len(resultados) - recusados, recusados
+
+
+def pendentes():
+    return _conexao().execute('SELECT COUNT(*) FROM fila WHERE estado = ?', (PENDENTE,)).fetchone()[0]
+
+
+def limpar(dias=7):
+    """Remove envios já processados há mais de 'dias' dias. Retorna a quantidade removida."""
+    cursor = _conexao().execute(
+        'DELETE FROM fila WHERE estado != ? AND processado_em < ?', (PENDENTE, time.time() - dias * 86400)
+    )
+    return cursor.rowcount
@@ -0,0 +1,180 @@
+"""
+Horas para a folha de pagamento: normais, extras (50% e 100%) e adicional noturno.
+
+Parte da mesma base em arrays do pivô (pivo.base_do_periodo: uma linha por participante
+de cada apontamento, titular e auxiliares, como no fechamento). Cada registro vira um
+intervalo [início, fim) em minutos absolutos desde o início do período; o fim é o início
+mais a duração, então a virada de dia já está incluída.
+
+Adicional noturno (CLT art. 73): minutos entre 22:00 e 05:00. O trecho noturno de cada
+intervalo é a interseção com as janelas noturnas que começam na véspera, no próprio dia
+e no dia seguinte (um registro dura menos de 24h, então não alcança outras), calculada
+para todos os registros de uma vez com np.minimum/np.maximum. A hora noturna reduzida
+tem 52min30s: noturnas_reduzidas = minutos noturnos x 60 / 52,5.
+
+Extras: as horas de cada colaborador são somadas por dia de apontamento (bincount) e
+comparadas com a jornada do dia da semana (settings.FOLHA_JORNADA_MINUTOS). O excedente
+é extra 50%; as horas de domingos e feriados (models.Feriado) são todas extra 100%.
+
+Status: registros rejeitados não são pagos. Os ainda não aprovados (em análise ou com
+ajuste solicitado) entram, como no fechamento da competência, e também são somados à
+parte na coluna "Não Aprovadas" para conferência antes do envio à folha.
+"""
+import io
+
+import numpy as np
+import openpyxl
+from django.conf import settings
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+from .models import Feriado
+from .pivo import STATUS, base_do_periodo
+
+NOTURNO_INICIO = 22 * 60
+NOTURNO_FIM = 5 * 60
+DURACAO_NOTURNO = 24 * 60 - NOTURNO_INICIO + NOTURNO_FIM
+HORA_NOTURNA_REDUZIDA = 52.5
+
+DOMINGO = 6
+
+COLUNAS_FOLHA = (
+    ('dias_trabalhados', 'Dias Trabalhados'),
+    ('total', 'Total Horas'),
+    ('normais', 'Horas Normais'),
+    ('extras_50', 'Extras 50%'),
+    ('extras_100', 'Extras 100%'),
+    ('noturnas', 'Horas Noturnas'),
+    ('noturnas_reduzidas', 'Noturnas (Hora Reduzida)'),
+    ('nao_aprovadas', 'Não Aprovadas (incluídas)'),
+)
+
+APROVADO = STATUS.index('APROVADO')
+REJEITADO = STATUS.index('REJEITADO')
+
+
+# ==============================================================================
+# CÁLCULO
+# ==============================================================================
+
+def minutos_noturnos(inicio, fim):
+    """Minutos de cada intervalo [inicio, fim) (minutos desde a meia-noite do 1º dia) entre 22:00 e 05:00."""
+    dia = inicio // 1440
+    noturnos = np.zeros(len(inicio), dtype=np.int64)
+    for deslocamento in (-1, 0, 1):
+        janela = (dia + deslocamento) * 1440 + NOTURNO_INICIO
+        noturnos += np.clip(np.minimum(fim, janela + DURACAO_NOTURNO) - np.maximum(inicio, janela), 0, None)
+    return noturnos
+
+
+def jornada_por_dia(inicio, dias, jornada=None, feriados=()):
+    """(jornada em minutos, é domingo ou feriado) de cada dia do período, a partir de 'inicio'."""
+    jornada = tuple(jornada or settings.FOLHA_JORNADA_MINUTOS)
+    if len(jornada) != 6:
+        raise ValueError("A jornada deve ter 6 valores em minutos (segunda a sábado).")
+    dia_semana = (inicio.weekday() + np.arange(dias)) % 7
+    descanso = dia_semana == DOMINGO
+    for feriado in feriados:
+        if 0 <= (feriado - inicio).days < dias:
+            descanso[(feriado - inicio).days] = True
+    limite = np.where(descanso, 0, np.array(jornada + (0,), dtype=np.int64)[dia_semana])
+    return limite, descanso
+
+
+def calcular_folha(base, jornada=None, feriados=()):
+    """
+    Minutos de cada bucket da folha por colaborador da base, em ordem alfabética.
+    Lista de dicts com 'colaborador', 'setor' e as chaves de COLUNAS_FOLHA.
+    """
+    pessoas, dias = len(base.pessoas), base.dias
+    pessoa = base.pessoa.astype(np.int64)
+    minutos = base.minutos.astype(np.int64)
+    inicio = base.dia.astype(np.int64) * 1440 + base.inicio_minuto
+    noturnos = np.bincount(pessoa, weights=minutos_noturnos(inicio, inicio + minutos), minlength=pessoas)
+    nao_aprovadas = np.bincount(pessoa, weights=np.where(base.status != APROVADO, minutos, 0), minlength=pessoas)
+
+    por_dia = np.bincount(
+        pessoa * dias + base.dia, weights=minutos, minlength=pessoas * dias
+    ).reshape(pessoas, dias).astype(np.int64)
+    limite, descanso = jornada_por_dia(base.inicio, dias, jornada, feriados)
+    extras_100 = np.where(descanso, por_dia, 0).sum(axis=1)
+    extras_50 = np.where(descanso, 0, np.clip(por_dia - limite, 0, None)).sum(axis=1)
+    total = por_dia.sum(axis=1)
+    dias_trabalhados = (por_dia > 0).sum(axis=1)
+
+    folha = [
+        {
+            'colaborador': base.pessoas[i],
+            'setor': base.setores[base.setor_pessoa[i]],
+            'dias_trabalhados': int(dias_trabalhados[i]),
+            'total': int(total[i]),
+            'normais': int(total[i] - extras_50[i] - extras_100[i]),
+            'extras_50': int(extras_50[i]),
+            'extras_100': int(extras_100[i]),
+            'noturnas': int(noturnos[i]),
+            'noturnas_reduzidas': int(round(noturnos[i] * 60 / HORA_NOTURNA_REDUZIDA)),
+            'nao_aprovadas': int(nao_aprovadas[i]),
+        }
+        for i in range(pessoas)
+    ]
+    return sorted(folha, key=lambda linha: linha['colaborador'].lower())
+
+
+def folha_do_periodo(inicio, fim, jornada=None):
+    """
+    calcular_folha sobre a base do período (em cache, ver pivo.base_do_periodo), sem os
+    registros rejeitados.
+    """
+    if fim < inicio:
+        raise ValueError("A data final deve ser igual ou posterior à inicial.")
+    base = base_do_periodo(inicio, fim)
+    return calcular_folha(base.filtrar(base.status != REJEITADO), jornada, Feriado.datas_no_intervalo(inicio, fim))
+
+
+# ==============================================================================
+# PLANILHA
+# ==============================================================================
+
+def _hhmm(minutos):
+    return f"{minutos // 60:02d}:{minutos % 60:02d}"
+
+
+def planilha_folha(folha, inicio, fim):
+    """Bytes do .xlsx da folha: horas decimais (para importação) e HH:MM do total e das extras."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = f"Folha {inicio:%m-%Y}" if (inicio.year, inicio.month) == (fim.year, fim.month) else "Folha"
+    ws.append(["Colaborador", "Setor"] + [rotulo for _, rotulo in COLUNAS_FOLHA] + ["Total (HH:MM)", "Extras (HH:MM)"])
+    for cell in ws[1]:
+        cell.font = Font(bold=True, color="FFFFFF")
+        cell.fill = PatternFill(start_color="4F46E5", end_color="4F46E5", fill_type="solid")
+        cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+
+    for linha in folha:
+        valores = [
+            linha[chave] if chave == 'dias_trabalhados' else round(linha[chave] / 60, 2)
+            for chave, _ in COLUNAS_FOLHA
+        ]
+        ws.append([
+            linha['colaborador'], linha['setor'], *valores,
+            _hhmm(linha['total']), _hhmm(linha['extras_50'] + linha['extras_100']),
+        ])
+
+    for row in ws.iter_rows(min_row=2, min_col=4, max_col=2 + len(COLUNAS_FOLHA)):
+        for cell in row:
+            cell.number_format = '0.00'
+    ws.column_dimensions['A'].width = max((len(linha['colaborador']) for linha in folha), default=20) + 2
+    ws.column_dimensions['B'].width = max((len(linha['setor']) for linha in folha), default=10) + 2
+    for i in range(3, ws.max_column + 1):
+        ws.column_dimensions[get_column_letter(i)].width = 14
+    ws.freeze_panes = 'C2'
+
+    # Rodapé com o período e as regras aplicadas
+    ws.append([])
+    ws.append([f"Período: {inicio:%d/%m/%Y} a {fim:%d/%m/%Y}"])
+    ws.append(["Noturno: 22:00 às 05:00, hora reduzida de 52min30s. Domingos e feriados: extra 100%."])
+    ws.append(["Registros rejeitados não entram. Não Aprovadas: horas em análise já somadas ao total."])
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
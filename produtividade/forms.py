@@ -4,7 +4,54 @@ from django.utils.safestring import mark_safe
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import datetime, timedelta
-from .models import Apontamento, Colaborador, Veiculo, Projeto, Setor, CodigoCliente, CentroCusto
+from .models import Apontamento, Colaborador, Veiculo, Projeto, Setor, CodigoCliente, CentroCusto, FechamentoPeriodo
+from .registro import conflitos_horario
+
+
+def mensagem_conflito(conflito, colaborador):
+    """Alerta HTML com os dados do apontamento que conflita com o horário informado."""
+    # Montagem dos dados para a mensagem de erro
+    if conflito.local_execucao == 'INT':
+        referencia = f"{str(conflito.projeto)}" if conflito.projeto else f"{str(conflito.codigo_cliente)}"
+    else: 
+        referencia = f"{str(conflito.centro_custo)}" if conflito.centro_custo else "Local Externo"
+        
+    inicio_str = conflito.hora_inicio.strftime('%H:%M')
+    termino_str = conflito.hora_termino.strftime('%H:%M')
+    data_fmt = conflito.data_apontamento.strftime('%d/%m/%Y')
+    
+    # Ícones SVG inline para o alerta
+    icon_user = '<svg class="w-4 h-4 text-gray-400 flex-shrink-0" fill="none" viewBox="0 0 24 24" stroke="currentColor" stroke-width="2"><path d="M16 7a4 4 0 11-8 0 4 4 0 018 0zM12 14a7 7 0 00-7 7h14a7 7 0 00-7-7z" /></svg>'
+    icon_place = '<svg class="w-4 h-4 text-gray-400 flex-shrink-0" fill="none" viewBox="0 0 24 24" stroke="currentColor" stroke-width="2"><path d="M19 21V5a2 2 0 00-2-2H7a2 2 0 00-2 2v16m14 0h2m-2 0h-5m-9 0H3m2 0h5M9 7h1m-1 4h1m4-4h1m-1 4h1m-5 10v-5a1 1 0 011-1h2a1 1 0 011 1v5m-4 0h4" /></svg>'
+    icon_date = '<svg class="w-4 h-4 text-gray-400 flex-shrink-0" fill="none" viewBox="0 0 24 24" stroke="currentColor" stroke-width="2"><path d="M8 7V3m8 4V3m-9 8h10M5 21h14a2 2 0 002-2V7a2 2 0 00-2-2H5a2 2 0 00-2 2v12a2 2 0 002 2z" /></svg>'
+    icon_clock = '<svg class="w-4 h-4 text-gray-400 flex-shrink-0" fill="none" viewBox="0 0 24 24" stroke="currentColor" stroke-width="2"><path d="M12 8v4l3 3m6-3a9 9 0 11-18 0 9 9 0 0118 0z" /></svg>'
+
+    error_message = mark_safe(f"""
+        <div class="text-left">
+            <p class="font-bold text-base text-red-300 mb-2">Conflito de horário detectado!</p>
+            <div class="bg-slate-800/80 p-3 rounded border border-red-500/30 text-sm space-y-2 mb-3 shadow-inner">
+                <div class="flex items-start gap-3">
+                    <div class="mt-0.5">{icon_user}</div>
+                    <span class="font-bold text-white tracking-wide">{colaborador.nome_completo.upper()}</span>
+                </div>
+                <div class="flex items-start gap-3">
+                    <div class="mt-0.5">{icon_place}</div>
+                    <span class="text-gray-300">{referencia}</span>
+                </div>
+                <div class="flex items-start gap-3">
+                    <div class="mt-0.5">{icon_date}</div>
+                    <span class="text-gray-300">{data_fmt}</span>
+                </div>
+                <div class="flex items-center gap-3">
+                    <div>{icon_clock}</div>
+                    <span class="font-mono text-white font-bold bg-red-900/40 px-2 rounded border border-red-900/50">{inicio_str} - {termino_str}</span>
+                </div>
+            </div>
+            <p class="text-xs text-red-300 italic">Ajuste os horários. Não é permitido inserir uma atividade dentro da outra.</p>
+        </div>
+    """)
+    return error_message
+
 
 class ApontamentoForm(forms.ModelForm):
     """
@@ -303,66 +350,23 @@ class ApontamentoForm(forms.ModelForm):
             if dt_termino > agora:
                 self.add_error('hora_termino', "O horário de término não pode ser no futuro.")
 
+        # 1.1 Bloqueio de Competência Fechada (folha já processada)
+        data_original = self.instance.data_apontamento if self.instance and self.instance.pk else None
+        if FechamentoPeriodo.data_esta_fechada(data_apontamento) or FechamentoPeriodo.data_esta_fechada(data_original):
+            self.add_error('data_apontamento', "Esta competência já foi fechada. Não é possível lançar ou alterar registros nela.")
+
         # Se houver erros, retorna imediatamente
         if self.errors:
             return cleaned_data
 
         # 2. Detecção de Conflitos (Overlap)
-        if colaborador and data_apontamento and inicio and termino and inicio < termino:
-            query = Apontamento.objects.filter(
-                colaborador=colaborador,
-                data_apontamento=data_apontamento,
-                hora_inicio__lt=termino, 
-                hora_termino__gt=inicio 
-            )
-            # Exclui o próprio registro se for edição
-            if self.instance and self.instance.pk:
-                query = query.exclude(pk=self.instance.pk)
-
-            if query.exists():
-                conflito = query.first()
-                
-                # Montagem dos dados para a mensagem de erro
-                if conflito.local_execucao == 'INT':
-                    referencia = f"{str(conflito.projeto)}" if conflito.projeto else f"{str(conflito.codigo_cliente)}"
-                else: 
-                    referencia = f"{str(conflito.centro_custo)}" if conflito.centro_custo else "Local Externo"
-                    
-                inicio_str = conflito.hora_inicio.strftime('%H:%M')
-                termino_str = conflito.hora_termino.strftime('%H:%M')
-                data_fmt = conflito.data_apontamento.strftime('%d/%m/%Y')
-                
-                # Ícones SVG inline para o alerta
-                icon_user = '<svg class="w-4 h-4 text-gray-400 flex-shrink-0" fill="none" viewBox="0 0 24 24" stroke="currentColor" stroke-width="2"><path d="M16 7a4 4 0 11-8 0 4 4 0 018 0zM12 14a7 7 0 00-7 7h14a7 7 0 00-7-7z" /></svg>'
-                icon_place = '<svg class="w-4 h-4 text-gray-400 flex-shrink-0" fill="none" viewBox="0 0 24 24" stroke="currentColor" stroke-width="2"><path d="M19 21V5a2 2 0 00-2-2H7a2 2 0 00-2 2v16m14 0h2m-2 0h-5m-9 0H3m2 0h5M9 7h1m-1 4h1m4-4h1m-1 4h1m-5 10v-5a1 1 0 011-1h2a1 1 0 011 1v5m-4 0h4" /></svg>'
-                icon_date = '<svg class="w-4 h-4 text-gray-400 flex-shrink-0" fill="none" viewBox="0 0 24 24" stroke="currentColor" stroke-width="2"><path d="M8 7V3m8 4V3m-9 8h10M5 21h14a2 2 0 002-2V7a2 2 0 00-2-2H5a2 2 0 00-2 2v12a2 2 0 002 2z" /></svg>'
-                icon_clock = '<svg class="w-4 h-4 text-gray-400 flex-shrink-0" fill="none" viewBox="0 0 24 24" stroke="currentColor" stroke-width="2"><path d="M12 8v4l3 3m6-3a9 9 0 11-18 0 9 9 0 0118 0z" /></svg>'
-
-                error_message = mark_safe(f"""
-                    <div class="text-left">
-                        <p class="font-bold text-base text-red-300 mb-2">Conflito de horário detectado!</p>
-                        <div class="bg-slate-800/80 p-3 rounded border border-red-500/30 text-sm space-y-2 mb-3 shadow-inner">
-                            <div class="flex items-start gap-3">
-                                <div class="mt-0.5">{icon_user}</div>
-                                <span class="font-bold text-white tracking-wide">{colaborador.nome_completo.upper()}</span>
-                            </div>
-                            <div class="flex items-start gap-3">
-                                <div class="mt-0.5">{icon_place}</div>
-                                <span class="text-gray-300">{referencia}</span>
-                            </div>
-                            <div class="flex items-start gap-3">
-                                <div class="mt-0.5">{icon_date}</div>
-                                <span class="text-gray-300">{data_fmt}</span>
-                            </div>
-                            <div class="flex items-center gap-3">
-                                <div>{icon_clock}</div>
-                                <span class="font-mono text-white font-bold bg-red-900/40 px-2 rounded border border-red-900/50">{inicio_str} - {termino_str}</span>
-                            </div>
-                        </div>
-                        <p class="text-xs text-red-300 italic">Ajuste os horários. Não é permitido inserir uma atividade dentro da outra.</p>
-                    </div>
-                """)
-                raise ValidationError(error_message)
+        # Retorno rápido ao usuário; a verificação definitiva é refeita na transação de
+        # gravação (produtividade.registro), que cobre envios simultâneos.
+        if colaborador and data_apontamento and inicio and termino:
+            excluir_pk = self.instance.pk if self.instance else None
+            conflito = conflitos_horario(colaborador.pk, data_apontamento, inicio, termino, excluir_pk).first()
+            if conflito:
+                raise ValidationError(mensagem_conflito(conflito, colaborador))
 
         # 3. Validação de Local e Contexto
         local = cleaned_data.get('local_execucao')
@@ -0,0 +1,359 @@
+"""
+Importação de cadastros (Colaborador, Projeto, Código de Cliente e Veículo) a partir
+de planilhas .xlsx ou .csv.
+
+A planilha é lida em streaming (openpyxl em modo read-only / csv linha a linha) e
+processada em lotes: cada lote é validado em memória (validadores dos próprios campos,
+sem consultas por linha) e gravado com um único bulk_create(update_conflicts=True),
+que insere os novos e atualiza os existentes pela chave natural. Células vazias de
+colunas opcionais não apagam o valor já cadastrado (a linha só atualiza os campos
+preenchidos). Erros são reportados por número de linha da planilha e não interrompem
+a importação.
+"""
+import csv
+import io
+import re
+import unicodedata
+from collections import defaultdict
+
+import openpyxl
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .cache_tags import TAGS_CATALOGO, invalidar
+from .models import CodigoCliente, Colaborador, Projeto, Setor, Veiculo, chave_placa
+
+TAMANHO_LOTE = 1000
+
+# Placa antiga (ABC1234) ou Mercosul (ABC1D23), já sem hífen/espaços
+PADRAO_PLACA = re.compile(r'^[A-Z]{3}\d[A-Z0-9]\d{2}$')
+
+VALORES_VERDADEIROS = {'1', 'sim', 's', 'true', 'verdadeiro', 'ativo', 'x'}
+
+
+# ==============================================================================
+# LEITURA DA PLANILHA
+# ==============================================================================
+
+def normalizar_cabecalho(valor):
+    """'Código da Obra ' -> 'codigo_da_obra'."""
+    texto = unicodedata.normalize('NFKD', str(valor or '')).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', '_', texto.strip().lower()).strip('_')
+
+
+def ler_planilha(arquivo, nome_arquivo):
+    """
+    Gera (número da linha, {cabeçalho normalizado: valor}) para cada linha não vazia
+    da aba ativa. A primeira linha é o cabeçalho. Aceita caminho ou arquivo binário aberto.
+    """
+    for _, numero, dados in ler_abas(arquivo, nome_arquivo, todas=False):
+        yield numero, dados
+
+
+def ler_abas(arquivo, nome_arquivo, todas=True):
+    """Como ler_planilha, percorrendo todas as abas (cada uma com o seu cabeçalho): gera (aba, número, dados)."""
+    if str(nome_arquivo).lower().endswith('.csv'):
+        yield from _registros(str(nome_arquivo), _linhas_csv(arquivo))
+        return
+
+    wb = openpyxl.load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        for ws in (wb.worksheets if todas else [wb.active]):
+            yield from _registros(ws.title, ws.iter_rows(values_only=True))
+    finally:
+        wb.close()
+
+
+def _registros(aba, linhas):
+    cabecalho = None
+    for numero, valores in enumerate(linhas, start=1):
+        if cabecalho is None:
+            cabecalho = [normalizar_cabecalho(v) for v in valores]
+            continue
+        if not any(v not in (None, '') for v in valores):
+            continue
+        yield aba, numero, dict(zip(cabecalho, valores))
+
+
+def _linhas_csv(arquivo):
+    caminho = isinstance(arquivo, str) or hasattr(arquivo, '__fspath__')
+    binario = open(arquivo, 'rb') if caminho else arquivo
+    texto = io.TextIOWrapper(binario, encoding='utf-8-sig', newline='')
+    try:
+        amostra = texto.read(4096)
+        texto.seek(0)
+        # Relatórios do sistema usam ';' (Excel pt-BR); aceita também ','
+        delimitador = ';' if amostra.count(';') >= amostra.count(',') else ','
+        yield from csv.reader(texto, delimiter=delimitador)
+    finally:
+        if caminho:
+            texto.close()
+        else:
+            texto.detach()
+
+
+# ==============================================================================
+# NORMALIZAÇÃO DE VALORES
+# ==============================================================================
+
+def texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def normalizar_placa(valor):
+    return chave_placa(texto(valor)) or ''
+
+
+def normalizar_codigo_cliente(valor):
+    # Excel converte "0123" em número: recompõe os zeros à esquerda
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return f"{int(valor):04d}"
+    return texto(valor)
+
+
+def booleano(valor):
+    if isinstance(valor, bool):
+        return valor
+    return texto(valor).lower() in VALORES_VERDADEIROS
+
+
+# ==============================================================================
+# DEFINIÇÃO DOS CADASTROS
+# ==============================================================================
+
+class Cadastro:
+    """
+    Regras de um cadastro importável: chave natural, colunas aceitas (com sinônimos
+    de cabeçalho) e conversão de cada coluna para o campo do model.
+    """
+
+    def __init__(self, model, chave, colunas, obrigatorias):
+        self.model = model
+        self.chave = chave
+        # {campo: (sinônimos de cabeçalho, conversor)}
+        self.colunas = colunas
+        self.obrigatorias = obrigatorias
+
+    def mapear_cabecalho(self, cabecalho):
+        """{campo: cabeçalho presente na planilha} (só campos presentes são atualizados)."""
+        mapa = {}
+        for campo, (sinonimos, _) in self.colunas.items():
+            for nome in (campo, *sinonimos):
+                if nome in cabecalho:
+                    mapa[campo] = nome
+                    break
+        return mapa
+
+    def contexto(self):
+        """Dados auxiliares carregados uma vez por importação."""
+        return {}
+
+    def converter(self, campo, valor, contexto):
+        return self.colunas[campo][1](valor)
+
+
+class CadastroColaborador(Cadastro):
+
+    def contexto(self):
+        return {'setores': {normalizar_cabecalho(nome): pk for pk, nome in Setor.objects.values_list('pk', 'nome')}}
+
+    def converter(self, campo, valor, contexto):
+        if campo != 'setor':
+            return super().converter(campo, valor, contexto)
+        nome = texto(valor)
+        if not nome:
+            return None
+        try:
+            return contexto['setores'][normalizar_cabecalho(nome)]
+        except KeyError:
+            raise ValidationError(f"Setor '{nome}' não cadastrado.")
+
+
+class CadastroVeiculo(Cadastro):
+    """
+    Placas comparadas pela chave normalizada (models.chave_placa): 'ABC1234' na planilha
+    atualiza o 'ABC-1234' já cadastrado em vez de criar um segundo veículo.
+    """
+
+    def contexto(self):
+        return {'placas': {chave_placa(p): p for p in Veiculo.objects.values_list('placa', flat=True)}}
+
+    def converter(self, campo, valor, contexto):
+        if campo != 'placa':
+            return super().converter(campo, valor, contexto)
+        placa = normalizar_placa(valor)
+        if placa and not PADRAO_PLACA.match(placa):
+            raise ValidationError("Placa inválida (use ABC1234 ou ABC1D23).")
+        return contexto['placas'].get(placa, placa)
+
+
+CADASTROS = {
+    'colaborador': CadastroColaborador(
+        Colaborador, 'id_colaborador',
+        {
+            'id_colaborador': (('matricula', 'id', 'codigo'), texto),
+            'nome_completo': (('nome', 'colaborador'), texto),
+            'cargo': ((), texto),
+            'setor': (('setor_id',), texto),
+        },
+        obrigatorias=('id_colaborador', 'nome_completo'),
+    ),
+    'projeto': Cadastro(
+        Projeto, 'codigo',
+        {
+            'codigo': (('codigo_da_obra', 'obra'), texto),
+            'nome': (('nome_do_projeto', 'projeto'), texto),
+            'ativo': ((), booleano),
+        },
+        obrigatorias=('codigo', 'nome'),
+    ),
+    'cliente': Cadastro(
+        CodigoCliente, 'codigo',
+        {
+            'codigo': (('codigo_cliente', 'cod_cliente'), normalizar_codigo_cliente),
+            'nome': (('nome_do_cliente', 'cliente'), texto),
+            'ativo': ((), booleano),
+        },
+        obrigatorias=('codigo', 'nome'),
+    ),
+    'veiculo': CadastroVeiculo(
+        Veiculo, 'placa',
+        {
+            'placa': ((), normalizar_placa),
+            'descricao': (('modelo', 'modelo_descricao'), texto),
+        },
+        obrigatorias=('placa',),
+    ),
+}
+
+
+# ==============================================================================
+# IMPORTAÇÃO
+# ==============================================================================
+
+class ResultadoImportacao:
+
+    def __init__(self):
+        self.criados = 0
+        self.atualizados = 0
+        self.erros = []  # [(linha, mensagem)]
+
+    @property
+    def processados(self):
+        return self.criados + self.atualizados
+
+
+def _validar_linha(cadastro, mapa, dados, contexto):
+    """
+    (instância não salva, campos preenchidos na linha); ValidationError se inválida.
+    Células vazias de colunas opcionais ficam de fora (o registro existente mantém o valor).
+    """
+    valores = {}
+    erros = {}
+    for campo, coluna in mapa.items():
+        valor = dados.get(coluna)
+        if campo not in cadastro.obrigatorias and texto(valor) == '':
+            continue
+        try:
+            valores[campo] = cadastro.converter(campo, valor, contexto)
+        except ValidationError as e:
+            erros[campo] = e.messages
+    for campo in cadastro.obrigatorias:
+        if campo not in erros and not valores.get(campo):
+            erros[campo] = ["Campo obrigatório."]
+
+    campos = frozenset(valores)
+    if 'setor' in valores:
+        valores['setor_id'] = valores.pop('setor')
+    obj = cadastro.model(**valores)
+    if not erros:
+        # Validadores dos campos (regex do código de cliente, tamanhos); unicidade fica com o upsert
+        try:
+            obj.clean_fields(exclude=[f.name for f in cadastro.model._meta.fields if f.name not in campos])
+        except ValidationError as e:
+            erros.update(e.message_dict)
+    if erros:
+        raise ValidationError(erros)
+    return obj, campos
+
+
+def _gravar_lote(cadastro, lote, resultado, simular):
+    """
+    lote: {chave natural: (instância, campos preenchidos)}. Um SELECT das chaves
+    existentes + um upsert por combinação de campos preenchidos (normalmente uma só).
+    """
+    model = cadastro.model
+    existentes = dict(
+        model.objects.filter(**{f'{cadastro.chave}__in': list(lote)}).values_list(cadastro.chave, 'pk')
+    )
+    resultado.atualizados += len(existentes)
+    resultado.criados += len(lote) - len(existentes)
+    if simular:
+        return existentes
+
+    grupos = defaultdict(list)
+    for obj, preenchidos in lote.values():
+        grupos[preenchidos].append(obj)
+    for preenchidos, objs in grupos.items():
+        campos = [f.name for f in model._meta.fields if f.name in preenchidos and f.name != cadastro.chave]
+        model.objects.bulk_create(
+            objs,
+            update_conflicts=bool(campos),
+            ignore_conflicts=not campos,
+            unique_fields=[cadastro.chave] if campos else None,
+            update_fields=campos or None,
+        )
+    return existentes
+
+
+def importar_cadastro(tipo, arquivo, nome_arquivo, tamanho_lote=TAMANHO_LOTE, simular=False):
+    """
+    Importa (ou apenas valida, com simular=True) uma planilha do cadastro 'tipo'.
+    Cada lote é gravado na sua própria transação; linhas inválidas são ignoradas e reportadas.
+    """
+    cadastro = CADASTROS[tipo]
+    contexto = cadastro.contexto()
+    resultado = ResultadoImportacao()
+    colaboradores_alterados = set()
+
+    mapa = None
+    lote = {}
+
+    def gravar():
+        with transaction.atomic():
+            existentes = _gravar_lote(cadastro, lote, resultado, simular)
+        if cadastro.model is Colaborador:
+            colaboradores_alterados.update(existentes.values())
+        lote.clear()
+
+    for numero, dados in ler_planilha(arquivo, nome_arquivo):
+        if mapa is None:
+            mapa = cadastro.mapear_cabecalho(dados)
+            faltando = [c for c in cadastro.obrigatorias if c not in mapa]
+            if faltando:
+                resultado.erros.append((1, f"Colunas obrigatórias ausentes: {', '.join(faltando)}."))
+                return resultado
+        try:
+            obj, preenchidos = _validar_linha(cadastro, mapa, dados, contexto)
+        except ValidationError as e:
+            mensagens = [f"{campo}: {' '.join(msgs)}" for campo, msgs in e.message_dict.items()]
+            resultado.erros.append((numero, '; '.join(mensagens)))
+            continue
+        # Chave repetida na planilha: vale a última ocorrência
+        lote[getattr(obj, cadastro.chave)] = (obj, preenchidos)
+        if len(lote) >= tamanho_lote:
+            gravar()
+
+    if lote:
+        gravar()
+
+    if not simular and resultado.processados:
+        # bulk_create não dispara signals: invalida o cache dos cadastros manualmente
+        tags = [TAGS_CATALOGO[cadastro.model]]
+        tags += [f'colaborador:{pk}' for pk in colaboradores_alterados]
+        transaction.on_commit(lambda: invalidar(*tags))
+    return resultado
@@ -0,0 +1,414 @@
+"""
+Importação de planilhas legadas de horas (período anterior ao sistema).
+
+Layout esperado: o mesmo do relatório Excel/CSV (Data, Colaborador, Tipo, Local,
+Código de Obra, Código Cliente, Veículo, Placa, Hora Início, Hora Fim, Plantão,
+Dorme Fora, Observações), aceitando sinônimos comuns de cabeçalho e todas as abas
+da pasta de trabalho. Auxiliares vêm na coluna 'Auxiliares' (nomes separados por
+vírgula ou ';') ou como linhas de "Carona" logo após o registro principal, como no
+próprio relatório.
+
+Desempenho:
+- cadastros carregados uma única vez em dicionários (nenhuma consulta por linha);
+- sobreposição de horários verificada em memória, por colaborador, contra o próprio
+  lote e contra o banco (uma consulta por lote na tabela principal e no arquivo);
+- gravação com bulk_create em lotes; cada lote é uma transação que também avança o
+  checkpoint (ImportacaoLegado), então uma execução interrompida retoma de onde parou.
+
+bulk_create não dispara signals: registros históricos não entram no dashboard do dia
+e não alteram caches de cadastro; o índice de busca é mantido pelos triggers do banco.
+As séries temporais dos meses importados são invalidadas a cada lote.
+"""
+import hashlib
+import re
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cache_tags import invalidar, tag_mes
+from .fechamento import minutos_intervalo
+from .importacao import booleano, ler_abas, normalizar_cabecalho, normalizar_codigo_cliente, normalizar_placa, texto
+from .models import (
+    Apontamento, ApontamentoArquivado, CentroCusto, CodigoCliente, Colaborador,
+    FechamentoPeriodo, ImportacaoLegado, Projeto, Veiculo, chave_placa
+)
+
+TAMANHO_LOTE = 1000
+
+# {campo: sinônimos de cabeçalho (já normalizados)}
+COLUNAS = {
+    'data': ('data', 'data_apontamento', 'dia'),
+    'colaborador': ('colaborador', 'nome', 'nome_completo', 'funcionario'),
+    'matricula': ('matricula', 'id_colaborador'),
+    'tipo': ('tipo', 'local_execucao'),
+    'local': ('local_obra_setor', 'local', 'centro_custo', 'justificativa'),
+    'codigo_obra': ('codigo_de_obra', 'codigo_obra', 'obra'),
+    'codigo_cliente': ('codigo_cliente', 'cod_cliente', 'cliente'),
+    'veiculo': ('veiculo', 'modelo'),
+    'placa': ('placa',),
+    'hora_inicio': ('hora_inicio', 'inicio', 'entrada'),
+    'hora_fim': ('hora_fim', 'hora_termino', 'termino', 'saida'),
+    'plantao': ('plantao', 'em_plantao'),
+    'dorme_fora': ('dorme_fora',),
+    'observacoes': ('observacoes', 'ocorrencias', 'obs'),
+    'auxiliares': ('auxiliares', 'auxiliar', 'auxiliares_extras'),
+}
+
+PADRAO_CARONA = re.compile(r'^\s*auxiliar de:\s*(.+)$', re.IGNORECASE)
+
+
+class ErroLinha(Exception):
+    pass
+
+
+def assinatura_arquivo(caminho):
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+# ==============================================================================
+# CONVERSÃO DE VALORES
+# ==============================================================================
+
+def converter_data(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    txt = texto(valor)
+    for formato in ('%d/%m/%Y', '%Y-%m-%d', '%d/%m/%y', '%d-%m-%Y'):
+        try:
+            return datetime.strptime(txt, formato).date()
+        except ValueError:
+            continue
+    raise ErroLinha(f"Data inválida: '{txt}'.")
+
+
+def converter_hora(valor):
+    if isinstance(valor, datetime):
+        return valor.time().replace(second=0, microsecond=0)
+    if isinstance(valor, time):
+        return valor.replace(second=0, microsecond=0)
+    if isinstance(valor, timedelta):
+        minutos = int(valor.total_seconds() // 60) % 1440
+        return time(minutos // 60, minutos % 60)
+    if isinstance(valor, float) and 0 <= valor < 1:
+        # Célula de hora sem formatação: fração do dia
+        minutos = round(valor * 1440) % 1440
+        return time(minutos // 60, minutos % 60)
+    txt = texto(valor).lower().replace('h', ':')
+    m = re.match(r'^(\d{1,2}):(\d{2})(?::\d{2})?$', txt)
+    if m and int(m.group(1)) < 24 and int(m.group(2)) < 60:
+        return time(int(m.group(1)), int(m.group(2)))
+    raise ErroLinha(f"Hora inválida: '{texto(valor)}'.")
+
+
+def _chave_nome(valor):
+    return normalizar_cabecalho(texto(valor))
+
+
+# ==============================================================================
+# CADASTROS EM MEMÓRIA
+# ==============================================================================
+
+class Catalogos:
+    """Cadastros carregados uma vez por importação (nome/código -> pk)."""
+
+    def __init__(self):
+        self.por_nome = {}
+        self.nomes_repetidos = set()
+        self.por_matricula = {}
+        for pk, nome, matricula in Colaborador.objects.values_list('pk', 'nome_completo', 'id_colaborador'):
+            chave = _chave_nome(nome)
+            if chave in self.por_nome:
+                self.nomes_repetidos.add(chave)
+            self.por_nome[chave] = pk
+            self.por_matricula[texto(matricula)] = pk
+
+        self.projetos = {texto(c).upper(): pk for pk, c in Projeto.objects.values_list('pk', 'codigo') if c}
+        self.clientes = dict((c, pk) for pk, c in CodigoCliente.objects.values_list('pk', 'codigo'))
+        self.centros = {_chave_nome(n): pk for pk, n in CentroCusto.objects.values_list('pk', 'nome')}
+        self.veiculos = {normalizar_placa(p): pk for pk, p in Veiculo.objects.values_list('pk', 'placa')}
+        self.fechados = set(FechamentoPeriodo.objects.values_list('ano', 'mes'))
+
+    def colaborador(self, nome, matricula=None):
+        matricula = texto(matricula)
+        if matricula:
+            if matricula not in self.por_matricula:
+                raise ErroLinha(f"Matrícula '{matricula}' não cadastrada.")
+            return self.por_matricula[matricula]
+        chave = _chave_nome(nome)
+        if not chave:
+            raise ErroLinha("Colaborador não informado.")
+        if chave in self.nomes_repetidos:
+            raise ErroLinha(f"Nome '{texto(nome)}' pertence a mais de um colaborador; informe a matrícula.")
+        if chave not in self.por_nome:
+            raise ErroLinha(f"Colaborador '{texto(nome)}' não cadastrado.")
+        return self.por_nome[chave]
+
+
+# ==============================================================================
+# MONTAGEM DOS REGISTROS
+# ==============================================================================
+
+class Registro:
+    """Apontamento ainda não gravado, com auxiliares e intervalo absoluto em minutos."""
+    __slots__ = ('posicao', 'origem', 'obj', 'auxiliares', 'inicio', 'fim')
+
+    def __init__(self, posicao, origem, obj):
+        self.posicao = posicao
+        self.origem = origem
+        self.obj = obj
+        self.auxiliares = []
+        self.inicio = obj.data_apontamento.toordinal() * 1440 + obj.hora_inicio.hour * 60 + obj.hora_inicio.minute
+        self.fim = self.inicio + minutos_intervalo(obj.hora_inicio, obj.hora_termino)
+
+    @property
+    def chave(self):
+        o = self.obj
+        return (o.data_apontamento, o.colaborador_id, o.hora_inicio, o.hora_termino)
+
+
+def _valor(dados, mapa, campo):
+    coluna = mapa.get(campo)
+    return dados.get(coluna) if coluna else None
+
+
+def _local(dados, mapa, catalogos):
+    """(local_execucao, projeto_id, codigo_cliente_id, centro_custo_id)."""
+    codigo_obra = texto(_valor(dados, mapa, 'codigo_obra')).upper()
+    codigo_cliente = normalizar_codigo_cliente(_valor(dados, mapa, 'codigo_cliente'))
+    projeto_id = cliente_id = centro_id = None
+    if codigo_obra:
+        if codigo_obra not in catalogos.projetos:
+            raise ErroLinha(f"Obra '{codigo_obra}' não cadastrada.")
+        projeto_id = catalogos.projetos[codigo_obra]
+    elif codigo_cliente:
+        if codigo_cliente not in catalogos.clientes:
+            raise ErroLinha(f"Código de cliente '{codigo_cliente}' não cadastrado.")
+        cliente_id = catalogos.clientes[codigo_cliente]
+
+    tipo = _chave_nome(_valor(dados, mapa, 'tipo'))
+    if tipo in ('ext', 'fora_do_setor', 'fora_da_obra', 'externo'):
+        local_execucao = 'EXT'
+    elif tipo in ('int', 'obra', 'dentro_da_obra', 'interno'):
+        local_execucao = 'INT'
+    else:
+        local_execucao = 'INT' if (projeto_id or cliente_id) else 'EXT'
+
+    if local_execucao == 'INT' and not (projeto_id or cliente_id):
+        raise ErroLinha("Registro em obra sem código de obra ou de cliente.")
+    if local_execucao == 'EXT':
+        local = _chave_nome(_valor(dados, mapa, 'local'))
+        if local and local != 'atividade_externa':
+            if local not in catalogos.centros:
+                raise ErroLinha(f"Centro de custo '{texto(_valor(dados, mapa, 'local'))}' não cadastrado.")
+            centro_id = catalogos.centros[local]
+    return local_execucao, projeto_id, cliente_id, centro_id
+
+
+def montar_registro(posicao, origem, dados, mapa, catalogos, usuario):
+    """Registro principal a partir da linha ou ('carona', chave do principal, auxiliar_id)."""
+    data = converter_data(_valor(dados, mapa, 'data'))
+    inicio = converter_hora(_valor(dados, mapa, 'hora_inicio'))
+    termino = converter_hora(_valor(dados, mapa, 'hora_fim'))
+    if inicio == termino:
+        raise ErroLinha("Hora de início igual à de término.")
+    if (data.year, data.month) in catalogos.fechados:
+        raise ErroLinha(f"Competência {data:%m/%Y} já fechada.")
+    colaborador_id = catalogos.colaborador(_valor(dados, mapa, 'colaborador'), _valor(dados, mapa, 'matricula'))
+
+    veiculo = texto(_valor(dados, mapa, 'veiculo'))
+    observacoes = texto(_valor(dados, mapa, 'observacoes'))
+    carona = PADRAO_CARONA.match(observacoes)
+    if veiculo.lower() == 'carona' and carona:
+        principal_id = catalogos.colaborador(carona.group(1))
+        return 'carona', (data, principal_id, inicio, termino), colaborador_id
+
+    local_execucao, projeto_id, cliente_id, centro_id = _local(dados, mapa, catalogos)
+    em_plantao = booleano(_valor(dados, mapa, 'plantao'))
+    dorme_fora = booleano(_valor(dados, mapa, 'dorme_fora'))
+
+    placa = normalizar_placa(_valor(dados, mapa, 'placa'))
+    veiculo_id = catalogos.veiculos.get(placa) if placa else None
+
+    obj = Apontamento(
+        colaborador_id=colaborador_id, data_apontamento=data,
+        hora_inicio=inicio, hora_termino=termino,
+        local_execucao=local_execucao, projeto_id=projeto_id,
+        codigo_cliente_id=cliente_id, centro_custo_id=centro_id,
+        veiculo_id=veiculo_id,
+        veiculo_manual_modelo=(veiculo or None) if placa and not veiculo_id else None,
+        veiculo_manual_placa=placa if placa and not veiculo_id else None,
+        placa_normalizada=chave_placa(placa),  # bulk_create não passa pelo save()
+        ocorrencias=observacoes or None,
+        em_plantao=em_plantao, data_plantao=data if em_plantao else None,
+        dorme_fora=dorme_fora, data_dorme_fora=data if dorme_fora else None,
+        status_aprovacao='APROVADO',  # horas de planilha já foram pagas
+        registrado_por=usuario,
+    )
+    registro = Registro(posicao, origem, obj)
+
+    for nome in re.split(r'[;,]', texto(_valor(dados, mapa, 'auxiliares'))):
+        if nome.strip():
+            registro.auxiliares.append(catalogos.colaborador(nome))
+    return registro
+
+
+# ==============================================================================
+# IMPORTAÇÃO
+# ==============================================================================
+
+class ImportadorLegado:
+    """
+    Importa uma planilha legada. executar() é um gerador que devolve o checkpoint
+    após cada lote gravado; as linhas rejeitadas ficam em self.erros.
+    """
+
+    def __init__(self, caminho, usuario=None, tamanho_lote=TAMANHO_LOTE):
+        self.caminho = caminho
+        self.usuario = usuario
+        self.tamanho_lote = tamanho_lote
+        self.erros = []  # [(aba, linha, mensagem)]
+
+        assinatura = assinatura_arquivo(caminho)
+        self.checkpoint, _ = ImportacaoLegado.objects.get_or_create(
+            assinatura=assinatura,
+            defaults={'nome_arquivo': str(caminho).rsplit('/', 1)[-1], 'iniciado_por': usuario},
+        )
+
+    @property
+    def concluida(self):
+        return self.checkpoint.concluido_em is not None
+
+    def executar(self):
+        if self.concluida:
+            raise ValueError(f"Esta planilha já foi importada em {self.checkpoint.concluido_em:%d/%m/%Y %H:%M}.")
+
+        catalogos = Catalogos()
+        lote = []
+        por_chave = {}
+        rejeitados = 0
+        posicao = 0
+        mapas = {}
+
+        for aba, numero, dados in ler_abas(self.caminho, self.caminho):
+            posicao += 1
+            if posicao <= self.checkpoint.ultima_posicao:
+                continue
+
+            if aba not in mapas:
+                mapas[aba] = self._mapear(aba, dados)
+            mapa = mapas[aba]
+            if mapa is None:
+                continue
+
+            try:
+                resultado = montar_registro(posicao, (aba, numero), dados, mapa, catalogos, self.usuario)
+            except ErroLinha as e:
+                self.erros.append((aba, numero, str(e)))
+                rejeitados += 1
+                continue
+
+            if isinstance(resultado, tuple):
+                # Carona: anexa ao principal, que está no lote corrente
+                _, chave, auxiliar_id = resultado
+                principal = por_chave.get(chave)
+                if principal is None:
+                    self.erros.append((aba, numero, "Carona sem registro principal correspondente logo acima."))
+                    rejeitados += 1
+                elif auxiliar_id not in principal.auxiliares and auxiliar_id != chave[1]:
+                    principal.auxiliares.append(auxiliar_id)
+                continue
+
+            # Um novo registro principal fecha o lote anterior (as caronas dele já foram lidas)
+            if len(lote) >= self.tamanho_lote:
+                self._gravar(lote, posicao - 1, rejeitados)
+                yield self.checkpoint
+                lote, por_chave, rejeitados = [], {}, 0
+
+            lote.append(resultado)
+            por_chave[resultado.chave] = resultado
+
+        if lote or rejeitados or posicao > self.checkpoint.ultima_posicao:
+            self._gravar(lote, posicao, rejeitados)
+        self.checkpoint.concluido_em = timezone.now()
+        self.checkpoint.save(update_fields=['concluido_em', 'atualizado_em'])
+        yield self.checkpoint
+
+    # --------------------------------------------------------------------------
+
+    def _mapear(self, aba, dados):
+        """{campo: coluna da aba}; None (aba ignorada) se faltam colunas essenciais."""
+        mapa = {campo: next((n for n in sinonimos if n in dados), None) for campo, sinonimos in COLUNAS.items()}
+        faltando = [c for c in ('data', 'hora_inicio', 'hora_fim') if not mapa[c]]
+        if not mapa['colaborador'] and not mapa['matricula']:
+            faltando.append('colaborador')
+        if faltando:
+            self.erros.append((aba, 1, f"Aba ignorada: colunas ausentes ({', '.join(faltando)})."))
+            return None
+        return mapa
+
+    def _sem_sobreposicao(self, lote):
+        """Remove (e reporta) registros que se sobrepõem a outro do mesmo colaborador."""
+        colaboradores = {r.obj.colaborador_id for r in lote}
+        datas = [r.obj.data_apontamento for r in lote]
+        inicio, fim = min(datas) - timedelta(days=1), max(datas) + timedelta(days=1)
+
+        # {(colaborador, data): [(início, fim)]} em minutos absolutos
+        ocupacao = defaultdict(list)
+        for model in (Apontamento, ApontamentoArquivado):
+            existentes = model.objects.filter(
+                colaborador_id__in=colaboradores, data_apontamento__range=(inicio, fim)
+            ).values_list('colaborador_id', 'data_apontamento', 'hora_inicio', 'hora_termino')
+            for colab, data, h_ini, h_fim in existentes:
+                ini = data.toordinal() * 1440 + h_ini.hour * 60 + h_ini.minute
+                ocupacao[(colab, data)].append((ini, ini + minutos_intervalo(h_ini, h_fim)))
+
+        aceitos = []
+        for r in lote:
+            colab, data = r.obj.colaborador_id, r.obj.data_apontamento
+            # Registros com virada de dia alcançam o dia seguinte
+            vizinhos = (data - timedelta(days=1), data, data + timedelta(days=1))
+            if any(ini < r.fim and r.inicio < f for d in vizinhos for ini, f in ocupacao.get((colab, d), ())):
+                aba, numero = r.origem
+                self.erros.append((aba, numero, f"Conflito de horário com outro registro do colaborador em {data:%d/%m/%Y}."))
+                continue
+            ocupacao[(colab, data)].append((r.inicio, r.fim))
+            aceitos.append(r)
+        return aceitos
+
+    def _gravar(self, lote, ultima_posicao, rejeitados):
+        aceitos = self._sem_sobreposicao(lote) if lote else []
+        rejeitados += len(lote) - len(aceitos)
+        Through = Apontamento.auxiliares_extras.through
+
+        with transaction.atomic():
+            criados = Apontamento.objects.bulk_create(
+                [self._com_auxiliar_principal(r) for r in aceitos], batch_size=500
+            )
+            vinculos = [
+                Through(apontamento_id=obj.pk, colaborador_id=aux_id)
+                for r, obj in zip(aceitos, criados)
+                for aux_id in r.auxiliares[1:]
+            ]
+            Through.objects.bulk_create(vinculos, batch_size=500)
+            meses = {tag_mes(obj.data_apontamento) for obj in criados}
+            transaction.on_commit(lambda: invalidar(*meses))
+
+            self.checkpoint.ultima_posicao = ultima_posicao
+            self.checkpoint.importados += len(criados)
+            self.checkpoint.rejeitados += rejeitados
+            self.checkpoint.save(update_fields=['ultima_posicao', 'importados', 'rejeitados', 'atualizado_em'])
+
+    @staticmethod
+    def _com_auxiliar_principal(registro):
+        # Primeiro auxiliar vai no campo 'auxiliar'; os demais em 'auxiliares_extras'
+        if registro.auxiliares:
+            registro.obj.auxiliar_id = registro.auxiliares[0]
+        return registro.obj
@@ -0,0 +1,149 @@
+"""
+Pipeline único de linhas de apontamento (histórico, Excel, CSV e JSON).
+
+Cada apontamento "explode" em uma linha do colaborador principal e uma linha por
+auxiliar (campo 'auxiliar' + 'auxiliares_extras'). A leitura usa values() apenas com
+as colunas necessárias e busca os auxiliares extras em lote pela tabela intermediária,
+uma consulta por bloco de registros, tanto na tabela principal quanto no arquivo.
+Os formatos de saída apenas consomem as tuplas geradas aqui.
+"""
+import heapq
+from collections import defaultdict, namedtuple
+from itertools import islice
+
+from .fechamento import minutos_intervalo
+from .models import Apontamento
+
+TAMANHO_BLOCO = 2000
+
+# Colunas lidas do banco (mesmos nomes nas duas tabelas)
+CAMPOS_LEITURA = (
+    'id', 'data_apontamento', 'hora_inicio', 'hora_termino', 'local_execucao', 'ocorrencias',
+    'em_plantao', 'dorme_fora', 'status_ajuste', 'status_aprovacao', 'contagem_edicao',
+    'motivo_ajuste', 'motivo_rejeicao', 'latitude', 'longitude', 'data_registro', 'data_atualizacao',
+    'veiculo_manual_modelo', 'veiculo_manual_placa',
+    'projeto_id', 'projeto__codigo', 'projeto__nome',
+    'codigo_cliente_id', 'codigo_cliente__codigo', 'codigo_cliente__nome',
+    'centro_custo_id', 'centro_custo__nome', 'veiculo_id', 'veiculo__descricao', 'veiculo__placa',
+    'colaborador__nome_completo', 'colaborador__cargo',
+    'registrado_por_id', 'registrado_por__username',
+    'registrado_por__first_name', 'registrado_por__last_name',
+    'auxiliar_id', 'auxiliar__nome_completo', 'auxiliar__cargo',
+)
+
+# Uma linha expandida. 'colaborador'/'cargo' são do auxiliar nas linhas de carona;
+# 'colaborador_principal' é sempre o dono do registro.
+LinhaApontamento = namedtuple('LinhaApontamento', [
+    'id', 'arquivado', 'is_auxiliar', 'aux_id',
+    'colaborador', 'cargo', 'colaborador_principal', 'cargo_principal',
+    'data_apontamento', 'hora_inicio', 'hora_termino', 'local_execucao', 'ocorrencias',
+    'em_plantao', 'dorme_fora', 'status_ajuste', 'status_aprovacao', 'contagem_edicao',
+    'motivo_ajuste', 'motivo_rejeicao', 'latitude', 'longitude', 'data_registro', 'data_atualizacao',
+    'veiculo_manual_modelo', 'veiculo_manual_placa',
+    'projeto_id', 'projeto_codigo', 'projeto_nome', 'cliente_id', 'cliente_codigo', 'cliente_nome',
+    'centro_custo_id', 'centro_custo_nome', 'veiculo_id', 'veiculo_descricao', 'veiculo_placa',
+    'registrado_por_id', 'registrado_por_username', 'registrado_por_first_name', 'registrado_por_last_name',
+])
+
+
+# ==============================================================================
+# FORMATAÇÕES COMUNS
+# ==============================================================================
+
+def duracao_hhmm(linha):
+    """Duração HH:MM considerando virada de dia (mesma regra de Apontamento.duracao_total_str)."""
+    minutos = minutos_intervalo(linha.hora_inicio, linha.hora_termino)
+    return f"{minutos // 60:02d}:{minutos % 60:02d}"
+
+
+def local_e_codigos(linha):
+    """(tipo, local, código de obra, código de cliente) como nos relatórios."""
+    codigo_obra = None
+    codigo_cliente = None
+    local_nome = ""
+    if linha.local_execucao == 'INT':
+        tipo = "OBRA"
+        if linha.projeto_id:
+            local_nome = linha.projeto_nome
+            codigo_obra = linha.projeto_codigo
+        elif linha.cliente_id:
+            local_nome = linha.cliente_nome
+            codigo_cliente = linha.cliente_codigo
+    else:
+        tipo = "FORA DO SETOR"
+        local_nome = linha.centro_custo_nome if linha.centro_custo_id else "Atividade Externa"
+        if linha.projeto_id: codigo_obra = linha.projeto_codigo
+        elif linha.cliente_id: codigo_cliente = linha.cliente_codigo
+    return tipo, local_nome, codigo_obra, codigo_cliente
+
+
+def registrado_por_nome(linha):
+    if linha.registrado_por_first_name:
+        return f"{linha.registrado_por_first_name} {linha.registrado_por_last_name}"
+    return linha.registrado_por_username or "Sistema"
+
+
+# ==============================================================================
+# LEITURA E EXPANSÃO
+# ==============================================================================
+
+def _auxiliares_extras(model, ids):
+    """{apontamento_id: [(id, nome, cargo), ...]} em uma consulta (ordem de Colaborador: nome)."""
+    Through = model.auxiliares_extras.through
+    coluna = 'apontamento_id' if model is Apontamento else 'apontamentoarquivado_id'
+    extras = defaultdict(list)
+    linhas = Through.objects.filter(**{f'{coluna}__in': ids}).order_by(
+        'colaborador__nome_completo', 'colaborador_id'
+    ).values_list(coluna, 'colaborador_id', 'colaborador__nome_completo', 'colaborador__cargo')
+    for ap_id, colab_id, nome, cargo in linhas:
+        extras[ap_id].append((colab_id, nome, cargo))
+    return extras
+
+
+def _expandir(queryset, arquivado, ordem, tamanho_bloco):
+    model = queryset.model
+    leitura = queryset.order_by(*ordem).values(*CAMPOS_LEITURA).iterator(chunk_size=tamanho_bloco)
+    while True:
+        bloco = list(islice(leitura, tamanho_bloco))
+        if not bloco:
+            return
+        extras = _auxiliares_extras(model, [r['id'] for r in bloco])
+        for r in bloco:
+            base = (
+                r['data_apontamento'], r['hora_inicio'], r['hora_termino'], r['local_execucao'], r['ocorrencias'],
+                r['em_plantao'], r['dorme_fora'], r['status_ajuste'], r['status_aprovacao'], r['contagem_edicao'],
+                r['motivo_ajuste'], r['motivo_rejeicao'], r['latitude'], r['longitude'],
+                r['data_registro'], r['data_atualizacao'],
+                r['veiculo_manual_modelo'], r['veiculo_manual_placa'],
+                r['projeto_id'], r['projeto__codigo'], r['projeto__nome'],
+                r['codigo_cliente_id'], r['codigo_cliente__codigo'], r['codigo_cliente__nome'],
+                r['centro_custo_id'], r['centro_custo__nome'],
+                r['veiculo_id'], r['veiculo__descricao'], r['veiculo__placa'],
+                r['registrado_por_id'], r['registrado_por__username'],
+                r['registrado_por__first_name'], r['registrado_por__last_name'],
+            )
+            nome, cargo = r['colaborador__nome_completo'], r['colaborador__cargo']
+            yield LinhaApontamento(r['id'], arquivado, False, None, nome, cargo, nome, cargo, *base)
+
+            auxiliares = []
+            if r['auxiliar_id']:
+                auxiliares.append((r['auxiliar_id'], r['auxiliar__nome_completo'], r['auxiliar__cargo']))
+            auxiliares.extend(extras.get(r['id'], ()))
+            for aux_id, aux_nome, aux_cargo in auxiliares:
+                yield LinhaApontamento(r['id'], arquivado, True, aux_id, aux_nome, aux_cargo, nome, cargo, *base)
+
+
+def linhas_apontamentos(quentes, frios=None, reverse=False, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Linhas expandidas de um queryset de Apontamento (e opcionalmente do arquivo),
+    intercaladas por (data, id). Gerador: memória limitada ao tamanho do bloco.
+    """
+    ordem = ('-data_apontamento', '-id') if reverse else ('data_apontamento', 'id')
+    linhas = _expandir(quentes, False, ordem, tamanho_bloco)
+    if frios is None:
+        return linhas
+    return heapq.merge(
+        linhas, _expandir(frios, True, ordem, tamanho_bloco),
+        key=lambda l: (l.data_apontamento, l.id), reverse=reverse
+    )
+
@@ -0,0 +1,116 @@
+"""
+Correções em lote (ações do admin sobre Apontamento).
+
+Cada ação é um único UPDATE sobre os registros selecionados, precedido pelos
+snapshots de histórico gravados com bulk_create. Registros de competências fechadas
+são ignorados, assim como, na reatribuição, os que ficariam fora das regras de local
+do ApontamentoForm. Como update() não dispara signals, os eventos do dashboard (na
+mesma transação do UPDATE) e a invalidação do cache (após o commit) são feitos aqui.
+"""
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .cache_tags import invalidar, tag_mes
+from .eventos import contribuicoes, publicar_lote
+from .models import Apontamento, ApontamentoHistorico, FechamentoPeriodo
+
+# Mesmos campos do snapshot da edição pela tela (model_to_dict: campos editáveis)
+CAMPOS_SNAPSHOT = [f.name for f in Apontamento._meta.concrete_fields if f.editable]
+
+# Leitura dos registros após o UPDATE, em blocos de IDs
+TAMANHO_BLOCO = 2000
+
+
+def _valor_json(valor):
+    if isinstance(valor, (datetime, date, time)):
+        return valor.isoformat()
+    if isinstance(valor, (timedelta, Decimal)):
+        return str(valor)
+    return valor
+
+
+def gravar_snapshots(queryset, usuario):
+    """
+    Grava o estado atual dos registros em ApontamentoHistorico (bulk_create).
+    A versão segue a maior já registrada (ou a contagem de edições) + 1.
+    Retorna os IDs de colaborador afetados.
+    """
+    versoes = dict(
+        ApontamentoHistorico.objects.filter(apontamento_original__in=queryset.values('pk'))
+        .values_list('apontamento_original_id').annotate(Max('numero_edicao'))
+    )
+    historicos = []
+    colaboradores = set()
+    for dados in queryset.values(*CAMPOS_SNAPSHOT).iterator(chunk_size=TAMANHO_BLOCO):
+        colaboradores.add(dados['colaborador'])
+        historicos.append(ApontamentoHistorico(
+            apontamento_original_id=dados['id'],
+            dados_snapshot={k: _valor_json(v) for k, v in dados.items()},
+            editado_por=usuario,
+            numero_edicao=max(versoes.get(dados['id'], 0), dados['contagem_edicao']) + 1,
+        ))
+    ApontamentoHistorico.objects.bulk_create(historicos, batch_size=500)
+    return colaboradores
+
+
+def atualizar_em_lote(queryset, usuario, **valores):
+    """
+    Aplica 'valores' a todos os registros do queryset em competências abertas.
+    Retorna (atualizados, ignorados por competência fechada).
+    """
+    total = queryset.count()
+    abertos = queryset.exclude(FechamentoPeriodo.filtro_fechados())
+
+    with transaction.atomic():
+        antes = contribuicoes(abertos)
+        if not antes:
+            return 0, total
+        colaboradores = gravar_snapshots(abertos, usuario)
+        atualizados = abertos.update(data_atualizacao=timezone.now(), **valores)
+
+        # Relido por ID: o UPDATE pode ter tirado os registros do filtro original
+        ids = list(antes)
+        depois = {}
+        for inicio in range(0, len(ids), TAMANHO_BLOCO):
+            depois.update(contribuicoes(Apontamento.objects.filter(pk__in=ids[inicio:inicio + TAMANHO_BLOCO])))
+
+        publicar_lote('EDITADO', antes, depois)
+        meses = {tag_mes(c['data']) for c in (*antes.values(), *depois.values())}
+        transaction.on_commit(lambda: invalidar(*(f'colaborador:{c}' for c in colaboradores), *meses))
+
+    return atualizados, total - atualizados
+
+
+def reatribuir_em_lote(queryset, usuario, projeto=None, centro_custo=None):
+    """
+    Troca a obra e/ou o centro de custo só dos registros em que o resultado continua
+    válido pelas regras do ApontamentoForm.clean:
+      - INT: obra ou cliente, sem centro de custo (não recebem centro de custo);
+      - EXT: centro de custo obrigatório; obra/cliente só se ele permite alocação.
+    Centro de custo sem alocação limpa a obra/cliente (como o formulário faz).
+    Retorna (atualizados, ignorados por competência fechada, incompatíveis).
+    """
+    valores = {}
+    if centro_custo:
+        compativeis = queryset.filter(local_execucao='EXT')
+        valores['centro_custo'] = centro_custo
+        if not centro_custo.permite_alocacao:
+            valores.update(projeto=None, codigo_cliente=None)
+        elif not projeto:
+            # Alocação obrigatória: só quem já tem obra ou cliente
+            compativeis = compativeis.filter(Q(projeto__isnull=False) | Q(codigo_cliente__isnull=False))
+    else:
+        compativeis = queryset.filter(
+            Q(local_execucao='INT') | Q(local_execucao='EXT', centro_custo__permite_alocacao=True)
+        )
+    if projeto:
+        # Obra OU cliente
+        valores.update(projeto=projeto, codigo_cliente=None)
+
+    incompativeis = queryset.count() - compativeis.count()
+    atualizados, fechados = atualizar_em_lote(compativeis, usuario, **valores)
+    return atualizados, fechados, incompativeis
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+
+from produtividade.cache_tags import estatisticas, obter_ou_calcular, zerar_estatisticas
+from produtividade.fechamento import planilha_fechamento, resumo_congelado
+from produtividade.models import CentroCusto, Colaborador, FechamentoPeriodo, Projeto
+from produtividade.views import lista_auxiliares
+
+
+class Command(BaseCommand):
+    help = (
+        "Pré-carrega o cache compartilhado (cadastros usados no formulário e fechamentos). "
+        "Executar após cada deploy, antes de liberar o tráfego."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--estatisticas', action='store_true',
+            help="Apenas mostra os contadores de hit/miss acumulados."
+        )
+        parser.add_argument(
+            '--zerar-estatisticas', action='store_true',
+            help="Zera os contadores de hit/miss."
+        )
+
+    def handle(self, *args, **options):
+        if options['zerar_estatisticas']:
+            zerar_estatisticas()
+            self.stdout.write("Contadores zerados.")
+            return
+
+        if not options['estatisticas']:
+            self._aquecer()
+
+        stats = estatisticas()
+        self.stdout.write(
+            f"Hits: {stats['hits']} | Misses: {stats['misses']} | "
+            f"Taxa de acerto: {stats['taxa_acerto']}% | Esperas esgotadas: {stats['esperas_esgotadas']}"
+        )
+
+    def _aquecer(self):
+        obter_ou_calcular('ajax:auxiliares', lista_auxiliares, tags=['catalog:colaborador'])
+
+        projetos = Projeto.objects.filter(ativo=True).values_list('pk', 'nome')
+        for pk, nome in projetos:
+            obter_ou_calcular(f'ajax:projeto:{pk}', lambda nome=nome: {'nome_projeto': nome}, tags=['catalog:projeto'])
+
+        colaboradores = Colaborador.objects.values_list('pk', 'cargo')
+        for pk, cargo in colaboradores:
+            obter_ou_calcular(f'ajax:colaborador:{pk}', lambda cargo=cargo: {'cargo': cargo}, tags=[f'colaborador:{pk}'])
+
+        centros = CentroCusto.objects.filter(ativo=True).values_list('pk', 'permite_alocacao')
+        for pk, permite in centros:
+            obter_ou_calcular(
+                f'ajax:centro_custo:{pk}', lambda permite=permite: {'permite_alocacao': permite},
+                tags=['catalog:centro_custo']
+            )
+
+        fechamentos = list(FechamentoPeriodo.objects.all())
+        for fechamento in fechamentos:
+            resumo_congelado(fechamento)
+            planilha_fechamento(fechamento)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Cache aquecido: {len(projetos)} projetos, {len(colaboradores)} colaboradores, "
+            f"{len(centros)} centros de custo, {len(fechamentos)} fechamentos."
+        ))
@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from produtividade.arquivamento import (
+    arquivar_anteriores_a, candidatos_arquivamento, data_corte_padrao
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move apontamentos antigos (e seus auxiliares e históricos) para as tabelas de arquivo. "
+        "Registros em análise ou com ajuste pendente permanecem na tabela principal."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--antes-de', dest='antes_de',
+            help="Data de corte (AAAA-MM-DD). Padrão: hoje menos ARQUIVO_APONTAMENTOS_DIAS."
+        )
+        parser.add_argument(
+            '--lote', type=int, default=500,
+            help="Quantidade de registros movidos por transação (padrão: 500)."
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Apenas informa quantos registros seriam arquivados."
+        )
+
+    def handle(self, *args, **options):
+        if options['antes_de']:
+            try:
+                data_corte = datetime.strptime(options['antes_de'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError("Data inválida. Use o formato AAAA-MM-DD.")
+        else:
+            data_corte = data_corte_padrao()
+
+        if options['lote'] < 1:
+            raise CommandError("O tamanho do lote deve ser positivo.")
+
+        qtd = candidatos_arquivamento(data_corte).count()
+        self.stdout.write(f"Registros anteriores a {data_corte:%d/%m/%Y}: {qtd}")
+
+        if options['dry_run'] or not qtd:
+            return
+
+        total = 0
+        for total in arquivar_anteriores_a(data_corte, tamanho_lote=options['lote']):
+            self.stdout.write(f"  ... {total}/{qtd} arquivados")
+
+        self.stdout.write(self.style.SUCCESS(f"Arquivamento concluído: {total} registros movidos."))
@@ -0,0 +1,63 @@
+import csv
+import time
+from collections import Counter
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from produtividade.auditoria import TAMANHO_LOTE, TIPOS_ANOMALIA, auditar, linha_anomalia
+from produtividade.models import Colaborador
+
+
+class Command(BaseCommand):
+    help = (
+        "Audita os apontamentos (principal e arquivo) em uma única varredura ordenada: "
+        "sobreposições (inclusive na virada de dia), dias acima do limite, duplicados e "
+        "rateios inconsistentes. Memória constante, seja qual for o tamanho da base."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inicio', help="Data inicial (AAAA-MM-DD). Padrão: toda a base.")
+        parser.add_argument('--fim', help="Data final (AAAA-MM-DD).")
+        parser.add_argument(
+            '--limite-horas', type=float, default=None,
+            help="Total diário considerado excessivo (padrão: AUDITORIA_LIMITE_DIARIO_MINUTOS)."
+        )
+        parser.add_argument('--tipo', choices=sorted(TIPOS_ANOMALIA), help="Lista apenas um tipo de ocorrência.")
+        parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help="Registros lidos por lote.")
+        parser.add_argument('--csv', action='store_true', help="Lista as ocorrências em CSV na saída padrão.")
+
+    def handle(self, *args, **options):
+        try:
+            inicio = datetime.strptime(options['inicio'], '%Y-%m-%d').date() if options['inicio'] else None
+            fim = datetime.strptime(options['fim'], '%Y-%m-%d').date() if options['fim'] else None
+        except ValueError:
+            raise CommandError("Datas inválidas. Use o formato AAAA-MM-DD.")
+        if options['lote'] < 1:
+            raise CommandError("O tamanho do lote deve ser positivo.")
+        limite = round(options['limite_horas'] * 60) if options['limite_horas'] else None
+
+        nomes = dict(Colaborador.objects.values_list('pk', 'nome_completo'))
+        escritor = csv.writer(self.stdout, delimiter=';') if options['csv'] else None
+        if escritor:
+            escritor.writerow(['Tipo', 'Colaborador', 'Data', 'Registros', 'Detalhe'])
+
+        contagem = Counter()
+        comeco = time.perf_counter()
+        for anomalia in auditar(inicio, fim, limite, options['lote']):
+            contagem[anomalia.tipo] += 1
+            if options['tipo'] and anomalia.tipo != options['tipo']:
+                continue
+            linha = linha_anomalia(anomalia, nomes)
+            if escritor:
+                escritor.writerow(linha)
+            else:
+                self.stdout.write(f"  [{linha[0]}] {linha[1]} {linha[2]}: {linha[4]} (registros {linha[3]})")
+        duracao = time.perf_counter() - comeco
+
+        if escritor:
+            return
+        for chave, rotulo in TIPOS_ANOMALIA.items():
+            self.stdout.write(f"{rotulo}: {contagem[chave]}")
+        estilo = self.style.WARNING if contagem else self.style.SUCCESS
+        self.stdout.write(estilo(f"{sum(contagem.values())} ocorrência(s) em {duracao:.1f}s."))
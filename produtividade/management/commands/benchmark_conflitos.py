@@ -0,0 +1,172 @@
+import random
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from produtividade.models import Apontamento, Colaborador
+from produtividade.registro import ConflitoHorario, conflitos_horario, gravar_apontamentos
+from produtividade.series import MinutosIntervalo
+
+# Dias fictícios (uma rodada a cada dois dias, para os registros que viram a noite
+# não alcançarem a rodada seguinte), bem longe de qualquer competência real
+DATA_BASE = date(2000, 1, 3)
+DURACOES_MINUTOS = (30, 60, 90, 120)
+
+
+def contar_sobreposicoes(colaborador_id, data_apontamento):
+    """
+    Registros do dia (e da véspera/dia seguinte, pela virada) que começam antes do fim
+    de outro: varredura ordenada pelo início, em minutos absolutos.
+    """
+    sobreposicoes = 0
+    maior_fim = None
+    intervalos = sorted(
+        (data.toordinal() * 1440 + inicio.hour * 60 + inicio.minute, minutos)
+        for data, inicio, minutos in Apontamento.objects.filter(
+            colaborador_id=colaborador_id,
+            data_apontamento__gte=data_apontamento - timedelta(days=1),
+            data_apontamento__lte=data_apontamento + timedelta(days=1),
+        ).annotate(minutos=MinutosIntervalo()).values_list('data_apontamento', 'hora_inicio', 'minutos')
+    )
+    for comeco, minutos in intervalos:
+        if maior_fim is not None and comeco < maior_fim:
+            sobreposicoes += 1
+        maior_fim = max(maior_fim or 0, comeco + minutos)
+    return sobreposicoes
+
+
+class Command(BaseCommand):
+    help = (
+        "Dispara envios simultâneos de apontamentos sobrepostos para um colaborador "
+        "temporário e verifica se algum conflito passou. Mede a vazão por nível de "
+        "concorrência. Grava no banco configurado: prefira uma cópia de homologação."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concorrencia', default='1,2,4,8,16',
+            help="Níveis de envios simultâneos, separados por vírgula (padrão: 1,2,4,8,16)."
+        )
+        parser.add_argument(
+            '--envios', type=int, default=40,
+            help="Envios por thread em cada nível (padrão: 40)."
+        )
+        parser.add_argument(
+            '--modo', choices=('transacional', 'ingenuo'), default='transacional',
+            help="transacional: produtividade.registro; ingenuo: verificação e save() "
+                 "separados, como antes (padrão: transacional)."
+        )
+        parser.add_argument(
+            '--manter', action='store_true',
+            help="Não remove o colaborador e os apontamentos gerados."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            niveis = [int(n) for n in options['concorrencia'].split(',') if n.strip()]
+        except ValueError:
+            raise CommandError("--concorrencia deve ser uma lista de inteiros (ex: 1,4,16).")
+        if not niveis or min(niveis) < 1 or options['envios'] < 1:
+            raise CommandError("Concorrência e envios devem ser positivos.")
+
+        colaborador = Colaborador.objects.create(
+            id_colaborador=f"BENCH-{uuid.uuid4().hex[:10]}",
+            nome_completo="Benchmark de Concorrência",
+        )
+        self.stdout.write(
+            f"Modo {options['modo']} | {options['envios']} envios por thread | "
+            f"colaborador temporário {colaborador.id_colaborador}"
+        )
+        self.stdout.write(
+            f"{'threads':>7} {'envios':>7} {'gravados':>8} {'conflitos':>9} {'falhas':>6} "
+            f"{'envios/s':>9} {'p95 ms':>8} {'sobrepostos':>11}"
+        )
+
+        total_sobreposicoes = 0
+        try:
+            for indice, threads in enumerate(niveis):
+                dia = DATA_BASE + timedelta(days=2 * indice)
+                resultado = self._rodada(colaborador.pk, dia, threads, options['envios'], options['modo'])
+                sobreposicoes = contar_sobreposicoes(colaborador.pk, dia)
+                total_sobreposicoes += sobreposicoes
+
+                latencias = sorted(resultado['latencias'])
+                p95 = latencias[int(len(latencias) * 0.95) - 1] if len(latencias) > 1 else latencias[0]
+                enviados = threads * options['envios']
+                linha = (
+                    f"{threads:>7} {enviados:>7} {resultado['gravados']:>8} {resultado['conflitos']:>9} "
+                    f"{len(resultado['falhas']):>6} {enviados / resultado['duracao']:>9.1f} "
+                    f"{p95:>8.1f} {sobreposicoes:>11}"
+                )
+                self.stdout.write(self.style.ERROR(linha) if sobreposicoes else linha)
+                if resultado['falhas']:
+                    self.stdout.write(self.style.WARNING(f"        ex. de falha: {resultado['falhas'][0]}"))
+        finally:
+            if not options['manter']:
+                Apontamento.objects.filter(colaborador=colaborador).delete()
+                colaborador.delete()
+
+        if total_sobreposicoes:
+            self.stdout.write(self.style.ERROR(f"{total_sobreposicoes} sobreposições gravadas."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Nenhuma sobreposição gravada."))
+
+    def _rodada(self, colaborador_id, dia, threads, envios, modo):
+        resultado = {'gravados': 0, 'conflitos': 0, 'falhas': [], 'latencias': []}
+        trava_resultado = threading.Lock()
+        largada = threading.Barrier(threads)
+
+        def trabalhador(semente):
+            sorteio = random.Random(semente)
+            parcial = {'gravados': 0, 'conflitos': 0, 'falhas': [], 'latencias': []}
+            try:
+                largada.wait()
+                for _ in range(envios):
+                    duracao = sorteio.choice(DURACOES_MINUTOS)
+                    # Início em qualquer horário: os que passam da meia-noite viram o dia
+                    inicio = datetime.combine(dia, datetime.min.time()) + timedelta(
+                        minutes=sorteio.randrange(0, 24 * 60, 15)
+                    )
+                    apontamento = Apontamento(
+                        colaborador_id=colaborador_id,
+                        data_apontamento=dia,
+                        hora_inicio=inicio.time(),
+                        hora_termino=(inicio + timedelta(minutes=duracao)).time(),
+                        local_execucao='EXT',
+                        status_aprovacao='EM_ANALISE',
+                        ocorrencias='benchmark_conflitos',
+                    )
+                    t0 = time.perf_counter()
+                    try:
+                        if modo == 'transacional':
+                            gravar_apontamentos([apontamento])
+                        elif conflitos_horario(colaborador_id, dia, apontamento.hora_inicio, apontamento.hora_termino).exists():
+                            raise ConflitoHorario(None)
+                        else:
+                            apontamento.save()
+                        parcial['gravados'] += 1
+                    except ConflitoHorario:
+                        parcial['conflitos'] += 1
+                    except OperationalError as e:
+                        parcial['falhas'].append(str(e))
+                    parcial['latencias'].append((time.perf_counter() - t0) * 1000)
+            finally:
+                connection.close()
+                with trava_resultado:
+                    for chave in ('gravados', 'conflitos'):
+                        resultado[chave] += parcial[chave]
+                    resultado['falhas'] += parcial['falhas']
+                    resultado['latencias'] += parcial['latencias']
+
+        inicio = time.perf_counter()
+        trabalhadores = [threading.Thread(target=trabalhador, args=(n,)) for n in range(threads)]
+        for t in trabalhadores:
+            t.start()
+        for t in trabalhadores:
+            t.join()
+        resultado['duracao'] = time.perf_counter() - inicio
+        return resultado
@@ -0,0 +1,167 @@
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.test.utils import override_settings
+
+from produtividade import fila
+from produtividade.management.commands.benchmark_conflitos import DATA_BASE
+from produtividade.models import Apontamento, Colaborador
+from produtividade.registro import gravar_apontamentos
+
+DURACAO_MINUTOS = 15
+SLOTS_POR_DIA = 24 * 60 // DURACAO_MINUTOS
+
+
+def percentil(valores, fracao):
+    valores = sorted(valores)
+    return valores[max(int(len(valores) * fracao) - 1, 0)] if valores else 0.0
+
+
+class Command(BaseCommand):
+    help = (
+        "Teste de carga do pico de envios: clientes simultâneos enviando apontamentos "
+        "(um colaborador temporário por cliente, sem conflitos), gravando direto no banco "
+        "ou pela fila de gravação com um escritor único. Mede recibos/s, latência do envio "
+        "e a vazão sustentada de gravação. Grava no banco configurado: prefira uma cópia."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modo', choices=('fila', 'direto'), default='fila',
+            help="fila: enfileira e um escritor grava em lotes; direto: cada envio grava na hora."
+        )
+        parser.add_argument(
+            '--clientes', type=int, default=50,
+            help="Clientes (workers) enviando ao mesmo tempo (padrão: 50)."
+        )
+        parser.add_argument(
+            '--envios', type=int, default=20,
+            help="Envios por cliente (padrão: 20)."
+        )
+        parser.add_argument(
+            '--lote', type=int, default=fila.TAMANHO_LOTE,
+            help=f"Envios por transação do escritor no modo fila (padrão: {fila.TAMANHO_LOTE})."
+        )
+
+    def handle(self, *args, **options):
+        if min(options['clientes'], options['envios'], options['lote']) < 1:
+            raise CommandError("Clientes, envios e lote devem ser positivos.")
+
+        sufixo = uuid.uuid4().hex[:8]
+        Colaborador.objects.bulk_create([
+            Colaborador(id_colaborador=f"BENCH-{sufixo}-{n}", nome_completo=f"Benchmark Fila {n}")
+            for n in range(options['clientes'])
+        ])
+        colaboradores = list(Colaborador.objects.filter(id_colaborador__startswith=f"BENCH-{sufixo}-"))
+        self.stdout.write(
+            f"Modo {options['modo']}: {options['clientes']} clientes x {options['envios']} envios"
+        )
+
+        diretorio = tempfile.mkdtemp(prefix='benchmark_fila_')
+        caminho_fila = os.path.join(diretorio, 'fila.sqlite3')
+        try:
+            with override_settings(FILA_GRAVACAO=True, FILA_SQLITE_PATH=caminho_fila):
+                self._executar(colaboradores, options)
+        finally:
+            Apontamento.objects.filter(colaborador__in=colaboradores).delete()
+            Colaborador.objects.filter(pk__in=[c.pk for c in colaboradores]).delete()
+            for nome in os.listdir(diretorio):
+                os.remove(os.path.join(diretorio, nome))
+            os.rmdir(diretorio)
+
+    def _executar(self, colaboradores, options):
+        latencias = []
+        falhas = []
+        trava = threading.Lock()
+        # No modo fila o escritor parte junto com os clientes
+        largada = threading.Barrier(len(colaboradores) + (options['modo'] == 'fila'))
+        envios_concluidos = threading.Event()
+        escritor = {'lotes': 0, 'maior_fila': 0, 'ultimo_commit': None}
+
+        def cliente(colaborador):
+            parciais, erros = [], []
+            try:
+                largada.wait()
+                for n in range(options['envios']):
+                    inicio = datetime.combine(
+                        DATA_BASE + timedelta(days=n // SLOTS_POR_DIA), datetime.min.time()
+                    ) + timedelta(minutes=(n % SLOTS_POR_DIA) * DURACAO_MINUTOS)
+                    apontamento = Apontamento(
+                        colaborador_id=colaborador.pk,
+                        data_apontamento=inicio.date(),
+                        hora_inicio=inicio.time(),
+                        hora_termino=(inicio + timedelta(minutes=DURACAO_MINUTOS - 1)).time(),
+                        local_execucao='EXT',
+                        status_aprovacao='EM_ANALISE',
+                        ocorrencias='benchmark_fila',
+                    )
+                    t0 = time.perf_counter()
+                    try:
+                        if options['modo'] == 'fila':
+                            fila.enfileirar([apontamento], None, None)
+                        else:
+                            gravar_apontamentos([apontamento])
+                    except OperationalError as e:
+                        erros.append(str(e))
+                    parciais.append((time.perf_counter() - t0) * 1000)
+            finally:
+                connection.close()
+                with trava:
+                    latencias.extend(parciais)
+                    falhas.extend(erros)
+
+        def gravador():
+            try:
+                largada.wait()
+                while True:
+                    escritor['maior_fila'] = max(escritor['maior_fila'], fila.pendentes())
+                    gravados, recusados = fila.processar_lote(options['lote'])
+                    if gravados or recusados:
+                        escritor['lotes'] += 1
+                        escritor['ultimo_commit'] = time.perf_counter()
+                    elif envios_concluidos.is_set():
+                        break
+                    else:
+                        time.sleep(0.05)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=cliente, args=(c,)) for c in colaboradores]
+        if options['modo'] == 'fila':
+            thread_gravador = threading.Thread(target=gravador)
+            thread_gravador.start()
+
+        inicio = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        duracao_envios = time.perf_counter() - inicio
+        envios_concluidos.set()
+        if options['modo'] == 'fila':
+            thread_gravador.join()
+        duracao_total = (escritor['ultimo_commit'] or time.perf_counter()) - inicio
+
+        total = len(latencias)
+        gravados = Apontamento.objects.filter(colaborador__in=colaboradores).count()
+        self.stdout.write(
+            f"Envios: {total} em {duracao_envios:.2f}s ({total / duracao_envios:.1f} recibos/s) | "
+            f"latência p50 {percentil(latencias, 0.5):.1f} ms, p95 {percentil(latencias, 0.95):.1f} ms, "
+            f"máx {max(latencias, default=0):.1f} ms"
+        )
+        self.stdout.write(
+            f"Gravados: {gravados} em {duracao_total:.2f}s ({gravados / duracao_total:.1f} gravações/s sustentadas)"
+        )
+        if options['modo'] == 'fila':
+            self.stdout.write(
+                f"Escritor: {escritor['lotes']} lotes, maior fila observada {escritor['maior_fila']}"
+            )
+        if falhas:
+            self.stdout.write(self.style.WARNING(f"Falhas: {len(falhas)} (ex: {falhas[0]})"))
+        self.stdout.write(self.style.SUCCESS("Benchmark concluído."))
@@ -0,0 +1,123 @@
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+ENDPOINTS = {
+    'dashboard': '/produtividade/api/dashboard/',
+    'exportar': '/produtividade/api/exportar-completo/?days=7&formato=colunar',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Simula clientes em polling contra um servidor já em execução (ASGI ou WSGI) "
+        "e mede vazão e latência dos endpoints JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', default='http://127.0.0.1:8000',
+            help="Endereço base do servidor (padrão: http://127.0.0.1:8000)."
+        )
+        parser.add_argument(
+            '--endpoint', choices=sorted(ENDPOINTS), default='dashboard',
+            help="Endpoint consultado pelos clientes (padrão: dashboard)."
+        )
+        parser.add_argument(
+            '--clientes', type=int, default=200,
+            help="Clientes simultâneos (padrão: 200)."
+        )
+        parser.add_argument(
+            '--requisicoes', type=int, default=10,
+            help="Requisições por cliente (padrão: 10)."
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=0.0,
+            help="Pausa em segundos entre requisições do mesmo cliente (padrão: 0)."
+        )
+
+    def handle(self, *args, **options):
+        if options['clientes'] < 1 or options['requisicoes'] < 1:
+            raise CommandError("Clientes e requisições devem ser positivos.")
+
+        base = urlsplit(options['url'])
+        if base.scheme != 'http' or not base.hostname:
+            raise CommandError("Informe uma URL http:// válida.")
+
+        self.host = base.hostname
+        self.porta = base.port or 80
+        self.caminho = ENDPOINTS[options['endpoint']]
+        self.api_key = getattr(settings, 'DJANGO_API_KEY', 'chave_secreta_123')
+
+        self.stdout.write(
+            f"{options['clientes']} clientes x {options['requisicoes']} requisições "
+            f"em {base.geturl()}{self.caminho}"
+        )
+        inicio = time.perf_counter()
+        latencias, erros = asyncio.run(self._executar(options))
+        duracao = time.perf_counter() - inicio
+
+        total = len(latencias) + len(erros)
+        self.stdout.write(f"Requisições: {total} em {duracao:.2f}s ({total / duracao:.1f} req/s)")
+        if erros:
+            self.stdout.write(self.style.WARNING(
+                f"Falhas: {len(erros)} (ex: {erros[0]})"
+            ))
+        if latencias:
+            latencias.sort()
+            p95 = latencias[int(len(latencias) * 0.95) - 1] if len(latencias) > 1 else latencias[0]
+            p99 = latencias[int(len(latencias) * 0.99) - 1] if len(latencias) > 1 else latencias[0]
+            self.stdout.write(
+                f"Latência (ms): média {statistics.mean(latencias):.1f} | "
+                f"p50 {statistics.median(latencias):.1f} | p95 {p95:.1f} | "
+                f"p99 {p99:.1f} | máx {latencias[-1]:.1f}"
+            )
+            self.stdout.write(self.style.SUCCESS("Benchmark concluído."))
+
+    # --------------------------------------------------------------------------
+    # Cliente HTTP mínimo (stdlib), uma conexão por requisição
+    # --------------------------------------------------------------------------
+
+    async def _executar(self, options):
+        latencias, erros = [], []
+        await asyncio.gather(*[
+            self._cliente(options['requisicoes'], options['intervalo'], latencias, erros)
+            for _ in range(options['clientes'])
+        ])
+        return latencias, erros
+
+    async def _cliente(self, requisicoes, intervalo, latencias, erros):
+        for _ in range(requisicoes):
+            inicio = time.perf_counter()
+            try:
+                status = await self._get()
+            except (OSError, asyncio.IncompleteReadError) as e:
+                erros.append(repr(e))
+            else:
+                if status == 200:
+                    latencias.append((time.perf_counter() - inicio) * 1000)
+                else:
+                    erros.append(f"HTTP {status}")
+            if intervalo:
+                await asyncio.sleep(intervalo)
+
+    async def _get(self):
+        reader, writer = await asyncio.open_connection(self.host, self.porta)
+        try:
+            writer.write((
+                f"GET {self.caminho} HTTP/1.1\r\n"
+                f"Host: {self.host}:{self.porta}\r\n"
+                f"X-API-KEY: {self.api_key}\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode())
+            await writer.drain()
+            linha_status = await reader.readline()
+            await reader.read()
+        finally:
+            writer.close()
+        partes = linha_status.split()
+        return int(partes[1]) if len(partes) > 1 else 0
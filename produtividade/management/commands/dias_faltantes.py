@@ -0,0 +1,62 @@
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from produtividade.calendario import dias_faltantes
+from produtividade.models import Setor
+
+
+class Command(BaseCommand):
+    help = (
+        "Lista os dias úteis sem apontamento de todos os colaboradores na competência "
+        "(até hoje). Com --csv, gera a lista em CSV na saída padrão."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('competencia', nargs='?', help="Competência AAAA-MM (padrão: mês atual).")
+        parser.add_argument('--setor', help="Nome do setor (padrão: todos).")
+        parser.add_argument(
+            '--cobrar-feriados', action='store_true',
+            help="Considera os feriados cadastrados como dias úteis."
+        )
+        parser.add_argument('--csv', action='store_true', help="Saída em CSV (uma linha por colaborador).")
+
+    def handle(self, *args, **options):
+        competencia = options['competencia'] or f"{timezone.localdate():%Y-%m}"
+        try:
+            ano, mes = (int(x) for x in competencia.split('-'))
+        except ValueError:
+            raise CommandError("Competência inválida. Use o formato AAAA-MM.")
+
+        setor_id = None
+        if options['setor']:
+            setor = Setor.objects.filter(nome__iexact=options['setor']).first()
+            if setor is None:
+                raise CommandError(f"Setor '{options['setor']}' não encontrado.")
+            setor_id = setor.pk
+
+        try:
+            resultado = dias_faltantes(ano, mes, setor_id, excluir_feriados=not options['cobrar_feriados'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        colaboradores = resultado['colaboradores']
+        if options['csv']:
+            escritor = csv.writer(sys.stdout)
+            escritor.writerow(['id_colaborador', 'colaborador', 'setor', 'qtd_dias', 'dias'])
+            for c in colaboradores:
+                escritor.writerow([
+                    c['id_colaborador'], c['colaborador'], c['setor'], len(c['faltantes']),
+                    ' '.join(dia.isoformat() for dia in c['faltantes']),
+                ])
+            return
+
+        self.stdout.write(
+            f"{len(resultado['dias_esperados'])} dias úteis até {resultado['fim']:%d/%m/%Y}; "
+            f"{len(colaboradores)} colaboradores com dias sem apontamento."
+        )
+        for c in colaboradores:
+            dias = ', '.join(f"{dia:%d/%m}" for dia in c['faltantes'])
+            self.stdout.write(f"  {c['colaborador']} ({c['setor']}): {len(c['faltantes'])} dia(s) - {dias}")
@@ -0,0 +1,50 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from produtividade.importacao import CADASTROS, TAMANHO_LOTE, importar_cadastro
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa cadastros (colaborador, projeto, cliente, veiculo) de uma planilha .xlsx ou .csv. "
+        "Registros existentes são atualizados pela chave natural (id_colaborador, codigo, placa)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipo', choices=sorted(CADASTROS), help="Cadastro de destino.")
+        parser.add_argument('arquivo', help="Caminho da planilha (.xlsx ou .csv). A primeira linha é o cabeçalho.")
+        parser.add_argument(
+            '--lote', type=int, default=TAMANHO_LOTE,
+            help=f"Linhas gravadas por transação (padrão: {TAMANHO_LOTE})."
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Apenas valida a planilha, sem gravar."
+        )
+
+    def handle(self, *args, **options):
+        caminho = Path(options['arquivo'])
+        if not caminho.exists():
+            raise CommandError(f"Arquivo não encontrado: {caminho}")
+        if caminho.suffix.lower() not in ('.xlsx', '.csv'):
+            raise CommandError("Formato não suportado. Use .xlsx ou .csv.")
+        if options['lote'] < 1:
+            raise CommandError("O tamanho do lote deve ser positivo.")
+
+        inicio = time.perf_counter()
+        resultado = importar_cadastro(
+            options['tipo'], caminho, caminho.name,
+            tamanho_lote=options['lote'], simular=options['dry_run']
+        )
+        duracao = time.perf_counter() - inicio
+
+        for linha, mensagem in resultado.erros:
+            self.stdout.write(self.style.WARNING(f"Linha {linha}: {mensagem}"))
+
+        acao = "Validação concluída" if options['dry_run'] else "Importação concluída"
+        self.stdout.write(self.style.SUCCESS(
+            f"{acao} em {duracao:.1f}s: {resultado.criados} novo(s), "
+            f"{resultado.atualizados} atualizado(s), {len(resultado.erros)} erro(s)."
+        ))
@@ -0,0 +1,73 @@
+import csv
+import time
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from produtividade.importacao_legado import TAMANHO_LOTE, ImportadorLegado
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa planilhas legadas de horas (.xlsx com uma ou mais abas, ou .csv) para Apontamento. "
+        "A importação é retomável: executar de novo com o mesmo arquivo continua do último lote gravado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help="Caminho da planilha (.xlsx ou .csv).")
+        parser.add_argument(
+            '--usuario',
+            help="Username gravado como 'registrado por' (padrão: vazio, exibido como Sistema)."
+        )
+        parser.add_argument(
+            '--lote', type=int, default=TAMANHO_LOTE,
+            help=f"Registros gravados por transação (padrão: {TAMANHO_LOTE})."
+        )
+        parser.add_argument(
+            '--erros',
+            help="Arquivo CSV com as linhas rejeitadas (padrão: <arquivo>.erros.csv)."
+        )
+
+    def handle(self, *args, **options):
+        caminho = Path(options['arquivo'])
+        if not caminho.exists():
+            raise CommandError(f"Arquivo não encontrado: {caminho}")
+        if caminho.suffix.lower() not in ('.xlsx', '.csv'):
+            raise CommandError("Formato não suportado. Use .xlsx ou .csv.")
+        if options['lote'] < 1:
+            raise CommandError("O tamanho do lote deve ser positivo.")
+
+        usuario = None
+        if options['usuario']:
+            usuario = User.objects.filter(username=options['usuario']).first()
+            if usuario is None:
+                raise CommandError(f"Usuário '{options['usuario']}' não encontrado.")
+
+        importador = ImportadorLegado(caminho, usuario=usuario, tamanho_lote=options['lote'])
+        if importador.concluida:
+            raise CommandError(
+                f"Esta planilha já foi importada em {importador.checkpoint.concluido_em:%d/%m/%Y %H:%M} "
+                f"({importador.checkpoint.importados} registros)."
+            )
+        if importador.checkpoint.ultima_posicao:
+            self.stdout.write(f"Retomando após a linha de dados {importador.checkpoint.ultima_posicao}.")
+
+        inicio = time.perf_counter()
+        checkpoint = importador.checkpoint
+        for checkpoint in importador.executar():
+            self.stdout.write(f"  ... {checkpoint.importados} importados, {checkpoint.rejeitados} rejeitados")
+        duracao = time.perf_counter() - inicio
+
+        if importador.erros:
+            destino = Path(options['erros'] or f"{caminho}.erros.csv")
+            with open(destino, 'w', newline='', encoding='utf-8-sig') as f:
+                writer = csv.writer(f, delimiter=';')
+                writer.writerow(['Aba', 'Linha', 'Erro'])
+                writer.writerows(importador.erros)
+            self.stdout.write(self.style.WARNING(f"{len(importador.erros)} linha(s) rejeitada(s): detalhes em {destino}"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Importação concluída em {duracao:.1f}s: {checkpoint.importados} registros importados, "
+            f"{checkpoint.rejeitados} linhas rejeitadas."
+        ))
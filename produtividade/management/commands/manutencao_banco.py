@@ -0,0 +1,136 @@
+import os
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from produtividade import manutencao
+from produtividade.trava import TravaOcupada, trava_exclusiva
+
+
+def _mb(n_bytes):
+    return f"{n_bytes / (1024 * 1024):.1f} MB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Backup a quente do banco SQLite (API de backup online, em passos curtos), "
+        "verificação de integridade da cópia, PRAGMA optimize e vacuum incremental. "
+        "Seguro para o cron em horário de trabalho."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--destino', default=settings.BACKUP_DIR,
+            help=f"Diretório das cópias (padrão: BACKUP_DIR = {settings.BACKUP_DIR})."
+        )
+        parser.add_argument(
+            '--manter', type=int, default=settings.BACKUP_MANTER,
+            help=f"Cópias mantidas; as mais antigas são removidas (padrão: {settings.BACKUP_MANTER}, 0 = todas)."
+        )
+        parser.add_argument(
+            '--paginas', type=int, default=256,
+            help="Páginas copiadas por passo do backup (padrão: 256)."
+        )
+        parser.add_argument(
+            '--pausa', type=float, default=0.02,
+            help="Pausa em segundos entre os passos, liberando o banco (padrão: 0.02)."
+        )
+        parser.add_argument(
+            '--integridade', choices=('rapida', 'completa'), default='rapida',
+            help="quick_check (padrão) ou integrity_check completo sobre a cópia."
+        )
+        parser.add_argument('--sem-backup', action='store_true', help="Não gera cópia.")
+        parser.add_argument('--sem-otimizar', action='store_true', help="Não executa PRAGMA optimize.")
+        parser.add_argument('--sem-vacuum', action='store_true', help="Não executa o vacuum incremental.")
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help="ANALYZE completo em vez do PRAGMA optimize (mais lento)."
+        )
+        parser.add_argument(
+            '--converter-auto-vacuum', action='store_true',
+            help="Liga auto_vacuum=INCREMENTAL com um VACUUM completo. Bloqueia o banco: fora do expediente."
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("Este comando é específico para SQLite.")
+        if options['paginas'] < 1 or options['manter'] < 0:
+            raise CommandError("Páginas deve ser positivo e manter não pode ser negativo.")
+
+        banco = str(settings.DATABASES['default']['NAME'])
+        os.makedirs(options['destino'], exist_ok=True)
+
+        # Execuções do cron não se sobrepõem
+        try:
+            with trava_exclusiva(os.path.join(options['destino'], '.manutencao.lock')):
+                self._executar(banco, options)
+        except TravaOcupada:
+            raise CommandError("Já existe uma manutenção em andamento.")
+
+    def _executar(self, banco, options):
+        conn = manutencao.conectar(banco)
+        paginas, livres, tamanho_pagina = manutencao.tamanho_paginas(conn)
+        conn.close()
+        self.stdout.write(
+            f"Banco: {banco} | {_mb(paginas * tamanho_pagina)} "
+            f"({livres} páginas livres = {_mb(livres * tamanho_pagina)})"
+        )
+        problemas = []
+
+        if not options['sem_backup']:
+            prefixo = os.path.splitext(os.path.basename(banco))[0]
+            destino = os.path.join(options['destino'], f"{prefixo}-{datetime.now():%Y%m%d-%H%M%S}.sqlite3")
+            inicio = time.perf_counter()
+            tamanho, reinicios = manutencao.backup_online(
+                banco, destino, paginas=options['paginas'], pausa=options['pausa']
+            )
+            self.stdout.write(
+                f"Backup: {destino} ({_mb(tamanho)}) em {time.perf_counter() - inicio:.2f}s"
+                + (f", {reinicios} reinícios por escrita concorrente" if reinicios else "")
+            )
+
+            inicio = time.perf_counter()
+            problemas = manutencao.verificar_integridade(destino, options['integridade'] == 'completa')
+            if problemas:
+                self.stdout.write(self.style.ERROR(
+                    f"Integridade: {len(problemas)} problemas em {time.perf_counter() - inicio:.2f}s"
+                ))
+                for linha in problemas[:20]:
+                    self.stdout.write(f"  {linha}")
+            else:
+                self.stdout.write(f"Integridade ({options['integridade']}): ok em {time.perf_counter() - inicio:.2f}s")
+                # Só uma cópia íntegra entra na rotação e afasta as antigas
+                for nome in manutencao.rotacionar(options['destino'], f"{prefixo}-", options['manter']):
+                    self.stdout.write(f"  removida cópia antiga {nome}")
+
+        if options['converter_auto_vacuum']:
+            inicio = time.perf_counter()
+            manutencao.converter_auto_vacuum(banco)
+            self.stdout.write(f"auto_vacuum=INCREMENTAL ligado (VACUUM completo em {time.perf_counter() - inicio:.2f}s)")
+
+        if not options['sem_otimizar']:
+            inicio = time.perf_counter()
+            manutencao.otimizar(banco, analyze_completo=options['analyze'])
+            operacao = 'ANALYZE' if options['analyze'] else 'PRAGMA optimize'
+            self.stdout.write(f"{operacao}: {time.perf_counter() - inicio:.2f}s")
+
+        if not options['sem_vacuum']:
+            inicio = time.perf_counter()
+            liberadas = manutencao.vacuum_incremental(banco, pausa=options['pausa'])
+            if liberadas is None:
+                self.stdout.write(
+                    "Vacuum incremental: banco sem auto_vacuum=INCREMENTAL "
+                    "(use --converter-auto-vacuum fora do expediente)."
+                )
+            else:
+                self.stdout.write(
+                    f"Vacuum incremental: {_mb(liberadas * tamanho_pagina)} devolvidos "
+                    f"em {time.perf_counter() - inicio:.2f}s"
+                )
+
+        if problemas:
+            raise CommandError("A cópia falhou na verificação de integridade; verifique o banco.")
+        self.stdout.write(self.style.SUCCESS("Manutenção concluída."))
@@ -0,0 +1,86 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError
+
+from produtividade import fila
+from produtividade.trava import TravaOcupada, trava_exclusiva
+
+# A cada quantas rodadas vazias remove os envios antigos já processados
+RODADAS_LIMPEZA = 600
+
+
+class Command(BaseCommand):
+    help = (
+        "Grava no banco principal os apontamentos da fila de gravação (FILA_GRAVACAO=1), "
+        "em lotes. Deve haver um único processo destes em execução (ex: um serviço systemd)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=fila.TAMANHO_LOTE,
+            help=f"Envios gravados por transação (padrão: {fila.TAMANHO_LOTE})."
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=0.5,
+            help="Pausa em segundos quando a fila está vazia (padrão: 0.5)."
+        )
+        parser.add_argument(
+            '--uma-vez', action='store_true',
+            help="Esvazia a fila e termina (para cron ou manutenção)."
+        )
+        parser.add_argument(
+            '--manter-dias', type=int, default=7,
+            help="Dias em que envios já processados ficam na fila (padrão: 7)."
+        )
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError("O tamanho do lote deve ser positivo.")
+
+        # Escritor único: um segundo processo sairia disputando o lock do banco à toa
+        try:
+            with trava_exclusiva(f"{settings.FILA_SQLITE_PATH}.lock"):
+                total_gravados, total_recusados = self._processar(options)
+        except TravaOcupada:
+            raise CommandError("Já existe um processo gravando a fila.")
+
+        fila.limpar(options['manter_dias'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Fila processada: {total_gravados} gravados, {total_recusados} recusados."
+        ))
+
+    def _processar(self, options):
+        """Laço de gravação até Ctrl+C (ou fila vazia, com --uma-vez). Retorna os totais."""
+        self.stdout.write(f"Fila: {settings.FILA_SQLITE_PATH} ({fila.pendentes()} pendentes)")
+        total_gravados = total_recusados = rodadas_vazias = 0
+        try:
+            while True:
+                try:
+                    inicio = time.perf_counter()
+                    gravados, recusados = fila.processar_lote(options['lote'])
+                except OperationalError as e:
+                    # Banco ocupado além do timeout (ex: backup): o lote continua pendente
+                    self.stderr.write(f"Lote adiado: {e}")
+                    time.sleep(options['intervalo'])
+                    continue
+
+                if gravados or recusados:
+                    total_gravados += gravados
+                    total_recusados += recusados
+                    self.stdout.write(
+                        f"  {gravados} gravados, {recusados} recusados "
+                        f"em {(time.perf_counter() - inicio) * 1000:.0f} ms"
+                    )
+                    continue
+
+                if options['uma_vez']:
+                    break
+                rodadas_vazias += 1
+                if rodadas_vazias % RODADAS_LIMPEZA == 0:
+                    fila.limpar(options['manter_dias'])
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+        return total_gravados, total_recusados
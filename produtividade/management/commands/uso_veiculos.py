@@ -0,0 +1,62 @@
+import csv
+import sys
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from produtividade.veiculos import GRANULARIDADES_USO, calcular_uso
+
+
+class Command(BaseCommand):
+    help = (
+        "Horas de uso por veículo (frota e placas manuais, sem dupla contagem) e usos "
+        "simultâneos da mesma placa em destinos diferentes, numa varredura ordenada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inicio', help="Data inicial (AAAA-MM-DD). Padrão: 4 semanas atrás.")
+        parser.add_argument('--fim', help="Data final (AAAA-MM-DD). Padrão: hoje.")
+        parser.add_argument('--granularidade', choices=GRANULARIDADES_USO, default='semana')
+        parser.add_argument('--conflitos', action='store_true', help="Lista os usos simultâneos.")
+        parser.add_argument('--csv', action='store_true', help="Horas por veículo e período em CSV na saída padrão.")
+
+    def handle(self, *args, **options):
+        hoje = timezone.localdate()
+        try:
+            inicio = datetime.strptime(options['inicio'], '%Y-%m-%d').date() if options['inicio'] else hoje - timedelta(days=27)
+            fim = datetime.strptime(options['fim'], '%Y-%m-%d').date() if options['fim'] else hoje
+        except ValueError:
+            raise CommandError("Datas inválidas. Use o formato AAAA-MM-DD.")
+        if fim < inicio:
+            raise CommandError("A data final deve ser igual ou posterior à inicial.")
+
+        resultado = calcular_uso(inicio, fim, options['granularidade'])
+
+        if options['csv']:
+            escritor = csv.writer(sys.stdout, delimiter=';')
+            escritor.writerow(['Placa', 'Veículo', *(f"{p:%Y-%m-%d}" for p in resultado['periodos']), 'Total (h)', 'Conflitos'])
+            for v in resultado['veiculos']:
+                escritor.writerow([
+                    v['placa'], v['descricao'], *(f"{m / 60:.2f}" for m in v['minutos']),
+                    f"{v['total'] / 60:.2f}", v['conflitos'],
+                ])
+            return
+
+        for v in resultado['veiculos']:
+            self.stdout.write(
+                f"  {v['placa']:<8} {v['descricao'][:30]:<30} {v['total'] // 60:>5}h{v['total'] % 60:02d} "
+                f"({v['registros']} registros, {v['conflitos']} conflitos)"
+            )
+        if options['conflitos']:
+            for c in resultado['conflitos']:
+                a, b = (f"{nome} {horario} [{destino}]" for nome, horario, destino in zip(
+                    c['colaboradores'], c['horarios'], c['destinos']
+                ))
+                self.stdout.write(f"  [{c['placa']}] {c['data']:%d/%m/%Y}: {a} x {b}")
+
+        estilo = self.style.WARNING if resultado['conflitos'] else self.style.SUCCESS
+        self.stdout.write(estilo(
+            f"{len(resultado['veiculos'])} veículo(s), {len(resultado['conflitos'])} uso(s) simultâneo(s) "
+            f"de {inicio:%d/%m/%Y} a {fim:%d/%m/%Y}."
+        ))
@@ -0,0 +1,169 @@
+"""
+Backup a quente e manutenção do banco SQLite (db.sqlite3).
+
+O backup usa a API de backup online do sqlite3 em passos de poucas páginas, com uma
+pausa entre eles: cada passo segura o lock de leitura por milissegundos, então os
+workers continuam gravando durante a cópia (se o banco mudar no meio, o SQLite
+reinicia a cópia para manter a consistência). A verificação de integridade roda
+sobre a cópia, não sobre o banco em uso, para não prender leitores por segundos.
+
+Na manutenção do banco em uso, cada operação é curta:
+- PRAGMA optimize com analysis_limit (ANALYZE aproximado só onde faz diferença);
+- PRAGMA incremental_vacuum em passos, devolvendo páginas livres ao sistema
+  (só tem efeito com auto_vacuum=INCREMENTAL; ver converter_auto_vacuum).
+"""
+import os
+import sqlite3
+import time
+
+# Linhas amostradas por índice no ANALYZE do PRAGMA optimize
+LIMITE_ANALISE = 1000
+
+
+def conectar(caminho, timeout=20):
+    return sqlite3.connect(caminho, timeout=timeout, isolation_level=None)
+
+
+def _pragma(conn, nome):
+    return conn.execute(f'PRAGMA {nome}').fetchone()[0]
+
+
+def tamanho_paginas(conn):
+    """(páginas totais, páginas livres, bytes por página)."""
+    return _pragma(conn, 'page_count'), _pragma(conn, 'freelist_count'), _pragma(conn, 'page_size')
+
+
+# ==============================================================================
+# BACKUP
+# ==============================================================================
+
+class _CopiaReiniciada(Exception):
+    pass
+
+
+def backup_online(origem, destino, paginas=256, pausa=0.02, progresso=None, max_reinicios=3):
+    """
+    Copia 'origem' para 'destino' (arquivo novo) com a API de backup online.
+    progresso(restantes, total) é chamado a cada passo. O arquivo só aparece com o
+    nome final depois de completo (cópia em .tmp + rename).
+
+    Cada escrita de outro processo durante a cópia faz o SQLite recomeçar do zero; se
+    isso acontecer 'max_reinicios' vezes (pico de gravação), a cópia é refeita com
+    passos 8x maiores e, por fim, num passo único (leitores e escritores esperam pelo
+    busy timeout só durante a cópia). Retorna (bytes, reinícios).
+    """
+    temporario = f'{destino}.tmp'
+    if os.path.exists(temporario):
+        os.remove(temporario)
+
+    estado = {'restantes': None, 'reinicios': 0}
+
+    def passo(status, restantes, total):
+        if estado['restantes'] is not None and restantes > estado['restantes']:
+            estado['reinicios'] += 1
+            if estado['reinicios'] % max_reinicios == 0:
+                raise _CopiaReiniciada()
+        estado['restantes'] = restantes
+        if progresso:
+            progresso(restantes, total)
+        # Libera o banco entre os passos para os escritores
+        if restantes:
+            time.sleep(pausa)
+
+    fonte = conectar(origem)
+    copia = sqlite3.connect(temporario)
+    try:
+        for paginas_passo in (paginas, paginas * 8, -1):
+            estado['restantes'] = None
+            try:
+                fonte.backup(copia, pages=paginas_passo, progress=passo)
+                break
+            except _CopiaReiniciada:
+                continue
+    finally:
+        copia.close()
+        fonte.close()
+    os.replace(temporario, destino)
+    return os.path.getsize(destino), estado['reinicios']
+
+
+def verificar_integridade(caminho, completa=False):
+    """Lista de problemas encontrados (vazia = íntegro). quick_check é O(N) sem conferir índices."""
+    conn = conectar(caminho)
+    try:
+        pragma = 'integrity_check' if completa else 'quick_check'
+        linhas = [linha[0] for linha in conn.execute(f'PRAGMA {pragma}')]
+        linhas += [
+            f"Chave estrangeira inválida: {tabela} (rowid {rowid}) -> {pai}"
+            for tabela, rowid, pai, _ in conn.execute('PRAGMA foreign_key_check')
+        ]
+    finally:
+        conn.close()
+    return [linha for linha in linhas if linha != 'ok']
+
+
+def rotacionar(diretorio, prefixo, manter):
+    """Remove os backups mais antigos de 'prefixo', mantendo os 'manter' mais recentes."""
+    arquivos = sorted(
+        nome for nome in os.listdir(diretorio) if nome.startswith(prefixo) and nome.endswith('.sqlite3')
+    )
+    removidos = arquivos[:-manter] if manter else []
+    for nome in removidos:
+        os.remove(os.path.join(diretorio, nome))
+    return removidos
+
+
+# ==============================================================================
+# MANUTENÇÃO DO BANCO EM USO
+# ==============================================================================
+
+def otimizar(caminho, analyze_completo=False):
+    """PRAGMA optimize (padrão) ou ANALYZE completo."""
+    conn = conectar(caminho)
+    try:
+        if analyze_completo:
+            conn.execute('ANALYZE')
+        else:
+            conn.execute(f'PRAGMA analysis_limit={LIMITE_ANALISE}')
+            conn.execute('PRAGMA optimize')
+    finally:
+        conn.close()
+
+
+def vacuum_incremental(caminho, paginas=512, pausa=0.02):
+    """
+    Devolve as páginas livres ao sistema em passos curtos. Retorna as páginas liberadas,
+    ou None se o banco não está em auto_vacuum=INCREMENTAL.
+    """
+    conn = conectar(caminho)
+    try:
+        if _pragma(conn, 'auto_vacuum') != 2:
+            return None
+        liberadas = 0
+        while True:
+            livres = _pragma(conn, 'freelist_count')
+            if not livres:
+                break
+            # fetchall: o pragma libera uma página por passo do cursor
+            conn.execute(f'PRAGMA incremental_vacuum({paginas})').fetchall()
+            restantes = _pragma(conn, 'freelist_count')
+            if restantes >= livres:
+                break
+            liberadas += livres - restantes
+            time.sleep(pausa)
+        return liberadas
+    finally:
+        conn.close()
+
+
+def converter_auto_vacuum(caminho):
+    """
+    Liga auto_vacuum=INCREMENTAL. Exige um VACUUM completo, que bloqueia o banco
+    inteiro enquanto reescreve o arquivo: executar fora do horário de trabalho.
+    """
+    conn = conectar(caminho, timeout=60)
+    try:
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtividade', '0017_apontamento_id_agrupamento_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApontamentoArquivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID Original')),
+                ('data_apontamento', models.DateField(verbose_name='Data')),
+                ('hora_inicio', models.TimeField(verbose_name='Hora Início')),
+                ('hora_termino', models.TimeField(verbose_name='Hora Término')),
+                ('local_execucao', models.CharField(choices=[('INT', 'Dentro da obra'), ('EXT', 'Fora da obra')], max_length=3, verbose_name='Local de Execução')),
+                ('veiculo_manual_modelo', models.CharField(blank=True, max_length=100, null=True)),
+                ('veiculo_manual_placa', models.CharField(blank=True, max_length=20, null=True)),
+                ('ocorrencias', models.TextField(blank=True, null=True)),
+                ('em_plantao', models.BooleanField(default=False)),
+                ('data_plantao', models.DateField(blank=True, null=True)),
+                ('dorme_fora', models.BooleanField(default=False)),
+                ('data_dorme_fora', models.DateField(blank=True, null=True)),
+                ('data_registro', models.DateTimeField()),
+                ('id_agrupamento', models.CharField(blank=True, max_length=100, null=True)),
+                ('motivo_ajuste', models.TextField(blank=True, null=True)),
+                ('status_aprovacao', models.CharField(choices=[('EM_ANALISE', 'Em Análise'), ('APROVADO', 'Aprovado'), ('REJEITADO', 'Rejeitado'), ('SOLICITACAO_AJUSTE', 'Solicitação de Ajuste')], max_length=20)),
+                ('status_ajuste', models.CharField(blank=True, max_length=20, null=True)),
+                ('contagem_edicao', models.IntegerField(default=0)),
+                ('motivo_rejeicao', models.TextField(blank=True, null=True)),
+                ('latitude', models.DecimalField(blank=True, decimal_places=8, max_digits=12, null=True)),
+                ('longitude', models.DecimalField(blank=True, decimal_places=8, max_digits=12, null=True)),
+                ('data_arquivamento', models.DateTimeField(auto_now_add=True, verbose_name='Arquivado em')),
+                ('auxiliar', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='produtividade.colaborador')),
+                ('auxiliares_extras', models.ManyToManyField(blank=True, related_name='+', to='produtividade.colaborador')),
+                ('centro_custo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='produtividade.centrocusto')),
+                ('codigo_cliente', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='produtividade.codigocliente')),
+                ('colaborador', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='produtividade.colaborador', verbose_name='Colaborador')),
+                ('projeto', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='produtividade.projeto')),
+                ('registrado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('veiculo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='produtividade.veiculo')),
+            ],
+            options={
+                'verbose_name': 'Apontamento Arquivado',
+                'verbose_name_plural': 'Apontamentos Arquivados',
+                'ordering': ['-data_apontamento', '-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ApontamentoHistoricoArquivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='ID Original')),
+                ('dados_snapshot', models.JSONField(verbose_name='Cópia dos Dados (Snapshot)')),
+                ('data_edicao', models.DateTimeField()),
+                ('numero_edicao', models.IntegerField(verbose_name='Versão da Edição')),
+                ('apontamento_original', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historico_versoes', to='produtividade.apontamentoarquivado', verbose_name='Apontamento Original')),
+                ('editado_por', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Editado Por')),
+            ],
+            options={
+                'verbose_name': 'Histórico Arquivado',
+                'verbose_name_plural': 'Históricos Arquivados',
+                'ordering': ['-data_edicao'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='apontamentoarquivado',
+            index=models.Index(fields=['data_apontamento', 'colaborador'], name='arquivo_data_colab_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtividade', '0018_arquivo_apontamentos'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FechamentoPeriodo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ano', models.PositiveSmallIntegerField(verbose_name='Ano')),
+                ('mes', models.PositiveSmallIntegerField(verbose_name='Mês')),
+                ('data_fechamento', models.DateTimeField(auto_now_add=True, verbose_name='Data do Fechamento')),
+                ('fechado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Fechado Por')),
+            ],
+            options={
+                'verbose_name': 'Fechamento de Período',
+                'verbose_name_plural': 'Fechamentos de Período',
+                'ordering': ['-ano', '-mes'],
+            },
+        ),
+        migrations.CreateModel(
+            name='FechamentoResumo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_minutos', models.PositiveIntegerField(default=0, verbose_name='Total (minutos)')),
+                ('qtd_registros', models.PositiveIntegerField(default=0, verbose_name='Qtd. Registros')),
+                ('dias_plantao', models.PositiveSmallIntegerField(default=0, verbose_name='Dias de Plantão')),
+                ('dias_dorme_fora', models.PositiveSmallIntegerField(default=0, verbose_name='Dias de Dorme-Fora')),
+                ('rateio', models.JSONField(default=dict, verbose_name='Rateio (minutos por destino)')),
+                ('colaborador', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='produtividade.colaborador', verbose_name='Colaborador')),
+                ('fechamento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumos', to='produtividade.fechamentoperiodo', verbose_name='Fechamento')),
+            ],
+            options={
+                'verbose_name': 'Resumo do Fechamento',
+                'verbose_name_plural': 'Resumos do Fechamento',
+                'ordering': ['colaborador__nome_completo'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='fechamentoperiodo',
+            constraint=models.UniqueConstraint(fields=('ano', 'mes'), name='fechamento_ano_mes_unico'),
+        ),
+        migrations.AddConstraint(
+            model_name='fechamentoresumo',
+            constraint=models.UniqueConstraint(fields=('fechamento', 'colaborador'), name='resumo_fechamento_colab_unico'),
+        ),
+    ]
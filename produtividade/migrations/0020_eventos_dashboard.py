@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtividade', '0019_fechamento_periodo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoDashboard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('CRIADO', 'Criado'), ('EDITADO', 'Editado'), ('APROVACAO', 'Aprovação'), ('EXCLUIDO', 'Excluído')], max_length=10, verbose_name='Tipo')),
+                ('data_apontamento', models.DateField(verbose_name='Data do Apontamento')),
+                ('apontamento_id', models.BigIntegerField(verbose_name='ID do Apontamento')),
+                ('delta', models.JSONField(default=dict, verbose_name='Delta dos KPIs')),
+                ('criado_em', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Criado em')),
+            ],
+            options={
+                'verbose_name': 'Evento do Dashboard',
+                'verbose_name_plural': 'Eventos do Dashboard',
+                'ordering': ['id'],
+            },
+        ),
+    ]
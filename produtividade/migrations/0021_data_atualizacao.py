@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtividade', '0020_eventos_dashboard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apontamento',
+            name='data_atualizacao',
+            field=models.DateTimeField(auto_now=True, null=True, verbose_name='Última Atualização'),
+        ),
+        migrations.AddField(
+            model_name='apontamentoarquivado',
+            name='data_atualizacao',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
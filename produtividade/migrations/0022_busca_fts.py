@@ -0,0 +1,73 @@
+"""
+Índice de texto (SQLite FTS5) sobre ocorrencias, motivo_ajuste e motivo_rejeicao.
+
+Uma tabela virtual por tabela de origem (principal e arquivo), com rowid = id do
+apontamento. Triggers mantêm os índices sincronizados em qualquer escrita, inclusive
+bulk_create/update(), arquivamento e SQL direto. Em outros bancos a migração não
+faz nada e a busca usa o fallback com icontains (ver produtividade/busca.py).
+"""
+from django.db import migrations
+
+TABELAS_ORIGEM = ('produtividade_apontamento', 'produtividade_apontamentoarquivado')
+COLUNAS = ('ocorrencias', 'motivo_ajuste', 'motivo_rejeicao')
+
+
+def _sql_criacao():
+    colunas = ', '.join(COLUNAS)
+    novos = ', '.join(f'new.{c}' for c in COLUNAS)
+    sql = []
+    for tabela in TABELAS_ORIGEM:
+        fts = f'{tabela}_fts'
+        sql += [
+            # unicode61 + remove_diacritics 2: "tubulação" casa com "tubulacao" e vice-versa
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{colunas}, tokenize = 'unicode61 remove_diacritics 2')",
+
+            f"CREATE TRIGGER IF NOT EXISTS {tabela}_fts_ai AFTER INSERT ON {tabela} BEGIN "
+            f"INSERT INTO {fts}(rowid, {colunas}) VALUES (new.id, {novos}); END",
+
+            f"CREATE TRIGGER IF NOT EXISTS {tabela}_fts_ad AFTER DELETE ON {tabela} BEGIN "
+            f"DELETE FROM {fts} WHERE rowid = old.id; END",
+
+            f"CREATE TRIGGER IF NOT EXISTS {tabela}_fts_au AFTER UPDATE OF {colunas} ON {tabela} BEGIN "
+            f"DELETE FROM {fts} WHERE rowid = old.id; "
+            f"INSERT INTO {fts}(rowid, {colunas}) VALUES (new.id, {novos}); END",
+
+            # Carga inicial dos registros existentes
+            f"INSERT INTO {fts}(rowid, {colunas}) SELECT id, {colunas} FROM {tabela}",
+        ]
+    return sql
+
+
+def _sql_remocao():
+    sql = []
+    for tabela in TABELAS_ORIGEM:
+        for sufixo in ('ai', 'ad', 'au'):
+            sql.append(f"DROP TRIGGER IF EXISTS {tabela}_fts_{sufixo}")
+        sql.append(f"DROP TABLE IF EXISTS {tabela}_fts")
+    return sql
+
+
+def criar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in _sql_criacao():
+        schema_editor.execute(sql)
+
+
+def remover_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in _sql_remocao():
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtividade', '0021_data_atualizacao'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtividade', '0022_busca_fts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='apontamento',
+            index=models.Index(fields=['data_apontamento', 'id'], name='apontamento_data_id_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtividade', '0023_indice_data_apontamento'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportacaoLegado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('assinatura', models.CharField(max_length=64, unique=True, verbose_name='Assinatura (SHA-256 do arquivo)')),
+                ('nome_arquivo', models.CharField(max_length=255, verbose_name='Arquivo')),
+                ('ultima_posicao', models.PositiveIntegerField(default=0, verbose_name='Última Posição Confirmada')),
+                ('importados', models.PositiveIntegerField(default=0, verbose_name='Registros Importados')),
+                ('rejeitados', models.PositiveIntegerField(default=0, verbose_name='Linhas Rejeitadas')),
+                ('iniciado_em', models.DateTimeField(auto_now_add=True, verbose_name='Iniciado em')),
+                ('atualizado_em', models.DateTimeField(auto_now=True, verbose_name='Atualizado em')),
+                ('concluido_em', models.DateTimeField(blank=True, null=True, verbose_name='Concluído em')),
+                ('iniciado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Iniciado Por')),
+            ],
+            options={
+                'verbose_name': 'Importação de Planilha Legada',
+                'verbose_name_plural': 'Importações de Planilhas Legadas',
+                'ordering': ['-iniciado_em'],
+            },
+        ),
+    ]
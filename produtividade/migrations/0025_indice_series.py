@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:56
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtividade', '0024_importacao_legado'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='apontamentoarquivado',
+            name='arquivo_data_colab_idx',
+        ),
+        migrations.AddIndex(
+            model_name='apontamento',
+            index=models.Index(fields=['data_apontamento', 'colaborador', 'hora_inicio', 'hora_termino', 'projeto', 'codigo_cliente', 'centro_custo'], name='apontamento_serie_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='apontamentoarquivado',
+            index=models.Index(fields=['data_apontamento', 'colaborador', 'hora_inicio', 'hora_termino', 'projeto', 'codigo_cliente', 'centro_custo'], name='arquivo_serie_idx'),
+        ),
+    ]
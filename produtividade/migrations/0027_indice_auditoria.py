@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtividade', '0026_feriado'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='apontamento',
+            index=models.Index(fields=['colaborador', 'data_apontamento', 'hora_inicio'], name='apontamento_auditoria_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='apontamentoarquivado',
+            index=models.Index(fields=['colaborador', 'data_apontamento', 'hora_inicio'], name='arquivo_auditoria_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:15
+
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+
+LOTE = 500
+
+
+def preencher_chave(apps, schema_editor):
+    """Chave da placa dos registros existentes (frota ou manual), atualizada em lotes por placa."""
+    for nome in ('Apontamento', 'ApontamentoArquivado'):
+        model = apps.get_model('produtividade', nome)
+        por_chave = defaultdict(list)
+        registros = model.objects.filter(
+            Q(veiculo__isnull=False) | Q(veiculo_manual_placa__isnull=False)
+        ).values_list('pk', 'veiculo__placa', 'veiculo_manual_placa')
+        for pk, placa_frota, placa_manual in registros.iterator(chunk_size=2000):
+            chave = re.sub(r'[^0-9A-Za-z]', '', placa_frota or placa_manual or '').upper()
+            if chave:
+                por_chave[chave].append(pk)
+        for chave, ids in por_chave.items():
+            for i in range(0, len(ids), LOTE):
+                model.objects.filter(pk__in=ids[i:i + LOTE]).update(placa_normalizada=chave)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtividade', '0027_indice_auditoria'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apontamento',
+            name='placa_normalizada',
+            field=models.CharField(blank=True, editable=False, max_length=20, null=True, verbose_name='Placa (Chave)'),
+        ),
+        migrations.AddField(
+            model_name='apontamentoarquivado',
+            name='placa_normalizada',
+            field=models.CharField(blank=True, editable=False, max_length=20, null=True),
+        ),
+        migrations.RunPython(preencher_chave, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='apontamento',
+            index=models.Index(fields=['placa_normalizada', 'data_apontamento', 'hora_inicio'], name='apontamento_placa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='apontamentoarquivado',
+            index=models.Index(fields=['placa_normalizada', 'data_apontamento', 'hora_inicio'], name='arquivo_placa_idx'),
+        ),
+    ]
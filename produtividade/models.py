@@ -1,9 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator
 from django.core.exceptions import ValidationError
 from datetime import date, datetime, timedelta
+import re
 
 # ==============================================================================
 # TABELAS AUXILIARES (CADASTROS)
@@ -179,6 +180,21 @@ class Veiculo(models.Model):
             return f"{self.descricao} - {self.placa}"
         return self.placa
 
+    def save(self, *args, **kwargs):
+        placa_anterior = None
+        if self.pk:
+            placa_anterior = Veiculo.objects.filter(pk=self.pk).values_list('placa', flat=True).first()
+        super().save(*args, **kwargs)
+        # Placa corrigida no cadastro: a chave gravada nos apontamentos acompanha
+        if placa_anterior is not None and chave_placa(placa_anterior) != chave_placa(self.placa):
+            for model in (Apontamento, ApontamentoArquivado):
+                model.objects.filter(veiculo=self).update(placa_normalizada=chave_placa(self.placa))
+
+
+def chave_placa(placa):
+    """Placa sem separadores e em maiúsculas (ABC-1D23 -> ABC1D23), ou None se vazia."""
+    return re.sub(r'[^0-9A-Za-z]', '', placa or '').upper() or None
+
 
 # ==============================================================================
 # TABELA PRINCIPAL (CORE)
@@ -260,6 +276,11 @@ class Apontamento(models.Model):
     veiculo_manual_placa = models.CharField(
         max_length=20, blank=True, null=True, verbose_name="Placa (Manual)"
     )
+    # Chave única da placa (frota ou manual), preenchida no save(): base do relatório
+    # de uso de veículos e da detecção de uso simultâneo (veiculos.py)
+    placa_normalizada = models.CharField(
+        max_length=20, blank=True, null=True, editable=False, verbose_name="Placa (Chave)"
+    )
     
     # --- 4. Equipe e Ocorrências ---
     ocorrencias = models.TextField(
@@ -305,6 +326,8 @@ class Apontamento(models.Model):
         User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Usuário de Registro"
     )
     data_registro = models.DateTimeField(auto_now_add=True)
+    # Última gravação (chave do cache de linhas do histórico). update() deve preenchê-la manualmente.
+    data_atualizacao = models.DateTimeField(auto_now=True, null=True, verbose_name="Última Atualização")
 
     # --- 7. Controle de Ajustes e Workflow ---
     id_agrupamento = models.CharField(
@@ -385,10 +408,41 @@ class Apontamento(models.Model):
         verbose_name = "Apontamento"
         verbose_name_plural = "Apontamentos"
         ordering = ['-data_apontamento', '-id']
+        indexes = [
+            # Ordenação padrão e date_hierarchy do admin percorrem o índice sem ordenar a tabela
+            models.Index(fields=['data_apontamento', 'id'], name='apontamento_data_id_idx'),
+            # Cobre as séries temporais (series.py): o GROUP BY lê só o índice, sem visitar a tabela
+            models.Index(
+                fields=['data_apontamento', 'colaborador', 'hora_inicio', 'hora_termino', 'projeto', 'codigo_cliente', 'centro_custo'],
+                name='apontamento_serie_idx',
+            ),
+            # Varredura da auditoria (auditoria.py) e verificação de conflito: registros do
+            # colaborador já em ordem de dia e hora de início
+            models.Index(fields=['colaborador', 'data_apontamento', 'hora_inicio'], name='apontamento_auditoria_idx'),
+            # Uso de veículos (veiculos.py): registros de cada placa em ordem de dia e hora
+            models.Index(fields=['placa_normalizada', 'data_apontamento', 'hora_inicio'], name='apontamento_placa_idx'),
+        ]
 
     def __str__(self):
         return f"{self.colaborador} - {self.data_apontamento}"
 
+    def chave_placa_atual(self):
+        """Chave da placa do veículo apontado (frota tem prioridade sobre a manual)."""
+        if self.veiculo_id:
+            if Apontamento.veiculo.is_cached(self):
+                return chave_placa(self.veiculo.placa)
+            return chave_placa(Veiculo.objects.filter(pk=self.veiculo_id).values_list('placa', flat=True).first())
+        return chave_placa(self.veiculo_manual_placa)
+
+    def save(self, *args, **kwargs):
+        self.placa_normalizada = self.chave_placa_atual()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'veiculo', 'veiculo_id', 'veiculo_manual_placa'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'placa_normalizada'}
+        # Atômico com o post_save: o evento do Dashboard é gravado junto (ver eventos.py)
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
 
 # ==============================================================================
 # TABELAS DE HISTÓRICO E AUDITORIA
@@ -429,4 +483,297 @@ class ApontamentoHistorico(models.Model):
         ordering = ['-data_edicao']
 
     def __str__(self):
-        return f"V{self.numero_edicao} - {self.apontamento_original}"
\ No newline at end of file
+        return f"V{self.numero_edicao} - {self.apontamento_original}"
+
+# ==============================================================================
+# TABELAS DE ARQUIVO (DADOS FRIOS)
+# Registros antigos movidos pelo comando 'arquivar_apontamentos'.
+# Mantêm o mesmo ID e os mesmos nomes de campo da tabela principal,
+# permitindo que exportações e histórico leiam as duas de forma transparente.
+# ==============================================================================
+
+class ApontamentoArquivado(models.Model):
+    """
+    Cópia fiel de um Apontamento fechado, retirado da tabela principal.
+    """
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID Original")
+
+    colaborador = models.ForeignKey(
+        Colaborador, on_delete=models.PROTECT, related_name='+', verbose_name="Colaborador"
+    )
+    data_apontamento = models.DateField(verbose_name="Data")
+    hora_inicio = models.TimeField(verbose_name="Hora Início")
+    hora_termino = models.TimeField(verbose_name="Hora Término")
+
+    local_execucao = models.CharField(
+        max_length=3, choices=Apontamento.LOCAL_CHOICES, verbose_name="Local de Execução"
+    )
+    projeto = models.ForeignKey(
+        Projeto, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    codigo_cliente = models.ForeignKey(
+        CodigoCliente, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    centro_custo = models.ForeignKey(
+        CentroCusto, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+
+    veiculo = models.ForeignKey(
+        Veiculo, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    veiculo_manual_modelo = models.CharField(max_length=100, blank=True, null=True)
+    veiculo_manual_placa = models.CharField(max_length=20, blank=True, null=True)
+    placa_normalizada = models.CharField(max_length=20, blank=True, null=True, editable=False)
+
+    ocorrencias = models.TextField(blank=True, null=True)
+    auxiliar = models.ForeignKey(
+        Colaborador, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    auxiliares_extras = models.ManyToManyField(Colaborador, blank=True, related_name='+')
+
+    em_plantao = models.BooleanField(default=False)
+    data_plantao = models.DateField(null=True, blank=True)
+    dorme_fora = models.BooleanField(default=False)
+    data_dorme_fora = models.DateField(null=True, blank=True)
+
+    registrado_por = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    data_registro = models.DateTimeField()
+    data_atualizacao = models.DateTimeField(null=True, blank=True)
+
+    id_agrupamento = models.CharField(max_length=100, null=True, blank=True)
+    motivo_ajuste = models.TextField(blank=True, null=True)
+    status_aprovacao = models.CharField(
+        max_length=20, choices=Apontamento.STATUS_APROVACAO_CHOICES
+    )
+    status_ajuste = models.CharField(max_length=20, null=True, blank=True)
+    contagem_edicao = models.IntegerField(default=0)
+    motivo_rejeicao = models.TextField(blank=True, null=True)
+
+    latitude = models.DecimalField(max_digits=12, decimal_places=8, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=12, decimal_places=8, null=True, blank=True)
+
+    data_arquivamento = models.DateTimeField(auto_now_add=True, verbose_name="Arquivado em")
+
+    # Mesma regra de duração da tabela principal (virada de dia)
+    duracao_total_str = Apontamento.duracao_total_str
+
+    class Meta:
+        verbose_name = "Apontamento Arquivado"
+        verbose_name_plural = "Apontamentos Arquivados"
+        ordering = ['-data_apontamento', '-id']
+        indexes = [
+            # Mesmas colunas iniciais do antigo (data, colaborador), cobrindo também as séries temporais
+            models.Index(
+                fields=['data_apontamento', 'colaborador', 'hora_inicio', 'hora_termino', 'projeto', 'codigo_cliente', 'centro_custo'],
+                name='arquivo_serie_idx',
+            ),
+            models.Index(fields=['colaborador', 'data_apontamento', 'hora_inicio'], name='arquivo_auditoria_idx'),
+            models.Index(fields=['placa_normalizada', 'data_apontamento', 'hora_inicio'], name='arquivo_placa_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.colaborador} - {self.data_apontamento} (Arquivo)"
+
+
+class ApontamentoHistoricoArquivado(models.Model):
+    """
+    Versões anteriores (snapshots) de apontamentos que foram arquivados.
+    """
+    id = models.BigIntegerField(primary_key=True, verbose_name="ID Original")
+
+    apontamento_original = models.ForeignKey(
+        ApontamentoArquivado,
+        on_delete=models.CASCADE,
+        related_name='historico_versoes',
+        verbose_name="Apontamento Original"
+    )
+    dados_snapshot = models.JSONField(verbose_name="Cópia dos Dados (Snapshot)")
+    editado_por = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, related_name='+', verbose_name="Editado Por"
+    )
+    data_edicao = models.DateTimeField()
+    numero_edicao = models.IntegerField(verbose_name="Versão da Edição")
+
+    class Meta:
+        verbose_name = "Histórico Arquivado"
+        verbose_name_plural = "Históricos Arquivados"
+        ordering = ['-data_edicao']
+
+    def __str__(self):
+        return f"V{self.numero_edicao} - {self.apontamento_original}"
+
+
+# ==============================================================================
+# CALENDÁRIO (FERIADOS)
+# Dias sem expediente: não contam como falta de apontamento e, na folha, as horas
+# trabalhadas neles são extra 100% (como no domingo).
+# ==============================================================================
+
+class Feriado(models.Model):
+    data = models.DateField(unique=True, verbose_name="Data")
+    descricao = models.CharField(max_length=100, verbose_name="Descrição")
+
+    class Meta:
+        verbose_name = "Feriado"
+        verbose_name_plural = "Feriados"
+        ordering = ['-data']
+
+    def __str__(self):
+        return f"{self.data:%d/%m/%Y} - {self.descricao}"
+
+    @classmethod
+    def datas_no_intervalo(cls, inicio, fim):
+        return set(cls.objects.filter(data__gte=inicio, data__lte=fim).values_list('data', flat=True))
+
+
+# ==============================================================================
+# FECHAMENTO DE PERÍODO (FOLHA)
+# Um mês fechado bloqueia edições e congela os totais por colaborador.
+# ==============================================================================
+
+class FechamentoPeriodo(models.Model):
+    """
+    Competência (mês/ano) fechada pelo Owner para processamento da folha.
+    """
+    ano = models.PositiveSmallIntegerField(verbose_name="Ano")
+    mes = models.PositiveSmallIntegerField(verbose_name="Mês")
+
+    fechado_por = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Fechado Por"
+    )
+    data_fechamento = models.DateTimeField(auto_now_add=True, verbose_name="Data do Fechamento")
+
+    class Meta:
+        verbose_name = "Fechamento de Período"
+        verbose_name_plural = "Fechamentos de Período"
+        ordering = ['-ano', '-mes']
+        constraints = [
+            models.UniqueConstraint(fields=['ano', 'mes'], name='fechamento_ano_mes_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.mes:02d}/{self.ano}"
+
+    @property
+    def inicio(self):
+        return date(self.ano, self.mes, 1)
+
+    @property
+    def fim(self):
+        proximo = date(self.ano + (self.mes // 12), (self.mes % 12) + 1, 1)
+        return proximo - timedelta(days=1)
+
+    @classmethod
+    def data_esta_fechada(cls, data):
+        """Indica se a data pertence a uma competência já fechada."""
+        if not data:
+            return False
+        return cls.objects.filter(ano=data.year, mes=data.month).exists()
+
+    @classmethod
+    def filtro_fechados(cls, campo='data_apontamento'):
+        """Q que seleciona registros cuja data cai em algum mês fechado."""
+        filtro = models.Q(pk__in=[])
+        for ano, mes in cls.objects.values_list('ano', 'mes'):
+            filtro |= models.Q(**{f'{campo}__year': ano, f'{campo}__month': mes})
+        return filtro
+
+
+class FechamentoResumo(models.Model):
+    """
+    Totais congelados de um colaborador na competência fechada.
+    Nunca são recalculados: relatórios do período leem apenas esta tabela.
+    """
+    fechamento = models.ForeignKey(
+        FechamentoPeriodo, on_delete=models.CASCADE, related_name='resumos', verbose_name="Fechamento"
+    )
+    colaborador = models.ForeignKey(
+        Colaborador, on_delete=models.PROTECT, related_name='+', verbose_name="Colaborador"
+    )
+
+    total_minutos = models.PositiveIntegerField(default=0, verbose_name="Total (minutos)")
+    qtd_registros = models.PositiveIntegerField(default=0, verbose_name="Qtd. Registros")
+    dias_plantao = models.PositiveSmallIntegerField(default=0, verbose_name="Dias de Plantão")
+    dias_dorme_fora = models.PositiveSmallIntegerField(default=0, verbose_name="Dias de Dorme-Fora")
+
+    # Minutos por destino de custo (Obra/Cliente/Centro de Custo)
+    rateio = models.JSONField(default=dict, verbose_name="Rateio (minutos por destino)")
+
+    class Meta:
+        verbose_name = "Resumo do Fechamento"
+        verbose_name_plural = "Resumos do Fechamento"
+        ordering = ['colaborador__nome_completo']
+        constraints = [
+            models.UniqueConstraint(fields=['fechamento', 'colaborador'], name='resumo_fechamento_colab_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.fechamento} - {self.colaborador}"
+
+    @property
+    def total_horas_str(self):
+        return f"{self.total_minutos // 60:02d}:{self.total_minutos % 60:02d}"
+
+
+# ==============================================================================
+# EVENTOS DO DASHBOARD (CANAL SSE ENTRE WORKERS)
+# Cada alteração em Apontamento grava aqui o delta dos KPIs do dia.
+# Os workers leem a tabela por ID crescente e repassam aos clientes conectados.
+# ==============================================================================
+
+class EventoDashboard(models.Model):
+    TIPO_CHOICES = [
+        ('CRIADO', 'Criado'),
+        ('EDITADO', 'Editado'),
+        ('APROVACAO', 'Aprovação'),
+        ('EXCLUIDO', 'Excluído'),
+    ]
+
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES, verbose_name="Tipo")
+    data_apontamento = models.DateField(verbose_name="Data do Apontamento")
+    apontamento_id = models.BigIntegerField(verbose_name="ID do Apontamento")
+
+    # {'minutos': int, 'registros': int, 'colaboradores': {nome: int}, 'projetos': {nome: int}, 'status': str}
+    delta = models.JSONField(default=dict, verbose_name="Delta dos KPIs")
+    criado_em = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Criado em")
+
+    class Meta:
+        verbose_name = "Evento do Dashboard"
+        verbose_name_plural = "Eventos do Dashboard"
+        ordering = ['id']
+
+    def __str__(self):
+        return f"#{self.id} {self.tipo} ({self.data_apontamento:%d/%m/%Y})"
+
+
+# ==============================================================================
+# IMPORTAÇÃO DE PLANILHAS LEGADAS (CHECKPOINT)
+# Cada lote gravado atualiza o checkpoint na mesma transação: uma importação
+# interrompida continua da última posição confirmada, sem duplicar registros.
+# ==============================================================================
+
+class ImportacaoLegado(models.Model):
+    assinatura = models.CharField(max_length=64, unique=True, verbose_name="Assinatura (SHA-256 do arquivo)")
+    nome_arquivo = models.CharField(max_length=255, verbose_name="Arquivo")
+
+    # Contagem de linhas de dados lidas (todas as abas, em ordem) até o último lote gravado
+    ultima_posicao = models.PositiveIntegerField(default=0, verbose_name="Última Posição Confirmada")
+    importados = models.PositiveIntegerField(default=0, verbose_name="Registros Importados")
+    rejeitados = models.PositiveIntegerField(default=0, verbose_name="Linhas Rejeitadas")
+
+    iniciado_por = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Iniciado Por"
+    )
+    iniciado_em = models.DateTimeField(auto_now_add=True, verbose_name="Iniciado em")
+    atualizado_em = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
+    concluido_em = models.DateTimeField(null=True, blank=True, verbose_name="Concluído em")
+
+    class Meta:
+        verbose_name = "Importação de Planilha Legada"
+        verbose_name_plural = "Importações de Planilhas Legadas"
+        ordering = ['-iniciado_em']
+
+    def __str__(self):
+        return f"{self.nome_arquivo} ({self.importados} registros)"
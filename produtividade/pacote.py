@@ -0,0 +1,171 @@
+"""
+Pacote de fechamento: uma planilha do relatório de horas por setor (ou por projeto),
+entregue num único ZIP.
+
+Cada planilha é montada num processo separado (ProcessPoolExecutor com contexto
+'spawn': nada é herdado do worker web). Cada processo abre a sua própria conexão ao
+banco, em modo somente leitura (PRAGMA query_only no SQLite). O ZIP é enviado em
+streaming à medida que as planilhas ficam prontas. Com banco em memória ou
+um único grupo, as planilhas são geradas no próprio processo.
+
+Só um pacote por vez usa o pool, em toda a máquina (trava em PACOTE_TRAVA_PATH,
+compartilhada pelos workers web e pelo comando exportar_pacote): pedidos simultâneos
+geram as suas planilhas em série, no próprio processo, em vez de abrir mais um pool
+com um processo por núcleo cada.
+
+Os imports de models/relatorio ficam dentro das funções: o processo filho importa
+este módulo para desserializar o initializer antes de o Django estar configurado.
+"""
+import io
+import logging
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db import connection
+from django.utils.text import slugify
+
+from .trava import TravaOcupada, trava_exclusiva
+
+logger = logging.getLogger(__name__)
+
+# Abaixo deste volume de apontamentos no período o pacote é gerado no próprio processo
+MIN_REGISTROS_PARALELO = 5000
+
+# agrupamento -> (campo da chave, campos do rótulo, rótulo dos registros sem grupo)
+AGRUPAMENTOS = {
+    'setor': ('colaborador__setor_id', ('colaborador__setor__nome',), 'Sem setor'),
+    'projeto': ('projeto_id', ('projeto__codigo', 'projeto__nome'), 'Sem projeto'),
+}
+
+
+def _iniciar_processo(nome_banco):
+    import django
+    from django.conf import settings
+
+    # O mesmo arquivo do processo pai (que pode ser o banco de testes, trocado em tempo de execução)
+    settings.DATABASES['default']['NAME'] = nome_banco
+    django.setup()
+
+    from django.db.backends.signals import connection_created
+
+    connection_created.connect(_somente_leitura)
+
+
+def _somente_leitura(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA query_only = ON')
+
+
+def grupos_do_periodo(filtros, agrupamento):
+    """[(chave, rótulo)] dos grupos com registros no período, tabela principal e arquivo."""
+    from .models import Apontamento, ApontamentoArquivado
+
+    campo, campos_rotulo, sem_grupo = AGRUPAMENTOS[agrupamento]
+    grupos = {}
+    for model in (Apontamento, ApontamentoArquivado):
+        for chave, *rotulo in model.objects.filter(**filtros).values_list(campo, *campos_rotulo).distinct():
+            grupos[chave] = ' - '.join(str(parte) for parte in rotulo if parte) or sem_grupo
+    return sorted(grupos.items(), key=lambda item: item[1].lower())
+
+
+def _tarefas(filtros, agrupamento):
+    """(filtros do grupo, nome do arquivo) para cada grupo; nomes únicos dentro do ZIP."""
+    campo = AGRUPAMENTOS[agrupamento][0]
+    nomes = set()
+    for chave, rotulo in grupos_do_periodo(filtros, agrupamento):
+        filtro_grupo = {campo: chave} if chave is not None else {f'{campo}__isnull': True}
+        nome = slugify(rotulo) or 'grupo'
+        if nome in nomes:
+            nome = f'{nome}-{chave}'
+        nomes.add(nome)
+        yield {**filtros, **filtro_grupo}, f'{nome}.xlsx'
+
+
+def gerar_planilha(filtros, nome_arquivo):
+    """Executado no processo filho: (nome do arquivo, conteúdo .xlsx)."""
+    from .relatorio import planilha_relatorio, registros_filtrados
+
+    buffer = io.BytesIO()
+    planilha_relatorio(registros_filtrados(filtros)).save(buffer)
+    return nome_arquivo, buffer.getvalue()
+
+
+def _registros_no_periodo(filtros):
+    from .models import Apontamento, ApontamentoArquivado
+
+    return sum(model.objects.filter(**filtros).count() for model in (Apontamento, ApontamentoArquivado))
+
+
+def planilhas(filtros, agrupamento='setor', processos=None):
+    """
+    Gera (nome, conteúdo) de cada planilha do pacote, na ordem em que ficam prontas.
+    processos=None: um por núcleo, ou nenhum processo extra em períodos pequenos (subir
+    um processo com o Django custa mais que montar algumas planilhas pequenas). Nunca
+    mais processos que núcleos, e em série se outro pacote já estiver usando o pool.
+    """
+    tarefas = list(_tarefas(filtros, agrupamento))
+    if processos is None and _registros_no_periodo(filtros) < MIN_REGISTROS_PARALELO:
+        processos = 1
+    nucleos = os.cpu_count() or 1
+    processos = min(processos or nucleos, nucleos, len(tarefas))
+
+    if processos > 1 and not (connection.vendor == 'sqlite' and connection.is_in_memory_db()):
+        try:
+            with trava_exclusiva(settings.PACOTE_TRAVA_PATH):
+                yield from _em_paralelo(tarefas, processos)
+            return
+        except TravaOcupada:
+            logger.warning("Outro pacote já está usando os processos paralelos; gerando este em série.")
+
+    for tarefa in tarefas:
+        yield gerar_planilha(*tarefa)
+
+
+def _em_paralelo(tarefas, processos):
+    pool = ProcessPoolExecutor(
+        max_workers=processos,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_iniciar_processo,
+        initargs=(connection.settings_dict['NAME'],),
+    )
+    try:
+        futuros = [pool.submit(gerar_planilha, *tarefa) for tarefa in tarefas]
+        for futuro in as_completed(futuros):
+            yield futuro.result()
+    finally:
+        # Download cancelado: descarta as planilhas que ainda não começaram
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+class _SaidaZip:
+    """Destino não pesquisável do ZipFile: acumula os bytes até o próximo yield."""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def drenar(self):
+        dados = b''.join(self.partes)
+        self.partes.clear()
+        return dados
+
+
+def zip_em_streaming(arquivos):
+    """Monta o ZIP a partir de (nome, conteúdo), devolvendo os bytes em partes."""
+    saida = _SaidaZip()
+    # .xlsx já é compactado: ZIP_STORED evita gastar CPU à toa
+    with zipfile.ZipFile(saida, 'w', compression=zipfile.ZIP_STORED) as pacote:
+        for nome, conteudo in arquivos:
+            pacote.writestr(nome, conteudo)
+            yield saida.drenar()
+    yield saida.drenar()
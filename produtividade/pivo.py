@@ -0,0 +1,360 @@
+"""
+Tabela dinâmica de horas (colaborador x obra x dia/semana/mês...) calculada com NumPy.
+
+O período é lido uma única vez do banco (tabela principal + arquivo) e guardado em
+arrays compactos: uma linha por participante de cada apontamento (titular, auxiliar e
+auxiliares extras recebem as horas do registro, como no fechamento), com códigos
+inteiros para colaborador e obra, o dia como deslocamento desde o início do período
+e a duração já calculada no SQL (virada de dia incluída, ver series.MinutosIntervalo),
+junto com o minuto do dia em que o registro começa e o status de aprovação (usados
+pela folha, ver folha.py). A base traz todos os status; quem consome decide o que
+entra (BasePivo.filtrar). Fica em cache com as mesmas tags por mês das séries temporais.
+
+Qualquer combinação de dimensões é então agregada de forma vetorizada: os códigos das
+dimensões viram um índice único (ravel_multi_index) e as horas são somadas com
+bincount, sem laços em Python por registro.
+"""
+from datetime import timedelta
+
+import numpy as np
+import openpyxl
+from django.db.models import CharField
+from django.db.models.functions import Cast
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+from .cache_tags import obter_ou_calcular, tag_mes
+from .models import (
+    Apontamento, ApontamentoArquivado, CentroCusto, CodigoCliente, Colaborador, Projeto, Setor
+)
+from .series import MinutoDoDia, MinutosIntervalo, periodos_do_intervalo
+
+DIMENSOES = {
+    'colaborador': 'Colaborador',
+    'setor': 'Setor',
+    'obra': 'Obra / Destino',
+    'papel': 'Participação',
+    'dia': 'Dia',
+    'semana': 'Semana',
+    'mes': 'Mês',
+}
+# Dimensões de tempo: colunas na ordem do calendário, inclusive períodos sem horas
+DIMENSOES_TEMPO = ('dia', 'semana', 'mes')
+
+# Acima disso o resultado não cabe numa planilha legível (nem numa resposta JSON razoável)
+MAX_CELULAS = 2_000_000
+
+TIMEOUT_BASE = 60 * 60
+
+TAGS_CADASTROS = (
+    'catalog:colaborador', 'catalog:setor', 'catalog:projeto', 'catalog:cliente', 'catalog:centro_custo'
+)
+
+CAMPOS_BASE = (
+    'id', 'colaborador_id', 'auxiliar_id', 'data_texto', 'local_execucao',
+    'projeto_id', 'codigo_cliente_id', 'centro_custo_id', 'minutos', 'inicio_minuto', 'status_aprovacao',
+)
+
+# Códigos do array 'status' da base (posição em STATUS_APROVACAO_CHOICES)
+STATUS = tuple(chave for chave, _ in Apontamento.STATUS_APROVACAO_CHOICES)
+
+
+# ==============================================================================
+# BASE (ARRAYS DO PERÍODO)
+# ==============================================================================
+
+class BasePivo:
+    """
+    Arrays de um período, alinhados (uma posição por participante de um apontamento):
+    dia (desde 'inicio'), pessoa e destino (códigos), minutos, auxiliar (bool),
+    inicio_minuto (minuto do dia da hora de início) e status (código em STATUS).
+    """
+
+    def __init__(self, inicio, fim, dia, pessoa, destino, minutos, auxiliar, pessoas, setor_pessoa, setores, destinos,
+                 inicio_minuto, status):
+        self.inicio, self.fim = inicio, fim
+        self.dia, self.pessoa, self.destino = dia, pessoa, destino
+        self.minutos, self.auxiliar, self.inicio_minuto = minutos, auxiliar, inicio_minuto
+        self.status = status
+        self.pessoas = pessoas            # código -> nome
+        self.setor_pessoa = setor_pessoa  # código da pessoa -> código do setor
+        self.setores = setores            # código -> nome
+        self.destinos = destinos          # código -> rótulo (OBRA / CLIENTE / CC)
+
+    def __len__(self):
+        return len(self.minutos)
+
+    @property
+    def dias(self):
+        return (self.fim - self.inicio).days + 1
+
+    def filtrar(self, mascara):
+        """Nova base só com as posições de 'mascara' (mesmos cadastros e códigos)."""
+        return BasePivo(
+            self.inicio, self.fim,
+            dia=self.dia[mascara], pessoa=self.pessoa[mascara], destino=self.destino[mascara],
+            minutos=self.minutos[mascara], auxiliar=self.auxiliar[mascara],
+            pessoas=self.pessoas, setor_pessoa=self.setor_pessoa, setores=self.setores, destinos=self.destinos,
+            inicio_minuto=self.inicio_minuto[mascara], status=self.status[mascara],
+        )
+
+
+def _ler_registros(inicio, fim):
+    """Colunas dos apontamentos do período (duas tabelas) e pares (apontamento, auxiliar extra)."""
+    filtro = {'data_apontamento__gte': inicio, 'data_apontamento__lte': fim}
+    registros = []
+    for model in (Apontamento, ApontamentoArquivado):
+        # Data como texto ISO: o NumPy converte o array inteiro de uma vez (sem um date() por linha)
+        registros += model.objects.filter(**filtro).order_by().annotate(
+            minutos=MinutosIntervalo(), inicio_minuto=MinutoDoDia('hora_inicio'),
+            data_texto=Cast('data_apontamento', CharField()),
+        ).values_list(*CAMPOS_BASE)
+
+    extras = list(Apontamento.auxiliares_extras.through.objects.filter(
+        apontamento__data_apontamento__gte=inicio, apontamento__data_apontamento__lte=fim
+    ).values_list('apontamento_id', 'colaborador_id'))
+    extras += ApontamentoArquivado.auxiliares_extras.through.objects.filter(
+        apontamentoarquivado__data_apontamento__gte=inicio, apontamentoarquivado__data_apontamento__lte=fim
+    ).values_list('apontamentoarquivado_id', 'colaborador_id')
+    return registros, extras
+
+
+def _destinos(local, projeto, cliente, centro):
+    """
+    Código do destino de custo de cada registro (mesma regra de fechamento.destino_custo:
+    obra > cliente > centro de custo fora da obra) e os rótulos dos códigos.
+    """
+    tipo = np.select([projeto >= 0, cliente >= 0, (local == 1) & (centro >= 0)], [0, 1, 2], 3)
+    ref = np.select([tipo == 0, tipo == 1, tipo == 2], [projeto, cliente, centro], 0)
+    chaves, codigo = np.unique(tipo.astype(np.int64) << 32 | ref, return_inverse=True)
+
+    nomes = {
+        0: ('OBRA', dict(Projeto.objects.values_list('pk', 'codigo'))),
+        1: ('CLIENTE', dict(CodigoCliente.objects.values_list('pk', 'codigo'))),
+        2: ('CC', dict(CentroCusto.objects.values_list('pk', 'nome'))),
+    }
+    rotulos = []
+    for chave in chaves.tolist():
+        tipo_chave, ref_chave = chave >> 32, chave & 0xFFFFFFFF
+        if tipo_chave == 3:
+            rotulos.append("NÃO INFORMADO")
+        else:
+            prefixo, catalogo = nomes[tipo_chave]
+            rotulos.append(f"{prefixo} {catalogo.get(ref_chave, ref_chave)}")
+    return codigo.astype(np.int32), rotulos
+
+
+def carregar_base(inicio, fim):
+    """Lê o período do banco e monta a BasePivo (sem cache; ver base_do_periodo)."""
+    registros, extras = _ler_registros(inicio, fim)
+    if registros:
+        ids, colab, aux, datas, local, projeto, cliente, centro, minutos, inicio_minuto, status = zip(*registros)
+    else:
+        ids = colab = aux = datas = local = projeto = cliente = centro = minutos = inicio_minuto = status = ()
+
+    def inteiros(valores):
+        return np.array([-1 if v is None else v for v in valores], dtype=np.int64)
+
+    ids, colab, aux = np.array(ids, dtype=np.int64), np.array(colab, dtype=np.int64), inteiros(aux)
+    dia = (np.array(datas, dtype='datetime64[D]') - np.datetime64(inicio, 'D')).astype(np.int32)
+    minutos = np.array(minutos, dtype=np.int32)
+    inicio_minuto = np.array(inicio_minuto, dtype=np.int32)
+    codigo_status = {chave: i for i, chave in enumerate(STATUS)}
+    status = np.array([codigo_status.get(v, -1) for v in status], dtype=np.int8)
+    destino, destinos = _destinos(
+        np.array([v == 'EXT' for v in local], dtype=bool), inteiros(projeto), inteiros(cliente), inteiros(centro)
+    )
+
+    # Participantes: titular, auxiliar principal e auxiliares extras (posição do registro + colaborador)
+    posicao = np.arange(len(ids))
+    com_aux = aux >= 0
+    partes_pos = [posicao, posicao[com_aux]]
+    partes_pessoa = [colab, aux[com_aux]]
+    if extras:
+        ap_extra, colab_extra = (np.array(v, dtype=np.int64) for v in zip(*extras))
+        ordem = np.argsort(ids)
+        partes_pos.append(ordem[np.searchsorted(ids, ap_extra, sorter=ordem)])
+        partes_pessoa.append(colab_extra)
+    pos = np.concatenate(partes_pos)
+    pessoa_id = np.concatenate(partes_pessoa)
+    auxiliar = np.arange(len(pos)) >= len(ids)
+
+    # A mesma pessoa duas vezes no registro conta uma vez (titular tem prioridade: vem primeiro)
+    _, primeiros = np.unique(pos << 32 | pessoa_id, return_index=True)
+    pos, pessoa_id, auxiliar = pos[primeiros], pessoa_id[primeiros], auxiliar[primeiros]
+
+    ids_pessoas, pessoa = np.unique(pessoa_id, return_inverse=True)
+    cadastro = {
+        pk: (nome, setor_id) for pk, nome, setor_id in
+        Colaborador.objects.filter(pk__in=ids_pessoas.tolist()).values_list('pk', 'nome_completo', 'setor_id')
+    }
+    nomes_setores = dict(Setor.objects.values_list('pk', 'nome'))
+    setores = ['Sem setor'] + sorted(set(nomes_setores.values()))
+    codigo_setor = {nome: i for i, nome in enumerate(setores)}
+
+    pessoas, setor_pessoa = [], []
+    for pk in ids_pessoas.tolist():
+        nome, setor_id = cadastro.get(pk, (str(pk), None))
+        pessoas.append(nome)
+        setor_pessoa.append(codigo_setor[nomes_setores.get(setor_id, 'Sem setor')])
+
+    return BasePivo(
+        inicio, fim,
+        dia=dia[pos], pessoa=pessoa.astype(np.int32), destino=destino[pos],
+        minutos=minutos[pos], auxiliar=auxiliar,
+        pessoas=pessoas, setor_pessoa=np.array(setor_pessoa, dtype=np.int32),
+        setores=setores, destinos=destinos, inicio_minuto=inicio_minuto[pos], status=status[pos],
+    )
+
+
+def base_do_periodo(inicio, fim):
+    """BasePivo do período, em cache até algum apontamento dos meses envolvidos mudar."""
+    tags = [tag_mes(mes) for mes in periodos_do_intervalo(inicio, fim, 'mes')] + list(TAGS_CADASTROS)
+    return obter_ou_calcular(
+        f'pivo:base:v3:{inicio:%Y%m%d}:{fim:%Y%m%d}', lambda: carregar_base(inicio, fim),
+        tags=tags, timeout=TIMEOUT_BASE,
+    )
+
+
+# ==============================================================================
+# PIVÔ
+# ==============================================================================
+
+def _dimensao(base, nome, filtro):
+    """(código de cada linha da base na dimensão, rótulo de cada código)."""
+    if nome == 'colaborador':
+        return base.pessoa[filtro], base.pessoas
+    if nome == 'setor':
+        return base.setor_pessoa[base.pessoa[filtro]], base.setores
+    if nome == 'obra':
+        return base.destino[filtro], base.destinos
+    if nome == 'papel':
+        return base.auxiliar[filtro].astype(np.int32), ['Titular', 'Auxiliar']
+    if nome == 'dia':
+        return base.dia[filtro], [f"{base.inicio + timedelta(days=i):%d/%m/%Y}" for i in range(base.dias)]
+    if nome == 'semana':
+        deslocamento = base.inicio.weekday()
+        semanas = periodos_do_intervalo(base.inicio, base.fim, 'semana')
+        return (base.dia[filtro] + deslocamento) // 7, [f"Semana {s:%d/%m/%Y}" for s in semanas]
+    # mes: mês de cada dia do período, indexado pelo deslocamento do dia
+    dias = np.datetime64(base.inicio, 'D') + np.arange(base.dias)
+    meses = dias.astype('datetime64[M]').astype(np.int64)
+    mes_do_dia = (meses - meses[0]).astype(np.int32)
+    return mes_do_dia[base.dia[filtro]], [f"{m:%m/%Y}" for m in periodos_do_intervalo(base.inicio, base.fim, 'mes')]
+
+
+def _horas(minutos):
+    return np.round(minutos / 60, 2)
+
+
+def pivotar(base, linhas, coluna=None, auxiliares=True):
+    """
+    Horas por combinação das dimensões de 'linhas' (em linhas) e de 'coluna' (em colunas).
+    auxiliares=False: só as horas dos titulares. ValueError para combinações inválidas.
+    """
+    linhas = list(linhas)
+    if not linhas:
+        raise ValueError("Informe ao menos uma dimensão para as linhas.")
+    invalidas = [d for d in (*linhas, coluna) if d is not None and d not in DIMENSOES]
+    if invalidas:
+        raise ValueError(f"Dimensões inválidas: {', '.join(invalidas)}. Use: {', '.join(DIMENSOES)}.")
+    if len(set(linhas)) != len(linhas) or coluna in linhas:
+        raise ValueError("Cada dimensão pode aparecer uma única vez.")
+
+    filtro = slice(None) if auxiliares else ~base.auxiliar
+    minutos = base.minutos[filtro].astype(np.int64)
+
+    codigos, rotulos = [], []
+    for nome in linhas:
+        c, r = _dimensao(base, nome, filtro)
+        codigos.append(c.astype(np.int64))
+        rotulos.append(r)
+    chave = np.ravel_multi_index(codigos, [max(len(r), 1) for r in rotulos])
+    combinacoes, linha_de = np.unique(chave, return_inverse=True)
+
+    if coluna is None:
+        coluna_de, colunas = np.zeros(len(minutos), dtype=np.int64), ['Total']
+    else:
+        coluna_de, rotulos_coluna = _dimensao(base, coluna, filtro)
+        if coluna in DIMENSOES_TEMPO:
+            colunas = rotulos_coluna
+        else:
+            # Categorias sem horas no período não viram colunas
+            presentes, coluna_de = np.unique(coluna_de, return_inverse=True)
+            colunas = [rotulos_coluna[i] for i in presentes.tolist()]
+
+    if len(combinacoes) * len(colunas) > MAX_CELULAS:
+        raise ValueError("Combinação grande demais: reduza o período ou o número de dimensões.")
+
+    matriz = np.bincount(
+        linha_de * len(colunas) + coluna_de, weights=minutos, minlength=len(combinacoes) * len(colunas)
+    ).reshape(len(combinacoes), len(colunas))
+
+    # Linhas em ordem alfabética (dimensões de tempo em ordem do calendário)
+    partes = np.unravel_index(combinacoes, [max(len(r), 1) for r in rotulos])
+    chaves_ordem = [
+        codigo.tolist() if nome in DIMENSOES_TEMPO else [r[i].lower() for i in codigo.tolist()]
+        for nome, codigo, r in zip(linhas, partes, rotulos)
+    ]
+    ordem = sorted(range(len(combinacoes)), key=lambda i: [k[i] for k in chaves_ordem])
+    nomes_linha = [[r[i] for i in codigo.tolist()] for codigo, r in zip(partes, rotulos)]
+
+    horas = _horas(matriz)
+    total_linha = _horas(matriz.sum(axis=1))
+    return {
+        'inicio': base.inicio.isoformat(),
+        'fim': base.fim.isoformat(),
+        'linhas': linhas,
+        'coluna': coluna,
+        'auxiliares': auxiliares,
+        'colunas': colunas,
+        'dados': [
+            {
+                'chaves': [nomes[i] for nomes in nomes_linha],
+                'horas': horas[i].tolist(),
+                'total': float(total_linha[i]),
+            }
+            for i in ordem
+        ],
+        'totais': _horas(matriz.sum(axis=0)).tolist(),
+        'total_geral': float(_horas(matriz.sum())),
+    }
+
+
+# ==============================================================================
+# PLANILHA
+# ==============================================================================
+
+def planilha_pivo(resultado, titulo="Horas"):
+    """Workbook da tabela dinâmica: cabeçalho destacado, totais em negrito e painéis congelados."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = titulo
+
+    dims = resultado['linhas']
+    ws.append([DIMENSOES[d] for d in dims] + resultado['colunas'] + ['Total'])
+    for cell in ws[1]:
+        cell.font = Font(bold=True, color="FFFFFF")
+        cell.fill = PatternFill(start_color="4F46E5", end_color="4F46E5", fill_type="solid")
+        cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+
+    for item in resultado['dados']:
+        ws.append(item['chaves'] + item['horas'] + [item['total']])
+    ws.append(['Total'] + [''] * (len(dims) - 1) + resultado['totais'] + [resultado['total_geral']])
+    for cell in ws[ws.max_row]:
+        cell.font = Font(bold=True)
+
+    primeira_valor = len(dims) + 1
+    for row in ws.iter_rows(min_row=2, min_col=primeira_valor):
+        for cell in row:
+            cell.number_format = '0.00'
+    for cell in ws.iter_rows(min_row=2, min_col=ws.max_column, max_col=ws.max_column):
+        cell[0].font = Font(bold=True)
+
+    for i, _ in enumerate(dims, start=1):
+        largura = max((len(str(item['chaves'][i - 1])) for item in resultado['dados']), default=10)
+        ws.column_dimensions[get_column_letter(i)].width = max(largura, len(DIMENSOES[dims[i - 1]])) + 2
+    for i in range(primeira_valor, ws.max_column + 1):
+        ws.column_dimensions[get_column_letter(i)].width = 12
+    ws.freeze_panes = ws.cell(row=2, column=primeira_valor)
+    return wb
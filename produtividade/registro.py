@@ -0,0 +1,97 @@
+"""
+Gravação de apontamentos com verificação de conflito de horário na mesma transação.
+
+O clean() do ApontamentoForm dá o retorno imediato ao usuário, mas roda fora da
+transação do save(): dois envios simultâneos para o mesmo colaborador (ex: o
+administrativo e o próprio colaborador lançando o dia) passariam ambos. Aqui a
+verificação e a escrita acontecem numa única transação curta:
+
+- SQLite: DATABASES usa transaction_mode IMMEDIATE, então o BEGIN já reserva o lock
+  de escrita; o segundo envio espera o primeiro terminar e enxerga o registro gravado.
+- Bancos com lock de linha: SELECT ... FOR UPDATE na linha do colaborador serializa
+  os envios do mesmo colaborador sem bloquear os demais (no SQLite é ignorado).
+"""
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import Apontamento, Colaborador
+from .series import MinutosIntervalo
+
+
+class ConflitoHorario(ValidationError):
+    """O intervalo se sobrepõe a outro apontamento do colaborador ('conflito')."""
+
+    def __init__(self, conflito):
+        self.conflito = conflito
+        super().__init__("Conflito de horário detectado.", code='conflito_horario')
+
+
+def _minuto_absoluto(data, hora):
+    return data.toordinal() * 1440 + hora.hour * 60 + hora.minute
+
+
+def conflitos_horario(colaborador_id, data_apontamento, inicio, termino, excluir_pk=None):
+    """
+    Apontamentos do colaborador que se sobrepõem ao intervalo [inicio, termino) do dia.
+    Considera a virada de dia (ex: 22h às 02h) nos dois lados: os candidatos vêm da
+    véspera ao dia seguinte e são comparados em minutos absolutos.
+    """
+    comeco = _minuto_absoluto(data_apontamento, inicio)
+    fim = comeco + (_minuto_absoluto(data_apontamento, termino) - comeco) % 1440
+    candidatos = Apontamento.objects.filter(
+        colaborador_id=colaborador_id,
+        data_apontamento__gte=data_apontamento - timedelta(days=1),
+        data_apontamento__lte=data_apontamento + timedelta(days=1),
+    )
+    if excluir_pk:
+        candidatos = candidatos.exclude(pk=excluir_pk)
+    sobrepostos = []
+    for pk, data, hora_inicio, minutos in candidatos.annotate(minutos=MinutosIntervalo()).values_list(
+        'pk', 'data_apontamento', 'hora_inicio', 'minutos'
+    ):
+        comeco_outro = _minuto_absoluto(data, hora_inicio)
+        if comeco_outro < fim and comeco < comeco_outro + minutos:
+            sobrepostos.append(pk)
+    if not sobrepostos:
+        return Apontamento.objects.none()
+    return Apontamento.objects.filter(pk__in=sobrepostos).order_by('data_apontamento', 'hora_inicio')
+
+
+@contextmanager
+def escrita_colaborador(colaborador_id):
+    """Transação de escrita serializada por colaborador (ver docstring do módulo)."""
+    with transaction.atomic():
+        list(Colaborador.objects.select_for_update().filter(pk=colaborador_id).values_list('pk'))
+        yield
+
+
+def verificar_conflito(apontamento):
+    """Levanta ConflitoHorario se o apontamento (novo ou editado) sobrepõe outro já gravado."""
+    inicio, termino = apontamento.hora_inicio, apontamento.hora_termino
+    if not (inicio and termino):
+        return
+    conflito = conflitos_horario(
+        apontamento.colaborador_id, apontamento.data_apontamento, inicio, termino, apontamento.pk
+    ).select_related('projeto', 'codigo_cliente', 'centro_custo').first()
+    if conflito:
+        raise ConflitoHorario(conflito)
+
+
+def gravar_apontamentos(apontamentos, auxiliares_extras=None):
+    """
+    Grava apontamentos novos do mesmo colaborador (registro único ou rateio) de forma
+    atômica: ou todos passam na verificação de conflito e são salvos, ou nenhum.
+    auxiliares_extras: IDs aplicados a todos os registros gravados.
+    """
+    if not apontamentos:
+        return []
+    with escrita_colaborador(apontamentos[0].colaborador_id):
+        for apontamento in apontamentos:
+            verificar_conflito(apontamento)
+            apontamento.save()
+            if auxiliares_extras:
+                apontamento.auxiliares_extras.set(auxiliares_extras)
+    return apontamentos
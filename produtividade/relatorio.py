@@ -0,0 +1,165 @@
+"""
+Relatório de horas (Excel/CSV): filtros, formatação das linhas e montagem da planilha.
+
+Usado pelas exportações em views.py, pela ação de exportação do admin e pelos processos
+do pacote por setor/projeto (produtividade/pacote.py), que importam só este módulo.
+"""
+from datetime import timedelta
+
+import openpyxl
+from django.utils import timezone
+from openpyxl.styles import Alignment, Font, PatternFill
+
+from .linhas import linhas_apontamentos, local_e_codigos
+from .models import Apontamento, ApontamentoArquivado
+
+
+CABECALHO_RELATORIO = [
+    "Data", "Dia Semana", "Colaborador", "Cargo", "Tipo", 
+    "Local (Obra/Setor)", "Código de Obra", "Código Cliente", 
+    "Veículo", "Placa", "Hora Início", "Hora Fim", "Total Horas", 
+    "Plantão", "Dorme Fora", "Observações", "Registrado Por", 'Latitude', 'Longitude'
+]
+
+DIAS_SEMANA_PT = {
+    0: 'Segunda-feira', 1: 'Terça-feira', 2: 'Quarta-feira',
+    3: 'Quinta-feira', 4: 'Sexta-feira', 5: 'Sábado', 6: 'Domingo'
+}
+
+def format_duration(inicio, fim):
+    """Calcula a duração considerando virada de dia."""
+    if not inicio or not fim: return "00:00:00"
+    dummy_date = timezone.now().date()
+    dt_inicio = timezone.datetime.combine(dummy_date, inicio)
+    dt_fim = timezone.datetime.combine(dummy_date, fim)
+    
+    if dt_fim < dt_inicio:
+        dt_fim += timedelta(days=1)
+
+    diff = dt_fim - dt_inicio
+    total_seconds = int(diff.total_seconds())
+    hours = total_seconds // 3600
+    minutes = (total_seconds % 3600) // 60
+    seconds = total_seconds % 60
+    return f"{hours:02}:{minutes:02}:{seconds:02}"
+
+def filtros_relatorio(params):
+    """
+    Filtros do relatório a partir da querystring: start_date/end_date (AAAA-MM-DD),
+    setor (id) e projeto (id).
+    """
+    filtros = {}
+    start_date_str = params.get('start_date')
+    end_date_str = params.get('end_date')
+    if start_date_str and end_date_str:
+        try:
+            filtros['data_apontamento__gte'] = timezone.datetime.strptime(start_date_str, '%Y-%m-%d').date()
+            filtros['data_apontamento__lte'] = timezone.datetime.strptime(end_date_str, '%Y-%m-%d').date()
+        except ValueError:
+            filtros = {}
+
+    setor_id = params.get('setor')
+    if setor_id and setor_id.isdigit():
+        filtros['colaborador__setor_id'] = int(setor_id)
+
+    projeto_id = params.get('projeto')
+    if projeto_id and projeto_id.isdigit():
+        filtros['projeto_id'] = int(projeto_id)
+    return filtros
+
+
+def registros_filtrados(filtros):
+    """Apontamentos do relatório (tabela principal + arquivo) em ordem de data."""
+    queryset = Apontamento.objects.filter(**filtros)
+    arquivados = ApontamentoArquivado.objects.filter(**filtros)
+
+    # Linhas já expandidas (principal + auxiliares), lidas em blocos: memória constante
+    return linhas_apontamentos(queryset, arquivados)
+
+
+def linhas_relatorio(linhas):
+    """Formata as linhas do relatório (Excel/CSV): auxiliares aparecem como 'Carona'."""
+    for linha in linhas:
+        data_fmt = linha.data_apontamento.strftime('%d/%m/%Y')
+        dia_semana = DIAS_SEMANA_PT[linha.data_apontamento.weekday()]
+
+        # Local
+        tipo, local_nome, col_codigo_obra, col_codigo_cliente = local_e_codigos(linha)
+        col_codigo_obra = col_codigo_obra or ""
+        col_codigo_cliente = col_codigo_cliente or ""
+
+        if col_codigo_obra and len(col_codigo_obra) >= 5:
+             col_codigo_cliente = col_codigo_obra[1:5]
+        elif col_codigo_obra:
+             col_codigo_cliente = col_codigo_obra
+
+        duracao_str = format_duration(linha.hora_inicio, linha.hora_termino)
+        reg_por = linha.registrado_por_username or "Sistema"
+
+        # Apenas Status SIM/NÃO
+        plantao_str = "SIM" if linha.em_plantao else "NÃO"
+        dorme_fora_str = "SIM" if linha.dorme_fora else "NÃO"
+
+        if linha.is_auxiliar:
+            # Linha Auxiliar (Carona)
+            yield [
+                data_fmt, dia_semana, linha.colaborador, linha.cargo,
+                tipo, local_nome, col_codigo_obra, col_codigo_cliente, 
+                "Carona", "", linha.hora_inicio, linha.hora_termino, 
+                duracao_str, plantao_str, dorme_fora_str, 
+                f"Auxiliar de: {linha.colaborador_principal}", reg_por
+            ]
+            continue
+
+        # Veículo
+        veiculo_nome_modelo = ""
+        veiculo_placa_only = ""
+
+        if linha.veiculo_id:
+            veiculo_nome_modelo = linha.veiculo_descricao if linha.veiculo_descricao else "Veículo da Frota"
+            veiculo_placa_only = linha.veiculo_placa
+        elif linha.veiculo_manual_modelo:
+            veiculo_nome_modelo = linha.veiculo_manual_modelo
+            veiculo_placa_only = linha.veiculo_manual_placa if linha.veiculo_manual_placa else ""
+
+        # Linha Principal (Colunas ajustadas)
+        yield [
+            data_fmt, dia_semana, linha.colaborador, linha.cargo,
+            tipo, local_nome, col_codigo_obra, col_codigo_cliente, 
+            veiculo_nome_modelo, veiculo_placa_only, linha.hora_inicio, linha.hora_termino, 
+            duracao_str, plantao_str, dorme_fora_str, 
+            linha.ocorrencias, reg_por,
+            linha.latitude, linha.longitude
+        ]
+
+
+def planilha_relatorio(linhas, titulo="Relatorio de Horas"):
+    """Workbook do relatório: cabeçalho destacado e colunas ajustadas ao conteúdo."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = titulo
+
+    # Cabeçalho
+    ws.append(CABECALHO_RELATORIO)
+
+    # Estilo do cabeçalho
+    for cell in ws[1]:
+        cell.font = Font(bold=True, color="FFFFFF")
+        cell.fill = PatternFill(start_color="4F46E5", end_color="4F46E5", fill_type="solid")
+        cell.alignment = Alignment(horizontal='center', vertical='center')
+
+    for row in linhas_relatorio(linhas):
+        ws.append(row)
+
+    # Auto-ajuste de largura das colunas
+    for col in ws.columns:
+        max_length = 0
+        column = col[0].column_letter
+        for cell in col:
+            try:
+                if len(str(cell.value)) > max_length:
+                    max_length = len(str(cell.value))
+            except: pass
+        adjusted_width = (max_length + 2)
+        ws.column_dimensions[column].width = adjusted_width
+    return wb
@@ -0,0 +1,264 @@
+"""
+Séries temporais de horas e efetivo (colaboradores distintos) para o Dashboard.
+
+A agregação acontece no banco: GROUP BY pelo período (dia, semana ou mês) e pela
+dimensão escolhida, com a duração calculada em SQL. No SQLite, as funções Trunc e
+Extract do Django são funções Python chamadas linha a linha; aqui elas são trocadas
+por date()/strftime() nativos (as_sqlite), o que mantém um ano de dados bem abaixo
+de 200 ms. Nos demais bancos valem as expressões padrão do Django.
+
+O resultado fica em cache por (intervalo, granularidade, agrupamento), com uma tag
+por mês coberto (ver cache_tags.tag_mes): gravar um apontamento de hoje não invalida
+as séries de meses anteriores.
+"""
+from datetime import date, timedelta
+
+from django.db.models import Count, DateField, Func, IntegerField, Sum
+from django.db.models.functions import ExtractHour, ExtractMinute, Trunc
+
+from .cache_tags import obter_ou_calcular, tag_mes
+from .models import Apontamento, ApontamentoArquivado, CentroCusto, CodigoCliente, Colaborador, Projeto, Setor
+
+GRANULARIDADES = ('dia', 'semana', 'mes')
+
+# agrupamento -> (campo da chave, cadastro e campos do rótulo, rótulo sem grupo, tags de cadastro)
+# Os rótulos são lidos à parte: textos no GROUP BY deixariam a ordenação bem mais cara
+AGRUPAMENTOS_SERIE = {
+    'projeto': ('projeto_id', Projeto, ('codigo', 'nome'), 'Sem projeto', ('catalog:projeto',)),
+    'codigo_cliente': ('codigo_cliente_id', CodigoCliente, ('codigo', 'nome'), 'Sem código de cliente', ('catalog:cliente',)),
+    'centro_custo': ('centro_custo_id', CentroCusto, ('nome',), 'Sem centro de custo', ('catalog:centro_custo',)),
+    'setor': ('colaborador__setor_id', Setor, ('nome',), 'Sem setor', ('catalog:setor', 'catalog:colaborador')),
+    'colaborador': ('colaborador_id', Colaborador, ('nome_completo',), '', ('catalog:colaborador',)),
+}
+
+# Uma série diária de ~3 anos; acima disso, use semana ou mês
+MAX_PERIODOS = 1100
+
+TIMEOUT_SERIE = 60 * 60
+
+
+# ==============================================================================
+# EXPRESSÕES SQL
+# ==============================================================================
+
+class MinutosIntervalo(Func):
+    """Minutos entre hora_inicio e hora_termino, com virada de dia (como fechamento.minutos_intervalo)."""
+    output_field = IntegerField()
+
+    def __init__(self, inicio='hora_inicio', fim='hora_termino'):
+        super().__init__(inicio, fim)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        inicio, fim = self.get_source_expressions()
+
+        def minutos(hora):
+            return ExtractHour(hora) * 60 + ExtractMinute(hora)
+
+        expressao = (minutos(fim) - minutos(inicio) + 1440) % 1440
+        return compiler.compile(expressao.resolve_expression(compiler.query))
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        (inicio, params_inicio), (fim, params_fim) = (
+            compiler.compile(expressao) for expressao in self.get_source_expressions()
+        )
+        # '%%' vira '%' no cursor do SQLite (mesma convenção dos lookups LIKE do Django)
+        sql = (
+            f"(((CAST(strftime('%%s', {fim}) AS INTEGER) - CAST(strftime('%%s', {inicio}) AS INTEGER))"
+            f" + 86400) %% 86400) / 60"
+        )
+        return sql, (*params_fim, *params_inicio)
+
+
+class MinutoDoDia(Func):
+    """Minuto do dia (0 a 1439) de um campo de hora."""
+    output_field = IntegerField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        hora = self.get_source_expressions()[0]
+        expressao = ExtractHour(hora) * 60 + ExtractMinute(hora)
+        return compiler.compile(expressao.resolve_expression(compiler.query))
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        hora, params = compiler.compile(self.get_source_expressions()[0])
+        return f"(CAST(strftime('%%s', {hora}) AS INTEGER) %% 86400) / 60", params
+
+
+class PeriodoSerie(Func):
+    """Primeiro dia do período (dia, semana iniciada na segunda-feira ou mês) de uma data."""
+    output_field = DateField()
+
+    MODIFICADORES_SQLITE = {
+        'dia': '',
+        'semana': ", 'weekday 0', '-6 days'",
+        'mes': ", 'start of month'",
+    }
+    TRUNC = {'dia': 'day', 'semana': 'week', 'mes': 'month'}
+
+    def __init__(self, expressao, granularidade):
+        self.granularidade = granularidade
+        super().__init__(expressao)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        expressao = Trunc(
+            self.get_source_expressions()[0], self.TRUNC[self.granularidade], output_field=DateField()
+        )
+        return compiler.compile(expressao.resolve_expression(compiler.query))
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        template = f"date(%(expressions)s{self.MODIFICADORES_SQLITE[self.granularidade]})"
+        return super().as_sql(compiler, connection, template=template, **extra_context)
+
+
+# ==============================================================================
+# AGREGAÇÃO
+# ==============================================================================
+
+def inicio_periodo(dia, granularidade):
+    """Mesmo cálculo de PeriodoSerie, em Python (para listar os períodos do intervalo)."""
+    if granularidade == 'semana':
+        return dia - timedelta(days=dia.weekday())
+    if granularidade == 'mes':
+        return dia.replace(day=1)
+    return dia
+
+
+def periodos_do_intervalo(inicio, fim, granularidade):
+    """Todos os períodos do intervalo, inclusive os sem registros (séries sem buracos)."""
+    periodos = []
+    atual = inicio_periodo(inicio, granularidade)
+    while atual <= fim:
+        periodos.append(atual)
+        if granularidade == 'mes':
+            atual = date(atual.year + atual.month // 12, atual.month % 12 + 1, 1)
+        else:
+            atual += timedelta(days=7 if granularidade == 'semana' else 1)
+    return periodos
+
+
+def _consulta(model, inicio, fim, granularidade, campos):
+    return model.objects.filter(
+        data_apontamento__gte=inicio, data_apontamento__lte=fim
+    ).order_by().annotate(periodo=PeriodoSerie('data_apontamento', granularidade)).values('periodo', *campos)
+
+
+def _agregar(inicio, fim, granularidade, campo=None, so_efetivo=False):
+    """
+    {(período, chave): {'colaboradores', 'minutos', 'apontamentos'}} das duas tabelas.
+    Sem 'campo', a chave é None (total do período). so_efetivo: só a contagem de colaboradores.
+    Um colaborador pode ter registros nas duas tabelas no mesmo período (pendências de
+    aprovação ficam na principal): nesses casos o efetivo é recontado pela união dos IDs.
+    """
+    campos = (campo,) if campo else ()
+    metricas = {'colaboradores': Count('colaborador_id', distinct=True)}
+    if not so_efetivo:
+        metricas.update(minutos=Sum(MinutosIntervalo()), apontamentos=Count('id'))
+
+    por_tabela = []
+    for model in (Apontamento, ApontamentoArquivado):
+        linhas = _consulta(model, inicio, fim, granularidade, campos).annotate(**metricas)
+        por_tabela.append({(linha['periodo'], linha[campo] if campo else None): linha for linha in linhas})
+
+    quentes, frios = por_tabela
+    resultado = {}
+    for chave, linha in (*frios.items(), *quentes.items()):
+        atual = resultado.get(chave)
+        if atual is None:
+            resultado[chave] = {
+                'colaboradores': linha['colaboradores'],
+                'minutos': linha.get('minutos') or 0,
+                'apontamentos': linha.get('apontamentos', 0),
+            }
+        else:
+            atual['minutos'] += linha.get('minutos') or 0
+            atual['apontamentos'] += linha.get('apontamentos', 0)
+
+    sobrepostos = quentes.keys() & frios.keys()
+    if sobrepostos:
+        periodos = {periodo for periodo, _ in sobrepostos}
+        pessoas = {chave: set() for chave in sobrepostos}
+        for model in (Apontamento, ApontamentoArquivado):
+            distintos = _consulta(model, inicio, fim, granularidade, campos).filter(
+                periodo__in=periodos
+            ).values_list('periodo', *campos, 'colaborador_id').distinct()
+            for periodo, *resto in distintos:
+                chave = (periodo, resto[0] if campo else None)
+                if chave in pessoas:
+                    pessoas[chave].add(resto[-1])
+        for chave, ids in pessoas.items():
+            resultado[chave]['colaboradores'] = len(ids)
+    return resultado
+
+
+def _horas(minutos):
+    return round(minutos / 60, 2)
+
+
+def calcular_serie(inicio, fim, granularidade, agrupamento):
+    """Payload colunar: uma lista de períodos e, por grupo, listas alinhadas de valores."""
+    campo, cadastro, campos_rotulo, sem_grupo, _ = AGRUPAMENTOS_SERIE[agrupamento]
+    periodos = periodos_do_intervalo(inicio, fim, granularidade)
+    indice = {periodo: i for i, periodo in enumerate(periodos)}
+
+    def vazia():
+        return {'horas': [0] * len(periodos), 'colaboradores': [0] * len(periodos), 'apontamentos': [0] * len(periodos)}
+
+    totais = vazia()
+    minutos_totais = [0] * len(periodos)
+    series = {}
+    minutos_grupo = {}
+    for (periodo, chave), valores in _agregar(inicio, fim, granularidade, campo).items():
+        i = indice[periodo]
+        serie = series.get(chave)
+        if serie is None:
+            serie = series[chave] = {'chave': chave, 'rotulo': sem_grupo, **vazia()}
+        serie['horas'][i] = _horas(valores['minutos'])
+        serie['colaboradores'][i] = valores['colaboradores']
+        serie['apontamentos'][i] = valores['apontamentos']
+        minutos_grupo[chave] = minutos_grupo.get(chave, 0) + valores['minutos']
+        # Os grupos particionam os registros: horas e apontamentos do total são a soma deles
+        minutos_totais[i] += valores['minutos']
+        totais['apontamentos'][i] += valores['apontamentos']
+        if agrupamento == 'colaborador':
+            totais['colaboradores'][i] += 1
+
+    for pk, *rotulo in cadastro.objects.filter(pk__in=series.keys() - {None}).values_list('pk', *campos_rotulo):
+        series[pk]['rotulo'] = ' - '.join(str(parte) for parte in rotulo if parte) or sem_grupo
+
+    totais['horas'] = [_horas(minutos) for minutos in minutos_totais]
+    # O mesmo colaborador pode estar em vários grupos: o efetivo total é contado à parte
+    if agrupamento != 'colaborador':
+        for (periodo, _), valores in _agregar(inicio, fim, granularidade, so_efetivo=True).items():
+            totais['colaboradores'][indice[periodo]] = valores['colaboradores']
+
+    return {
+        'inicio': inicio.isoformat(),
+        'fim': fim.isoformat(),
+        'granularidade': granularidade,
+        'agrupamento': agrupamento,
+        'periodos': [periodo.isoformat() for periodo in periodos],
+        'totais': totais,
+        # Grupos com mais horas primeiro
+        'series': sorted(series.values(), key=lambda s: -minutos_grupo[s['chave']]),
+    }
+
+
+def serie_temporal(inicio, fim, granularidade='dia', agrupamento='projeto'):
+    """
+    Série de horas, efetivo e apontamentos por período e grupo, em cache.
+    ValueError para parâmetros inválidos (a view responde 400).
+    """
+    if granularidade not in GRANULARIDADES:
+        raise ValueError(f"Granularidade inválida. Use: {', '.join(GRANULARIDADES)}.")
+    if agrupamento not in AGRUPAMENTOS_SERIE:
+        raise ValueError(f"Agrupamento inválido. Use: {', '.join(AGRUPAMENTOS_SERIE)}.")
+    if fim < inicio:
+        raise ValueError("A data final deve ser igual ou posterior à inicial.")
+    if len(periodos_do_intervalo(inicio, fim, granularidade)) > MAX_PERIODOS:
+        raise ValueError(f"Intervalo longo demais para a granularidade '{granularidade}' (máximo de {MAX_PERIODOS} períodos).")
+
+    tags = [tag_mes(mes) for mes in periodos_do_intervalo(inicio, fim, 'mes')] + list(AGRUPAMENTOS_SERIE[agrupamento][4])
+    return obter_ou_calcular(
+        f'serie:{inicio:%Y%m%d}:{fim:%Y%m%d}:{granularidade}:{agrupamento}',
+        lambda: calcular_serie(inicio, fim, granularidade, agrupamento),
+        tags=tags, timeout=TIMEOUT_SERIE,
+    )
@@ -1,3 +1,831 @@
-from django.test import TestCase
+import csv
+import io
+import os
+import re
+import tempfile
+import threading
+from collections import Counter
+from datetime import date, time, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from . import urls as produtividade_urls
+from .arquivamento import arquivar_lote
+from .auditoria import Anomalia, auditar
+from .cache_tags import obter_ou_calcular, tag_mes
+from .eventos import EstadoKPI
+from .fechamento import calcular_resumos, fechar_periodo
+from .folha import folha_do_periodo
+from .importacao import importar_cadastro
+from .importacao_legado import ImportadorLegado
+from .models import (
+    Apontamento, ApontamentoArquivado, ApontamentoHistorico, CentroCusto, CodigoCliente,
+    Colaborador, EventoDashboard, FechamentoPeriodo, Feriado, Projeto, Setor, Veiculo
+)
+from .pacote import planilhas
+from .pivo import carregar_base, pivotar
+from .registro import ConflitoHorario, gravar_apontamentos
+from .trava import trava_exclusiva
+from .veiculos import calcular_uso, conflitos_veiculo
+
+# ==============================================================================
+# HARNESS DE CONTAGEM DE QUERIES (REGRESSÃO N+1)
+# Cada rota de produtividade/urls.py é medida com duas massas de dados.
+# A quantidade de queries deve ser idêntica nas duas e ficar abaixo do orçamento.
+# ==============================================================================
+
+TAMANHO_PEQUENO = 10
+TAMANHO_GRANDE = 500
+
+# Orçamento padrão de queries por requisição (sessão + usuário + consultas da view)
+ORCAMENTO_PADRAO = 20
+
+# Configuração por nome de rota:
+#   usuario -> 'owner' ou 'operacional'
+#   metodo  -> 'get' (padrão) ou 'post'
+#   dados   -> querystring/corpo enviados
+#   alvo    -> método do TestCase que cria o objeto alvo (padrão: '_alvo')
+#   kwargs  -> função (alvo) -> kwargs do reverse()
+#   api     -> envia o header X-API-KEY
+#   orcamento -> sobrescreve ORCAMENTO_PADRAO
+ROTAS = {
+    'home': {},
+    'home_menu': {},
+    'configuracoes': {},
+    'novo_apontamento': {},
+    'apontamento_sucesso': {},
+    'editar_apontamento': {'kwargs': lambda alvo: {'pk': alvo.pk}},
+    'excluir_apontamento': {'kwargs': lambda alvo: {'pk': alvo.pk}},
+    'historico_apontamentos': {},
+    'solicitar_ajuste': {
+        'kwargs': lambda alvo: {'pk': alvo.pk},
+        'metodo': 'post',
+        'dados': {'motivo_texto': 'Horário incorreto'},
+    },
+    'aprovar_ajuste': {'kwargs': lambda alvo: {'pk': alvo.pk}},
+    'aprovacao_dashboard': {},
+    'analise_apontamento': {'kwargs': lambda alvo: {'pk': alvo.pk}},
+    'processar_aprovacao': {
+        'kwargs': lambda alvo: {'pk': alvo.pk},
+        'metodo': 'post',
+        'dados': {'acao': 'APROVAR', 'motivo_rejeicao': 'Conferido'},
+    },
+    'get_projeto_info': {'kwargs': lambda alvo: {'projeto_id': alvo.projeto_id}},
+    'get_colaborador_info': {'kwargs': lambda alvo: {'colaborador_id': alvo.colaborador_id}},
+    'get_auxiliares': {},
+    'get_centro_custo_info_ajax': {'kwargs': lambda alvo: {'cc_id': alvo.centro_custo_id}},
+    'get_calendar_status_ajax': {
+        'usuario': 'operacional',
+        'dados': lambda: {'month': timezone.now().month, 'year': timezone.now().year},
+    },
+    'api_dashboard_data': {'api': True},
+    'api_serie_temporal': {
+        'api': True,
+        'dados': lambda: {
+            'inicio': f"{timezone.localdate() - timedelta(days=365):%Y-%m-%d}",
+            'granularidade': 'semana',
+            'agrupamento': 'setor',
+        },
+    },
+    'api_exportar_completo': {'api': True},
+    'exportar_relatorio_excel': {},
+    'exportar_relatorio_csv': {},
+    'exportar_pacote': {
+        'dados': lambda: {
+            'start_date': f"{timezone.localdate() - timedelta(days=30):%Y-%m-%d}",
+            'end_date': f"{timezone.localdate():%Y-%m-%d}",
+            'por': 'projeto',
+        },
+    },
+    'relatorio_pivo': {
+        'dados': lambda: {
+            'start_date': f"{timezone.localdate() - timedelta(days=30):%Y-%m-%d}",
+            'end_date': f"{timezone.localdate():%Y-%m-%d}",
+            'linhas': 'colaborador,obra',
+            'coluna': 'semana',
+            'formato': 'xlsx',
+        },
+    },
+    'fechamento_periodo': {},
+    'fechamento_detalhe': {'alvo': '_alvo_fechamento', 'kwargs': lambda alvo: {'pk': alvo.pk}},
+    'exportar_fechamento_excel': {'alvo': '_alvo_fechamento', 'kwargs': lambda alvo: {'pk': alvo.pk}},
+    'exportar_folha': {'dados': lambda: {'competencia': f"{timezone.localdate():%Y-%m}"}},
+    'dias_faltantes': {},
+    'auditoria_apontamentos': {},
+    'uso_veiculos': {},
+}
+
+# Rotas que não podem ser medidas pelo cliente de teste síncrono (com o motivo)
+ROTAS_SEM_MEDICAO = {
+    'api_dashboard_stream': 'stream SSE infinito, só responde sob ASGI',
+}
+
+
+def fingerprint(sql):
+    """Normaliza uma query removendo literais para agrupar padrões repetidos."""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(\.\d+)?\b', '?', sql)
+    sql = re.sub(r'\((?:\s*\?\s*,)+\s*\?\s*\)', '(?...)', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def resumo_queries(queries, limite=10):
+    """Lista os fingerprints mais frequentes para facilitar o diagnóstico."""
+    contagem = Counter(fingerprint(q['sql']) for q in queries)
+    linhas = [f"  {qtd:>4}x {fp}" for fp, qtd in contagem.most_common(limite)]
+    return "\n".join(linhas)
+
+
+# Cache isolado do arquivo compartilhado de desenvolvimento
+CACHE_TESTES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=CACHE_TESTES)
+class QueryCountRegressionTests(TestCase):
+    """
+    Garante que nenhuma rota execute queries proporcionais ao número de registros.
+    Toda rota nova em urls.py precisa ser cadastrada em ROTAS.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_superuser('owner', 'owner@teste.com', 'senha')
+        cls.user_operacional = User.objects.create_user('operacional', 'op@teste.com', 'senha')
+
+        setor = Setor.objects.create(nome='Manutenção')
+        cls.colaborador = Colaborador.objects.create(
+            id_colaborador='C001', nome_completo='Operador Teste',
+            cargo='ELETRICISTA', setor=setor, user_account=cls.user_operacional
+        )
+        cls.auxiliares = [
+            Colaborador.objects.create(
+                id_colaborador=f'A00{i}', nome_completo=f'Auxiliar {i}',
+                cargo='AUXILIAR TECNICO', setor=setor
+            )
+            for i in range(3)
+        ]
+        cls.projetos = [
+            Projeto.objects.create(codigo=f'O{1000 + i}01', nome=f'Obra {i}') for i in range(3)
+        ]
+        cls.cliente = CodigoCliente.objects.create(codigo='1234', nome='Cliente Teste')
+        cls.centro_custo = CentroCusto.objects.create(nome='Almoxarifado', permite_alocacao=True)
+        cls.veiculo = Veiculo.objects.create(placa='ABC1D23', descricao='Fiat Strada')
+
+    def setUp(self):
+        self.sequencia = 0
+        self.competencias_fechadas = 0
+
+    # --------------------------------------------------------------------------
+    # Massa de dados
+    # --------------------------------------------------------------------------
+
+    def _novo_apontamento(self, **extra):
+        """Monta um apontamento variado (obra, cliente, externo, frota, manual)."""
+        i = self.sequencia
+        self.sequencia += 1
+        hoje = timezone.localdate()
+        dados = {
+            'colaborador': self.colaborador,
+            'data_apontamento': hoje - timedelta(days=(i // 3) % 3),
+            'hora_inicio': time(i % 24, 0),
+            'hora_termino': time((i + 9) % 24, 30),
+            'registrado_por': self.owner if i % 2 else self.user_operacional,
+            'auxiliar': self.auxiliares[i % 3],
+            'ocorrencias': f'Registro {i}',
+            'em_plantao': i % 5 == 0,
+            'dorme_fora': i % 7 == 0,
+        }
+        variante = i % 3
+        if variante == 0:
+            dados.update(local_execucao='INT', projeto=self.projetos[i % 3], veiculo=self.veiculo)
+        elif variante == 1:
+            dados.update(
+                local_execucao='INT', codigo_cliente=self.cliente,
+                veiculo_manual_modelo='Gol', veiculo_manual_placa='XYZ9876'
+            )
+        else:
+            dados.update(
+                local_execucao='EXT', centro_custo=self.centro_custo, projeto=self.projetos[0]
+            )
+        dados.update(extra)
+        return Apontamento(**dados)
+
+    def _semear(self, quantidade):
+        """Insere registros em lote, com auxiliares extras, até atingir a quantidade."""
+        faltam = quantidade - Apontamento.objects.count()
+        if faltam <= 0:
+            return
+        novos = Apontamento.objects.bulk_create([self._novo_apontamento() for _ in range(faltam)])
+        Through = Apontamento.auxiliares_extras.through
+        Through.objects.bulk_create([
+            Through(apontamento_id=a.pk, colaborador_id=aux.pk)
+            for a in novos for aux in self.auxiliares[:2]
+        ])
+
+    def _alvo(self):
+        """Registro alvo das rotas com <pk>, já editado uma vez (com histórico)."""
+        alvo = self._novo_apontamento(
+            local_execucao='EXT', centro_custo=self.centro_custo, projeto=self.projetos[1],
+            contagem_edicao=1, status_aprovacao='EM_ANALISE'
+        )
+        alvo.save()
+        alvo.auxiliares_extras.set(self.auxiliares[:2])
+        ApontamentoHistorico.objects.create(
+            apontamento_original=alvo,
+            editado_por=self.owner,
+            numero_edicao=1,
+            dados_snapshot={
+                'hora_inicio': '07:00:00', 'hora_termino': '12:00:00',
+                'local_execucao': 'INT', 'projeto': self.projetos[0].pk,
+                'codigo_cliente': self.cliente.pk, 'veiculo': self.veiculo.pk,
+                'centro_custo': None, 'auxiliar': self.auxiliares[0].pk,
+                'data_apontamento': '2020-01-01', 'em_plantao': True,
+                'dorme_fora': False, 'ocorrencias': 'Antes',
+            }
+        )
+        return alvo
+
+    def _alvo_fechamento(self):
+        """Fecha uma competência antiga (uma nova a cada medição)."""
+        self.competencias_fechadas += 1
+        return fechar_periodo(2000, self.competencias_fechadas, self.owner)
+
+    # --------------------------------------------------------------------------
+    # Medição
+    # --------------------------------------------------------------------------
+
+    def _medir(self, nome, config):
+        usuario = self.user_operacional if config.get('usuario') == 'operacional' else self.owner
+        self.client.force_login(usuario)
+
+        alvo = getattr(self, config.get('alvo', '_alvo'))()
+        kwargs = config['kwargs'](alvo) if 'kwargs' in config else {}
+        url = reverse(f'produtividade:{nome}', kwargs=kwargs)
+
+        dados = config.get('dados', {})
+        if callable(dados):
+            dados = dados()
+        headers = {'X-API-KEY': 'chave_secreta_123'} if config.get('api') else {}
+
+        # Mede sempre o caminho frio (sem valores em cache de medições anteriores)
+        cache.clear()
+
+        with self.settings(DJANGO_API_KEY='chave_secreta_123'):
+            with CaptureQueriesContext(connection) as ctx:
+                metodo = getattr(self.client, config.get('metodo', 'get'))
+                response = metodo(url, dados, headers=headers)
+                if response.streaming:
+                    # Em respostas streaming as queries acontecem durante o consumo
+                    b''.join(response.streaming_content)
+
+        self.assertLess(
+            response.status_code, 400,
+            f"{nome} respondeu {response.status_code} durante a medição."
+        )
+        return ctx.captured_queries
+
+    def _verificar_rota(self, nome):
+        config = ROTAS[nome]
+        orcamento = config.get('orcamento', ORCAMENTO_PADRAO)
+
+        self._semear(TAMANHO_PEQUENO)
+        pequeno = self._medir(nome, config)
+
+        self._semear(TAMANHO_GRANDE)
+        grande = self._medir(nome, config)
+
+        self.assertEqual(
+            len(pequeno), len(grande),
+            f"\n{nome}: {len(pequeno)} queries com {TAMANHO_PEQUENO} registros, "
+            f"{len(grande)} com {TAMANHO_GRANDE} (provável N+1).\n"
+            f"Fingerprints ({TAMANHO_GRANDE}):\n{resumo_queries(grande)}"
+        )
+        self.assertLessEqual(
+            len(grande), orcamento,
+            f"\n{nome}: {len(grande)} queries (orçamento {orcamento}).\n"
+            f"Fingerprints:\n{resumo_queries(grande)}"
+        )
+
+    def test_todas_as_rotas_estao_cadastradas(self):
+        """Rotas novas precisam entrar no harness (ou serem excluídas explicitamente)."""
+        nomes = {p.name for p in produtividade_urls.urlpatterns if isinstance(p, URLPattern)}
+        self.assertEqual(
+            nomes - set(ROTAS) - set(ROTAS_SEM_MEDICAO), set(),
+            "Rotas sem configuração de contagem de queries."
+        )
+
+
+def _criar_teste(nome):
+    def teste(self):
+        self._verificar_rota(nome)
+    teste.__doc__ = f"Contagem de queries estável para a rota '{nome}'."
+    return teste
+
+
+for _nome in ROTAS:
+    setattr(QueryCountRegressionTests, f'test_queries_{_nome}', _criar_teste(_nome))
+
+
+# ==============================================================================
+# COMPORTAMENTO (MASSAS MONTADAS À MÃO, RESULTADOS EXATOS)
+# ==============================================================================
+
+@override_settings(CACHES=CACHE_TESTES)
+class CenarioBase(TestCase):
+    """Cadastros mínimos e um atalho para criar apontamentos internos."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_superuser('owner', 'owner@teste.com', 'senha')
+        cls.setor = Setor.objects.create(nome='Manutenção')
+        cls.ana = Colaborador.objects.create(
+            id_colaborador='C001', nome_completo='Ana', cargo='ELETRICISTA', setor=cls.setor
+        )
+        cls.bruno = Colaborador.objects.create(
+            id_colaborador='A001', nome_completo='Bruno', cargo='AUXILIAR TECNICO', setor=cls.setor
+        )
+        cls.obra = Projeto.objects.create(codigo='O100101', nome='Obra Teste')
+
+    def setUp(self):
+        cache.clear()
+
+    def apontar(self, dia, inicio, termino, colaborador=None, **extra):
+        dados = {
+            'colaborador': colaborador or self.ana, 'data_apontamento': dia,
+            'hora_inicio': inicio, 'hora_termino': termino,
+            'local_execucao': 'INT', 'projeto': self.obra, 'registrado_por': self.owner,
+        }
+        dados.update(extra)
+        return Apontamento.objects.create(**dados)
+
+    def arquivar(self, pk, dia, inicio, termino, colaborador=None, **extra):
+        """Registro já movido para o arquivo (mantém o id original)."""
+        dados = {
+            'id': pk, 'colaborador': colaborador or self.ana, 'data_apontamento': dia,
+            'hora_inicio': inicio, 'hora_termino': termino, 'local_execucao': 'INT',
+            'projeto': self.obra, 'registrado_por': self.owner, 'data_registro': timezone.now(),
+        }
+        dados.update(extra)
+        return ApontamentoArquivado.objects.create(**dados)
+
+
+class FechamentoTests(CenarioBase):
+
+    def test_rejeitados_ficam_fora_do_resumo(self):
+        self.apontar(date(2000, 3, 1), time(8, 0), time(10, 0), auxiliar=self.bruno)
+        self.apontar(date(2000, 3, 1), time(10, 0), time(12, 0), status_aprovacao='REJEITADO')
+        self.apontar(date(2000, 3, 2), time(13, 0), time(14, 0), status_aprovacao='EM_ANALISE')
+
+        totais = calcular_resumos(date(2000, 3, 1), date(2000, 3, 31))
+
+        self.assertEqual(totais[self.ana.pk]['total_minutos'], 180)
+        self.assertEqual(totais[self.ana.pk]['qtd_registros'], 2)
+        self.assertEqual(dict(totais[self.ana.pk]['rateio']), {'OBRA O100101': 180})
+        self.assertEqual(totais[self.bruno.pk]['total_minutos'], 120)
+
+    def test_mes_corrente_nao_pode_ser_fechado(self):
+        hoje = timezone.localdate()
+        with self.assertRaises(ValueError):
+            fechar_periodo(hoje.year, hoje.month, self.owner)
+        self.assertFalse(FechamentoPeriodo.objects.exists())
+
+    def test_aprovacao_bloqueada_em_competencia_fechada(self):
+        apontamento = self.apontar(date(2000, 3, 1), time(8, 0), time(10, 0), status_aprovacao='EM_ANALISE')
+        fechar_periodo(2000, 3, self.owner)
+        self.client.force_login(self.owner)
+
+        self.client.post(
+            reverse('produtividade:processar_aprovacao', kwargs={'pk': apontamento.pk}),
+            {'acao': 'REJEITAR', 'motivo_rejeicao': 'Fora do prazo'},
+        )
+        self.client.get(reverse('produtividade:aprovar_ajuste', kwargs={'pk': apontamento.pk}))
+
+        apontamento.refresh_from_db()
+        self.assertEqual(apontamento.status_aprovacao, 'EM_ANALISE')
+        self.assertNotEqual(apontamento.status_ajuste, 'APROVADO')
+
+
+class ImportacaoCadastroTests(CenarioBase):
+
+    def importar(self, tipo, conteudo):
+        return importar_cadastro(tipo, io.BytesIO(conteudo.encode()), 'planilha.csv')
+
+    def test_placa_com_hifen_cadastrada_e_atualizada(self):
+        Veiculo.objects.create(placa='ABC-1234', descricao='Gol')
+
+        resultado = self.importar('veiculo', "placa;descricao\nabc 1234;Strada\nXYZ-9A87;Saveiro\n")
+
+        self.assertEqual((resultado.criados, resultado.atualizados, resultado.erros), (1, 1, []))
+        self.assertEqual(
+            list(Veiculo.objects.order_by('placa').values_list('placa', 'descricao')),
+            [('ABC-1234', 'Strada'), ('XYZ9A87', 'Saveiro')],
+        )
+
+    def test_celula_vazia_nao_apaga_valor_cadastrado(self):
+        resultado = self.importar(
+            'colaborador', "id_colaborador;nome_completo;cargo;setor\nC001;Ana Souza;;\nC009;Carla;;\n"
+        )
+
+        self.assertEqual((resultado.criados, resultado.atualizados, resultado.erros), (1, 1, []))
+        self.ana.refresh_from_db()
+        self.assertEqual((self.ana.nome_completo, self.ana.cargo, self.ana.setor), ('Ana Souza', 'ELETRICISTA', self.setor))
+        carla = Colaborador.objects.get(id_colaborador='C009')
+        self.assertEqual((carla.cargo, carla.setor), ('Operador', None))
+
+
+class GravacaoConcorrenteTests(TransactionTestCase):
+    """Envios simultâneos do mesmo horário, cada um na sua thread (e conexão): só um é gravado."""
+
+    ENVIOS = 4
+
+    def setUp(self):
+        self.dono = User.objects.create_user('dono', 'dono@teste.com', 'senha')
+        self.colaborador = Colaborador.objects.create(id_colaborador='C001', nome_completo='Ana', cargo='ELETRICISTA')
+
+    def _apontamento(self, dia, inicio, termino):
+        return Apontamento(
+            colaborador=self.colaborador, data_apontamento=dia, hora_inicio=inicio, hora_termino=termino,
+            local_execucao='INT', registrado_por=self.dono,
+        )
+
+    def _enviar_juntos(self, intervalos):
+        """Um envio por thread, todos liberados ao mesmo tempo; devolve os resultados ordenados."""
+        largada = threading.Barrier(len(intervalos))
+        resultados = []
+
+        def enviar(dia, inicio, termino):
+            try:
+                largada.wait()
+                gravar_apontamentos([self._apontamento(dia, inicio, termino)])
+                resultados.append('gravado')
+            except ConflitoHorario:
+                resultados.append('conflito')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=enviar, args=intervalo) for intervalo in intervalos]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return sorted(resultados)
+
+    def test_envios_sobrepostos_gravam_um_so(self):
+        resultados = self._enviar_juntos([
+            (date(2000, 3, 1), time(8, i), time(10, 0)) for i in range(self.ENVIOS)
+        ])
+
+        self.assertEqual(resultados, ['conflito'] * (self.ENVIOS - 1) + ['gravado'])
+        self.assertEqual(Apontamento.objects.filter(colaborador=self.colaborador).count(), 1)
+
+    def test_envios_que_viram_a_noite_gravam_um_so(self):
+        resultados = self._enviar_juntos([
+            (date(2000, 3, 1), time(22, 0), time(2, 0)),
+            (date(2000, 3, 1), time(22, 0), time(2, 0)),
+            (date(2000, 3, 1), time(23, 0), time(1, 0)),
+            (date(2000, 3, 2), time(0, 30), time(3, 0)),
+        ])
+
+        self.assertEqual(resultados, ['conflito'] * 3 + ['gravado'])
+        self.assertEqual(Apontamento.objects.filter(colaborador=self.colaborador).count(), 1)
+
+    def test_virada_de_dia_conflita_com_o_dia_seguinte(self):
+        gravar_apontamentos([self._apontamento(date(2000, 3, 1), time(22, 0), time(2, 0))])
+
+        with self.assertRaises(ConflitoHorario):
+            gravar_apontamentos([self._apontamento(date(2000, 3, 2), time(1, 0), time(3, 0))])
+        with self.assertRaises(ConflitoHorario):
+            gravar_apontamentos([self._apontamento(date(2000, 2, 29), time(23, 0), time(22, 30))])
+        gravar_apontamentos([self._apontamento(date(2000, 3, 2), time(2, 0), time(4, 0))])
+        self.assertEqual(Apontamento.objects.filter(colaborador=self.colaborador).count(), 2)
+
+
+class EventosDashboardTests(CenarioBase):
+
+    def test_snapshot_com_eventos_seguintes_igual_a_novo_snapshot(self):
+        hoje = timezone.localdate()
+        primeiro = self.apontar(hoje, time(8, 0), time(10, 0))
+        estado = EstadoKPI._carregar(hoje)
+
+        segundo = self.apontar(hoje, time(10, 0), time(11, 30), colaborador=self.bruno)
+        primeiro.hora_termino = time(9, 0)
+        primeiro.save()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.apontar(hoje, time(13, 0), time(14, 0))
+            raise RuntimeError
+        segundo.delete()
+
+        for evento in EventoDashboard.objects.filter(id__gt=estado.ultimo_id).order_by('id'):
+            estado.aplicar(evento)
+
+        novo = EstadoKPI._carregar(hoje)
+        self.assertEqual(estado.kpis(), novo.kpis())
+        self.assertEqual((estado.ultimo_id, estado.registros, estado.minutos), (novo.ultimo_id, 1, 60))
+
+
+class ArquivamentoTests(CenarioBase):
+
+    def _lote(self, dia, quantidade):
+        ids = []
+        for i in range(quantidade):
+            apontamento = self.apontar(dia, time(8 + i, 0), time(8 + i, 30))
+            apontamento.auxiliares_extras.set([self.bruno])
+            ids.append(apontamento.pk)
+        return ids
+
+    def _arquivar_medindo(self, ids):
+        eventos = EventoDashboard.objects.count()
+        with CaptureQueriesContext(connection) as queries, \
+                self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.assertEqual(arquivar_lote(ids), len(ids))
+        self.assertEqual(EventoDashboard.objects.count(), eventos)
+        self.assertEqual(len(callbacks), 1)
+        return len(queries)
+
+    def test_lote_sem_eventos_e_com_queries_fixas(self):
+        pequeno = self._arquivar_medindo(self._lote(date(2000, 3, 1), 3))
+        grande = self._arquivar_medindo(self._lote(date(2000, 3, 2), 6))
+
+        self.assertEqual(pequeno, grande)
+        self.assertFalse(Apontamento.objects.exists())
+        self.assertEqual(ApontamentoArquivado.objects.count(), 9)
+        self.assertEqual(ApontamentoArquivado.auxiliares_extras.through.objects.count(), 9)
+
+    def test_invalida_o_mes_do_lote(self):
+        ids = self._lote(date(2000, 3, 1), 2)
+        calcular = mock.Mock(return_value=1)
+        obter_ou_calcular('teste:mes', calcular, tags=[tag_mes(date(2000, 3, 1))])
+        with self.captureOnCommitCallbacks(execute=True):
+            arquivar_lote(ids)
+        obter_ou_calcular('teste:mes', calcular, tags=[tag_mes(date(2000, 3, 1))])
+        self.assertEqual(calcular.call_count, 2)
+
+
+class PacoteTests(CenarioBase):
+
+    def test_pool_ocupado_gera_em_serie(self):
+        eletrica = Colaborador.objects.create(
+            id_colaborador='C002', nome_completo='Caio', cargo='ELETRICISTA',
+            setor=Setor.objects.create(nome='Elétrica'),
+        )
+        self.apontar(date(2000, 3, 1), time(8, 0), time(10, 0))
+        self.apontar(date(2000, 3, 1), time(8, 0), time(10, 0), colaborador=eletrica)
+        filtros = {'data_apontamento__gte': date(2000, 3, 1), 'data_apontamento__lte': date(2000, 3, 31)}
+
+        with tempfile.TemporaryDirectory() as pasta, override_settings(PACOTE_TRAVA_PATH=os.path.join(pasta, 'pacote.lock')):
+            with trava_exclusiva(settings.PACOTE_TRAVA_PATH), \
+                    mock.patch('produtividade.pacote.os.cpu_count', return_value=4), \
+                    mock.patch('produtividade.pacote.ProcessPoolExecutor') as pool:
+                nomes = sorted(nome for nome, _ in planilhas(filtros, processos=2))
+
+        pool.assert_not_called()
+        self.assertEqual(nomes, ['eletrica.xlsx', 'manutencao.xlsx'])
+
+
+class AuditoriaTests(CenarioBase):
+
+    def test_varredura_aponta_cada_anomalia(self):
+        # Sobreposição na virada do dia, entre tabela principal e arquivo
+        noite = self.apontar(date(2000, 3, 1), time(22, 0), time(2, 0))
+        self.arquivar(9001, date(2000, 3, 2), time(1, 0), time(3, 0))
+        # Duplicado: mesmo horário e destino
+        dup1 = self.apontar(date(2000, 3, 3), time(8, 0), time(10, 0))
+        dup2 = self.apontar(date(2000, 3, 3), time(8, 0), time(10, 0))
+        # 17h30 no dia, encostados (sem sobreposição)
+        longo1 = self.apontar(date(2000, 3, 1), time(6, 0), time(18, 0), colaborador=self.bruno)
+        longo2 = self.apontar(date(2000, 3, 1), time(18, 0), time(23, 30), colaborador=self.bruno)
+        # Rateios: um registro só; dividido entre as tabelas (válido); dois colaboradores
+        sozinho = self.apontar(date(2000, 3, 5), time(9, 0), time(10, 0), colaborador=self.bruno, id_agrupamento='g1')
+        self.apontar(date(2000, 3, 6), time(14, 0), time(15, 0), id_agrupamento='g2')
+        self.arquivar(9002, date(2000, 3, 6), time(15, 0), time(16, 0), id_agrupamento='g2')
+        mistura1 = self.apontar(date(2000, 3, 7), time(10, 0), time(11, 0), id_agrupamento='g3')
+        mistura2 = self.apontar(date(2000, 3, 7), time(10, 0), time(11, 0), colaborador=self.bruno, id_agrupamento='g3')
+
+        anomalias = list(auditar(date(2000, 3, 1), date(2000, 3, 31), limite_diario=16 * 60))
+
+        ana, bruno = self.ana.pk, self.bruno.pk
+        # Varredura em ordem (colaborador, data); rateios depois, sem ordem definida entre grupos
+        self.assertEqual(anomalias[:3], [
+            Anomalia('SOBREPOSICAO', ana, date(2000, 3, 2), ((noite.pk, False), (9001, True)),
+                     "Início 01:00 antes do fim do registro anterior (02:00)"),
+            Anomalia('DUPLICADO', ana, date(2000, 3, 3), ((dup1.pk, False), (dup2.pk, False)),
+                     "Mesmo horário (08:00 às 10:00) e destino"),
+            Anomalia('DIA_EXCESSIVO', bruno, date(2000, 3, 1), ((longo1.pk, False), (longo2.pk, False)),
+                     "17:30 apontadas no dia (limite 16:00)"),
+        ])
+        self.assertCountEqual(anomalias[3:], [
+            Anomalia('RATEIO_ORFAO', bruno, date(2000, 3, 5), ((sozinho.pk, False),),
+                     "Rateio com um único registro restante (grupo g1)"),
+            Anomalia('RATEIO_ORFAO', ana, date(2000, 3, 7), ((mistura1.pk, False), (mistura2.pk, False)),
+                     "Rateio com 2 colaboradores e 1 dias diferentes (grupo g3)"),
+        ])
+
+
+    def test_comando_escreve_o_csv_na_saida_do_comando(self):
+        dup1 = self.apontar(date(2000, 3, 3), time(8, 0), time(10, 0))
+        dup2 = self.apontar(date(2000, 3, 3), time(8, 0), time(10, 0))
+        saida = io.StringIO()
+
+        call_command('auditar_apontamentos', inicio='2000-03-01', fim='2000-03-31', csv=True, stdout=saida)
+
+        self.assertEqual(list(csv.reader(io.StringIO(saida.getvalue()), delimiter=';')), [
+            ['Tipo', 'Colaborador', 'Data', 'Registros', 'Detalhe'],
+            ['Registro duplicado', 'Ana', '03/03/2000', f'{dup1.pk} {dup2.pk}', 'Mesmo horário (08:00 às 10:00) e destino'],
+        ])
+
+class FolhaTests(CenarioBase):
+
+    def test_buckets_da_folha(self):
+        # Março/2000: dia 1 é quarta, dia 5 é domingo; dia 3 (sexta) é feriado
+        Feriado.objects.create(data=date(2000, 3, 3), descricao='Feriado local')
+        self.apontar(date(2000, 3, 1), time(21, 0), time(6, 0), status_aprovacao='APROVADO')
+        self.apontar(date(2000, 3, 3), time(4, 0), time(6, 0), status_aprovacao='APROVADO')
+        self.apontar(date(2000, 3, 5), time(8, 0), time(10, 0), auxiliar=self.bruno, status_aprovacao='APROVADO')
+        self.apontar(date(2000, 3, 2), time(8, 0), time(12, 0), status_aprovacao='REJEITADO')
+        self.apontar(date(2000, 3, 2), time(23, 0), time(1, 0), colaborador=self.bruno)
+
+        folha = folha_do_periodo(date(2000, 3, 1), date(2000, 3, 31), jornada=(480,) * 5 + (0,))
+
+        self.assertEqual(folha, [
+            {
+                'colaborador': 'Ana', 'setor': 'Manutenção', 'dias_trabalhados': 3,
+                'total': 780, 'normais': 480, 'extras_50': 60, 'extras_100': 240,
+                'noturnas': 480, 'noturnas_reduzidas': 549, 'nao_aprovadas': 0,
+            },
+            {
+                'colaborador': 'Bruno', 'setor': 'Manutenção', 'dias_trabalhados': 2,
+                'total': 240, 'normais': 120, 'extras_50': 0, 'extras_100': 120,
+                'noturnas': 120, 'noturnas_reduzidas': 137, 'nao_aprovadas': 120,
+            },
+        ])
+
+
+class ImportacaoLegadoTests(CenarioBase):
+
+    PLANILHA = (
+        "Data;Colaborador;Tipo;Código de Obra;Veículo;Hora Início;Hora Fim;Observações;Auxiliares\n"
+        "01/03/2000;Ana;INT;O100101;;08:00;10:00;;Bruno\n"
+        "01/03/2000;Ana;INT;O100101;;09:00;11:00;;\n"
+        "02/03/2000;Bruno;INT;X999;;08:00;10:00;;\n"
+        "03/03/2000;Ana;INT;O100101;;22:00;02:00;;\n"
+        "03/03/2000;Bruno;;;Carona;22:00;02:00;Auxiliar de: Ana;\n"
+        "04/03/2000;Ana;INT;O100101;;01:00;03:00;;\n"
+        "05/03/2000;Ana;INT;O100101;;08:00;09:00;;\n"
+    )
+
+    def setUp(self):
+        super().setUp()
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', encoding='utf-8', delete=False) as arquivo:
+            arquivo.write(self.PLANILHA)
+        self.caminho = arquivo.name
+        self.addCleanup(os.remove, self.caminho)
+
+    def test_retoma_do_checkpoint_sem_duplicar(self):
+        # Primeira execução interrompida logo após o primeiro lote gravado
+        primeira = ImportadorLegado(self.caminho, self.owner, tamanho_lote=2)
+        execucao = primeira.executar()
+        self.assertEqual(next(execucao).ultima_posicao, 3)
+        execucao.close()
+        self.assertEqual(primeira.erros, [
+            (self.caminho, 4, "Obra 'X999' não cadastrada."),
+            (self.caminho, 3, "Conflito de horário com outro registro do colaborador em 01/03/2000."),
+        ])
+
+        segunda = ImportadorLegado(self.caminho, self.owner, tamanho_lote=2)
+        checkpoint = list(segunda.executar())[-1]
+
+        self.assertEqual(segunda.erros, [
+            (self.caminho, 7, "Conflito de horário com outro registro do colaborador em 04/03/2000."),
+        ])
+        self.assertEqual((checkpoint.ultima_posicao, checkpoint.importados, checkpoint.rejeitados), (7, 3, 3))
+        self.assertIsNotNone(checkpoint.concluido_em)
+        self.assertEqual(
+            list(Apontamento.objects.order_by('data_apontamento').values_list(
+                'data_apontamento', 'hora_inicio', 'hora_termino', 'auxiliar__nome_completo', 'status_aprovacao'
+            )),
+            [
+                (date(2000, 3, 1), time(8, 0), time(10, 0), 'Bruno', 'APROVADO'),
+                (date(2000, 3, 3), time(22, 0), time(2, 0), 'Bruno', 'APROVADO'),
+                (date(2000, 3, 5), time(8, 0), time(9, 0), None, 'APROVADO'),
+            ],
+        )
+        with self.assertRaises(ValueError):
+            next(ImportadorLegado(self.caminho, self.owner).executar())
+
+
+class PivoTests(CenarioBase):
+
+    def setUp(self):
+        super().setUp()
+        caio = Colaborador.objects.create(
+            id_colaborador='C002', nome_completo='Caio', cargo='AUXILIAR TECNICO',
+            setor=Setor.objects.create(nome='Elétrica'),
+        )
+        almox = CentroCusto.objects.create(nome='Almox', permite_alocacao=False)
+        cliente = CodigoCliente.objects.create(codigo='1234', nome='Cliente')
+        # Quarta 01/03/2000: titular, auxiliar e auxiliar extra na obra
+        self.apontar(date(2000, 3, 1), time(8, 0), time(10, 0), auxiliar=self.bruno).auxiliares_extras.set([caio])
+        # Segunda 06/03 (segunda semana): virada de dia fora da obra
+        self.apontar(date(2000, 3, 6), time(22, 0), time(1, 0), local_execucao='EXT', projeto=None, centro_custo=almox)
+        self.arquivar(9001, date(2000, 3, 7), time(9, 0), time(9, 45), colaborador=self.bruno, projeto=None, codigo_cliente=cliente)
+        self.base = carregar_base(date(2000, 3, 1), date(2000, 3, 12))
+
+    def linhas(self, resultado):
+        return [(linha['chaves'], linha['horas'], linha['total']) for linha in resultado['dados']]
+
+    def test_colaborador_e_obra_por_semana(self):
+        resultado = pivotar(self.base, ['colaborador', 'obra'], 'semana')
+
+        self.assertEqual(resultado['colunas'], ['Semana 28/02/2000', 'Semana 06/03/2000'])
+        self.assertEqual(self.linhas(resultado), [
+            (['Ana', 'CC Almox'], [0.0, 3.0], 3.0),
+            (['Ana', 'OBRA O100101'], [2.0, 0.0], 2.0),
+            (['Bruno', 'CLIENTE 1234'], [0.0, 0.75], 0.75),
+            (['Bruno', 'OBRA O100101'], [2.0, 0.0], 2.0),
+            (['Caio', 'OBRA O100101'], [2.0, 0.0], 2.0),
+        ])
+        self.assertEqual((resultado['totais'], resultado['total_geral']), ([6.0, 3.75], 9.75))
+
+    def test_setor_e_papel(self):
+        resultado = pivotar(self.base, ['setor', 'papel'])
+
+        self.assertEqual(self.linhas(resultado), [
+            (['Elétrica', 'Auxiliar'], [2.0], 2.0),
+            (['Manutenção', 'Auxiliar'], [2.0], 2.0),
+            (['Manutenção', 'Titular'], [5.75], 5.75),
+        ])
+
+    def test_so_titulares(self):
+        resultado = pivotar(self.base, ['colaborador'], 'obra', auxiliares=False)
+
+        self.assertEqual(resultado['colunas'], ['OBRA O100101', 'CLIENTE 1234', 'CC Almox'])
+        self.assertEqual(self.linhas(resultado), [
+            (['Ana'], [2.0, 0.0, 3.0], 5.0),
+            (['Bruno'], [0.0, 0.75, 0.0], 0.75),
+        ])
+
+
+class VeiculosTests(CenarioBase):
+
+    def setUp(self):
+        super().setUp()
+        self.caio = Colaborador.objects.create(id_colaborador='C002', nome_completo='Caio', cargo='ELETRICISTA', setor=self.setor)
+        self.almox = CentroCusto.objects.create(nome='Almox', permite_alocacao=False)
+        self.cliente = CodigoCliente.objects.create(codigo='1234', nome='Cliente')
+        frota = Veiculo.objects.create(placa='ABC-1234', descricao='Strada')
+        # Mesma placa: cadastro com hífen e digitada à mão sem hífen / com espaço
+        self.r1 = self.apontar(date(2000, 3, 1), time(8, 0), time(12, 0), veiculo=frota)
+        self.r3 = self.apontar(date(2000, 3, 1), time(9, 0), time(11, 0), colaborador=self.caio, veiculo_manual_placa='ABC 1234')
+        self.r2 = self.apontar(
+            date(2000, 3, 1), time(10, 0), time(14, 0), colaborador=self.bruno, veiculo_manual_placa='abc1234',
+            local_execucao='EXT', projeto=None, centro_custo=self.almox,
+        )
+        # Virada de dia: arquivo 02/03 22h-02h contra 03/03 01h-03h em outro destino
+        self.arquivar(9001, date(2000, 3, 2), time(22, 0), time(2, 0), veiculo=frota, placa_normalizada='ABC1234')
+        self.r5 = self.apontar(
+            date(2000, 3, 3), time(1, 0), time(3, 0), colaborador=self.bruno, veiculo_manual_placa='ABC1234',
+            projeto=None, codigo_cliente=self.cliente,
+        )
+        self.apontar(date(2000, 3, 4), time(8, 0), time(9, 0), veiculo_manual_placa='XYZ-9A87')
+
+    def test_uso_e_conflitos(self):
+        resultado = calcular_uso(date(2000, 3, 1), date(2000, 3, 5), 'dia')
+
+        self.assertEqual(resultado['veiculos'], [
+            {
+                'placa': 'ABC1234', 'descricao': 'Strada', 'frota': True,
+                'minutos': [360, 240, 60, 0, 0], 'total': 660, 'registros': 5, 'conflitos': 3,
+            },
+            {
+                'placa': 'XYZ9A87', 'descricao': 'Externo', 'frota': False,
+                'minutos': [0, 0, 0, 60, 0], 'total': 60, 'registros': 1, 'conflitos': 0,
+            },
+        ])
+        self.assertCountEqual(
+            [(c['registros'], c['destinos']) for c in resultado['conflitos']],
+            [
+                ([(self.r1.pk, False), (self.r2.pk, False)], ['OBRA O100101', 'CC Almox']),
+                ([(self.r3.pk, False), (self.r2.pk, False)], ['OBRA O100101', 'CC Almox']),
+                ([(9001, True), (self.r5.pk, False)], ['OBRA O100101', 'CLIENTE 1234']),
+            ],
+        )
+
+    def test_aviso_no_envio_com_placa_em_outro_formato(self):
+        novo = Apontamento(
+            colaborador=self.caio, data_apontamento=date(2000, 3, 1), hora_inicio=time(13, 0), hora_termino=time(15, 0),
+            local_execucao='INT', codigo_cliente=self.cliente, veiculo_manual_placa='abc-1234',
+        )
+
+        self.assertEqual(conflitos_veiculo([novo]), [{
+            'placa': 'ABC1234', 'colaborador': 'Bruno', 'data': date(2000, 3, 1),
+            'horario': '10:00 às 14:00', 'destino': 'CC Almox',
+        }])
@@ -0,0 +1,41 @@
+"""
+Trava de processo único para os comandos de longa duração (fila de gravação,
+manutenção do banco).
+
+Usa o lock do sistema operacional sobre um arquivo: flock no Linux/macOS e
+msvcrt.locking no Windows. Nos dois casos o sistema libera a trava se o processo
+morrer, então não sobra arquivo de trava órfão para apagar à mão.
+"""
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class TravaOcupada(Exception):
+    """Outro processo já detém a trava."""
+
+
+@contextmanager
+def trava_exclusiva(caminho):
+    """Mantém a trava de 'caminho' durante o bloco; TravaOcupada se já estiver em uso."""
+    arquivo = open(caminho, 'w')
+    try:
+        try:
+            if fcntl:
+                fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(arquivo.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            raise TravaOcupada(caminho)
+        try:
+            yield
+        finally:
+            if not fcntl:
+                arquivo.seek(0)
+                msvcrt.locking(arquivo.fileno(), msvcrt.LK_UNLCK, 1)
+    finally:
+        arquivo.close()
@@ -56,6 +56,8 @@ urlpatterns = [
     # ==========================================================================
     # 1. Status Online/Offline e Gráficos de hoje
     path('api/dashboard/', views.api_dashboard_data, name='api_dashboard_data'),
+    path('api/dashboard/stream/', views.api_dashboard_stream, name='api_dashboard_stream'),
+    path('api/dashboard/serie/', views.api_serie_temporal, name='api_serie_temporal'),
     
     # 2. Sincronização completa de dados (Excel JSON)
     path('api/exportar-completo/', views.api_exportar_json, name='api_exportar_completo'),
@@ -64,4 +66,18 @@ urlpatterns = [
     # RELATÓRIOS E EXPORTAÇÃO
     # ==========================================================================
     path('exportar/excel/', views.exportar_relatorio_excel, name='exportar_relatorio_excel'),
+    path('exportar/csv/', views.exportar_relatorio_csv, name='exportar_relatorio_csv'),
+    path('exportar/pacote/', views.exportar_pacote_zip, name='exportar_pacote'),
+    path('exportar/pivo/', views.relatorio_pivo, name='relatorio_pivo'),
+
+    # ==========================================================================
+    # FECHAMENTO DE PERÍODO (FOLHA)
+    # ==========================================================================
+    path('fechamento/', views.fechamento_periodo_view, name='fechamento_periodo'),
+    path('fechamento/<int:pk>/', views.fechamento_detalhe_view, name='fechamento_detalhe'),
+    path('fechamento/<int:pk>/excel/', views.exportar_fechamento_excel, name='exportar_fechamento_excel'),
+    path('fechamento/folha/', views.exportar_folha, name='exportar_folha'),
+    path('fechamento/dias-faltantes/', views.dias_faltantes_view, name='dias_faltantes'),
+    path('auditoria/', views.auditoria_apontamentos, name='auditoria_apontamentos'),
+    path('veiculos/uso/', views.uso_veiculos_view, name='uso_veiculos'),
 ]
\ No newline at end of file
@@ -0,0 +1,312 @@
+"""
+Uso de veículos e detecção de uso simultâneo (mesma placa em dois destinos ao mesmo tempo).
+
+O veículo de um apontamento é da frota (veiculo) ou informado à mão (veiculo_manual_placa);
+as duas formas convergem na coluna placa_normalizada (Apontamento.save, importação
+legada e migração 0028), indexada junto com data e hora de início.
+
+Varredura (sweep line), como na auditoria: as duas tabelas são lidas em lotes, ordenadas
+por (placa, data, hora de início, id) pelo índice apontamento_placa_idx, e intercaladas
+com heapq.merge. Por placa:
+
+- horas de uso: união dos intervalos (titular e auxiliar no mesmo carro, ou dois
+  registros sobrepostos, não contam em dobro). Cada registro soma apenas o trecho
+  depois do maior fim visto até agora, no período (dia/semana) do seu início;
+- uso simultâneo: os intervalos ainda ativos ficam num heap pelo fim; um início antes
+  do fim de um registro ativo com outro destino (obra/cliente/centro de custo) é
+  conflito. Mesmo destino é carona (equipe no mesmo carro) e não conta.
+"""
+import heapq
+import io
+from datetime import timedelta
+
+import openpyxl
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+from .cache_tags import obter_ou_calcular, tag_mes
+from .fechamento import destino_custo
+from .models import Apontamento, ApontamentoArquivado, Colaborador, Veiculo, chave_placa
+from .series import MinutosIntervalo, inicio_periodo, periodos_do_intervalo
+
+GRANULARIDADES_USO = ('dia', 'semana')
+
+TAMANHO_LOTE = 2000
+
+TIMEOUT_USO = 60 * 60
+
+# Limite de períodos do relatório (colunas da tabela/planilha)
+MAX_PERIODOS_USO = 400
+
+_CAMPOS = (
+    'placa_normalizada', 'data_apontamento', 'hora_inicio', 'id', 'hora_termino', 'minutos',
+    'projeto_id', 'codigo_cliente_id', 'centro_custo_id', 'colaborador_id',
+)
+
+_CAMPOS_DESTINO = (
+    'id', 'projeto__codigo', 'codigo_cliente__codigo', 'local_execucao', 'centro_custo__nome',
+)
+
+
+def _hhmm(minutos):
+    return f"{minutos // 60:02d}:{minutos % 60:02d}"
+
+
+def _registros_ordenados(model, inicio, fim, arquivado):
+    """Linhas com placa do período, em ordem de varredura, lidas em lotes (iterator)."""
+    linhas = model.objects.filter(
+        placa_normalizada__isnull=False, data_apontamento__gte=inicio, data_apontamento__lte=fim
+    ).order_by(
+        'placa_normalizada', 'data_apontamento', 'hora_inicio', 'id'
+    ).annotate(minutos=MinutosIntervalo()).values_list(*_CAMPOS)
+    for linha in linhas.iterator(chunk_size=TAMANHO_LOTE):
+        yield (*linha, arquivado)
+
+
+def varrer_veiculos(inicio, fim, granularidade='semana'):
+    """
+    Uma passada ordenada pelas duas tabelas. Retorna (uso, conflitos):
+      uso: {placa: {período: [minutos, registros]}} com minutos sem dupla contagem;
+      conflitos: [(placa, data, ativo, registro)] com as tuplas de varredura dos dois registros.
+    """
+    registros = heapq.merge(
+        _registros_ordenados(Apontamento, inicio, fim, False),
+        _registros_ordenados(ApontamentoArquivado, inicio, fim, True),
+        key=lambda r: r[:4],
+    )
+    uso, conflitos = {}, []
+    placa_atual = maior_fim = None
+    ativos = []  # heap (fim, id, arquivado, registro)
+
+    for registro in registros:
+        placa, data, hora, pk, _, minutos, projeto, cliente, centro, _, arquivado = registro
+        if placa != placa_atual:
+            placa_atual, maior_fim, ativos = placa, None, []
+            uso[placa] = {}
+
+        # Minutos absolutos: a virada de dia entra pela duração
+        comeco = data.toordinal() * 1440 + hora.hour * 60 + hora.minute
+        fim_registro = comeco + minutos
+
+        while ativos and ativos[0][0] <= comeco:
+            heapq.heappop(ativos)
+        destino = (projeto, cliente, centro)
+        for _, _, _, ativo in ativos:
+            if ativo[6:9] != destino:
+                conflitos.append((placa, data, ativo, registro))
+        heapq.heappush(ativos, (fim_registro, pk, arquivado, registro))
+
+        periodo = uso[placa].setdefault(inicio_periodo(data, granularidade), [0, 0])
+        periodo[0] += max(0, fim_registro - max(comeco, maior_fim if maior_fim is not None else comeco))
+        periodo[1] += 1
+        if maior_fim is None or fim_registro > maior_fim:
+            maior_fim = fim_registro
+
+    return uso, conflitos
+
+
+def _destinos(conflitos):
+    """{(id, arquivado): rótulo do destino} dos registros em conflito."""
+    ids = {False: set(), True: set()}
+    for _, _, ativo, registro in conflitos:
+        ids[ativo[-1]].add(ativo[3])
+        ids[registro[-1]].add(registro[3])
+    destinos = {}
+    for model, arquivado in ((Apontamento, False), (ApontamentoArquivado, True)):
+        lista = sorted(ids[arquivado])
+        for i in range(0, len(lista), 500):
+            for linha in model.objects.filter(pk__in=lista[i:i + 500]).values(*_CAMPOS_DESTINO):
+                destinos[(linha['id'], arquivado)] = destino_custo(linha)
+    return destinos
+
+
+def _descricoes():
+    """{chave da placa: descrição} da frota cadastrada."""
+    return {
+        chave_placa(placa): descricao or 'Veículo da Frota'
+        for placa, descricao in Veiculo.objects.values_list('placa', 'descricao')
+    }
+
+
+def calcular_uso(inicio, fim, granularidade='semana'):
+    """Horas por veículo e período, e a lista de usos simultâneos do intervalo."""
+    uso, brutos = varrer_veiculos(inicio, fim, granularidade)
+    periodos = periodos_do_intervalo(inicio, fim, granularidade)
+    frota = _descricoes()
+
+    veiculos = []
+    for placa in sorted(uso, key=lambda p: (-sum(m for m, _ in uso[p].values()), p)):
+        por_periodo = uso[placa]
+        total = sum(m for m, _ in por_periodo.values())
+        veiculos.append({
+            'placa': placa,
+            'descricao': frota.get(placa, 'Externo'),
+            'frota': placa in frota,
+            'minutos': [por_periodo.get(p, (0, 0))[0] for p in periodos],
+            'total': total,
+            'registros': sum(n for _, n in por_periodo.values()),
+            'conflitos': 0,
+        })
+
+    destinos = _destinos(brutos)
+    ids_colaboradores = {r[9] for _, _, a, b in brutos for r in (a, b)}
+    nomes = dict(Colaborador.objects.filter(pk__in=ids_colaboradores).values_list('pk', 'nome_completo'))
+    conflitos = []
+    for placa, data, ativo, registro in brutos:
+        par = (ativo, registro)
+        conflitos.append({
+            'placa': placa,
+            'data': data,
+            'registros': [(r[3], r[-1]) for r in par],  # (id, arquivado)
+            'colaboradores': [nomes.get(r[9], r[9]) for r in par],
+            'horarios': [f"{r[1]:%d/%m} {r[2]:%H:%M} às {r[4]:%H:%M}" for r in par],
+            'destinos': [destinos.get((r[3], r[-1]), '') for r in par],
+        })
+    por_placa = {v['placa']: v for v in veiculos}
+    for conflito in conflitos:
+        por_placa[conflito['placa']]['conflitos'] += 1
+
+    return {
+        'inicio': inicio,
+        'fim': fim,
+        'granularidade': granularidade,
+        'periodos': periodos,
+        'veiculos': veiculos,
+        'conflitos': conflitos,
+    }
+
+
+def uso_veiculos(inicio, fim, granularidade='semana'):
+    """
+    Relatório de uso (calcular_uso) com cache invalidado pelos meses do intervalo e pelos
+    cadastros. ValueError para granularidade inválida ou intervalo grande demais.
+    """
+    if granularidade not in GRANULARIDADES_USO:
+        raise ValueError(f"Granularidade inválida. Opções: {', '.join(GRANULARIDADES_USO)}.")
+    if fim < inicio:
+        raise ValueError("A data final deve ser igual ou posterior à inicial.")
+    if len(periodos_do_intervalo(inicio, fim, granularidade)) > MAX_PERIODOS_USO:
+        raise ValueError(f"Intervalo grande demais: no máximo {MAX_PERIODOS_USO} períodos.")
+
+    tags = {tag_mes(d) for d in periodos_do_intervalo(inicio, fim, 'mes')}
+    return obter_ou_calcular(
+        f'veiculos:uso:{inicio:%Y%m%d}:{fim:%Y%m%d}:{granularidade}',
+        lambda: calcular_uso(inicio, fim, granularidade),
+        tags=[*sorted(tags), 'catalog:veiculo', 'catalog:colaborador', 'catalog:projeto', 'catalog:cliente'],
+        timeout=TIMEOUT_USO,
+    )
+
+
+# ==============================================================================
+# VERIFICAÇÃO NO ENVIO
+# ==============================================================================
+
+def conflitos_veiculo(apontamentos):
+    """
+    Registros já gravados que usam o mesmo veículo, em horário sobreposto e com outro
+    destino, dos apontamentos recém-enviados (aviso ao usuário, não bloqueia o envio).
+    Considera a virada de dia (registros da véspera e do dia seguinte).
+    """
+    encontrados, vistos = [], set()
+    proprios = {a.pk for a in apontamentos if a.pk}
+    for apontamento in apontamentos:
+        chave = apontamento.placa_normalizada or apontamento.chave_placa_atual()
+        if not chave or not apontamento.hora_inicio or not apontamento.hora_termino:
+            continue
+        data = apontamento.data_apontamento
+        comeco = data.toordinal() * 1440 + apontamento.hora_inicio.hour * 60 + apontamento.hora_inicio.minute
+        fim = comeco + (
+            (apontamento.hora_termino.hour * 60 + apontamento.hora_termino.minute)
+            - (apontamento.hora_inicio.hour * 60 + apontamento.hora_inicio.minute)
+        ) % 1440
+        destino = (apontamento.projeto_id, apontamento.codigo_cliente_id, apontamento.centro_custo_id)
+
+        candidatos = Apontamento.objects.filter(
+            placa_normalizada=chave,
+            data_apontamento__gte=data - timedelta(days=1), data_apontamento__lte=data + timedelta(days=1),
+        ).exclude(pk__in=proprios).annotate(minutos=MinutosIntervalo()).values(
+            *_CAMPOS_DESTINO, 'data_apontamento', 'hora_inicio', 'hora_termino', 'minutos',
+            'projeto_id', 'codigo_cliente_id', 'centro_custo_id', 'colaborador__nome_completo',
+        )
+        for outro in candidatos:
+            if outro['id'] in vistos:
+                continue
+            inicio_outro = (
+                outro['data_apontamento'].toordinal() * 1440
+                + outro['hora_inicio'].hour * 60 + outro['hora_inicio'].minute
+            )
+            if inicio_outro < fim and comeco < inicio_outro + outro['minutos'] and (
+                (outro['projeto_id'], outro['codigo_cliente_id'], outro['centro_custo_id']) != destino
+            ):
+                vistos.add(outro['id'])
+                encontrados.append({
+                    'placa': chave,
+                    'colaborador': outro['colaborador__nome_completo'],
+                    'data': outro['data_apontamento'],
+                    'horario': f"{outro['hora_inicio']:%H:%M} às {outro['hora_termino']:%H:%M}",
+                    'destino': destino_custo(outro),
+                })
+    return encontrados
+
+
+def mensagem_conflito_veiculo(conflito):
+    """Aviso exibido após o envio quando o veículo já está apontado em outro destino."""
+    return (
+        f"Atenção: o veículo {conflito['placa']} também está apontado para {conflito['colaborador']} "
+        f"em {conflito['data']:%d/%m} ({conflito['horario']}, {conflito['destino']}). Confira a placa."
+    )
+
+
+# ==============================================================================
+# EXPORTAÇÃO
+# ==============================================================================
+
+def planilha_uso(resultado):
+    """Bytes do .xlsx: horas decimais por veículo e período, e a aba de usos simultâneos."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Uso por Veículo"
+    formato = '%d/%m/%Y' if resultado['granularidade'] == 'dia' else 'Sem. %d/%m'
+    ws.append(
+        ["Placa", "Veículo"] + [p.strftime(formato) for p in resultado['periodos']]
+        + ["Total (h)", "Total (HH:MM)", "Registros", "Conflitos"]
+    )
+    for v in resultado['veiculos']:
+        ws.append([
+            v['placa'], v['descricao'], *[round(m / 60, 2) for m in v['minutos']],
+            round(v['total'] / 60, 2), _hhmm(v['total']), v['registros'], v['conflitos'],
+        ])
+    for row in ws.iter_rows(min_row=2, min_col=3, max_col=3 + len(resultado['periodos'])):
+        for cell in row:
+            cell.number_format = '0.00'
+
+    simultaneos = wb.create_sheet("Uso Simultâneo")
+    simultaneos.append([
+        "Placa", "Data", "Registro A", "Colaborador A", "Horário A", "Destino A",
+        "Registro B", "Colaborador B", "Horário B", "Destino B",
+    ])
+    for c in resultado['conflitos']:
+        linha = [c['placa'], c['data'].strftime('%d/%m/%Y')]
+        for (pk, arquivado), colaborador, horario, destino in zip(
+            c['registros'], c['colaboradores'], c['horarios'], c['destinos']
+        ):
+            linha += [f"{pk}{' (arquivo)' if arquivado else ''}", colaborador, horario, destino]
+        simultaneos.append(linha)
+
+    for aba in (ws, simultaneos):
+        for cell in aba[1]:
+            cell.font = Font(bold=True, color="FFFFFF")
+            cell.fill = PatternFill(start_color="4F46E5", end_color="4F46E5", fill_type="solid")
+            cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
+        for i in range(1, aba.max_column + 1):
+            aba.column_dimensions[get_column_letter(i)].width = 14
+        aba.freeze_panes = 'C2'
+    ws.column_dimensions['B'].width = 28
+
+    ws.append([])
+    ws.append([f"Período: {resultado['inicio']:%d/%m/%Y} a {resultado['fim']:%d/%m/%Y}"])
+    ws.append(["Horas sem dupla contagem: registros sobrepostos da mesma placa contam uma vez."])
+
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
@@ -1,24 +1,50 @@
 from django.shortcuts import render, redirect, get_object_or_404, HttpResponse
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.contrib import messages
-from django.db.models import Q, Count
+from django.db.models import Q, Count, prefetch_related_objects
 from django.db import IntegrityError, transaction
 from django.utils import timezone
 from datetime import timedelta, datetime, date, time
 from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
+from django.core.handlers.asgi import ASGIRequest
 from django.forms.models import model_to_dict
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.functional import cached_property
+from django.utils.safestring import mark_safe
+from asgiref.sync import sync_to_async
 from openpyxl.styles import Font, PatternFill, Alignment
 import calendar
+import csv
+import logging
 import openpyxl
 import json
 import uuid
 
 
 # Imports locais
-from .forms import ApontamentoForm
-from .models import Apontamento, Projeto, Colaborador, Setor, Veiculo, CodigoCliente, CentroCusto, ApontamentoHistorico
+from .forms import ApontamentoForm, mensagem_conflito
+from .models import Apontamento, Projeto, Colaborador, Setor, Veiculo, CodigoCliente, CentroCusto, ApontamentoHistorico, ApontamentoArquivado, FechamentoPeriodo
+from .fechamento import fechar_periodo, resumo_congelado, planilha_fechamento
+from .eventos import fluxo_kpis, rotulo_projeto_dashboard
+from .cache_tags import chave_versionada, obter_ou_calcular
+from .busca import filtrar_por_texto
+from .registro import ConflitoHorario, escrita_colaborador, verificar_conflito
+from .fila import envios_do_usuario, gravar_ou_enfileirar
+from .linhas import duracao_hhmm, linhas_apontamentos, local_e_codigos, registrado_por_nome
+from .pacote import AGRUPAMENTOS, planilhas, zip_em_streaming
+from .auditoria import TIPOS_ANOMALIA, auditar, linha_anomalia, nomes_colaboradores
+from .calendario import dias_faltantes
+from .folha import folha_do_periodo, planilha_folha
+from .pivo import DIMENSOES, base_do_periodo, pivotar, planilha_pivo
+from .series import serie_temporal
+from .veiculos import conflitos_veiculo, mensagem_conflito_veiculo, planilha_uso, uso_veiculos
+from .relatorio import CABECALHO_RELATORIO, filtros_relatorio, linhas_relatorio, planilha_relatorio, registros_filtrados
+
+logger = logging.getLogger(__name__)
 
 # ==============================================================================
 # 1. LÓGICA DE CONTROLE DE ACESSO (RBAC & HELPERS)
@@ -63,6 +89,17 @@ def distribuir_horarios_com_gap(inicio, fim, qtd_obras):
         tempo_atual = fim_obra
     return intervalos
 
+def mensagem_protocolo(protocolo):
+    """Recibo do envio que foi para a fila de gravação (ver produtividade/fila.py)."""
+    return f"Registro recebido (protocolo #{protocolo}). Ele aparece no histórico como 'Processando' até ser gravado."
+
+def competencia_fechada(request, apontamento):
+    """Bloqueia alterações em registros de mês já fechado (folha processada)."""
+    if FechamentoPeriodo.data_esta_fechada(apontamento.data_apontamento):
+        messages.error(request, f"A competência {apontamento.data_apontamento:%m/%Y} está fechada. O registro não pode mais ser alterado.")
+        return True
+    return False
+
 @login_required
 def home_redirect_view(request):
     return redirect('produtividade:home_menu')
@@ -137,16 +174,10 @@ def apontamento_atividade_view(request):
                 lista_extras = [x.strip() for x in extras_obras_str.split(',') if x.strip()] if extras_obras_str else []
                 todas_obras_raw = ([principal_str] + lista_extras) if principal_str else lista_extras
 
-                if not todas_obras_raw:
-                    apontamento.status_aprovacao = 'EM_ANALISE'
-                    apontamento.save()
-                    messages.success(request, "Registro salvo (único).")
-                    return redirect('produtividade:novo_apontamento')
-
                 horarios = distribuir_horarios_com_gap(apontamento.hora_inicio, apontamento.hora_termino, len(todas_obras_raw))
                 aux_extras_str = form.cleaned_data.get('auxiliares_extras_list')
                 ids_aux_list = [int(x) for x in aux_extras_str.split(',') if x.strip().isdigit()] if aux_extras_str else []
-                contagem_sucesso = 0
+                novos_registros = []
 
                 for idx, item_hibrido in enumerate(todas_obras_raw):
                     try:
@@ -185,33 +216,50 @@ def apontamento_atividade_view(request):
                             if not CodigoCliente.objects.filter(pk=obj_id).exists(): continue
                             novo_registro.codigo_cliente_id = obj_id; novo_registro.projeto = None
                         
-                        novo_registro.save()
-                        contagem_sucesso += 1
-                        if form.cleaned_data.get('registrar_auxiliar') and ids_aux_list:
-                            novo_registro.auxiliares_extras.set(ids_aux_list)
-                    except Exception as e:
-                        print(f"Erro rateio: {e}")
+                        novos_registros.append(novo_registro)
+                    except Exception:
+                        logger.exception("Erro ao montar o rateio (item %r)", item_hibrido)
                         continue
-                
-                if contagem_sucesso > 0: messages.success(request, f"Rateio realizado: {contagem_sucesso} registros.")
-                else: messages.error(request, "Erro ao salvar rateio.")
-                return redirect('produtividade:novo_apontamento')
+
+                # Sem obras informadas: grava o registro único
+                if not todas_obras_raw:
+                    novos_registros = [apontamento]
+
+                # Todas as obras do rateio são gravadas juntas, com o conflito reverificado na transação
+                extras = ids_aux_list if form.cleaned_data.get('registrar_auxiliar') else None
+                try:
+                    protocolo = gravar_ou_enfileirar(novos_registros, extras, request.user)
+                except ConflitoHorario as e:
+                    form.add_error(None, mensagem_conflito(e.conflito, apontamento.colaborador))
+                else:
+                    if protocolo: messages.success(request, mensagem_protocolo(protocolo))
+                    elif not todas_obras_raw: messages.success(request, "Registro salvo (único).")
+                    elif novos_registros: messages.success(request, f"Rateio realizado: {len(novos_registros)} registros.")
+                    else: messages.error(request, "Erro ao salvar rateio.")
+                    for conflito in conflitos_veiculo(novos_registros):
+                        messages.warning(request, mensagem_conflito_veiculo(conflito))
+                    return redirect('produtividade:novo_apontamento')
 
             else:
                 apontamento.status_aprovacao = 'EM_ANALISE'
-                apontamento.save() 
+                ids_list = None
                 if form.cleaned_data.get('registrar_auxiliar'):
                     ids_string = form.cleaned_data.get('auxiliares_extras_list')
                     if ids_string:
                         ids_list = [int(x) for x in ids_string.split(',') if x.strip().isdigit()]
-                        apontamento.auxiliares_extras.set(ids_list)
-                    else:
-                        apontamento.auxiliares_extras.clear()
-                else:
-                    apontamento.auxiliares_extras.clear()
 
-                messages.success(request, f"Registro de {apontamento.colaborador} salvo com sucesso!")
-                return redirect('produtividade:novo_apontamento')
+                try:
+                    protocolo = gravar_ou_enfileirar([apontamento], ids_list, request.user)
+                except ConflitoHorario as e:
+                    # Outro envio gravou um horário sobreposto entre a validação e a gravação
+                    form.add_error(None, mensagem_conflito(e.conflito, apontamento.colaborador))
+                else:
+                    if protocolo: messages.success(request, mensagem_protocolo(protocolo))
+                    else: messages.success(request, f"Registro de {apontamento.colaborador} salvo com sucesso!")
+                    # Mesmo veículo apontado em outro destino no mesmo horário: avisa, sem bloquear
+                    for conflito in conflitos_veiculo([apontamento]):
+                        messages.warning(request, mensagem_conflito_veiculo(conflito))
+                    return redirect('produtividade:novo_apontamento')
     else:
         now_local = timezone.localtime(timezone.now())
         initial_data = {
@@ -233,6 +281,126 @@ def apontamento_atividade_view(request):
 # 3. EDIÇÃO E HISTÓRICO DE APONTAMENTOS
 # ==============================================================================
 
+# Incrementar ao alterar _linha_historico.html (descarta as linhas renderizadas em cache)
+VERSAO_LINHA_HISTORICO = 1
+TIMEOUT_LINHA_HISTORICO = 7 * 24 * 3600
+
+# Nomes de cadastro aparecem na linha: renomear uma obra/colaborador invalida as linhas
+TAGS_LINHA_HISTORICO = [
+    'catalog:projeto', 'catalog:cliente', 'catalog:centro_custo',
+    'catalog:veiculo', 'catalog:colaborador',
+]
+
+class LinhaHistorico:
+    """
+    Uma linha da tabela do histórico (registro principal ou auxiliar), sobre a
+    tupla de linhas_apontamentos(). Os textos de exibição são calculados sob demanda:
+    se a linha já está em cache, nada além da chave é avaliado.
+    """
+    def __init__(self, linha, owner, pode_agir):
+        self.linha = linha
+        self.pode_agir = pode_agir
+        self.pode_editar = (linha.contagem_edicao < 1) or owner
+
+    @property
+    def chave_cache(self):
+        l = self.linha
+        atualizacao = l.data_atualizacao.timestamp() if l.data_atualizacao else 0
+        return (
+            f"{'arq' if l.arquivado else 'ap'}:{l.id}:{l.aux_id or 0}:"
+            f"{l.contagem_edicao}:{l.status_aprovacao}:{atualizacao}:"
+            f"{int(self.pode_agir)}{int(self.pode_editar)}"
+        )
+
+    @property
+    def cacheavel(self):
+        # O formulário de aprovação de ajuste leva o token CSRF do usuário: não pode ser compartilhado
+        return self.linha.status_aprovacao != 'SOLICITACAO_AJUSTE'
+
+    # --- Atributos lidos pelo template ---
+
+    def __getattr__(self, nome):
+        # Campos da tupla (id, is_auxiliar, arquivado, latitude, status_aprovacao...)
+        return getattr(self.linha, nome)
+
+    @property
+    def data(self): return self.linha.data_apontamento
+    @property
+    def inicio(self): return self.linha.hora_inicio
+    @property
+    def termino(self): return self.linha.hora_termino
+    @property
+    def obs(self): return self.linha.ocorrencias
+    @property
+    def registrado_em(self): return self.linha.data_registro
+    @property
+    def nome(self): return self.linha.colaborador
+
+    @cached_property
+    def duracao(self):
+        return duracao_hhmm(self.linha)
+
+    @cached_property
+    def registrado_por_str(self):
+        return registrado_por_nome(self.linha)
+
+    @cached_property
+    def local_ref(self):
+        l = self.linha
+        # Formatação inteligente do Local
+        if l.local_execucao == 'INT':
+            if l.projeto_id:
+                return f"{l.projeto_codigo} - {l.projeto_nome}" if l.projeto_codigo else f"{l.projeto_nome}"
+            elif l.cliente_id:
+                return f"{l.cliente_codigo} - {l.cliente_nome}"
+            return "Obra/Cliente não informado"
+
+        local_ref = l.centro_custo_nome if l.centro_custo_id else "Atividade Externa"
+        if l.projeto_id:
+            local_ref += f" (Obra: {l.projeto_codigo})"
+        elif l.cliente_id:
+            local_ref += f" (CLIENTE: {l.cliente_codigo})"
+        return local_ref
+
+    @cached_property
+    def veiculo(self):
+        # Formatação inteligente do Veículo (auxiliares vão de carona: coluna vazia)
+        l = self.linha
+        if l.is_auxiliar: return ""
+        if l.veiculo_id: return f"{l.veiculo_descricao} - {l.veiculo_placa}" if l.veiculo_descricao else l.veiculo_placa
+        if l.veiculo_manual_placa: return f"{l.veiculo_manual_modelo} - {l.veiculo_manual_placa} (Externo)"
+        return ""
+
+def renderizar_linhas_historico(request, linhas, owner, gestor):
+    """
+    HTML de cada linha, reaproveitando o cache sempre que possível.
+    Uma única leitura (get_many) traz todas as linhas já renderizadas; só as novas
+    ou alteradas passam pelo template e são gravadas de volta (set_many).
+    """
+    template = get_template('produtividade/_linha_historico.html')
+    contexto_base = {'is_owner': owner, 'is_gestor': gestor}
+    prefixo = chave_versionada(
+        f"historico:linha:v{VERSAO_LINHA_HISTORICO}:{int(owner)}{int(gestor)}", TAGS_LINHA_HISTORICO
+    )
+
+    chaves = [f"{prefixo}:{linha.chave_cache}" if linha.cacheavel else None for linha in linhas]
+    em_cache = cache.get_many([c for c in chaves if c])
+
+    html, novos = [], {}
+    for linha, chave in zip(linhas, chaves):
+        fragmento = em_cache.get(chave) if chave else None
+        if fragmento is None:
+            contexto = dict(contexto_base, item=linha)
+            # Sem request (e sem context processors), exceto quando há token CSRF na linha
+            fragmento = template.render(contexto, request if chave is None else None)
+            if chave:
+                novos[chave] = fragmento
+        html.append(mark_safe(fragmento))
+
+    if novos:
+        cache.set_many(novos, timeout=TIMEOUT_LINHA_HISTORICO)
+    return html
+
 @login_required
 def historico_apontamentos_view(request):
     """
@@ -240,20 +408,19 @@ def historico_apontamentos_view(request):
     """
     user = request.user
     
-    # Eager Loading para evitar N+1 queries
-    queryset = Apontamento.objects.select_related(
-        'projeto', 'codigo_cliente', 'colaborador', 
-        'veiculo', 'centro_custo', 'registrado_por'
-    ).prefetch_related('auxiliares_extras').all()
+    # Colunas e auxiliares são lidos em lote por linhas_apontamentos()
+    queryset = Apontamento.objects.all()
 
     # --- Filtros de Data ---
     period = request.GET.get('period')
     start_date_str = request.GET.get('start_date')
     end_date_str = request.GET.get('end_date')
+    busca = request.GET.get('q', '').strip()
     
     end_date = timezone.now().date()
     start_date = end_date - timedelta(days=6)
     current_period = '7'
+    filtrar_datas = True
 
     if period:
         try:
@@ -271,8 +438,22 @@ def historico_apontamentos_view(request):
             current_period = 'custom'
         except ValueError:
             pass
-
-    queryset = queryset.filter(data_apontamento__gte=start_date, data_apontamento__lte=end_date)
+    elif busca:
+        # Busca textual sem período explícito percorre todo o histórico (índice FTS)
+        filtrar_datas = False
+        current_period = 'busca'
+
+    if filtrar_datas:
+        queryset = queryset.filter(data_apontamento__gte=start_date, data_apontamento__lte=end_date)
+    queryset = filtrar_por_texto(queryset, busca)
+
+    # Owner consulta também o arquivo (períodos antigos já movidos da tabela principal)
+    arquivados = None
+    if is_owner(user):
+        arquivados = ApontamentoArquivado.objects.all()
+        if filtrar_datas:
+            arquivados = arquivados.filter(data_apontamento__gte=start_date, data_apontamento__lte=end_date)
+        arquivados = filtrar_por_texto(arquivados, busca)
 
     # --- Regras de Visualização ---
     if not is_owner(user) and not is_gerente(user):
@@ -289,108 +470,39 @@ def historico_apontamentos_view(request):
             start_date = limit_date
         queryset = queryset.filter(data_apontamento__gte=limit_date)
 
-    # Processamento para exibição
-    historico_lista = []
+    # Processamento para exibição (linha principal + uma linha por auxiliar, já expandidas)
+    owner = is_owner(user)
+    gestor = is_gerente(user)
+    linhas = []
 
     total_segundos_geral = 0
 
-    for item in queryset:
-        # Formatação inteligente do Local
-        if item.local_execucao == 'INT':
-            local_tipo_display = "DENTRO DA OBRA"
-            if item.projeto:
-                p_cod = item.projeto.codigo if item.projeto.codigo else ""
-                local_ref = f"{p_cod} - {item.projeto.nome}" if p_cod else f"{item.projeto.nome}"
-            elif item.codigo_cliente:
-                local_ref = f"{item.codigo_cliente.codigo} - {item.codigo_cliente.nome}"
-            else:
-                local_ref = "Obra/Cliente não informado"
-        else:
-            local_tipo_display = "FORA DO SETOR"
-            local_ref = item.centro_custo.nome if item.centro_custo else "Atividade Externa"
-            if item.projeto:
-                local_ref += f" (Obra: {item.projeto.codigo})"
-            elif item.codigo_cliente:
-                local_ref += f" (CLIENTE: {item.codigo_cliente.codigo})"
-
-        # Formatação inteligente do Veículo
-        if item.veiculo: 
-            veiculo_display = str(item.veiculo)
-        elif item.veiculo_manual_placa: 
-            veiculo_display = f"{item.veiculo_manual_modelo} - {item.veiculo_manual_placa} (Externo)"
-        else: 
-            veiculo_display = ""
-
-        reg_user = item.registrado_por
-        user_display = f"{reg_user.first_name} {reg_user.last_name}" if reg_user and reg_user.first_name else (reg_user.username if reg_user else "Sistema")
-
-        # Horas totais do apontamento
-        duracao_formatada = item.duracao_total_str
-
-        base_dict = {
-            'id': item.id,
-            'data': item.data_apontamento,
-            'local_ref': local_ref,
-            'local_tipo': local_tipo_display,
-            'inicio': item.hora_inicio,
-            'termino': item.hora_termino,
-            'duracao': duracao_formatada,
-            'local_tipo': item.get_local_execucao_display(),
-            'obs': item.ocorrencias,
-            'registrado_em': item.data_registro,
-            'registrado_por_str': user_display,
-            'registrado_por_id': item.registrado_por.id if item.registrado_por else None,
-            'em_plantao': item.em_plantao,
-            'dorme_fora': item.dorme_fora,
-            'motivo_ajuste': item.motivo_ajuste,
-            'status_ajuste': item.status_ajuste,
-            'status_aprovacao': item.status_aprovacao,
-            'contagem_edicao': item.contagem_edicao,
-            'pode_editar': (item.contagem_edicao < 1) or is_owner(user),
-            'motivo_rejeicao': item.motivo_rejeicao,
-            'latitude': item.latitude,
-            'longitude': item.longitude,
-        }
+    for linha in linhas_apontamentos(queryset, arquivados, reverse=True):
+        pode_agir = owner or linha.registrado_por_id == user.id
+        linhas.append(LinhaHistorico(linha, owner, pode_agir))
 
-        # Adiciona linha principal (Colaborador)
-        row_main = base_dict.copy()
-        row_main.update({
-            'nome': item.colaborador.nome_completo, 
-            'cargo': item.colaborador.cargo, 
-            'veiculo': veiculo_display, 
-            'is_auxiliar': False
-        })
-        historico_lista.append(row_main)
+    historico_lista = renderizar_linhas_historico(request, linhas, owner, gestor)
 
-        # Adiciona linhas de Auxiliares (se houver) para visualização expandida
-        auxiliares_a_exibir = []
-        if item.auxiliar: auxiliares_a_exibir.append(item.auxiliar)
-        
-        extras = item.auxiliares_extras.all()
-        auxiliares_a_exibir.extend(extras)
-
-        for aux in auxiliares_a_exibir:
-            row_aux = base_dict.copy()
-            row_aux.update({
-                'nome': aux.nome_completo,
-                'cargo': aux.cargo,
-                'veiculo': "",
-                'is_auxiliar': True
-            })
-            historico_lista.append(row_aux)
+    # Envios de quem consulta ainda na fila de gravação (ou recusados por ela)
+    envios_fila = envios_do_usuario(user.id)
+    prefetch_related_objects(
+        [envio['apontamento'] for envio in envios_fila], 'colaborador', 'projeto', 'codigo_cliente', 'centro_custo'
+    )
 
     total_horas_periodo = f"{total_segundos_geral // 3600:02d}:{(total_segundos_geral % 3600) // 60:02d}"
 
     context = {
         'titulo': "Histórico",
         'apontamentos_lista': historico_lista,
-        'show_user_column': is_owner(user), 
-        'is_owner': is_owner(user),
-        'is_gestor': is_gerente(user),
+        'show_user_column': owner, 
+        'is_owner': owner,
+        'is_gestor': gestor,
         'current_period': current_period,
         'start_date_val': start_date.strftime('%Y-%m-%d'),
         'end_date_val': end_date.strftime('%Y-%m-%d'),
         'total_horas_periodo': total_horas_periodo,
+        'busca': busca,
+        'envios_fila': envios_fila,
     }
     return render(request, 'produtividade/historico_apontamentos.html', context)
 
@@ -410,6 +522,9 @@ def editar_apontamento_view(request, pk):
         messages.error(request, "Limite de edição atingido. Para correções, utilize a opção 'Solicitar Ajuste'.")
         return redirect('produtividade:historico_apontamentos')
 
+    if competencia_fechada(request, apontamento):
+        return redirect('produtividade:historico_apontamentos')
+
     user_kwargs = {'user': request.user, 'instance': apontamento}
 
     if request.method == 'POST':
@@ -423,35 +538,40 @@ def editar_apontamento_view(request, pk):
 
         form = ApontamentoForm(request.POST, **user_kwargs)
         if form.is_valid():
-            with transaction.atomic():
-                ApontamentoHistorico.objects.create(
-                    apontamento_original=apontamento,
-                    dados_snapshot=dados_originais,
-                    editado_por=user,
-                    numero_edicao=apontamento.contagem_edicao + 1
-                )
-
-                obj = form.save(commit=False)
-                obj.contagem_edicao += 1
-                obj.status_aprovacao = 'EM_ANALISE'
-                obj.motivo_rejeicao = None
+            try:
+                # Conflito reverificado na mesma transação da gravação (envios simultâneos)
+                with escrita_colaborador(form.instance.colaborador_id):
+                    verificar_conflito(form.instance)
+                    ApontamentoHistorico.objects.create(
+                        apontamento_original=apontamento,
+                        dados_snapshot=dados_originais,
+                        editado_por=user,
+                        numero_edicao=apontamento.contagem_edicao + 1
+                    )
+
+                    obj = form.save(commit=False)
+                    obj.contagem_edicao += 1
+                    obj.status_aprovacao = 'EM_ANALISE'
+                    obj.motivo_rejeicao = None
                 
-                if not form.cleaned_data.get('registrar_auxiliar'): obj.auxiliar = None
-                if not form.cleaned_data.get('registrar_veiculo'):
-                    obj.veiculo = None; obj.veiculo_manual_modelo = None; obj.veiculo_manual_placa = None
+                    if not form.cleaned_data.get('registrar_auxiliar'): obj.auxiliar = None
+                    if not form.cleaned_data.get('registrar_veiculo'):
+                        obj.veiculo = None; obj.veiculo_manual_modelo = None; obj.veiculo_manual_placa = None
                 
-                obj.save()
-
-                if form.cleaned_data.get('registrar_auxiliar'):
-                    ids_string = form.cleaned_data.get('auxiliares_extras_list')
-                    if ids_string:
-                        ids_list = [int(x) for x in ids_string.split(',') if x.strip().isdigit()]
-                        obj.auxiliares_extras.set(ids_list)
+                    obj.save()
+
+                    if form.cleaned_data.get('registrar_auxiliar'):
+                        ids_string = form.cleaned_data.get('auxiliares_extras_list')
+                        if ids_string:
+                            ids_list = [int(x) for x in ids_string.split(',') if x.strip().isdigit()]
+                            obj.auxiliares_extras.set(ids_list)
+                        else: obj.auxiliares_extras.clear()
                     else: obj.auxiliares_extras.clear()
-                else: obj.auxiliares_extras.clear()
-
-            messages.success(request, "Apontamento editado com sucesso! (Histórico salvo)")
-            return redirect('produtividade:historico_apontamentos')
+            except ConflitoHorario as e:
+                form.add_error(None, mensagem_conflito(e.conflito, form.instance.colaborador))
+            else:
+                messages.success(request, "Apontamento editado com sucesso! (Histórico salvo)")
+                return redirect('produtividade:historico_apontamentos')
     else:
         initial_data = {}
         if apontamento.veiculo:
@@ -497,6 +617,9 @@ def solicitar_ajuste_view(request, pk):
          messages.error(request, "Você não tem permissão para solicitar ajuste neste registro.")
          return redirect('produtividade:historico_apontamentos')
 
+    if competencia_fechada(request, apontamento):
+        return redirect('produtividade:historico_apontamentos')
+
     if request.method == 'POST':
         motivo = request.POST.get('motivo_texto')
         if motivo:
@@ -516,6 +639,8 @@ def solicitar_ajuste_view(request, pk):
 def excluir_apontamento_view(request, pk):
     """Exclusão de registro (Acesso Admin)."""
     apontamento = get_object_or_404(Apontamento, pk=pk)
+    if competencia_fechada(request, apontamento):
+        return redirect('produtividade:historico_apontamentos')
     apontamento.delete()
     messages.success(request, "Apontamento excluído com sucesso.")
     return redirect('produtividade:historico_apontamentos')
@@ -526,6 +651,8 @@ def excluir_apontamento_view(request, pk):
 def aprovar_ajuste_view(request, pk):
     """Aprovação rápida de ajuste sem necessidade de edição."""
     apontamento = get_object_or_404(Apontamento, pk=pk)
+    if competencia_fechada(request, apontamento):
+        return redirect('produtividade:historico_apontamentos')
     apontamento.status_ajuste = 'APROVADO'
     apontamento.save()
     messages.success(request, "Solicitação marcada como APROVADA.")
@@ -540,30 +667,49 @@ def aprovar_ajuste_view(request, pk):
 def apontamento_sucesso_view(request):
     return render(request, 'produtividade/apontamento_sucesso.html')
 
+# Dados de cadastro: cache compartilhado invalidado pelas tags de catálogo (ver cache_tags.py)
+
 @login_required
 def get_projeto_info_ajax(request, projeto_id):
-    projeto = get_object_or_404(Projeto, pk=projeto_id)
-    return JsonResponse({'nome_projeto': projeto.nome})
+    dados = obter_ou_calcular(
+        f'ajax:projeto:{projeto_id}',
+        lambda: {'nome_projeto': get_object_or_404(Projeto, pk=projeto_id).nome},
+        tags=['catalog:projeto']
+    )
+    return JsonResponse(dados)
 
 @login_required
 def get_colaborador_info_ajax(request, colaborador_id):
-    colaborador = get_object_or_404(Colaborador, pk=colaborador_id)
-    return JsonResponse({'cargo': colaborador.cargo})
+    dados = obter_ou_calcular(
+        f'ajax:colaborador:{colaborador_id}',
+        lambda: {'cargo': get_object_or_404(Colaborador, pk=colaborador_id).cargo},
+        tags=[f'colaborador:{colaborador_id}']
+    )
+    return JsonResponse(dados)
 
 @login_required
 def get_auxiliares_ajax(request):
+    dados = obter_ou_calcular('ajax:auxiliares', lista_auxiliares, tags=['catalog:colaborador'])
+    return JsonResponse(dados)
+
+def lista_auxiliares():
     auxs = Colaborador.objects.filter(cargo__in=['AUXILIAR TECNICO', 'OFICIAL DE SISTEMAS']).values('id', 'nome_completo')
-    return JsonResponse({'auxiliares': list(auxs)})
+    return {'auxiliares': list(auxs)}
 
 @login_required
 def get_centro_custo_info_ajax(request, cc_id):
-    cc = get_object_or_404(CentroCusto, pk=cc_id)
-    return JsonResponse({'permite_alocacao': cc.permite_alocacao})
+    dados = obter_ou_calcular(
+        f'ajax:centro_custo:{cc_id}',
+        lambda: {'permite_alocacao': get_object_or_404(CentroCusto, pk=cc_id).permite_alocacao},
+        tags=['catalog:centro_custo']
+    )
+    return JsonResponse(dados)
 
 @login_required
-def get_calendar_status_ajax(request):
+async def get_calendar_status_ajax(request):
     """
     Retorna o status dos dias no calendário (preenchido, dorme_fora, etc.) para feedback visual.
+    View assíncrona: o widget faz polling e não deve prender um worker síncrono.
     """
     try:
         month = int(request.GET.get('month'))
@@ -571,11 +717,11 @@ def get_calendar_status_ajax(request):
     except (ValueError, TypeError):
         return JsonResponse({'error': 'Parâmetros inválidos'}, status=400)
     
-    user = request.user
+    user = await request.auser()
     if is_owner(user): return JsonResponse({'is_owner': True, 'days': []})
 
     try:
-        colaborador = Colaborador.objects.get(user_account=user)
+        colaborador = await Colaborador.objects.aget(user_account=user)
     except Colaborador.DoesNotExist:
         return JsonResponse({'error': 'Colaborador não encontrado'}, status=400)
 
@@ -589,7 +735,7 @@ def get_calendar_status_ajax(request):
     
     # Mapeia dias com atividades
     dias_info = {}
-    for entry in queryset:
+    async for entry in queryset:
         d_str = entry['data_apontamento'].strftime('%Y-%m-%d')
         if d_str not in dias_info:
             dias_info[d_str] = {
@@ -629,32 +775,35 @@ def get_calendar_status_ajax(request):
     return JsonResponse({'is_owner': False, 'days': days_data})
 
 @csrf_exempt
-def api_dashboard_data(request):
+async def api_dashboard_data(request):
     """
     API JSON para alimentar o Dashboard externo (PHP) ou interno.
     Agora protegida por API Key, igual à exportação.
+    Assíncrona (ORM async) para suportar muitos clientes em polling sob ASGI.
     """
     # 1. Segurança via API Key
     api_key_esperada = getattr(settings, 'DJANGO_API_KEY', 'chave_secreta_123')
     token_recebido = request.headers.get('X-API-KEY')
 
     # Permite acesso se tiver a chave OU se for usuário logado no navegador
-    if token_recebido != api_key_esperada and not request.user.is_authenticated:
+    if token_recebido != api_key_esperada and not (await request.auser()).is_authenticated:
          return JsonResponse({'erro': 'Acesso Negado'}, status=403)
 
     # 2. Definir o range de datas (Vamos pegar dados de HOJE)
     hoje = timezone.now().date()
     
     # 3. Buscar os apontamentos
-    qs = Apontamento.objects.filter(data_apontamento=hoje).select_related('projeto', 'colaborador')
+    qs = Apontamento.objects.filter(data_apontamento=hoje).select_related(
+        'projeto', 'colaborador', 'codigo_cliente', 'centro_custo'
+    )
 
     # 4. Processar métricas
-    total_registros = qs.count()
+    total_registros = await qs.acount()
     total_segundos = 0
     projetos_ativos = {}
     colaboradores_ids = set()
 
-    for a in qs:
+    async for a in qs:
         # Calcular horas (Termino - Inicio)
         if a.hora_inicio and a.hora_termino:
             dummy_date = date(2000, 1, 1)
@@ -668,13 +817,13 @@ def api_dashboard_data(request):
             diff = dt_termino - dt_inicio
             total_segundos += diff.total_seconds()
 
-        # Contagem por Projeto
-        nome_proj = "Outros"
-        if a.local_execucao == 'INT':
-             if a.projeto: nome_proj = a.projeto.nome
-             elif a.codigo_cliente: nome_proj = f"Cliente {a.codigo_cliente.codigo}"
-        else:
-             if a.centro_custo: nome_proj = a.centro_custo.nome
+        # Contagem por Projeto (mesmo rótulo usado no feed SSE)
+        nome_proj = rotulo_projeto_dashboard(
+            a.local_execucao,
+            a.projeto.nome if a.projeto else None,
+            a.codigo_cliente.codigo if a.codigo_cliente else None,
+            a.centro_custo.nome if a.centro_custo else None,
+        )
 
         projetos_ativos[nome_proj] = projetos_ativos.get(nome_proj, 0) + 1
         
@@ -702,159 +851,75 @@ def api_dashboard_data(request):
 
     return JsonResponse(data)
 
+@csrf_exempt
+async def api_serie_temporal(request):
+    """
+    Série temporal de horas, efetivo e apontamentos para o Dashboard (histórico).
+    Parâmetros (todos opcionais):
+      - inicio / fim: AAAA-MM-DD (padrão: últimos 30 dias)
+      - granularidade: dia | semana | mes (padrão dia)
+      - agrupamento: projeto | codigo_cliente | centro_custo | setor | colaborador (padrão projeto)
+    Mesma autenticação de api_dashboard_data. Agregado no banco e em cache (ver series.py).
+    """
+    api_key_esperada = getattr(settings, 'DJANGO_API_KEY', 'chave_secreta_123')
+    token_recebido = request.headers.get('X-API-KEY')
+    if token_recebido != api_key_esperada and not (await request.auser()).is_authenticated:
+         return JsonResponse({'erro': 'Acesso Negado'}, status=403)
+
+    hoje = timezone.now().date()
+    try:
+        fim = datetime.strptime(request.GET['fim'], '%Y-%m-%d').date() if request.GET.get('fim') else hoje
+        inicio = datetime.strptime(request.GET['inicio'], '%Y-%m-%d').date() if request.GET.get('inicio') else fim - timedelta(days=30)
+    except ValueError:
+        return JsonResponse({'erro': 'Datas inválidas. Use o formato AAAA-MM-DD.'}, status=400)
+
+    try:
+        dados = await sync_to_async(serie_temporal)(
+            inicio, fim,
+            granularidade=request.GET.get('granularidade', 'dia'),
+            agrupamento=request.GET.get('agrupamento', 'projeto'),
+        )
+    except ValueError as e:
+        return JsonResponse({'erro': str(e)}, status=400)
+
+    return JsonResponse(dados, json_dumps_params={'separators': (',', ':')})
+
+async def api_dashboard_stream(request):
+    """
+    Feed ao vivo (Server-Sent Events) dos KPIs de hoje.
+    Envia um 'snapshot' ao conectar e depois um 'delta' a cada apontamento criado,
+    editado, aprovado ou excluído. Mesma autenticação de api_dashboard_data.
+    """
+    api_key_esperada = getattr(settings, 'DJANGO_API_KEY', 'chave_secreta_123')
+    token_recebido = request.headers.get('X-API-KEY')
+    if token_recebido != api_key_esperada and not (await request.auser()).is_authenticated:
+         return JsonResponse({'erro': 'Acesso Negado'}, status=403)
+
+    # Sob WSGI o Django consumiria o stream inteiro antes de responder (prenderia o worker)
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'erro': 'Stream disponível apenas com servidor ASGI (uvicorn).'}, status=501)
+
+    duracao = getattr(settings, 'DASHBOARD_SSE_DURACAO', 300)
+    response = StreamingHttpResponse(fluxo_kpis(duracao), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Nginx: não bufferizar o stream
+    return response
+
 # ==============================================================================
 # 5. RELATÓRIOS (EXPORTAÇÃO EXCEL)
 # ==============================================================================
 
+def registros_relatorio(request):
+    """Linhas do relatório com os filtros da querystring (ver relatorio.filtros_relatorio)."""
+    return registros_filtrados(filtros_relatorio(request.GET))
+
 @login_required
 @user_passes_test(is_owner)
 def exportar_relatorio_excel(request):
     """
     Gera um relatório consolidado em Excel para conferência de folha e custos.
     """
-    start_date_str = request.GET.get('start_date')
-    end_date_str = request.GET.get('end_date')
-
-    queryset = Apontamento.objects.select_related(
-        'projeto', 'colaborador', 'veiculo', 'centro_custo', 'codigo_cliente'
-    ).prefetch_related('auxiliares_extras').all().order_by('data_apontamento')
-    
-    if start_date_str and end_date_str:
-        try:
-            start = timezone.datetime.strptime(start_date_str, '%Y-%m-%d').date()
-            end = timezone.datetime.strptime(end_date_str, '%Y-%m-%d').date()
-            queryset = queryset.filter(data_apontamento__gte=start, data_apontamento__lte=end)
-        except ValueError:
-            pass
-
-    # Setup do Excel
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Relatorio de Horas"
-
-    # Cabeçalho
-    headers = [
-        "Data", "Dia Semana", "Colaborador", "Cargo", "Tipo", 
-        "Local (Obra/Setor)", "Código de Obra", "Código Cliente", 
-        "Veículo", "Placa", "Hora Início", "Hora Fim", "Total Horas", 
-        "Plantão", "Dorme Fora", "Observações", "Registrado Por", 'Latitude', 'Longitude'
-    ]
-    ws.append(headers)
-
-    # Estilo do cabeçalho
-    for cell in ws[1]:
-        cell.font = Font(bold=True, color="FFFFFF")
-        cell.fill = PatternFill(start_color="4F46E5", end_color="4F46E5", fill_type="solid")
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-
-    def format_duration(inicio, fim):
-        """Calcula a duração considerando virada de dia."""
-        if not inicio or not fim: return "00:00:00"
-        dummy_date = timezone.now().date()
-        dt_inicio = timezone.datetime.combine(dummy_date, inicio)
-        dt_fim = timezone.datetime.combine(dummy_date, fim)
-        
-        if dt_fim < dt_inicio:
-            dt_fim += timedelta(days=1)
-
-        diff = dt_fim - dt_inicio
-        total_seconds = int(diff.total_seconds())
-        hours = total_seconds // 3600
-        minutes = (total_seconds % 3600) // 60
-        seconds = total_seconds % 60
-        return f"{hours:02}:{minutes:02}:{seconds:02}"
-
-    dias_semana_pt = {
-        0: 'Segunda-feira', 1: 'Terça-feira', 2: 'Quarta-feira',
-        3: 'Quinta-feira', 4: 'Sexta-feira', 5: 'Sábado', 6: 'Domingo'
-    }
-
-    for item in queryset:
-        data_fmt = item.data_apontamento.strftime('%d/%m/%Y')
-        dia_semana = dias_semana_pt[item.data_apontamento.weekday()]
-        
-        # Local
-        local_nome = ""
-        col_codigo_obra = ""
-        col_codigo_cliente = ""
-
-        if item.local_execucao == 'INT':
-            tipo = "OBRA"
-            if item.projeto:
-                local_nome = item.projeto.nome
-                col_codigo_obra = item.projeto.codigo
-            elif item.codigo_cliente:
-                local_nome = item.codigo_cliente.nome
-                col_codigo_cliente = item.codigo_cliente.codigo
-        else:
-            tipo = "FORA DO SETOR"
-            local_nome = item.centro_custo.nome if item.centro_custo else "Atividade Externa"
-            if item.projeto: col_codigo_obra = item.projeto.codigo
-            elif item.codigo_cliente: col_codigo_cliente = item.codigo_cliente.codigo
-
-        if col_codigo_obra and len(col_codigo_obra) >= 5:
-             col_codigo_cliente = col_codigo_obra[1:5]
-        elif col_codigo_obra:
-             col_codigo_cliente = col_codigo_obra
-
-        # Veículo
-        veiculo_nome_modelo = ""
-        veiculo_placa_only = ""
-
-        if item.veiculo:
-            veiculo_nome_modelo = item.veiculo.descricao if item.veiculo.descricao else "Veículo da Frota"
-            veiculo_placa_only = item.veiculo.placa
-        elif item.veiculo_manual_modelo:
-            veiculo_nome_modelo = item.veiculo_manual_modelo
-            veiculo_placa_only = item.veiculo_manual_placa if item.veiculo_manual_placa else ""
-
-        duracao_str = format_duration(item.hora_inicio, item.hora_termino)
-        reg_por = item.registrado_por.username if item.registrado_por else "Sistema"
-
-        # Apenas Status SIM/NÃO
-        plantao_str = "SIM" if item.em_plantao else "NÃO"
-        dorme_fora_str = "SIM" if item.dorme_fora else "NÃO"
-
-        # Linha Principal (Colunas ajustadas)
-        row_principal = [
-            data_fmt, dia_semana, item.colaborador.nome_completo, item.colaborador.cargo,
-            tipo, local_nome, col_codigo_obra, col_codigo_cliente, 
-            veiculo_nome_modelo, veiculo_placa_only, item.hora_inicio, item.hora_termino, 
-            duracao_str, plantao_str, dorme_fora_str, 
-            item.ocorrencias, reg_por,
-            item.latitude, item.longitude
-        ]
-        ws.append(row_principal)
-
-        # Linhas Auxiliares (Carona)
-        auxiliares = []
-        if item.auxiliar:
-            auxiliares.append(item.auxiliar)
-        
-        extras = list(item.auxiliares_extras.all())
-        auxiliares.extend(extras)
-
-        for aux in auxiliares:
-            row_aux = [
-                data_fmt, dia_semana, aux.nome_completo, aux.cargo,
-                tipo, local_nome, col_codigo_obra, col_codigo_cliente, 
-                "Carona", "", item.hora_inicio, item.hora_termino, 
-                duracao_str, plantao_str, dorme_fora_str, 
-                f"Auxiliar de: {item.colaborador.nome_completo}", reg_por
-            ]
-            ws.append(row_aux)
-
-    # Auto-ajuste de largura das colunas
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except: pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column].width = adjusted_width
+    wb = planilha_relatorio(registros_relatorio(request))
 
     response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
     filename = f"Relatorio_Horas_{timezone.now().strftime('%Y%m%d_%H%M')}.xlsx"
@@ -864,105 +929,226 @@ def exportar_relatorio_excel(request):
     return response
 
 
-@csrf_exempt
-def api_exportar_json(request):
-    api_key_esperada = getattr(settings, 'DJANGO_API_KEY', 'chave_secreta_123')
-    token_recebido = request.headers.get('X-API-KEY')
-    if token_recebido != api_key_esperada: return JsonResponse({'erro': 'Acesso Negado'}, status=403)
+class Echo:
+    """Buffer que apenas devolve o valor escrito (csv.writer -> StreamingHttpResponse)."""
+    def write(self, value):
+        return value
 
-    days = int(request.GET.get('days', 45))
-    start_date = timezone.now().date() - timedelta(days=days)
-    
-    queryset = Apontamento.objects.select_related(
-        'projeto', 'colaborador', 'veiculo', 'centro_custo', 'codigo_cliente'
-    ).prefetch_related('auxiliares_extras').filter(
-        data_apontamento__gte=start_date
-    ).order_by('data_apontamento')
+@login_required
+@user_passes_test(is_owner)
+def exportar_relatorio_csv(request):
+    """
+    Mesmo conteúdo do relatório Excel em CSV, gerado em streaming (memória constante).
+    UTF-8 com BOM e separador ';' para abrir direto no Excel em português.
+    Aceita os mesmos filtros: start_date, end_date, setor e projeto.
+    """
+    writer = csv.writer(Echo(), delimiter=';')
+
+    def gerar():
+        yield '\ufeff'
+        yield writer.writerow(CABECALHO_RELATORIO)
+        for row in linhas_relatorio(registros_relatorio(request)):
+            yield writer.writerow(['' if v is None else v for v in row])
 
-    dados_saida = []
+    response = StreamingHttpResponse(gerar(), content_type='text/csv; charset=utf-8')
+    filename = f"Relatorio_Horas_{timezone.now().strftime('%Y%m%d_%H%M')}.csv"
+    response['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
+
+
+@login_required
+@user_passes_test(is_owner)
+def exportar_pacote_zip(request):
+    """
+    Pacote de fechamento: uma planilha por setor (ou por projeto, com por=projeto) no
+    período, geradas em processos paralelos e enviadas num ZIP em streaming.
+    Aceita também os filtros setor e projeto do relatório.
+    """
+    filtros = filtros_relatorio(request.GET)
+    if 'data_apontamento__gte' not in filtros:
+        messages.error(request, "Informe o período (data inicial e final) para gerar o pacote.")
+        return redirect('produtividade:historico_apontamentos')
+
+    agrupamento = request.GET.get('por', 'setor')
+    if agrupamento not in AGRUPAMENTOS:
+        agrupamento = 'setor'
+
+    response = StreamingHttpResponse(
+        zip_em_streaming(planilhas(filtros, agrupamento)), content_type='application/zip'
+    )
+    inicio, fim = filtros['data_apontamento__gte'], filtros['data_apontamento__lte']
+    filename = f"Pacote_{agrupamento}_{inicio:%Y%m%d}_{fim:%Y%m%d}.zip"
+    response['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
 
+
+@login_required
+@user_passes_test(is_owner)
+def relatorio_pivo(request):
+    """
+    Tabela dinâmica de horas (ver pivo.py), em JSON ou planilha (formato=xlsx). Parâmetros:
+      - start_date / end_date: período (AAAA-MM-DD), obrigatório
+      - linhas: dimensões separadas por vírgula (padrão: colaborador,obra)
+      - coluna: dimensão das colunas (padrão: semana; vazio = apenas o total)
+      - auxiliares=0: somente as horas dos titulares
+    Dimensões: colaborador, setor, obra, papel, dia, semana, mes.
+    """
+    planilha = request.GET.get('formato') == 'xlsx'
+    filtros = filtros_relatorio(request.GET)
+    try:
+        if 'data_apontamento__gte' not in filtros:
+            raise ValueError("Informe o período (data inicial e final) para a tabela dinâmica.")
+        inicio, fim = filtros['data_apontamento__gte'], filtros['data_apontamento__lte']
+        if fim < inicio:
+            raise ValueError("A data final deve ser igual ou posterior à inicial.")
+        linhas = [d.strip() for d in request.GET.get('linhas', 'colaborador,obra').split(',') if d.strip()]
+        resultado = pivotar(
+            base_do_periodo(inicio, fim), linhas,
+            coluna=request.GET.get('coluna', 'semana') or None,
+            auxiliares=request.GET.get('auxiliares') != '0',
+        )
+    except ValueError as e:
+        if planilha:
+            messages.error(request, str(e))
+            return redirect('produtividade:historico_apontamentos')
+        return JsonResponse({'erro': str(e), 'dimensoes': list(DIMENSOES)}, status=400)
+
+    if not planilha:
+        return JsonResponse(resultado, json_dumps_params={'separators': (',', ':')})
+
+    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    filename = f"Horas_{'_'.join(resultado['linhas'])}_{inicio:%Y%m%d}_{fim:%Y%m%d}.xlsx"
+    response['Content-Disposition'] = f'attachment; filename={filename}'
+    planilha_pivo(resultado).save(response)
+    return response
+
+
+# Ordem das chaves de cada linha da exportação JSON (também usada no modo colunar)
+COLUNAS_EXPORTACAO_JSON = [
+    'data', 'dia_semana', 'tipo', 'local', 'codigo_obra', 'codigo_cliente',
+    'hora_inicio', 'hora_fim', 'observacoes', 'registrado_por', 'dorme_fora',
+    'em_plantao', 'status', 'colaborador', 'cargo', 'veiculo', 'placa', 'is_auxiliar'
+]
+
+# Colunas com muita repetição: no modo colunar viram índices de um dicionário
+COLUNAS_DICIONARIZADAS = ('local', 'cargo', 'colaborador')
+
+def linhas_exportacao_json(linhas):
+    """Um dict por linha do pipeline (auxiliares como 'Carona')."""
     def fmt_hora(h): return h.strftime('%H:%M:%S') if h else None
     def fmt_data(d): return d.strftime('%Y-%m-%d') if d else None
 
-    for item in queryset:
-        local_nome = ""
-        codigo_obra = None
-        codigo_cliente = None
-        
-        if item.local_execucao == 'INT':
-            tipo_str = "OBRA"
-            if item.projeto:
-                local_nome = item.projeto.nome
-                codigo_obra = item.projeto.codigo
-            elif item.codigo_cliente:
-                local_nome = item.codigo_cliente.nome
-                codigo_cliente = item.codigo_cliente.codigo
-        else:
-            tipo_str = "FORA DO SETOR"
-            local_nome = item.centro_custo.nome if item.centro_custo else "Atividade Externa"
-            if item.projeto: codigo_obra = item.projeto.codigo
-            elif item.codigo_cliente: codigo_cliente = item.codigo_cliente.codigo
+    for linha in linhas:
+        tipo_str, local_nome, codigo_obra, codigo_cliente = local_e_codigos(linha)
 
         if codigo_obra and len(str(codigo_obra)) >= 5:
              if not codigo_cliente: codigo_cliente = str(codigo_obra)[1:5]
         elif codigo_obra and not codigo_cliente:
              codigo_cliente = codigo_obra
 
-        veiculo_nome = ""
-        placa = ""
-        if item.veiculo:
-            veiculo_nome = item.veiculo.descricao
-            placa = item.veiculo.placa
-        elif item.veiculo_manual_modelo:
-            veiculo_nome = item.veiculo_manual_modelo
-            placa = item.veiculo_manual_placa
-
-        base_obj = {
-            'data': fmt_data(item.data_apontamento),
-            'dia_semana': item.data_apontamento.weekday(), 
+        row = {
+            'data': fmt_data(linha.data_apontamento),
+            'dia_semana': linha.data_apontamento.weekday(), 
             'tipo': tipo_str,
             'local': local_nome,
             'codigo_obra': codigo_obra,
             'codigo_cliente': codigo_cliente,
-            'hora_inicio': fmt_hora(item.hora_inicio),
-            'hora_fim': fmt_hora(item.hora_termino), 
-            'observacoes': item.ocorrencias,
-            'registrado_por': item.registrado_por.username if item.registrado_por else 'Sistema',
-            'dorme_fora': item.dorme_fora,
-            'em_plantao': item.em_plantao,
-            'status': item.status_ajuste or 'OK'
+            'hora_inicio': fmt_hora(linha.hora_inicio),
+            'hora_fim': fmt_hora(linha.hora_termino), 
+            'observacoes': linha.ocorrencias,
+            'registrado_por': linha.registrado_por_username or 'Sistema',
+            'dorme_fora': linha.dorme_fora,
+            'em_plantao': linha.em_plantao,
+            'status': linha.status_ajuste or 'OK',
+            'colaborador': linha.colaborador,
+            'cargo': linha.cargo,
         }
 
-        row_main = base_obj.copy()
-        row_main.update({
-            'colaborador': item.colaborador.nome_completo,
-            'cargo': item.colaborador.cargo,
-            'veiculo': veiculo_nome,
-            'placa': placa,
-            'is_auxiliar': False
-        })
-        dados_saida.append(row_main)
-
-        auxiliares = []
-        if item.auxiliar: auxiliares.append(item.auxiliar)
-        auxiliares.extend(list(item.auxiliares_extras.all()))
-
-        for aux in auxiliares:
-            row_aux = base_obj.copy()
-            row_aux.update({
-                'colaborador': aux.nome_completo,
-                'cargo': aux.cargo,
-                'veiculo': 'Carona', 
+        if linha.is_auxiliar:
+            # Auxiliares herdam status, plantão e dorme-fora do apontamento principal
+            row.update({
+                'veiculo': 'Carona',
                 'placa': None,
                 'is_auxiliar': True,
-                # Auxiliares herdam o status do apontamento principal, 
-                # mas geralmente não ganham plantão/dorme fora automaticamente (regra de negócio),
-                # vamos manter false para evitar duplicidade de custo visual, ou true se a regra for essa.
-                # Vou manter FALSE para caronas por segurança.
-                'dorme_fora': True if item.dorme_fora else False, 
-                'em_plantao': True if item.em_plantao else False, 
+                'dorme_fora': True if linha.dorme_fora else False,
+                'em_plantao': True if linha.em_plantao else False,
             })
-            dados_saida.append(row_aux)
+        else:
+            veiculo_nome = ""
+            placa = ""
+            if linha.veiculo_id:
+                veiculo_nome = linha.veiculo_descricao
+                placa = linha.veiculo_placa
+            elif linha.veiculo_manual_modelo:
+                veiculo_nome = linha.veiculo_manual_modelo
+                placa = linha.veiculo_manual_placa
+            row.update({'veiculo': veiculo_nome, 'placa': placa, 'is_auxiliar': False})
+        yield row
+
+def montar_payload_colunar(linhas, colunas):
+    """
+    Formato compacto: uma lista de colunas e cada linha como array posicional.
+    Strings repetidas (local, cargo, colaborador) são trocadas por índices de 'dicionarios'.
+    """
+    dicionarios = {c: {} for c in colunas if c in COLUNAS_DICIONARIZADAS}
+    saida = []
+    for row in linhas:
+        valores = []
+        for c in colunas:
+            valor = row[c]
+            if c in dicionarios:
+                valor = dicionarios[c].setdefault(valor, len(dicionarios[c]))
+            valores.append(valor)
+        saida.append(valores)
+
+    return {
+        'formato': 'colunar',
+        'colunas': colunas,
+        'dicionarios': {c: list(d) for c, d in dicionarios.items()},
+        'linhas': saida,
+    }
+
+@csrf_exempt
+@gzip_page
+async def api_exportar_json(request):
+    """
+    Sincronização completa para o Dashboard PHP.
+    Parâmetros opcionais:
+      - days: janela em dias (padrão 45)
+      - formato=colunar: payload compacto (colunas + arrays + dicionários)
+      - fields=data,colaborador,...: seleciona apenas as colunas informadas
+    A resposta é comprimida com gzip quando o cliente envia Accept-Encoding: gzip.
+    View assíncrona: a leitura roda em thread (sync_to_async), sem bloquear o event loop.
+    """
+    api_key_esperada = getattr(settings, 'DJANGO_API_KEY', 'chave_secreta_123')
+    token_recebido = request.headers.get('X-API-KEY')
+    if token_recebido != api_key_esperada: return JsonResponse({'erro': 'Acesso Negado'}, status=403)
+
+    colunas = COLUNAS_EXPORTACAO_JSON
+    fields_param = request.GET.get('fields')
+    if fields_param:
+        colunas = [c.strip() for c in fields_param.split(',') if c.strip()]
+        invalidas = [c for c in colunas if c not in COLUNAS_EXPORTACAO_JSON]
+        if invalidas or not colunas:
+            return JsonResponse({'erro': f"Campos inválidos: {', '.join(invalidas)}", 'campos_disponiveis': COLUNAS_EXPORTACAO_JSON}, status=400)
+
+    days = int(request.GET.get('days', 45))
+    start_date = timezone.now().date() - timedelta(days=days)
+    
+    quentes = Apontamento.objects.filter(data_apontamento__gte=start_date)
+    arquivados = ApontamentoArquivado.objects.filter(data_apontamento__gte=start_date)
+
+    # O pipeline é síncrono (leitura em blocos): roda inteiro fora do event loop
+    linhas = await sync_to_async(list)(linhas_exportacao_json(linhas_apontamentos(quentes, arquivados)))
+
+    if request.GET.get('formato') == 'colunar':
+        payload = montar_payload_colunar(linhas, colunas)
+        return JsonResponse(payload, json_dumps_params={'separators': (',', ':')})
+
+    if fields_param:
+        dados_saida = [{c: row[c] for c in colunas} for row in linhas]
+    else:
+        dados_saida = linhas
 
     return JsonResponse(dados_saida, safe=False)
 
@@ -981,7 +1167,7 @@ def aprovacao_dashboard_view(request):
     if is_owner(request.user):
         pendentes = Apontamento.objects.filter(
             status_aprovacao='EM_ANALISE'
-        ).select_related('colaborador', 'projeto', 'centro_custo').order_by('data_apontamento')
+        ).select_related('colaborador', 'projeto', 'centro_custo', 'codigo_cliente').order_by('data_apontamento')
         
     else:
         try:
@@ -991,7 +1177,7 @@ def aprovacao_dashboard_view(request):
             pendentes = Apontamento.objects.filter(
                 status_aprovacao='EM_ANALISE',
                 colaborador__setor__in=meus_setores
-            ).exclude(colaborador=gerente).select_related('colaborador', 'projeto', 'centro_custo').order_by('data_apontamento')
+            ).exclude(colaborador=gerente).select_related('colaborador', 'projeto', 'centro_custo', 'codigo_cliente').order_by('data_apontamento')
             
         except Colaborador.DoesNotExist:
             messages.error(request, "Seu usuário não está vinculado a um cadastro de Colaborador/Gestor.")
@@ -1165,6 +1351,8 @@ def processar_aprovacao_view(request, pk):
         return redirect('produtividade:aprovacao_dashboard')
     
     apontamento = get_object_or_404(Apontamento, pk=pk)
+    if competencia_fechada(request, apontamento):
+        return redirect('produtividade:aprovacao_dashboard')
     acao = request.POST.get('acao')
     motivo = request.POST.get('motivo_rejeicao', '').strip()
 
@@ -1184,4 +1372,279 @@ def processar_aprovacao_view(request, pk):
 
     apontamento.save()
     
-    return redirect('produtividade:aprovacao_dashboard')
\ No newline at end of file
+    return redirect('produtividade:aprovacao_dashboard')
+
+# ==============================================================================
+# 7. FECHAMENTO DE PERÍODO (FOLHA)
+# ==============================================================================
+
+@login_required
+@user_passes_test(is_owner)
+def fechamento_periodo_view(request):
+    """
+    Lista as competências fechadas e permite fechar um novo mês.
+    O fechamento bloqueia edições e congela os totais por colaborador.
+    """
+    if request.method == 'POST':
+        competencia = request.POST.get('competencia', '')  # formato AAAA-MM (input type=month)
+        try:
+            ano, mes = (int(x) for x in competencia.split('-'))
+            if not 1 <= mes <= 12:
+                raise ValueError
+        except ValueError:
+            messages.error(request, "Informe uma competência válida.")
+            return redirect('produtividade:fechamento_periodo')
+
+        try:
+            fechamento = fechar_periodo(ano, mes, request.user)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return redirect('produtividade:fechamento_periodo')
+
+        messages.success(request, f"Competência {fechamento} fechada com sucesso.")
+        return redirect('produtividade:fechamento_detalhe', pk=fechamento.pk)
+
+    fechamentos = FechamentoPeriodo.objects.select_related('fechado_por').annotate(qtd_colaboradores=Count('resumos'))
+    hoje = timezone.localdate()
+    mes_anterior = hoje.replace(day=1) - timedelta(days=1)
+
+    context = {
+        'titulo': 'Fechamento de Período',
+        'fechamentos': fechamentos,
+        'competencia_sugerida': mes_anterior.strftime('%Y-%m'),
+    }
+    return render(request, 'produtividade/fechamento_periodo.html', context)
+
+
+@login_required
+@user_passes_test(is_owner)
+def fechamento_detalhe_view(request, pk):
+    """Resumo congelado de uma competência (lido do cache, sem recálculo)."""
+    fechamento = get_object_or_404(FechamentoPeriodo.objects.select_related('fechado_por'), pk=pk)
+    linhas = resumo_congelado(fechamento)
+
+    total_minutos = sum(l['total_minutos'] for l in linhas)
+    context = {
+        'titulo': f'Fechamento {fechamento}',
+        'fechamento': fechamento,
+        'linhas': linhas,
+        'total_horas': f"{total_minutos // 60:02d}:{total_minutos % 60:02d}",
+    }
+    return render(request, 'produtividade/fechamento_detalhe.html', context)
+
+
+@login_required
+@user_passes_test(is_owner)
+def exportar_fechamento_excel(request, pk):
+    """Planilha do período fechado. O arquivo é gerado uma única vez (cache permanente)."""
+    fechamento = get_object_or_404(FechamentoPeriodo, pk=pk)
+    response = HttpResponse(
+        planilha_fechamento(fechamento),
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+    response['Content-Disposition'] = f'attachment; filename=Fechamento_{fechamento.ano}_{fechamento.mes:02d}.xlsx'
+    response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+
+@login_required
+@user_passes_test(is_owner)
+def exportar_folha(request):
+    """
+    Horas da competência para a folha (ver folha.py): normais, extras 50%/100% e
+    adicional noturno por colaborador. GET competencia=AAAA-MM; vale para meses abertos.
+    """
+    competencia = request.GET.get('competencia', '')
+    try:
+        ano, mes = (int(x) for x in competencia.split('-'))
+        inicio = date(ano, mes, 1)
+    except ValueError:
+        messages.error(request, "Informe uma competência válida.")
+        return redirect('produtividade:fechamento_periodo')
+
+    fim = date(ano + mes // 12, mes % 12 + 1, 1) - timedelta(days=1)
+    response = HttpResponse(
+        planilha_folha(folha_do_periodo(inicio, fim), inicio, fim),
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+    response['Content-Disposition'] = f'attachment; filename=Folha_{ano}_{mes:02d}.xlsx'
+    return response
+
+
+@login_required
+@user_passes_test(is_owner)
+def dias_faltantes_view(request):
+    """
+    Dias úteis sem apontamento de todos os colaboradores na competência (ver calendario.py).
+    GET: competencia (AAAA-MM, padrão mês atual), setor (ID), feriados=0 para cobrar
+    também os feriados, formato=xlsx para a planilha.
+    """
+    hoje = timezone.localdate()
+    competencia = request.GET.get('competencia') or f"{hoje:%Y-%m}"
+    try:
+        ano, mes = (int(x) for x in competencia.split('-'))
+        setor_id = int(request.GET['setor']) if request.GET.get('setor') else None
+        excluir_feriados = request.GET.get('feriados') != '0'
+        resultado = dias_faltantes(ano, mes, setor_id, excluir_feriados, hoje)
+    except ValueError:
+        messages.error(request, "Informe uma competência válida.")
+        return redirect('produtividade:fechamento_periodo')
+
+    if request.GET.get('formato') == 'xlsx':
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = f"Sem Apontamento {mes:02d}-{ano}"
+        ws.append(["ID Colaborador", "Colaborador", "Setor", "Qtd. Dias", "Dias sem Apontamento"])
+        for cell in ws[1]:
+            cell.font = Font(bold=True, color="FFFFFF")
+            cell.fill = PatternFill(start_color="4F46E5", end_color="4F46E5", fill_type="solid")
+            cell.alignment = Alignment(horizontal='center', vertical='center')
+        for c in resultado['colaboradores']:
+            ws.append([
+                c['id_colaborador'], c['colaborador'], c['setor'], len(c['faltantes']),
+                ", ".join(f"{dia:%d/%m}" for dia in c['faltantes']),
+            ])
+        response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        response['Content-Disposition'] = f'attachment; filename=Sem_Apontamento_{ano}_{mes:02d}.xlsx'
+        wb.save(response)
+        return response
+
+    filtros = request.GET.copy()
+    filtros.pop('formato', None)
+    filtros['competencia'] = f"{ano}-{mes:02d}"
+    context = {
+        'titulo': f'Dias sem Apontamento {mes:02d}/{ano}',
+        'competencia': f"{ano}-{mes:02d}",
+        'filtros': filtros.urlencode(),
+        'setores': Setor.objects.all(),
+        'setor_id': setor_id,
+        'excluir_feriados': excluir_feriados,
+        'fim': resultado['fim'],
+        'qtd_esperados': len(resultado['dias_esperados']),
+        'colaboradores': resultado['colaboradores'],
+    }
+    return render(request, 'produtividade/dias_faltantes.html', context)
+
+
+# Anomalias exibidas na tela; a lista completa sai no CSV
+MAX_ANOMALIAS_TELA = 300
+
+
+@login_required
+@user_passes_test(is_owner)
+def auditoria_apontamentos(request):
+    """
+    Auditoria de qualidade (ver auditoria.py): sobreposições, dias acima do limite,
+    duplicados e rateios inconsistentes. start_date/end_date opcionais (sem datas: toda
+    a base), tipo para filtrar a lista e formato=csv para a lista completa em streaming.
+    """
+    filtros = filtros_relatorio(request.GET)
+    inicio, fim = filtros.get('data_apontamento__gte'), filtros.get('data_apontamento__lte')
+    tipo = request.GET.get('tipo') if request.GET.get('tipo') in TIPOS_ANOMALIA else None
+
+    if request.GET.get('formato') == 'csv':
+        writer = csv.writer(Echo(), delimiter=';')
+        nomes = dict(Colaborador.objects.values_list('pk', 'nome_completo'))
+
+        def gerar():
+            yield '\ufeff'
+            yield writer.writerow(['Tipo', 'Colaborador', 'Data', 'Registros', 'Detalhe'])
+            for anomalia in auditar(inicio, fim):
+                if tipo is None or anomalia.tipo == tipo:
+                    yield writer.writerow(linha_anomalia(anomalia, nomes))
+
+        response = StreamingHttpResponse(gerar(), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f"attachment; filename=Auditoria_{timezone.now():%Y%m%d_%H%M}.csv"
+        return response
+
+    contagem = {chave: 0 for chave in TIPOS_ANOMALIA}
+    anomalias = []
+    for anomalia in auditar(inicio, fim):
+        contagem[anomalia.tipo] += 1
+        if (tipo is None or anomalia.tipo == tipo) and len(anomalias) < MAX_ANOMALIAS_TELA:
+            anomalias.append(anomalia)
+    nomes = nomes_colaboradores(anomalias)
+
+    filtros_url = request.GET.copy()
+    filtros_url.pop('formato', None)
+    context = {
+        'titulo': 'Auditoria de Apontamentos',
+        'inicio': inicio,
+        'fim': fim,
+        'tipo': tipo,
+        'tipos': [
+            {'chave': chave, 'rotulo': rotulo, 'qtd': contagem[chave]} for chave, rotulo in TIPOS_ANOMALIA.items()
+        ],
+        'total': sum(contagem.values()),
+        'filtros': filtros_url.urlencode(),
+        'limite_tela': MAX_ANOMALIAS_TELA,
+        'anomalias': [
+            {
+                'rotulo': TIPOS_ANOMALIA[a.tipo],
+                'tipo': a.tipo,
+                'colaborador': nomes.get(a.colaborador_id, a.colaborador_id),
+                'data': a.data,
+                'registros': a.registros,
+                'detalhe': a.detalhe,
+            }
+            for a in anomalias
+        ],
+    }
+    return render(request, 'produtividade/auditoria.html', context)
+
+
+# Conflitos exibidos na tela; a lista completa sai na planilha
+MAX_CONFLITOS_TELA = 300
+
+
+@login_required
+@user_passes_test(is_owner)
+def uso_veiculos_view(request):
+    """
+    Horas de uso por veículo (frota e placas manuais) e usos simultâneos em destinos
+    diferentes (ver veiculos.py). GET: start_date/end_date (padrão: últimas 4 semanas),
+    granularidade (dia/semana), formato=xlsx para a planilha.
+    """
+    hoje = timezone.localdate()
+    filtros = filtros_relatorio(request.GET)
+    inicio = filtros.get('data_apontamento__gte', hoje - timedelta(days=27))
+    fim = filtros.get('data_apontamento__lte', hoje)
+    granularidade = request.GET.get('granularidade') or 'semana'
+    try:
+        resultado = uso_veiculos(inicio, fim, granularidade)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('produtividade:fechamento_periodo')
+
+    if request.GET.get('formato') == 'xlsx':
+        response = HttpResponse(
+            planilha_uso(resultado),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+        response['Content-Disposition'] = f'attachment; filename=Uso_Veiculos_{inicio:%Y%m%d}_{fim:%Y%m%d}.xlsx'
+        return response
+
+    filtros_url = request.GET.copy()
+    filtros_url.pop('formato', None)
+    filtros_url.update({'start_date': f"{inicio:%Y-%m-%d}", 'end_date': f"{fim:%Y-%m-%d}", 'granularidade': granularidade})
+    formato_periodo = '%d/%m' if granularidade == 'dia' else 'Sem. %d/%m'
+    context = {
+        'titulo': 'Uso de Veículos',
+        'inicio': inicio,
+        'fim': fim,
+        'granularidade': granularidade,
+        'filtros': filtros_url.urlencode(),
+        'periodos': [p.strftime(formato_periodo) for p in resultado['periodos']],
+        'veiculos': [
+            {
+                **v,
+                'horas': [f"{m // 60:02d}:{m % 60:02d}" if m else '' for m in v['minutos']],
+                'total_horas': f"{v['total'] // 60:02d}:{v['total'] % 60:02d}",
+            }
+            for v in resultado['veiculos']
+        ],
+        'qtd_conflitos': len(resultado['conflitos']),
+        'conflitos': resultado['conflitos'][:MAX_CONFLITOS_TELA],
+        'limite_tela': MAX_CONFLITOS_TELA,
+    }
+    return render(request, 'produtividade/uso_veiculos.html', context)